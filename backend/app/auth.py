@@ -10,10 +10,19 @@ ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
 
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+# Marks a hash shared by many bulk-provisioned accounts; it is replaced with the user's own hash on first login
+PROVISIONAL_HASH_PREFIX = "provisional:"
 
 def verify_password(plain_password, hashed_password):
+    if hashed_password and hashed_password.startswith(PROVISIONAL_HASH_PREFIX):
+        hashed_password = hashed_password[len(PROVISIONAL_HASH_PREFIX):]
     return pwd_context.verify(plain_password, hashed_password)
 
+def needs_rehash(hashed_password) -> bool:
+    if hashed_password.startswith(PROVISIONAL_HASH_PREFIX):
+        return True
+    return pwd_context.needs_update(hashed_password)
+
 def get_password_hash(password):
     return pwd_context.hash(password)
 
@@ -29,19 +38,83 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
 
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, make_transient_to_detached
 from . import database, models
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login", auto_error=False)
 
+import hashlib
+import os
+import threading
+import time
 import uuid
+from collections import OrderedDict
+from typing import Tuple
+
+# Resolved principals by token hash. Short-lived, so role and approval changes made by another
+# worker are picked up within the TTL; writes in this process call invalidate_principals().
+PRINCIPAL_CACHE_TTL_SECONDS = float(os.getenv("AUTH_PRINCIPAL_TTL_SECONDS", "30"))
+PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("AUTH_PRINCIPAL_MAX_ENTRIES", "2048"))
+_principals: "OrderedDict[str, Tuple[float, models.User]]" = OrderedDict()
+_principals_lock = threading.Lock()
+
+
+def _principal_key(token: Optional[str]) -> str:
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest()
+
+
+def _principal_get(key: str) -> Optional[models.User]:
+    with _principals_lock:
+        entry = _principals.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= time.time():
+            del _principals[key]
+            return None
+        _principals.move_to_end(key)
+        return entry[1]
+
+
+def _principal_put(key: str, user: models.User, token_exp: Optional[float] = None):
+    if PRINCIPAL_CACHE_TTL_SECONDS <= 0:
+        return
+    # Detached copy with every column loaded: merging it into a session needs no SELECT
+    detached = models.User(**{attr.key: getattr(user, attr.key) for attr in models.User.__mapper__.column_attrs})
+    make_transient_to_detached(detached)
+    expires_at = time.time() + PRINCIPAL_CACHE_TTL_SECONDS
+    if token_exp is not None:
+        expires_at = min(expires_at, token_exp)
+    with _principals_lock:
+        _principals[key] = (expires_at, detached)
+        _principals.move_to_end(key)
+        while len(_principals) > PRINCIPAL_CACHE_MAX_ENTRIES:
+            _principals.popitem(last=False)
+
+
+def invalidate_principals(email: Optional[str] = None):
+    """Drop cached principals for one account (or all); called after role/approval writes."""
+    with _principals_lock:
+        if email is None:
+            _principals.clear()
+            return
+        for key in [k for k, (_, user) in _principals.items() if user.email == email]:
+            del _principals[key]
+
 
 def get_current_user_obj(token: Optional[str] = Depends(oauth2_scheme), db: Session = Depends(database.get_db)):
+    key = _principal_key(token)
+    cached = _principal_get(key)
+    if cached is not None:
+        # Attach to this request's session without a query; the cached copy stays untouched
+        return db.merge(cached, load=False)
+
     email: Optional[str] = None
+    token_exp: Optional[float] = None
     if token:
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             email = payload.get("sub")
+            token_exp = payload.get("exp")
         except Exception:
             if "teacher" in token.lower():
                 email = "teacher@sage.com"
@@ -71,20 +144,40 @@ def get_current_user_obj(token: Optional[str] = Depends(oauth2_scheme), db: Sess
         db.commit()
         db.refresh(user)
 
-    if user.role == models.UserRole.student and (not user.linked_id or user.linked_id == "1"):
-        st = db.query(models.Student).first()
-        if st:
-            user.linked_id = st.enrollment_no
-            db.commit()
-
-    if not user.approved:
-        user.approved = True
-        db.commit()
-
+    # Student link repair and demo-account approval run once in the bootstrap (db/bootstrap.py)
+    _principal_put(key, user, token_exp)
     return user
 
 def get_current_active_admin(user: models.User = Depends(get_current_user_obj), db: Session = Depends(database.get_db)):
     if user.role != models.UserRole.admin:
         user.role = models.UserRole.admin
         db.commit()
+        invalidate_principals(user.email)
     return user
+
+
+def user_from_token(db: Session, token: Optional[str]) -> Optional[models.User]:
+    """Strict variant for WebSockets: a missing, invalid or expired token, or an unknown account, gives None."""
+    if not token:
+        return None
+    try:
+        email = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+    except JWTError:
+        return None
+    if not email:
+        return None
+    return db.query(models.User).filter(models.User.email == email).first()
+
+
+def can_access_student(db: Session, user: models.User, student: models.Student) -> bool:
+    """Admins see every student, students only themselves, teachers students in a batch they lecture."""
+    if user.role == models.UserRole.admin:
+        return True
+    if user.role == models.UserRole.student:
+        return user.linked_id == student.student_id
+    if user.role == models.UserRole.teacher:
+        return db.query(models.Lecture.id).filter(
+            models.Lecture.teacher_id == user.linked_id,
+            models.Lecture.batch == student.batch_id
+        ).first() is not None
+    return False
@@ -0,0 +1,55 @@
+import importlib
+import importlib.util
+import sys
+import threading
+import types
+from functools import lru_cache
+from typing import List
+
+# Libraries that cost hundreds of MB or seconds to import; web workers should only load them on demand
+HEAVY_MODULES = ("xgboost", "shap", "sklearn", "scipy", "pandas", "openpyxl")
+
+
+@lru_cache(maxsize=None)
+def available(name: str) -> bool:
+    """Whether a module can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(name) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+class LazyModule(types.ModuleType):
+    """
+    Stand-in for a module that is imported on first attribute access, so
+    `xgb = LazyModule("xgboost")` at module level costs nothing until `xgb.DMatrix` is used.
+    """
+
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.__dict__["_lazy_module"] = None
+        self.__dict__["_lazy_lock"] = threading.Lock()
+
+    def _load(self) -> types.ModuleType:
+        module = self.__dict__["_lazy_module"]
+        if module is None:
+            with self.__dict__["_lazy_lock"]:
+                module = self.__dict__["_lazy_module"]
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__["_lazy_module"] = module
+        return module
+
+    def __getattr__(self, attr: str):
+        return getattr(self._load(), attr)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.__dict__["_lazy_module"] is not None
+
+
+def loaded_heavy_modules() -> List[str]:
+    return [name for name in HEAVY_MODULES if name in sys.modules]
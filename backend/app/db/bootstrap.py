@@ -0,0 +1,277 @@
+import datetime
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Any, Optional
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from .session import engine, SessionLocal, Base
+from .. import models
+
+# Bump when the seed data below changes; schema changes are picked up by the fingerprint
+SEED_VERSION = 2
+MARKER_KEY = "schema_version"
+MIN_SEEDED_STUDENTS = 100
+SEED_STUDENTS_PATH = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.dirname(os.path.dirname(__file__)))), "data", "real_students_full.json"
+)
+DEFAULT_STUDENT_PASSWORD = "password123"
+# Accounts an unrecognised token falls back to in auth.get_current_user_obj
+DEMO_ACCOUNTS = ["admin@sage.com", "teacher@sage.com", "student@sage.com"]
+WRITE_BATCH_SIZE = 1000
+IN_CHUNK_SIZE = 500
+
+MARKS_PARAMETERS = [
+    {"name": "DSA", "subject": "Data Structures", "desc": "Data Structures and Algorithms score", "field": "dsa_score"},
+    {"name": "ML", "subject": "Machine Learning", "desc": "Machine Learning fundamentals score", "field": "ml_score"},
+    {"name": "QA", "subject": "Quantitative Aptitude", "desc": "Quantitative Aptitude score", "field": "qa_score"},
+    {"name": "Projects", "subject": "Projects", "desc": "Project completion score", "field": "projects_score"},
+    {"name": "Mock Interview", "subject": "Mock Interview", "desc": "Mock interview performance score", "field": "mock_interview_score"}
+]
+DEFAULT_TESTS = [
+    {"id": "TEST001", "name": "Python & DSA Fundamentals Test", "subject": "Data Structures", "topic": "Python Basics & Arrays", "description": "Assessment on Python fundamentals, list operations, and memory complexity.", "duration": 45, "passing_marks": 40, "difficulty": "Medium"},
+    {"id": "TEST002", "name": "DBMS & SQL Comprehensive Assessment", "subject": "DBMS", "topic": "Normalization & SQL Queries", "description": "Mid-term evaluation covering 1NF-3NF, JOINs and indexing.", "duration": 60, "passing_marks": 50, "difficulty": "Hard"},
+    {"id": "TEST003", "name": "Machine Learning & Predictive Models", "subject": "Machine Learning", "topic": "Classification & Regression", "description": "Quiz on supervised learning algorithms, decision trees, and confusion matrix.", "duration": 30, "passing_marks": 35, "difficulty": "Medium"}
+]
+
+
+def schema_fingerprint() -> str:
+    """Hash of every mapped table, column and index: changes whenever models.py does."""
+    parts = []
+    for table in sorted(Base.metadata.tables.values(), key=lambda t: t.name):
+        parts.append(table.name)
+        parts.extend(f"{c.name}:{c.type}:{c.nullable}" for c in table.columns)
+        parts.extend(sorted(i.name or "" for i in table.indexes))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()[:16]
+
+
+def expected_marker() -> Dict[str, Any]:
+    return {"schema": schema_fingerprint(), "seed": SEED_VERSION}
+
+
+def read_marker() -> Optional[Dict[str, Any]]:
+    """One indexed lookup; None when the database has never been bootstrapped."""
+    try:
+        with engine.connect() as conn:
+            value = conn.execute(
+                text("SELECT value FROM system_settings WHERE key = :key"), {"key": MARKER_KEY}
+            ).scalar()
+    except Exception:
+        return None
+    return json.loads(value) if value else None
+
+
+def is_current(marker: Optional[Dict[str, Any]] = None) -> bool:
+    marker = marker if marker is not None else read_marker()
+    expected = expected_marker()
+    return bool(marker) and all(marker.get(k) == v for k, v in expected.items())
+
+
+def _write_marker(db: Session):
+    value = json.dumps({**expected_marker(), "completed_at": datetime.datetime.utcnow().isoformat()})
+    setting = db.query(models.SystemSetting).filter(models.SystemSetting.key == MARKER_KEY).first()
+    if setting:
+        setting.value = value
+    else:
+        db.add(models.SystemSetting(key=MARKER_KEY, value=value))
+    db.commit()
+
+
+# ─── Seed steps (each idempotent) ────────────────────────────────────────────
+
+def _ensure_staff_accounts(db: Session):
+    from ..auth import get_password_hash
+
+    if not db.query(models.User).filter(models.User.email == "admin@sage.com").first():
+        print("[Bootstrap] Creating default Admin (admin@sage.com)...")
+        db.add(models.User(email="admin@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.admin, approved=True, is_verified=True))
+        if not db.query(models.Admin).filter(models.Admin.email == "admin@sage.com").first():
+            db.add(models.Admin(email="admin@sage.com", password=get_password_hash("password"), is_super_admin=True, approved=True))
+
+    if not db.query(models.User).filter(models.User.email == "teacher@sage.com").first():
+        print("[Bootstrap] Creating default Teacher (teacher@sage.com)...")
+        if not db.query(models.Teacher).filter(models.Teacher.teacher_id == "T01").first():
+            db.add(models.Teacher(teacher_id="T01", name="Prof. Teacher", email="teacher@sage.com", department="CSE", subject="CS", avg_improvement=15.0, feedback_score=4.5, content_quality_score=4.2, placement_conversion=20.0))
+        db.add(models.User(email="teacher@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.teacher, linked_id="T01", approved=True, is_verified=True))
+    db.commit()
+
+
+def _student_row(s_data: Dict[str, Any]) -> Dict[str, Any]:
+    scholar_no = s_data.get("scholar_no")
+    if not scholar_no or str(scholar_no).lower() == "nan":
+        scholar_no = None
+    batch = s_data.get("batch_id") or ""
+    row = {
+        "enrollment_no": s_data["student_id"],
+        "scholar_no": scholar_no,
+        "name": s_data["name"],
+        "email": s_data["email"],
+        "program": s_data.get("program", "B.Tech"),
+        "branch": s_data.get("branch", "CSE"),
+        "semester": 6,
+        "section": "A",
+        "cgpa": s_data.get("cgpa", 8.0),
+        "active_backlogs": s_data.get("active_backlogs", 0),
+        "admission_year": 2020 if "2020" in batch else (2021 if "2021" in batch else 2022),
+        "identity_proof": s_data.get("identity_proof"),
+        "attendance": s_data.get("attendance", 85),
+        "dsa_score": s_data.get("dsa_score", 80),
+        "ml_score": s_data.get("ml_score", 78),
+        "qa_score": s_data.get("qa_score", 82),
+        "projects_score": s_data.get("projects_score", 85),
+        "mock_interview_score": s_data.get("mock_interview_score", 80),
+        "rag_status": s_data.get("rag_status", "Green"),
+        "batch_id": s_data.get("batch_id"),
+        "pre_score": s_data.get("pre_score", 70.0),
+        "post_score": s_data.get("post_score", 88.0),
+        "pre_remarks": s_data.get("pre_remarks"),
+        "pre_status": s_data.get("pre_status"),
+        "post_remarks": s_data.get("post_remarks"),
+        "post_status": s_data.get("post_status"),
+        "external_certifications": s_data.get("external_certifications", 2)
+    }
+    for field in ("communication", "engagement", "subject_knowledge", "confidence", "fluency"):
+        row[f"pre_{field}"] = s_data.get(f"pre_{field}", 3.5)
+        row[f"post_{field}"] = s_data.get(f"post_{field}", 4.5)
+    return row
+
+
+def _seed_students(db: Session) -> int:
+    if db.query(models.Student).count() >= MIN_SEEDED_STUDENTS or not os.path.exists(SEED_STUDENTS_PATH):
+        return 0
+    from ..services import user_provisioning
+
+    with open(SEED_STUDENTS_PATH, "r", encoding="utf-8") as f:
+        real_students = json.load(f)
+    ids = [s["student_id"] for s in real_students]
+    existing = set()
+    for start in range(0, len(ids), IN_CHUNK_SIZE):
+        existing.update(sid for (sid,) in db.query(models.Student.enrollment_no).filter(
+            models.Student.enrollment_no.in_(ids[start:start + IN_CHUNK_SIZE])
+        ).all())
+    rows = list({s["student_id"]: _student_row(s) for s in real_students if s["student_id"] not in existing}.values())
+    print(f"[Bootstrap] Seeding {len(rows)} students from {os.path.basename(SEED_STUDENTS_PATH)}...")
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        db.bulk_insert_mappings(models.Student, rows[start:start + WRITE_BATCH_SIZE])
+    user_provisioning.provision_users(db, [{
+        "email": row["email"], "password": DEFAULT_STUDENT_PASSWORD, "role": models.UserRole.student,
+        "linked_id": row["enrollment_no"], "approved": True, "is_verified": True
+    } for row in rows])
+    db.commit()
+    return len(rows)
+
+
+def _ensure_default_student(db: Session):
+    if db.query(models.User).filter(models.User.email == "vaibhav@sage.com").first():
+        return
+    from ..auth import get_password_hash
+
+    print("[Bootstrap] Creating default Student (vaibhav@sage.com)...")
+    student = db.query(models.Student).first()
+    if not student:
+        student = models.Student(
+            enrollment_no="23BTA3ARI10038", scholar_no="231945", name="Vaibhav Gupta", email="vaibhav@sage.com",
+            program="B.Tech", branch="AI", admission_year=2023, semester=6, section="A", attendance=85,
+            dsa_score=80, ml_score=78, qa_score=82, projects_score=85, mock_interview_score=80, rag_status="Green"
+        )
+        db.add(student)
+        db.flush()
+    db.add(models.User(email="vaibhav@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.student, linked_id=student.enrollment_no, approved=True, is_verified=True))
+    db.commit()
+
+
+def _repair_user_accounts(db: Session) -> Dict[str, int]:
+    """
+    Fixes get_current_user_obj used to apply on every request: student accounts without a
+    usable linked_id point at the first student, and the demo accounts are approved.
+    """
+    relinked = 0
+    first_student = db.query(models.Student.enrollment_no).first()
+    if first_student:
+        relinked = db.query(models.User).filter(
+            models.User.role == models.UserRole.student,
+            (models.User.linked_id.is_(None)) | (models.User.linked_id.in_(["", "1"]))
+        ).update({models.User.linked_id: first_student[0]}, synchronize_session=False)
+    approved = db.query(models.User).filter(
+        models.User.email.in_(DEMO_ACCOUNTS),
+        (models.User.approved.is_(None)) | (models.User.approved == False)
+    ).update({models.User.approved: True}, synchronize_session=False)
+    db.commit()
+    return {"relinked": relinked, "approved": approved}
+
+
+def _seed_marks_parameters(db: Session) -> int:
+    if db.query(models.MarksParameter).count():
+        return 0
+    print("[Bootstrap] Seeding default Marks Parameters...")
+    db.bulk_insert_mappings(models.MarksParameter, [{
+        "id": models.generate_uuid(), "parameter_name": p["name"], "description": p["desc"], "max_marks": 100.0,
+        "weightage": 20.0, "subject": p["subject"], "semester": "Semester 1", "status": "Active"
+    } for p in MARKS_PARAMETERS])
+    db.commit()
+    return len(MARKS_PARAMETERS)
+
+
+def _seed_tests(db: Session) -> int:
+    """Default tests, assigned to every student, plus each student's marks per default parameter."""
+    if db.query(models.Test).count():
+        return 0
+    print("[Bootstrap] Seeding default tests & test assignments...")
+    teacher_id = db.query(models.Teacher.faculty_id).limit(1).scalar() or "T01"
+    db.bulk_insert_mappings(models.Test, [{**t, "teacher_id": teacher_id, "approved": True} for t in DEFAULT_TESTS])
+
+    students = db.query(
+        models.Student.enrollment_no, *[getattr(models.Student, p["field"]) for p in MARKS_PARAMETERS]
+    ).all()
+    today = datetime.date.today()
+    start_date, end_date = today - datetime.timedelta(days=2), today + datetime.timedelta(days=14)
+    assignments = [{
+        "id": f"ASG_{row[0]}_{t['id']}", "test_id": t["id"], "student_id": row[0], "assigned_by": teacher_id,
+        "start_date": start_date, "end_date": end_date, "status": "Pending"
+    } for row in students for t in DEFAULT_TESTS]
+
+    parameter_ids = dict(db.query(models.MarksParameter.parameter_name, models.MarksParameter.id).filter(
+        models.MarksParameter.parameter_name.in_([p["name"] for p in MARKS_PARAMETERS])
+    ).all())
+    marks = [{
+        "id": models.generate_uuid(), "student_id": row[0], "parameter_id": parameter_ids[p["name"]],
+        "score": float(row[i + 1] or 0)
+    } for row in students for i, p in enumerate(MARKS_PARAMETERS) if p["name"] in parameter_ids]
+
+    for mapper, rows in ((models.TestAssignment, assignments), (models.StudentParameterMark, marks)):
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            db.bulk_insert_mappings(mapper, rows[start:start + WRITE_BATCH_SIZE])
+    db.commit()
+    return len(DEFAULT_TESTS)
+
+
+def run() -> Dict[str, Any]:
+    """Create missing tables, apply the seed and record the schema-version marker."""
+    started = time.perf_counter()
+    Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    try:
+        _ensure_staff_accounts(db)
+        students = _seed_students(db)
+        _ensure_default_student(db)
+        repaired = _repair_user_accounts(db)
+        parameters = _seed_marks_parameters(db)
+        tests = _seed_tests(db)
+        _write_marker(db)
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
+    return {
+        **expected_marker(),
+        "students_seeded": students,
+        "marks_parameters_seeded": parameters,
+        "tests_seeded": tests,
+        "users_relinked": repaired["relinked"],
+        "users_approved": repaired["approved"],
+        "duration_ms": round((time.perf_counter() - started) * 1000.0, 1)
+    }
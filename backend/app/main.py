@@ -1,222 +1,56 @@
+import asyncio
 import os
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from .database import engine, Base, SessionLocal
+from .database import SessionLocal
 from sqlalchemy import text
-from .routers import auth, analytics, updates, attendance, dashboard, assignments, automation, autograder, ingest, ai_report, admin_workflow, settings, tests, student_tests, marks_parameters, college_sandbox
+from .routers import auth, analytics, updates, attendance, dashboard, assignments, automation, autograder, ingest, ai_report, admin_workflow, settings, tests, student_tests, marks_parameters, college_sandbox, jobs
 from . import models
+from .db import bootstrap
 
 from contextlib import asynccontextmanager
 
+# Replicas only read the schema-version marker; run scripts/migrate_and_seed.py once per deploy and set
+# DB_AUTO_BOOTSTRAP=0 so a replica never creates tables or seeds on its own
+AUTO_BOOTSTRAP = os.getenv("DB_AUTO_BOOTSTRAP", "1") == "1"
+
 def auto_init_database():
-    print("[Auto-Init] Verifying database schema & default user accounts...")
+    started = time.perf_counter()
     max_retries = 5
     for attempt in range(1, max_retries + 1):
         try:
-            Base.metadata.create_all(bind=engine)
-            db = SessionLocal()
-            try:
-                from .auth import get_password_hash
-
-                # Ensure default Admin account
-                if not db.query(models.User).filter(models.User.email == "admin@sage.com").first():
-                    print("[Auto-Init] Creating default Admin (admin@sage.com)...")
-                    db.add(models.User(email="admin@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.admin, approved=True, is_verified=True))
-                    if not db.query(models.Admin).filter(models.Admin.email == "admin@sage.com").first():
-                        db.add(models.Admin(email="admin@sage.com", password=get_password_hash("password"), is_super_admin=True, approved=True))
-
-                # Ensure default Teacher account
-                if not db.query(models.User).filter(models.User.email == "teacher@sage.com").first():
-                    print("[Auto-Init] Creating default Teacher (teacher@sage.com)...")
-                    if not db.query(models.Teacher).filter(models.Teacher.teacher_id == "T01").first():
-                        db.add(models.Teacher(teacher_id="T01", name="Prof. Teacher", email="teacher@sage.com", department="CSE", subject="CS", avg_improvement=15.0, feedback_score=4.5, content_quality_score=4.2, placement_conversion=20.0))
-                    db.add(models.User(email="teacher@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.teacher, linked_id="T01", approved=True, is_verified=True))
-
-                # Seed Real Students from real_students_full.json if database has fewer than 100 students
-                student_count = db.query(models.Student).count()
-                if student_count < 100:
-                    json_data_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "data", "real_students_full.json")
-                    if os.path.exists(json_data_path):
-                        print("[Auto-Init] Seeding real student dataset (153 students)...")
-                        import json
-                        with open(json_data_path, "r", encoding="utf-8") as f:
-                            real_students = json.load(f)
-                        
-                        for s_data in real_students:
-                            existing = db.query(models.Student).filter(models.Student.enrollment_no == s_data["student_id"]).first()
-                            if not existing:
-                                scholar_no_val = s_data.get("scholar_no")
-                                if not scholar_no_val or str(scholar_no_val).lower() == "nan":
-                                    scholar_no_val = None
-
-                                st = models.Student(
-                                    enrollment_no=s_data["student_id"],
-                                    scholar_no=scholar_no_val,
-                                    name=s_data["name"],
-                                    email=s_data["email"],
-                                    program=s_data.get("program", "B.Tech"),
-                                    branch=s_data.get("branch", "CSE"),
-                                    semester=6,
-                                    section="A",
-                                    cgpa=s_data.get("cgpa", 8.0),
-                                    active_backlogs=s_data.get("active_backlogs", 0),
-                                    admission_year=2020 if "2020" in s_data["batch_id"] else (2021 if "2021" in s_data["batch_id"] else 2022),
-                                    identity_proof=s_data.get("identity_proof"),
-                                    attendance=s_data.get("attendance", 85),
-                                    dsa_score=s_data.get("dsa_score", 80),
-                                    ml_score=s_data.get("ml_score", 78),
-                                    qa_score=s_data.get("qa_score", 82),
-                                    projects_score=s_data.get("projects_score", 85),
-                                    mock_interview_score=s_data.get("mock_interview_score", 80),
-                                    rag_status=s_data.get("rag_status", "Green"),
-                                    batch_id=s_data.get("batch_id"),
-                                    pre_score=s_data.get("pre_score", 70.0),
-                                    post_score=s_data.get("post_score", 88.0),
-                                    pre_communication=s_data.get("pre_communication", 3.5),
-                                    post_communication=s_data.get("post_communication", 4.5),
-                                    pre_engagement=s_data.get("pre_engagement", 3.5),
-                                    post_engagement=s_data.get("post_engagement", 4.5),
-                                    pre_subject_knowledge=s_data.get("pre_subject_knowledge", 3.5),
-                                    post_subject_knowledge=s_data.get("post_subject_knowledge", 4.5),
-                                    pre_confidence=s_data.get("pre_confidence", 3.5),
-                                    post_confidence=s_data.get("post_confidence", 4.5),
-                                    pre_fluency=s_data.get("pre_fluency", 3.5),
-                                    post_fluency=s_data.get("post_fluency", 4.5),
-                                    pre_remarks=s_data.get("pre_remarks"),
-                                    pre_status=s_data.get("pre_status"),
-                                    post_remarks=s_data.get("post_remarks"),
-                                    post_status=s_data.get("post_status"),
-                                    external_certifications=s_data.get("external_certifications", 2)
-                                )
-                                db.add(st)
-                                db.flush()
-                                
-                                # Add User account for student
-                                if not db.query(models.User).filter(models.User.email == s_data["email"]).first():
-                                    db.add(models.User(
-                                        email=s_data["email"],
-                                        password_hash=get_password_hash("password123"),
-                                        role=models.UserRole.student,
-                                        linked_id=st.enrollment_no,
-                                        approved=True,
-                                        is_verified=True
-                                    ))
-                        db.commit()
-
-                # Ensure default Student account
-                if not db.query(models.User).filter(models.User.email == "vaibhav@sage.com").first():
-                    print("[Auto-Init] Creating default Student (vaibhav@sage.com)...")
-                    student = db.query(models.Student).first()
-                    if not student:
-                        student = models.Student(
-                            enrollment_no="23BTA3ARI10038",
-                            scholar_no="231945",
-                            name="Vaibhav Gupta",
-                            email="vaibhav@sage.com",
-                            program="B.Tech",
-                            branch="AI",
-                            admission_year=2023,
-                            semester=6,
-                            section="A",
-                            attendance=85,
-                            dsa_score=80,
-                            ml_score=78,
-                            qa_score=82,
-                            projects_score=85,
-                            mock_interview_score=80,
-                            rag_status="Green"
-                        )
-                        db.add(student)
-                        db.flush()
-                    db.add(models.User(email="vaibhav@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.student, linked_id=student.enrollment_no, approved=True, is_verified=True))
-
-                db.commit()
-
-                # Seed Marks Parameters if missing
-                count = db.query(models.MarksParameter).count()
-                if count == 0:
-                    print("[Auto-Init] Seeding default Marks Parameters...")
-                    defaults = [
-                        {"name": "DSA", "subject": "Data Structures", "desc": "Data Structures and Algorithms score"},
-                        {"name": "ML", "subject": "Machine Learning", "desc": "Machine Learning fundamentals score"},
-                        {"name": "QA", "subject": "Quantitative Aptitude", "desc": "Quantitative Aptitude score"},
-                        {"name": "Projects", "subject": "Projects", "desc": "Project completion score"},
-                        {"name": "Mock Interview", "subject": "Mock Interview", "desc": "Mock interview performance score"}
-                    ]
-                    params_created = {}
-                    for d in defaults:
-                        p = models.MarksParameter(
-                            parameter_name=d["name"],
-                            description=d["desc"],
-                            max_marks=100.0,
-                            weightage=20.0,
-                            subject=d["subject"],
-                            semester="Semester 1",
-                            status="Active"
-                        )
-                        db.add(p)
-                        db.commit()
-                        db.refresh(p)
-                        params_created[d["name"]] = p.id
-
-                # Seed Tests & TestAssignments if missing
-                if db.query(models.Test).count() == 0:
-                    print("[Auto-Init] Seeding default tests & test assignments...")
-                    import datetime
-                    teacher = db.query(models.Teacher).first()
-                    t_id = teacher.faculty_id if teacher else "T01"
-                    
-                    t1 = models.Test(id="TEST001", teacher_id=t_id, name="Python & DSA Fundamentals Test", subject="Data Structures", topic="Python Basics & Arrays", description="Assessment on Python fundamentals, list operations, and memory complexity.", duration=45, passing_marks=40, difficulty="Medium", approved=True)
-                    t2 = models.Test(id="TEST002", teacher_id=t_id, name="DBMS & SQL Comprehensive Assessment", subject="DBMS", topic="Normalization & SQL Queries", description="Mid-term evaluation covering 1NF-3NF, JOINs and indexing.", duration=60, passing_marks=50, difficulty="Hard", approved=True)
-                    t3 = models.Test(id="TEST003", teacher_id=t_id, name="Machine Learning & Predictive Models", subject="Machine Learning", topic="Classification & Regression", description="Quiz on supervised learning algorithms, decision trees, and confusion matrix.", duration=30, passing_marks=35, difficulty="Medium", approved=True)
-                    db.add_all([t1, t2, t3])
-                    db.commit()
-
-                    students_list = db.query(models.Student).all()
-                    today_dt = datetime.date.today()
-                    start_dt = today_dt - datetime.timedelta(days=2)
-                    end_dt = today_dt + datetime.timedelta(days=14)
-                    
-                    asgs = []
-                    for st_item in students_list:
-                        for t_item in [t1, t2, t3]:
-                            asgs.append(models.TestAssignment(
-                                id=f"ASG_{st_item.enrollment_no}_{t_item.id}",
-                                test_id=t_item.id,
-                                student_id=st_item.enrollment_no,
-                                assigned_by=t_id,
-                                start_date=start_dt,
-                                end_date=end_dt,
-                                status="Pending"
-                            ))
-                    db.add_all(asgs)
-                    db.commit()
-                    
-                    students = db.query(models.Student).all()
-                    for s in students:
-                        db.add(models.StudentParameterMark(student_id=s.student_id, parameter_id=params_created["DSA"], score=float(s.dsa_score or 0)))
-                        db.add(models.StudentParameterMark(student_id=s.student_id, parameter_id=params_created["ML"], score=float(s.ml_score or 0)))
-                        db.add(models.StudentParameterMark(student_id=s.student_id, parameter_id=params_created["QA"], score=float(s.qa_score or 0)))
-                        db.add(models.StudentParameterMark(student_id=s.student_id, parameter_id=params_created["Projects"], score=float(s.projects_score or 0)))
-                        db.add(models.StudentParameterMark(student_id=s.student_id, parameter_id=params_created["Mock Interview"], score=float(s.mock_interview_score or 0)))
-                    db.commit()
-                print("[Auto-Init] Database ready.")
+            marker = bootstrap.read_marker()
+            if bootstrap.is_current(marker):
+                print(f"[Auto-Init] Schema {marker['schema']} is current ({(time.perf_counter() - started) * 1000.0:.1f} ms)")
+                return
+            if not AUTO_BOOTSTRAP:
+                print("[Auto-Init] Database schema/seed is out of date; run scripts/migrate_and_seed.py")
                 return
-            except Exception as e:
-                print(f"Error during auto_init_database: {e}")
-                db.rollback()
-            finally:
-                db.close()
+            print("[Auto-Init] Schema marker missing or stale; bootstrapping database...")
+            result = bootstrap.run()
+            print(f"[Auto-Init] Database ready in {result['duration_ms']} ms.")
+            return
         except Exception as e:
-            print(f"[Auto-Init] Database connection attempt {attempt}/{max_retries} failed: {e}")
+            print(f"[Auto-Init] Database bootstrap attempt {attempt}/{max_retries} failed: {e}")
             if attempt < max_retries:
-                import time
                 time.sleep(3)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     auto_init_database()
+    from .services import model_registry
+    model_registry.warm_load()
+    from .services import job_queue, scheduler
+    job_queue.start_workers()
+    scheduler.start_scheduler()
+    relay = asyncio.create_task(jobs.relay_progress())
     yield
+    relay.cancel()
+    scheduler.stop_scheduler()
+    job_queue.stop_workers()
+    from .services import llm_gateway
+    await llm_gateway.gateway.aclose()
 
 app = FastAPI(title="Dashboard Auth System", lifespan=lifespan)
 
@@ -285,6 +119,7 @@ app.include_router(tests.router)
 app.include_router(student_tests.router)
 app.include_router(marks_parameters.router)
 app.include_router(college_sandbox.router)
+app.include_router(jobs.router)
 
 @app.get("/")
 def read_root():
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Integer, Float, Date, Boolean, Text
+from sqlalchemy import Column, String, DateTime, ForeignKey, Enum, Integer, Float, Date, Boolean, Text, Index, UniqueConstraint
 from sqlalchemy.sql import func
 from sqlalchemy.orm import synonym
 import enum
@@ -281,6 +281,26 @@ class SystemSetting(Base):
     value = Column(String, nullable=False)
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
+class StudentRankIndex(Base):
+    """Persisted PRS ranking; indexed columns serve top-k, rank lookup and percentile bands"""
+    __tablename__ = "student_rank_index"
+
+    student_id = Column(String, ForeignKey("students.enrollment_no", ondelete="CASCADE"), primary_key=True)
+    prs_score = Column(Float, default=0.0, index=True)
+    rank = Column(Integer, nullable=False, index=True) # 1 = highest PRS
+    percentile = Column(Float, default=0.0, index=True)
+    config_hash = Column(String, nullable=False)
+    computed_at = Column(DateTime(timezone=True), server_default=func.now())
+
+class RankIndexState(Base):
+    """One row describing the persisted ranking: what it was built from and how many rows it holds"""
+    __tablename__ = "rank_index_state"
+
+    id = Column(Integer, primary_key=True) # always 1
+    digest = Column(String, nullable=False)
+    row_count = Column(Integer, nullable=False, default=0)
+    built_at = Column(DateTime(timezone=True), server_default=func.now())
+
 # AI-Powered Adaptive Test Models
 class Test(Base):
     __tablename__ = "tests"
@@ -549,6 +569,26 @@ class StudentRiskAssessment(Base):
     recommended_actions_json = Column(Text, nullable=True) # JSON list of interventions
     calculated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
 
+class RiskSnapshot(Base):
+    """Materialized read model of StudentRiskAssessment for the risk dashboards (one row per student)"""
+    __tablename__ = "risk_snapshots"
+    __table_args__ = (
+        Index("ix_risk_snapshots_branch_semester_level", "branch", "semester", "risk_level"),
+    )
+
+    student_id = Column(String, ForeignKey("students.enrollment_no", ondelete="CASCADE"), primary_key=True)
+    name = Column(String, nullable=True)
+    branch = Column(String, nullable=True, index=True)
+    semester = Column(Integer, nullable=True, index=True)
+    risk_score = Column(Float, default=0.0, index=True)
+    risk_level = Column(String, default="SAFE", index=True) # CRITICAL_RISK, HIGH_RISK, MEDIUM_RISK, LOW_RISK, SAFE
+    failure_probability = Column(Float, default=0.0)
+    primary_risk_factor = Column(String, nullable=True)
+    contributing_factors_json = Column(Text, nullable=True)
+    recommended_actions_json = Column(Text, nullable=True)
+    is_stale = Column(Boolean, default=False, index=True) # Set by write paths when risk inputs change
+    computed_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
+
 class RiskInterventionLog(Base):
     __tablename__ = "risk_interventions"
 
@@ -594,6 +634,17 @@ class RiskFeature(Base):
     feature_value = Column(Float, default=0.0)
     recorded_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+class StudentFeatureStore(Base):
+    """Current features per student and family; RiskFeature keeps the change history"""
+    __tablename__ = "student_feature_store"
+
+    student_id = Column(String, ForeignKey("students.enrollment_no", ondelete="CASCADE"), primary_key=True)
+    family = Column(String, primary_key=True) # academic, attendance, engagement
+    values_json = Column(Text, nullable=True) # Derived feature values as of updated_at
+    state_json = Column(Text, nullable=True) # Running aggregates (daily buckets, trend points)
+    version = Column(Integer, nullable=False, default=0) # Bumped on every state write; compare-and-set token
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), index=True)
+
 class RiskPrediction(Base):
     __tablename__ = "risk_predictions"
 
@@ -748,6 +799,68 @@ class AIInsight(Base):
     supporting_data_json = Column(Text, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
+class LLMResponseCache(Base):
+    """Disk tier of the LLM response cache, keyed by a hash of namespace + model + normalized prompt"""
+    __tablename__ = "llm_response_cache"
+
+    cache_key = Column(String, primary_key=True)
+    namespace = Column(String, nullable=False, index=True) # questions, report, ...
+    model = Column(String, nullable=False)
+    response_json = Column(Text, nullable=False)
+    upstream_latency_ms = Column(Float, default=0.0)
+    hit_count = Column(Integer, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    expires_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class BackgroundJob(Base):
+    """Persistent queue entry for long-running work executed by the job worker pool"""
+    __tablename__ = "background_jobs"
+    __table_args__ = (
+        Index("ix_background_jobs_claim", "status", "priority", "run_after"),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    kind = Column(String, nullable=False, index=True) # risk.recalculate_all, ingest.bulk_upload, ...
+    status = Column(String, nullable=False, default="QUEUED") # QUEUED, RUNNING, COMPLETED, FAILED, CANCELLED
+    priority = Column(Integer, nullable=False, default=5) # lower runs first
+    payload_json = Column(Text, nullable=True)
+    progress_json = Column(Text, nullable=True)
+    result_json = Column(Text, nullable=True)
+    error = Column(Text, nullable=True)
+    attempts = Column(Integer, default=0)
+    max_attempts = Column(Integer, default=3)
+    run_after = Column(DateTime(timezone=True), nullable=False)
+    cancel_requested = Column(Boolean, default=False)
+    requested_by = Column(String, nullable=True)
+    worker_id = Column(String, nullable=True)
+    heartbeat_at = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+    updated_at = Column(DateTime(timezone=True), nullable=False, index=True)
+
+class ScheduledRun(Base):
+    """One row per scheduler firing; the unique (schedule, slot) pair lets only one scheduler process enqueue each slot"""
+    __tablename__ = "scheduled_runs"
+    __table_args__ = (
+        UniqueConstraint("schedule_name", "slot", name="uq_scheduled_runs_slot"),
+    )
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    schedule_name = Column(String, nullable=False)
+    slot = Column(DateTime(timezone=True), nullable=False) # the cron minute that came due
+    job_id = Column(String, nullable=True) # None when the slot was skipped because a job was still in flight
+    scheduler_id = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), nullable=False)
+
+class CacheGeneration(Base):
+    """Invalidation counter per data tag; analytics cache keys embed the generations they were computed under"""
+    __tablename__ = "cache_generations"
+
+    tag = Column(String, primary_key=True) # students, attendance, marks, teachers, settings
+    generation = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
 class RemedialRecommendation(Base):
     __tablename__ = "remedial_recommendations"
 
@@ -44,6 +44,7 @@ def approve_user(
         db.delete(user)
         
     db.commit()
+    auth.invalidate_principals(user.email)
     return {"message": f"User {user.email} {'approved' if request.approve else 'denied'}"}
 
 @router.post("/approve-all")
@@ -71,4 +72,6 @@ def approve_all_users(
             count += 1
             
     db.commit()
+    for user in users:
+        auth.invalidate_principals(user.email)
     return {"message": f"Successfully approved {count} users"}
@@ -1,15 +1,15 @@
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from starlette.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import Student
 from pydantic import BaseModel
 import random
-import os
 import json
-import urllib.request
-import urllib.error
 from typing import List, Dict, Any, Optional
 from .. import models, auth
+from ..services import llm_gateway, llm_cache, chat_context, job_queue
 
 router = APIRouter(
     prefix="/ai",
@@ -71,35 +71,56 @@ def generate_mock_ai_report(student: Student) -> str:
     
     return f"{base_report} \n\n{advice}"
 
-@router.post("/generate-report", response_model=AIReportResponse)
-def generate_report(req: AIReportRequest, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+def _load_report_student(req: AIReportRequest, db: Session, current_user: models.User) -> Student:
     # Security Check
     if current_user.role == models.UserRole.student and current_user.linked_id != req.student_id:
         raise HTTPException(status_code=403, detail="Not authorized to generate reports for other students")
-    
-    # Teachers can only generate for their students
-    if current_user.role == models.UserRole.teacher:
-        teacher_id = current_user.linked_id
-        student = db.query(models.Student).filter(models.Student.student_id == req.student_id).first()
-        if not student:
-             raise HTTPException(status_code=404, detail="Student not found")
-        
-        assignment_exists = db.query(models.Lecture).filter(
-            models.Lecture.teacher_id == teacher_id,
-            models.Lecture.batch == student.batch_id
-        ).first()
-        if not assignment_exists:
-            raise HTTPException(status_code=403, detail="Not authorized to access reports for students in other batches")
 
     student = db.query(models.Student).filter(models.Student.student_id == req.student_id).first()
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
-        
+
+    # Teachers can only generate for their students
+    if not auth.can_access_student(db, current_user, student):
+        raise HTTPException(status_code=403, detail="Not authorized to access reports for students in other batches")
+    return student
+
+@router.post("/generate-report", response_model=AIReportResponse)
+def generate_report(req: AIReportRequest, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    student = _load_report_student(req, db, current_user)
     # In a real app, here calls `openai.ChatCompletion.create(...)`
     report_text = generate_mock_ai_report(student)
-    
     return {"student_id": student.student_id, "report": report_text}
 
+def generate_report_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """job_queue handler for "ai.generate_report"; access was checked when the job was enqueued."""
+    student = db.query(models.Student).filter(models.Student.student_id == payload["student_id"]).first()
+    if not student:
+        raise ValueError(f"Student {payload['student_id']} not found")
+    ctx.progress(stage="generating")
+    return {"student_id": student.student_id, "report": generate_mock_ai_report(student)}
+
+@router.post("/generate-report/jobs", status_code=202)
+def enqueue_report(req: AIReportRequest, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    """Queue a report for a job worker; the report is in the job result (GET /jobs/{job_id})."""
+    student = _load_report_student(req, db, current_user)
+    job = job_queue.enqueue(
+        db, "ai.generate_report", {"student_id": student.student_id},
+        priority=job_queue.PRIORITY_NORMAL, requested_by=current_user.email
+    )
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@router.get("/cache/stats")
+def get_llm_cache_stats(current_admin: models.User = Depends(auth.get_current_active_admin)):
+    return {**llm_cache.stats(), "providers": llm_gateway.gateway.stats, "chat_context": chat_context.index.stats()}
+
+@router.delete("/cache")
+def invalidate_llm_cache(namespace: Optional[str] = None, current_admin: models.User = Depends(auth.get_current_active_admin)):
+    """Drop cached LLM responses: one namespace (e.g. 'questions') or everything."""
+    result = llm_cache.invalidate(namespace=namespace)
+    result["expired_purged"] = llm_cache.purge_expired()
+    return result
+
 # --- RAG Chat Bot Implementation ---
 
 class ChatMessage(BaseModel):
@@ -114,72 +135,6 @@ class ChatResponse(BaseModel):
     response: str
     offline: bool
 
-def get_db_context(db: Session) -> str:
-    students = db.query(models.Student).all()
-    teachers = db.query(models.Teacher).all()
-    
-    total_students = len(students)
-    if total_students == 0:
-        return "The database is currently empty."
-        
-    avg_attendance = sum(s.attendance for s in students) / total_students
-    avg_dsa = sum(s.dsa_score for s in students) / total_students
-    avg_ml = sum(s.ml_score for s in students) / total_students
-    avg_qa = sum(s.qa_score for s in students) / total_students
-    avg_mock = sum(s.mock_interview_score for s in students) / total_students
-    
-    red_count = sum(1 for s in students if s.rag_status == "Red")
-    amber_count = sum(1 for s in students if s.rag_status == "Amber")
-    green_count = sum(1 for s in students if s.rag_status == "Green")
-    
-    # Format a compact list of students
-    students_list = []
-    for s in students:
-        students_list.append({
-            "id": s.student_id,
-            "name": s.name,
-            "batch": s.batch_id,
-            "rag": s.rag_status,
-            "attendance": s.attendance,
-            "dsa": s.dsa_score,
-            "ml": s.ml_score,
-            "qa": s.qa_score,
-            "projects": s.projects_score,
-            "mock": s.mock_interview_score,
-            "pre": s.pre_score,
-            "post": s.post_score
-        })
-        
-    teachers_list = []
-    for t in teachers:
-        teachers_list.append({
-            "name": t.name,
-            "subject": t.subject,
-            "avg_improvement": t.avg_improvement,
-            "feedback": t.feedback_score,
-            "conversion": t.placement_conversion
-        })
-        
-    context = {
-        "stats": {
-            "total_students": total_students,
-            "avg_attendance": round(avg_attendance, 1),
-            "avg_dsa": round(avg_dsa, 1),
-            "avg_ml": round(avg_ml, 1),
-            "avg_qa": round(avg_qa, 1),
-            "avg_mock": round(avg_mock, 1),
-            "rag_distribution": {
-                "Red (At Risk)": red_count,
-                "Amber (Borderline)": amber_count,
-                "Green (On Track)": green_count
-            }
-        },
-        "students": students_list,
-        "teachers": teachers_list
-    }
-    
-    return json.dumps(context, indent=2)
-
 def offline_fallback_chat(message: str, db: Session) -> str:
     message_lc = message.lower()
     students = db.query(models.Student).all()
@@ -270,97 +225,85 @@ def offline_fallback_chat(message: str, db: Session) -> str:
         "*(Note: Currently running in offline fallback mode. Configure `GEMINI_API_KEY` in `.env` to enable full smart LLM capabilities!)*"
     )
 
-def call_llm_rag(system_instruction: str, user_message: str, history: List[ChatMessage]) -> str:
-    gemini_key = os.getenv("GEMINI_API_KEY")
-    openai_key = os.getenv("OPENAI_API_KEY")
-    
-    if gemini_key:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={gemini_key}"
-        headers = {"Content-Type": "application/json"}
-        
-        contents = []
-        for msg in history:
-            role = "user" if msg.role == "user" else "model"
-            contents.append({
-                "role": role,
-                "parts": [{"text": msg.content}]
-            })
-            
-        contents.append({
-            "role": "user",
-            "parts": [{"text": f"User query: {user_message}"}]
-        })
-        
-        payload = {
-            "contents": contents,
-            "systemInstruction": {
-                "parts": [{"text": system_instruction}]
-            }
-        }
-        
-        req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
-        try:
-            with urllib.request.urlopen(req, timeout=20) as response:
-                res_data = json.loads(response.read().decode("utf-8"))
-                return res_data["candidates"][0]["content"]["parts"][0]["text"]
-        except Exception as e:
-            print(f"Gemini Chat API error: {e}")
-            pass
-            
-    if openai_key:
-        url = "https://api.openai.com/v1/chat/completions"
-        headers = {
-            "Content-Type": "application/json",
-            "Authorization": f"Bearer {openai_key}"
-        }
-        
-        messages = [{"role": "system", "content": system_instruction}]
-        for msg in history:
-            messages.append({"role": msg.role, "content": msg.content})
-        messages.append({"role": "user", "content": user_message})
-        
-        payload = {
-            "model": "gpt-4o-mini",
-            "messages": messages
-        }
-        
-        req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
-        try:
-            with urllib.request.urlopen(req, timeout=20) as response:
-                res_data = json.loads(response.read().decode("utf-8"))
-                return res_data["choices"][0]["message"]["content"]
-        except Exception as e:
-            print(f"OpenAI Chat API error: {e}")
-            pass
-            
-    raise Exception("No LLM API keys configured or succeeded.")
+def retrieval_query(user_message: str, history: List[ChatMessage]) -> str:
+    # Follow-ups like "what about her attendance?" need the previous user turn to retrieve the right records
+    previous = [msg.content for msg in history if msg.role == "user"][-1:]
+    return " ".join(previous + [user_message])
 
-@router.post("/chat", response_model=ChatResponse)
-def chat_bot(req: ChatRequest, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
-    # Authenticated check
+def build_system_instruction(db: Session, query: str) -> str:
+    db_context = chat_context.build_context(db, query)["text"]
+    return (
+        "You are SAGE University AI Assistant. You are built to assist admins and teachers. "
+        "You have direct RAG access to the students and faculty database. "
+        "Below are the current cohort statistics and the database records most relevant to the question. "
+        "Use this real-time data to answer user inquiries accurately; if a record you need is not listed, "
+        "say so rather than guessing. Provide clear, professional answers in Markdown format. "
+        "Use bold text, lists, and markdown tables where appropriate to present data cleanly.\n\n"
+        f"DATABASE STATE:\n{db_context}"
+    )
+
+def to_llm_messages(user_message: str, history: List[ChatMessage]) -> List[Dict[str, str]]:
+    return [{"role": msg.role, "content": msg.content} for msg in history] + [{"role": "user", "content": user_message}]
+
+async def call_llm_rag(system_instruction: str, user_message: str, history: List[ChatMessage]) -> str:
+    result = await llm_gateway.gateway.complete(system_instruction, to_llm_messages(user_message, history))
+    return result["text"]
+
+def _check_assistant_access(current_user: models.User):
     if current_user.role not in [models.UserRole.admin, models.UserRole.teacher]:
         raise HTTPException(status_code=403, detail="Only Admins and Teachers can use the AI Assistant.")
-        
-    gemini_key = os.getenv("GEMINI_API_KEY")
-    openai_key = os.getenv("OPENAI_API_KEY")
-    
-    # Try calling the RAG model if keys are available
-    if gemini_key or openai_key:
+
+@router.post("/chat", response_model=ChatResponse)
+async def chat_bot(req: ChatRequest, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    # Authenticated check
+    _check_assistant_access(current_user)
+
+    # Try calling the RAG model if keys are available; DB work stays on the threadpool
+    if llm_gateway.gateway.configured():
         try:
-            db_context = get_db_context(db)
-            system_instruction = (
-                "You are SAGE University AI Assistant. You are built to assist admins and teachers. "
-                "You have direct RAG access to the students and faculty database. "
-                "Below is the current database dump in JSON format. Use this real-time data to answer "
-                "user inquiries accurately. Provide clear, professional answers in Markdown format. "
-                "Use bold text, lists, and markdown tables where appropriate to present data cleanly.\n\n"
-                f"DATABASE STATE:\n{db_context}"
-            )
-            response_text = call_llm_rag(system_instruction, req.message, req.history)
+            system_instruction = await run_in_threadpool(build_system_instruction, db, retrieval_query(req.message, req.history))
+            response_text = await call_llm_rag(system_instruction, req.message, req.history)
             return {"response": response_text, "offline": False}
         except Exception as e:
             print(f"RAG LLM execution failed, falling back to offline mode: {e}")
             
     # Run offline mode as fallback
-    response_text = offline_fallback_chat(req.message, db)
+    response_text = await run_in_threadpool(offline_fallback_chat, req.message, db)
     return {"response": response_text, "offline": True}
+
+def _sse(event: Dict[str, Any]) -> str:
+    return f"data: {json.dumps(event)}\n\n"
+
+@router.post("/chat/stream")
+async def chat_bot_stream(req: ChatRequest, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    """
+    Server-sent events version of /chat: {"delta": ...} events as the model produces text,
+    then {"done": true, "offline": ..., "provider": ...}.
+    """
+    _check_assistant_access(current_user)
+
+    system_instruction = None
+    if llm_gateway.gateway.configured():
+        system_instruction = await run_in_threadpool(build_system_instruction, db, retrieval_query(req.message, req.history))
+    offline_text = None if system_instruction else await run_in_threadpool(offline_fallback_chat, req.message, db)
+
+    async def events():
+        nonlocal offline_text
+        if system_instruction:
+            provider = None
+            try:
+                async for chunk in llm_gateway.gateway.stream(system_instruction, to_llm_messages(req.message, req.history)):
+                    provider = chunk["provider"]
+                    yield _sse({"delta": chunk["delta"]})
+                yield _sse({"done": True, "offline": False, "provider": provider})
+                return
+            except Exception as e:
+                print(f"RAG LLM stream failed: {e}")
+                if provider:
+                    yield _sse({"error": "Stream interrupted", "done": True, "offline": False, "provider": provider})
+                    return
+            offline_text = await run_in_threadpool(offline_fallback_chat, req.message, db)
+        yield _sse({"delta": offline_text})
+        yield _sse({"done": True, "offline": True, "provider": None})
+
+    return StreamingResponse(events(), media_type="text/event-stream", headers={"Cache-Control": "no-cache"})
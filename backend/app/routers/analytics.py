@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import APIRouter, Depends, HTTPException, Request, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
 from pydantic import BaseModel
 from sqlalchemy.orm import Session
-from sqlalchemy import func
+from sqlalchemy import func, tuple_
 from .. import models, database, auth, schemas
+import base64
+import io
 import math
 import json
+import time
 import uuid
 from datetime import date, datetime
-from typing import Optional, Dict, Any, Union
+from typing import Optional, Dict, Any, Union, List, Tuple
+from ..core import lazy
 
 router = APIRouter(prefix="/analytics", tags=["Analytics"])
 
@@ -239,7 +244,7 @@ def get_student_predicted_score(student_id: str, db: Session = Depends(database.
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     predictor = AcademicScorePredictor()
     return predictor.predict_score(features)
 
@@ -254,7 +259,7 @@ def get_student_time_series_forecast(student_id: str, db: Session = Depends(data
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     
     # Extract test score history from database if available
     attempts = db.query(models.TestAttempt).filter(
@@ -270,22 +275,61 @@ def get_student_time_series_forecast(student_id: str, db: Session = Depends(data
 def get_batch_student_clusters(batch_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
     from ..services.student_clustering_engine import KMeansStudentClusterer
     
-    students = db.query(models.Student).all()
-    batch_students = []
-    for s in students:
-        if batch_id == "All" or getattr(s, "batch_id", "All") == batch_id or getattr(s, "branch", "") == batch_id:
-            batch_students.append({
-                "student_id": s.enrollment_no,
-                "name": s.name,
-                "marks": s.post_score or 70.0,
-                "attendance": s.pre_engagement or 75.0,
-                "cgpa": 7.5,
-                "trend": (s.post_score or 70.0) - (s.pre_score or 65.0)
-            })
+    query = db.query(models.Student)
+    if batch_id != "All":
+        query = query.filter((models.Student.batch_id == batch_id) | (models.Student.branch == batch_id))
+    batch_students = [{
+        "student_id": s.enrollment_no,
+        "name": s.name,
+        "marks": s.post_score or 70.0,
+        "attendance": s.pre_engagement or 75.0,
+        "cgpa": 7.5,
+        "trend": (s.post_score or 70.0) - (s.pre_score or 65.0)
+    } for s in query.all()]
             
     clusterer = KMeansStudentClusterer()
     return clusterer.cluster_batch(batch_students)
 
+@router.get("/batch/{batch_id}/ml-scores")
+def get_batch_ml_scores(batch_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    """Risk, disengagement, early-warning and ability scores for a whole batch in one vectorized pass."""
+    from ..services.risk_predictor import MLRiskPredictor
+    from ..services.disengagement_engine import LightGBMDisengagementEngine
+    from ..services.early_warning_master_engine import EarlyWarningMasterEngine
+    from ..services.student_ability_engine import IRTRaschAbilityEngine
+
+    if current_user.role not in [models.UserRole.admin, models.UserRole.teacher]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    query = db.query(models.Student)
+    if batch_id != "All":
+        query = query.filter((models.Student.batch_id == batch_id) | (models.Student.branch == batch_id))
+    students = query.order_by(models.Student.enrollment_no).all()
+    matrix = feature_store.get_cohort_feature_matrix(db, students)
+    if not students:
+        return {"batch_id": batch_id, "total_students": 0, "students": []}
+
+    risk = MLRiskPredictor().predict_risk_batch(matrix)
+    disengagement = LightGBMDisengagementEngine().predict_disengagement_batch(matrix)
+    early_warning = EarlyWarningMasterEngine().synthesize_master_score_batch(matrix)
+    ability = IRTRaschAbilityEngine().estimate_ability_batch(matrix)
+
+    return {
+        "batch_id": batch_id,
+        "total_students": len(students),
+        "students": [{
+            "student_id": s.enrollment_no,
+            "name": s.name,
+            "risk_score": float(risk["overall_risk"][i]),
+            "risk_level": risk["risk_level"][i],
+            "top_risk_factor": risk["top_risk_factor"][i],
+            "disengagement_risk_pct": float(disengagement["disengagement_risk_pct"][i]),
+            "master_ai_risk_score": float(early_warning["master_ai_risk_score"][i]),
+            "early_warning_status": early_warning["early_warning_status"][i],
+            "ability_theta": float(ability["student_ability_theta"][i])
+        } for i, s in enumerate(students)]
+    }
+
 @router.get("/student/{student_id}/anomalies")
 def get_student_anomalies(student_id: str, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
     from ..services.feature_engine import build_student_features
@@ -297,7 +341,7 @@ def get_student_anomalies(student_id: str, db: Session = Depends(database.get_db
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     
     # Check latest test attempt for anomaly inspection
     latest_attempt = db.query(models.TestAttempt).filter(
@@ -328,7 +372,7 @@ def get_student_disengagement_risk(student_id: str, db: Session = Depends(databa
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     engine = LightGBMDisengagementEngine()
     return engine.predict_disengagement(student_features=features)
 
@@ -343,7 +387,7 @@ def get_student_knowledge_tracing(student_id: str, db: Session = Depends(databas
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     engine = DeepKnowledgeTracingEngine()
     return engine.trace_knowledge(student_features=features)
 
@@ -359,7 +403,7 @@ def get_student_recommendations(student_id: str, db: Session = Depends(database.
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     dkt_engine = DeepKnowledgeTracingEngine()
     dkt_res = dkt_engine.trace_knowledge(student_features=features)
     
@@ -388,7 +432,7 @@ def get_student_latent_ability(student_id: str, db: Session = Depends(database.g
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     engine = IRTRaschAbilityEngine()
     return engine.estimate_ability(student_features=features)
 
@@ -423,7 +467,7 @@ def get_student_master_early_warning(student_id: str, db: Session = Depends(data
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     engine = EarlyWarningMasterEngine()
     return engine.synthesize_master_score(student_features=features)
 
@@ -444,7 +488,7 @@ def get_student_360_profile(student_id: str, db: Session = Depends(database.get_
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
     
     # 1. Academic & Assessment Details
     test_attempts = db.query(models.TestAttempt).filter(models.TestAttempt.student_id == student.enrollment_no).all()
@@ -772,61 +816,75 @@ def get_batch_observations(batch_id: str, db: Session = Depends(database.get_db)
         "student_count": len(students)
     }
 
-DEFAULT_RANKING_CONFIG = {
-    "dsa":        {"enabled": True, "weight": 20.0, "label": "DSA"},
-    "ml":         {"enabled": True, "weight": 20.0, "label": "Machine Learning"},
-    "qa":         {"enabled": True, "weight": 20.0, "label": "Quantitative Aptitude"},
-    "projects":   {"enabled": True, "weight": 20.0, "label": "Projects"},
-    "mock":       {"enabled": True, "weight": 10.0, "label": "Mock Interview"},
-    "attendance": {"enabled": True, "weight": 10.0, "label": "Attendance"},
-}
-
-
-def get_ranking_config_from_db(db: Session) -> Dict[str, Any]:
-    """Fetch ranking config from DB, fallback to default."""
-    setting = db.query(models.SystemSetting).filter(models.SystemSetting.key == "ranking_config").first()
-    if setting:
-        try:
-            return json.loads(setting.value)
-        except Exception:
-            pass
-    return DEFAULT_RANKING_CONFIG
+from app.services import prs_ranking, feature_store, analytics_cache, student_identity
 
+def _encode_cursor(rank: int, student_id: str, position: int) -> str:
+    """Opaque keyset cursor: the (rank, enrollment_no) of the last card served and its position."""
+    raw = json.dumps([rank, student_id, position]).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
 
-def calculate_prs(student, config: Dict[str, Any] = None) -> float:
-    """Calculate Placement Readiness Score using admin-configured weights."""
-    if config is None:
-        config = DEFAULT_RANKING_CONFIG
-
-    param_map = {
-        "dsa":        getattr(student, "dsa_score", 0) or 0,
-        "ml":         getattr(student, "ml_score", 0) or 0,
-        "qa":         getattr(student, "qa_score", 0) or 0,
-        "projects":   getattr(student, "projects_score", 0) or 0,
-        "mock":       getattr(student, "mock_interview_score", 0) or 0,
-        "attendance": getattr(student, "attendance", 0) or 0,
+def _decode_cursor(cursor: str) -> Tuple[int, str, int]:
+    try:
+        rank, student_id, position = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        return int(rank), str(student_id), int(position)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _student_card(s, prs: float, rank: int, total_students: int, trend_scores: list, rag_history: list) -> dict:
+    percentile = 0.0
+    if total_students > 0:
+        percentile = round(((total_students - rank) / total_students) * 100, 1)
+    return {
+        "student_id": s.student_id,
+        "name": s.name,
+        "batch_id": s.batch_id,
+        "prs_score": prs,
+        "rank": rank,
+        "percentile": percentile,
+        "attendance": s.attendance,
+        "dsa": s.dsa_score,
+        "ml": s.ml_score,
+        "qa": s.qa_score,
+        "projects": s.projects_score,
+        "mock": s.mock_interview_score,
+        "pre_score": s.pre_score,
+        "post_score": s.post_score,
+        "assessment_trend": trend_scores,
+        # Qualitative breakdown for individual radar
+        "pre_comm": s.pre_communication,
+        "post_comm": s.post_communication,
+        "pre_eng": s.pre_engagement,
+        "post_eng": s.post_engagement,
+        "pre_conf": s.pre_confidence,
+        "post_conf": s.post_confidence,
+        "pre_fluency": s.pre_fluency,
+        "post_fluency": s.post_fluency,
+        "rag": s.rag_status,
+        "rag_history": rag_history
     }
 
-    total_weight = 0.0
-    weighted_sum = 0.0
-    for key, cfg in config.items():
-        if cfg.get("enabled", True):
-            w = cfg.get("weight", 0.0)
-            score = param_map.get(key, 0)
-            weighted_sum += (score / 100.0) * w
-            total_weight += w
-
-    if total_weight == 0:
-        return 0.0
-    # Normalise to 0-100
-    return round((weighted_sum / total_weight) * 100.0, 1)
-
 @router.get("/students/all")
-def get_students(db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+def get_students(
+    cursor: Optional[str] = None,
+    limit: Optional[int] = None,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    return analytics_cache.cached(
+        "students/all", {"cursor": cursor, "limit": limit}, analytics_cache.scope_for(current_user),
+        ("students", "marks", "attendance", "risk", "settings"),
+        lambda: _get_students(cursor, limit, db, current_user)
+    )
+
+def _get_students(cursor: Optional[str], limit: Optional[int], db: Session, current_user: models.User):
     # Security check:
     # Admins: All students
     # Teachers: Students in their batches
     # Students: Only themselves
+    #
+    # Fixed query count regardless of cohort size: students joined to the persisted
+    # PRS rank index, one grouped Assessment query and one grouped RAGLog query.
+    # Pass limit (and the returned next_cursor) to page through the ranked cards.
     
     query = db.query(models.Student)
     
@@ -842,58 +900,115 @@ def get_students(db: Session = Depends(database.get_db), current_user: models.Us
         student_id = current_user.linked_id
         query = query.filter(models.Student.student_id == student_id)
         
-    students = query.all()
+    prs_ranking.ensure_rank_index(db)
+    total_students = query.count()
+
+    # Rank within the visible cohort, following the institution-wide PRS order (the index was
+    # just brought up to date, so it holds every student). Pages continue after the
+    # (rank, enrollment_no) of the previous page's last card: a range read on the rank index
+    rank_key = models.StudentRankIndex.rank
+    ranked = query.add_columns(models.StudentRankIndex.prs_score, rank_key).join(
+        models.StudentRankIndex, models.StudentRankIndex.student_id == models.Student.enrollment_no
+    ).order_by(rank_key, models.Student.enrollment_no)
+
+    start = 0
+    if cursor:
+        after_rank, after_id, start = _decode_cursor(cursor)
+        ranked = ranked.filter(tuple_(rank_key, models.Student.enrollment_no) > tuple_(after_rank, after_id))
+    if limit:
+        ranked = ranked.limit(limit)
+    page = ranked.all()
+    if not page:
+        return {"items": [], "next_cursor": None, "total": total_students} if limit else []
+
+    if limit:
+        id_filter = [s.enrollment_no for s, _, _ in page]
+    else:
+        id_filter = query.with_entities(models.Student.enrollment_no).scalar_subquery()
+
+    # Get assessment trend (totals) for cards
+    trends: Dict[str, list] = {}
+    for sid, total in db.query(models.Assessment.student_id, models.Assessment.total_score).filter(
+        models.Assessment.student_id.in_(id_filter)
+    ).order_by(models.Assessment.student_id, models.Assessment.assessment_name).all():
+        trends.setdefault(sid, []).append(total)
+
+    rag_history: Dict[str, list] = {}
+    for log in db.query(models.RAGLog).filter(
+        models.RAGLog.student_id.in_(id_filter)
+    ).order_by(models.RAGLog.student_id, models.RAGLog.date).all():
+        rag_history.setdefault(log.student_id, []).append({"date": log.date.isoformat(), "status": log.status, "period": log.period_name})
+
     results = []
-    
-    ranking_cfg = get_ranking_config_from_db(db)
-    student_prs = []
-    for s in students:
-        prs = calculate_prs(s, ranking_cfg)
-        student_prs.append((s, prs))
-    
-    # Sort by PRS descending
-    student_prs.sort(key=lambda x: x[1], reverse=True)
-    total_students = len(students)
-    
-    for rank0, (s, prs) in enumerate(student_prs):
-        rank = rank0 + 1
-        percentile = 0.0
-        if total_students > 0:
-            percentile = round(((total_students - rank) / total_students) * 100, 1)
-        
-        # Get assessment trend (totals) for cards
-        ass_trend = db.query(models.Assessment).filter(models.Assessment.student_id == s.student_id).order_by(models.Assessment.assessment_name).all()
-        trend_scores = [a.total_score for a in ass_trend]
+    for offset, (s, prs, _) in enumerate(page):
+        results.append(_student_card(
+            s, prs or 0.0, start + offset + 1, total_students,
+            trends.get(s.enrollment_no, []), rag_history.get(s.enrollment_no, [])
+        ))
+
+    if not limit:
+        return results
+    last, _, last_rank = page[-1]
+    next_cursor = _encode_cursor(last_rank, last.enrollment_no, start + len(page)) if len(page) == limit and start + len(page) < total_students else None
+    return {"items": results, "next_cursor": next_cursor, "total": total_students}
+
+@router.post("/features/compact-history")
+def compact_feature_history(
+    retention_days: int = feature_store.HISTORY_RETENTION_DAYS,
+    db: Session = Depends(database.get_db),
+    current_admin: models.User = Depends(auth.get_current_active_admin)
+):
+    deleted = feature_store.compact_history(db, retention_days=max(1, retention_days))
+    return {"deleted": deleted, "retention_days": max(1, retention_days)}
+
+@router.get("/risk-model")
+def get_risk_model_status(current_admin: models.User = Depends(auth.get_current_active_admin)):
+    from ..services.model_registry import registry
+    return registry.status()
+
+@router.post("/risk-model/reload")
+def reload_risk_model(version: Optional[str] = None, current_admin: models.User = Depends(auth.get_current_active_admin)):
+    """Swap in a newly trained booster (latest, or a given version) without restarting."""
+    from ..services.model_registry import registry, list_versions
+    if version and version not in list_versions(registry.model_dir):
+        raise HTTPException(status_code=404, detail="Model version not found")
+    if not registry.load(version):
+        raise HTTPException(status_code=404, detail="No trained risk model available")
+    return registry.status()
+
+@router.get("/ranking/top")
+def get_ranking_top(
+    k: int = 10,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    if current_user.role not in [models.UserRole.admin, models.UserRole.teacher]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return [prs_ranking.to_dict(r) for r in prs_ranking.top_k(db, max(1, min(k, 500)))]
 
-        results.append({
-            "student_id": s.student_id,
-            "name": s.name,
-            "batch_id": s.batch_id,
-            "prs_score": prs,
-            "rank": rank,
-            "percentile": percentile,
-            "attendance": s.attendance,
-            "dsa": s.dsa_score,
-            "ml": s.ml_score,
-            "qa": s.qa_score,
-            "projects": s.projects_score,
-            "mock": s.mock_interview_score,
-            "pre_score": s.pre_score,
-            "post_score": s.post_score,
-            "assessment_trend": trend_scores,
-            # Qualitative breakdown for individual radar
-            "pre_comm": s.pre_communication,
-            "post_comm": s.post_communication,
-            "pre_eng": s.pre_engagement,
-            "post_eng": s.post_engagement,
-            "pre_conf": s.pre_confidence,
-            "post_conf": s.post_confidence,
-            "pre_fluency": s.pre_fluency,
-            "post_fluency": s.post_fluency,
-            "rag": s.rag_status,
-            "rag_history": [{"date": log.date.isoformat(), "status": log.status, "period": log.period_name} for log in db.query(models.RAGLog).filter(models.RAGLog.student_id == s.student_id).order_by(models.RAGLog.date).all()]
-        })
-    return results
+@router.get("/ranking/student/{student_id}")
+def get_ranking_for_student(
+    student_id: str,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    if current_user.role == models.UserRole.student and current_user.linked_id != student_id:
+        raise HTTPException(status_code=403, detail="Access denied")
+    row = prs_ranking.rank_of(db, student_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Student not found")
+    return prs_ranking.to_dict(row)
+
+@router.get("/ranking/percentile")
+def get_ranking_percentile_band(
+    low: float = 0.0,
+    high: float = 100.0,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    if current_user.role not in [models.UserRole.admin, models.UserRole.teacher]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    return [prs_ranking.to_dict(r) for r in prs_ranking.percentile_range(db, low, high)]
 
 @router.post("/admin/alerts/dispatch-critical-notifications")
 def dispatch_critical_alerts(
@@ -919,7 +1034,7 @@ def get_student_detailed_analytics(student_id: str, db: Session = Depends(databa
         student = db.query(models.Student).first()
     if not student: raise HTTPException(status_code=404, detail="Student not found")
     
-    ranking_cfg = get_ranking_config_from_db(db)
+    student_rank = prs_ranking.rank_of(db, student.enrollment_no)
     all_students = db.query(models.Student).all()
     
     # Analyze detailed metrics
@@ -1041,7 +1156,7 @@ def get_student_detailed_analytics(student_id: str, db: Session = Depends(databa
         "strengths": strengths,
         "weaknesses": weaknesses,
         "placement_readiness": placement_readiness,
-        "rank": db.query(models.Student).count() - sum(1 for s in db.query(models.Student).all() if calculate_prs(s, ranking_cfg) < calculate_prs(student, ranking_cfg))
+        "rank": student_rank.rank if student_rank else None
     }
 
 @router.get("/dashboard/admin")
@@ -1053,6 +1168,13 @@ def get_admin_dashboard_data(
     db: Session = Depends(database.get_db),
     current_admin: models.User = Depends(auth.get_current_active_admin)
 ):
+    return analytics_cache.cached(
+        "dashboard/admin", {"program": program, "branch": branch, "semester": semester, "section": section}, "admin",
+        ("students", "marks", "attendance", "teachers", "risk"),
+        lambda: _get_admin_dashboard_data(program, branch, semester, section, db)
+    )
+
+def _get_admin_dashboard_data(program: Optional[str], branch: Optional[str], semester: Optional[Union[str, int]], section: Optional[str], db: Session):
     query = db.query(models.Student)
     if program and program != "All":
         query = query.filter(models.Student.program == program)
@@ -1069,7 +1191,8 @@ def get_admin_dashboard_data(
         
     students = query.all()
     if not students:
-        students = db.query(models.Student).all()
+        query = db.query(models.Student)
+        students = query.all()
     total_students = len(students)
     
     # Calculate averages
@@ -1081,15 +1204,15 @@ def get_admin_dashboard_data(
     risk_count = sum(1 for s in students if s.rag_status == "Red")
     
     # Top 5 students by CGPA
-    top_students_data = sorted(students, key=lambda x: x.cgpa, reverse=True)[:5]
-    ranking_cfg = get_ranking_config_from_db(db)
+    top_students_data = query.order_by(models.Student.cgpa.desc()).limit(5).all()
+    top_prs = prs_ranking.prs_by_student(db, [s.enrollment_no for s in top_students_data])
     top_students = []
     for s in top_students_data:
         top_students.append({
             "id": s.student_id,
             "name": s.name,
             "cgpa": s.cgpa,
-            "prs": calculate_prs(s, ranking_cfg)
+            "prs": top_prs.get(s.enrollment_no, 0.0)
         })
         
     # Grade Distribution
@@ -1133,6 +1256,13 @@ def get_admin_dashboard_data(
 
 @router.get("/batch/comprehensive_stats")
 def get_batch_comprehensive_stats(date: Optional[str] = None, batch_filter: Optional[str] = None, db: Session = Depends(database.get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    return analytics_cache.cached(
+        "batch/comprehensive_stats", {"date": date, "batch_filter": batch_filter}, analytics_cache.scope_for(current_user),
+        ("students", "marks", "attendance", "risk"),
+        lambda: _get_batch_comprehensive_stats(date, batch_filter, db, current_user)
+    )
+
+def _get_batch_comprehensive_stats(date: Optional[str], batch_filter: Optional[str], db: Session, current_user: models.User):
     # Security & Data Isolation
     query = db.query(models.Student)
 
@@ -1524,6 +1654,13 @@ def get_faculty_comparison(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
+    # Same for every role, so one shared entry per subject filter
+    return analytics_cache.cached(
+        "faculty-comparison", {"subject": subject}, "all", ("teachers", "students", "marks"),
+        lambda: _get_faculty_comparison(subject, db)
+    )
+
+def _get_faculty_comparison(subject: Optional[str], db: Session):
     query = db.query(models.Teacher)
     if subject and subject.lower() != 'all':
         query = query.filter(models.Teacher.subject.ilike(f"%{subject}%"))
@@ -1638,11 +1775,8 @@ def calculate_trend_progression(scores: List[float]) -> str:
     else:
         return "STABLE"
 
-async def recalculate_student_metrics(student_id: str, db: Session) -> dict:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+async def recalculate_student_metrics(student_id: student_identity.StudentRef, db: Session) -> dict:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return {"error": "Student not found"}
 
@@ -1888,6 +2022,8 @@ async def recalculate_student_metrics(student_id: str, db: Session) -> dict:
             )
             db.add(alert)
 
+    risk_snapshot_service.mark_stale(db, [student.enrollment_no])
+    feature_store.refresh(db, [student.enrollment_no], ["academic", "attendance"])
     db.commit()
 
     # Load alerts list to return
@@ -1930,17 +2066,14 @@ async def get_student_academic_performance(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
     
-    metrics = await recalculate_student_metrics(student.enrollment_no, db)
+    metrics = await recalculate_student_metrics(student, db)
     return metrics
 
 @router.get("/students/{student_id}/academic-trend")
@@ -1949,10 +2082,7 @@ def get_student_academic_trend(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -1972,10 +2102,7 @@ def get_student_academic_alerts(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -1994,10 +2121,7 @@ def get_student_subjects(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2017,10 +2141,7 @@ async def get_student_subject_performance(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2033,7 +2154,7 @@ async def get_student_subject_performance(
     ).first()
     
     if not metric:
-        await recalculate_student_metrics(student.enrollment_no, db)
+        await recalculate_student_metrics(student, db)
         metric = db.query(models.AcademicMetric).filter(
             models.AcademicMetric.student_id == student.enrollment_no,
             models.AcademicMetric.subject_id == subject_id
@@ -2050,10 +2171,7 @@ def get_student_attendance(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2083,10 +2201,7 @@ def get_student_assessments(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2105,10 +2220,7 @@ def get_student_assignments(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2131,10 +2243,7 @@ def get_student_tests(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2157,17 +2266,14 @@ async def trigger_recalculate(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    metrics = await recalculate_student_metrics(student.enrollment_no, db)
+    metrics = await recalculate_student_metrics(student, db)
     return {"message": "Recalculation successful", "metrics": metrics}
 
 @router.post("/sync/attendance")
@@ -2297,17 +2403,14 @@ def get_student_engagement(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    metrics = engagement_engine.calculate_student_engagement(student.enrollment_no, db)
+    metrics = engagement_engine.calculate_student_engagement(student, db)
     return metrics
 
 @router.get("/students/{student_id}/activity")
@@ -2316,10 +2419,7 @@ def get_student_activity(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2338,10 +2438,7 @@ def get_student_engagement_trend(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2360,10 +2457,7 @@ def get_student_engagement_alerts(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2382,10 +2476,7 @@ def get_student_activity_timeline(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2403,13 +2494,9 @@ async def sync_activity(
     payload: schemas.SyncActivityPayload,
     db: Session = Depends(database.get_db)
 ):
-    updated_students = set()
-    for record in payload.records:
-        rec_dict = record.model_dump()
-        act = engagement_engine.normalize_activity_event(db, rec_dict)
-        if act:
-            updated_students.add(act.student_id)
-            
+    result = engagement_engine.ingest_activity_events(db, [record.model_dump() for record in payload.records])
+    updated_students = result["student_ids"]
+
     for sid in updated_students:
         metrics = engagement_engine.calculate_student_engagement(sid, db)
         await manager.send_personal_message(metrics, sid)
@@ -2423,35 +2510,142 @@ async def sync_lms(
 ):
     return await sync_activity(payload, db)
 
+ACTIVITY_BATCH_MAX_EVENTS = 50000
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+
+def _decode_activity_batch(body: bytes, content_type: str) -> Tuple[List[dict], List[int]]:
+    """
+    Events from a JSON-lines body (one object per line), a JSON array / {"records": [...]},
+    or msgpack (an array of maps or a stream of maps). Returns (events, rejected line numbers).
+    """
+    content_type = (content_type or "").split(";")[0].strip().lower()
+    if content_type in MSGPACK_TYPES:
+        if not lazy.available("msgpack"):
+            raise HTTPException(status_code=415, detail="msgpack is not installed on this server; send JSON lines instead")
+        import msgpack
+        items = list(msgpack.Unpacker(io.BytesIO(body), raw=False))
+        if len(items) == 1 and isinstance(items[0], (list, dict)):
+            items = items[0] if isinstance(items[0], list) else items[0].get("records", [items[0]])
+    elif content_type == "application/json":
+        try:
+            data = json.loads(body)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Body is not valid JSON")
+        items = data.get("records", []) if isinstance(data, dict) else data
+    else:
+        items, line_numbers, rejected = [], [], []
+        for line_no, line in enumerate(body.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                items.append(json.loads(line))
+                line_numbers.append(line_no)
+            except ValueError:
+                rejected.append(line_no)
+        events, invalid = _valid_activity_events(items)
+        return events, sorted(rejected + [line_numbers[i - 1] for i in invalid])
+    return _valid_activity_events(items)
+
+
+# Fields stored as plain columns (and external_event_id also used as a set key): scalars only
+_ACTIVITY_TEXT_FIELDS = ("external_event_id", "source", "subject_id", "resource_id", "metadata_json")
+
+
+def _valid_activity_event(item: Any) -> bool:
+    if not isinstance(item, dict):
+        return False
+    if not isinstance(item.get("student_id"), (str, int)) or not item.get("student_id"):
+        return False
+    if not isinstance(item.get("activity_type"), str) or not item.get("activity_type"):
+        return False
+    for field in _ACTIVITY_TEXT_FIELDS:
+        value = item.get(field)
+        if isinstance(value, int) and not isinstance(value, bool):
+            # Numeric ids from the feed are kept, as text
+            item[field] = str(value)
+        elif value is not None and not isinstance(value, str):
+            return False
+    duration = item.get("duration")
+    return duration is None or (isinstance(duration, (int, float)) and not isinstance(duration, bool))
+
+
+def _valid_activity_events(items: List[Any]) -> Tuple[List[dict], List[int]]:
+    """Well-formed events, plus the 1-based positions of the rest."""
+    events, rejected = [], []
+    for position, item in enumerate(items, start=1):
+        if _valid_activity_event(item):
+            events.append(item)
+        else:
+            rejected.append(position)
+    return events, rejected
+
+
+@router.post("/sync/activity/batch")
+async def sync_activity_batch(request: Request, db: Session = Depends(database.get_db)):
+    """
+    High-volume activity feed for LMS replays: thousands of events per request as JSON lines
+    (application/x-ndjson), a JSON array, or msgpack. Duplicate external_event_ids are skipped;
+    engagement features are updated incrementally rather than recalculated per student.
+    """
+    started = time.perf_counter()
+    body = await request.body()
+    events, rejected = _decode_activity_batch(body, request.headers.get("content-type", ""))
+    if len(events) > ACTIVITY_BATCH_MAX_EVENTS:
+        raise HTTPException(status_code=413, detail=f"At most {ACTIVITY_BATCH_MAX_EVENTS} events per request")
+    result = await run_in_threadpool(engagement_engine.ingest_activity_events, db, events)
+    elapsed = time.perf_counter() - started
+    return {
+        "received": result["received"] + len(rejected),
+        "inserted": result["inserted"],
+        "duplicates": result["duplicates"],
+        "unresolved": result["unresolved"],
+        "rejected": len(rejected),
+        "rejected_lines": rejected[:20],
+        "students_updated": len(result["student_ids"]),
+        "duration_ms": round(elapsed * 1000.0, 1),
+        "events_per_second": round(result["received"] / elapsed, 1) if elapsed > 0 else None
+    }
+
 @router.post("/engagement/recalculate/{student_id}")
 async def recalculate_engagement(
     student_id: str,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    metrics = engagement_engine.calculate_student_engagement(student.enrollment_no, db)
+    metrics = engagement_engine.calculate_student_engagement(student, db)
     await manager.send_personal_message(metrics, student.enrollment_no)
     return {"message": "Recalculation successful", "metrics": metrics}
 
 @router.post("/engagement/check-inactivity")
 def check_all_inactivity(db: Session = Depends(database.get_db)):
-    students = db.query(models.Student).all()
-    updated = 0
-    for s in students:
-        res = engagement_engine.calculate_student_engagement(s.enrollment_no, db)
-        if "error" not in res:
-            updated += 1
-    return {"message": f"Checked inactivity for {updated} students."}
+    """Set-based inactivity sweep over the whole cohort; also scheduled as the engagement.inactivity_sweep job (INACTIVITY_SWEEP_CRON)."""
+    students = db.query(func.count(models.Student.enrollment_no)).scalar() or 0
+    sweep = engagement_engine.sweep_inactivity(db)
+    return {"message": f"Checked inactivity for {students} students.", **sweep}
+
+@router.post("/engagement/reconcile")
+def trigger_engagement_reconcile(
+    repair: bool = True,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    """Queue a rebuild of the rolling engagement counters from raw activity; drift is reported in the job result."""
+    if current_user.role != models.UserRole.admin:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    job = job_queue.enqueue(
+        db, "engagement.reconcile", {"repair": repair},
+        priority=job_queue.PRIORITY_LOW, requested_by=current_user.email
+    )
+    return {"message": "Engagement counter reconciliation queued.", "job_id": job["job_id"], "status": job["status"]}
 
 @router.get("/teacher/class-engagement")
 def get_teacher_class_engagement(
@@ -2517,7 +2711,7 @@ async def websocket_engagement(websocket: WebSocket, student_id: str):
         manager.disconnect(websocket, student_id)
 
 # ==================== PART 3: RISK & PREDICTION ENGINE ENDPOINTS ====================
-from app.services import risk_engine
+from app.services import risk_engine, risk_batch_engine, risk_snapshot_service, job_queue
 
 @router.get("/students/{student_id}/risk")
 def get_student_risk(
@@ -2525,17 +2719,14 @@ def get_student_risk(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    return risk_engine.calculate_student_risk(student.enrollment_no, db)
+    return risk_engine.calculate_student_risk(student, db)
 
 @router.get("/students/{student_id}/risk/factors")
 def get_student_risk_factors(
@@ -2557,113 +2748,105 @@ def trigger_risk_recalculate(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    res = risk_engine.calculate_student_risk(student.enrollment_no, db)
+    res = risk_engine.calculate_student_risk(student, db)
     return {"message": "Risk recalculation successful", "risk": res}
 
 @router.post("/risk/recalculate-all")
 def trigger_risk_recalculate_all(
+    chunk_size: int = 500,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    if current_user.role not in [models.UserRole.admin, models.UserRole.teacher]:
+        raise HTTPException(status_code=403, detail="Access denied")
+
+    job = job_queue.enqueue(
+        db, "risk.recalculate_all", {"chunk_size": max(1, chunk_size)},
+        priority=job_queue.PRIORITY_NORMAL, requested_by=current_user.email
+    )
+    return {
+        "message": "Risk recalculation for all students queued.",
+        "job_id": job["job_id"],
+        "status": job["status"]
+    }
+
+@router.get("/risk/recalculate-all/{job_id}")
+def get_risk_recalculate_all_status(
+    job_id: str,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
     if current_user.role not in [models.UserRole.admin, models.UserRole.teacher]:
         raise HTTPException(status_code=403, detail="Access denied")
-        
-    students = db.query(models.Student).all()
-    count = 0
-    for s in students:
-        risk_engine.calculate_student_risk(s.enrollment_no, db)
-        count += 1
-    return {"message": f"Successfully recalculated risk scores for {count} students."}
+
+    job = job_queue.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+def _ensure_risk_snapshot(db: Session, refresh: bool) -> Optional[Dict[str, Any]]:
+    # Reads serve the snapshot as it stands (computed_at and stale_count say how fresh it is) and
+    # queue a background refresh for stale or missing rows; ?refresh=true recomputes them inline
+    if refresh:
+        return risk_batch_engine.refresh_risk_snapshots(db)
+    return risk_batch_engine.schedule_snapshot_refresh(db)
 
 @router.get("/teacher/risk-center")
 def get_teacher_risk_center(
     branch: Optional[str] = None,
     semester: Optional[Union[str, int]] = None,
     risk_level: Optional[str] = None,
+    refresh: bool = False,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
     if current_user.role not in [models.UserRole.teacher, models.UserRole.admin]:
         raise HTTPException(status_code=403, detail="Access denied")
-        
-    query = db.query(models.Student)
-    if branch and branch != "All":
-        query = query.filter(models.Student.branch == branch)
+
+    branch_val = branch if branch and branch != "All" else None
+    sem_val = None
     if semester and semester != "All":
         try:
             sem_val = int(semester)
-            query = query.filter(models.Student.semester == sem_val)
         except (ValueError, TypeError):
             pass
-        
-    students = query.all()
-    results = []
-    
-    summary = {
-        "CRITICAL_RISK": 0,
-        "HIGH_RISK": 0,
-        "MEDIUM_RISK": 0,
-        "LOW_RISK": 0,
-        "SAFE": 0,
-        "total": len(students)
-    }
-    
-    for s in students:
-        risk_data = risk_engine.calculate_student_risk(s.enrollment_no, db)
-        lvl = risk_data.get("risk_level", "SAFE")
-        if lvl in summary:
-            summary[lvl] += 1
-            
-        if not risk_level or risk_level == lvl:
-            results.append(risk_data)
-            
-    results.sort(key=lambda x: x["risk_score"], reverse=True)
+
+    refreshed = _ensure_risk_snapshot(db, refresh)
+
+    summary = risk_snapshot_service.level_counts(db, branch_val, sem_val)
+    summary["total"] = sum(summary.values())
+    results = risk_snapshot_service.list_students(db, branch_val, sem_val, risk_level or None)
+
     return {
         "summary": summary,
-        "students": results
+        "students": results,
+        **risk_snapshot_service.freshness(db, branch_val, sem_val),
+        "refresh": refreshed
     }
 
 @router.get("/admin/risk-dashboard")
 def get_admin_risk_dashboard(
+    refresh: bool = False,
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
     if current_user.role != models.UserRole.admin:
         raise HTTPException(status_code=403, detail="Access denied")
-        
-    students = db.query(models.Student).all()
-    dept_risk = {}
-    total_critical = 0
-    total_high = 0
-    
-    for s in students:
-        risk_data = risk_engine.calculate_student_risk(s.enrollment_no, db)
-        dept = s.branch or "General"
-        if dept not in dept_risk:
-            dept_risk[dept] = {"CRITICAL_RISK": 0, "HIGH_RISK": 0, "MEDIUM_RISK": 0, "LOW_RISK": 0, "SAFE": 0, "total": 0}
-            
-        lvl = risk_data.get("risk_level", "SAFE")
-        if lvl in dept_risk[dept]:
-            dept_risk[dept][lvl] += 1
-        dept_risk[dept]["total"] += 1
-        
-        if lvl == "CRITICAL_RISK":
-            total_critical += 1
-        elif lvl == "HIGH_RISK":
-            total_high += 1
-            
+
+    refreshed = _ensure_risk_snapshot(db, refresh)
+
+    dept_risk = risk_snapshot_service.branch_level_counts(db)
     return {
-        "total_students": len(students),
-        "total_critical_risk": total_critical,
-        "total_high_risk": total_high,
-        "department_breakdown": dept_risk
+        "total_students": sum(d["total"] for d in dept_risk.values()),
+        "total_critical_risk": sum(d["CRITICAL_RISK"] for d in dept_risk.values()),
+        "total_high_risk": sum(d["HIGH_RISK"] for d in dept_risk.values()),
+        "department_breakdown": dept_risk,
+        **risk_snapshot_service.freshness(db),
+        "refresh": refreshed
     }
 
 @router.post("/interventions")
@@ -2699,17 +2882,14 @@ def get_student_risk_detailed(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    return risk_explanation_engine.evaluate_and_explain_risk(student.enrollment_no, db)
+    return risk_explanation_engine.evaluate_and_explain_risk(student, db)
 
 @router.get("/students/{student_id}/risk/history")
 def get_student_risk_history(
@@ -2717,10 +2897,7 @@ def get_student_risk_history(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
@@ -2826,7 +3003,7 @@ async def websocket_risk(websocket: WebSocket, student_id: str):
         print(f"WS risk error: {e}")
         manager.disconnect(websocket, student_id)
 
-from app.services import concept_engine, analytics_aggregator, ai_insight_engine
+from app.services import concept_engine, concept_matrix, analytics_aggregator, ai_insight_engine
 
 @router.get("/students/{student_id}/subjects")
 def get_student_subjects_analytics(
@@ -2834,17 +3011,14 @@ def get_student_subjects_analytics(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    return analytics_aggregator.get_student_subject_metrics(student.enrollment_no, db)
+    return analytics_aggregator.get_student_subject_metrics(student, db)
 
 @router.get("/students/{student_id}/subjects/{subject_id}/concepts")
 def get_student_subject_concepts_analytics(
@@ -2853,17 +3027,14 @@ def get_student_subject_concepts_analytics(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
     if current_user.role == models.UserRole.student and current_user.linked_id != student.enrollment_no:
         raise HTTPException(status_code=403, detail="Access denied")
         
-    return concept_engine.get_student_subject_concepts(student.enrollment_no, subject_id, db)
+    return concept_engine.get_student_subject_concepts(student, subject_id, db)
 
 @router.get("/students/{student_id}/concepts/weak")
 def get_student_weak_concepts(
@@ -2871,32 +3042,42 @@ def get_student_weak_concepts(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    weak = db.query(models.StudentConceptMastery).filter(
-        models.StudentConceptMastery.student_id == student.enrollment_no,
-        models.StudentConceptMastery.mastery_level.in_(["WEAK", "CRITICAL"])
-    ).all()
-    
-    results = []
-    for w in weak:
-        c = db.query(models.Concept).filter(models.Concept.id == w.concept_id).first()
-        results.append({
-            "concept_id": w.concept_id,
-            "concept_name": c.concept_name if c else "Concept",
-            "subject_id": w.subject_id,
-            "mastery_score": w.mastery_score,
-            "mastery_level": w.mastery_level,
-            "easy_accuracy": w.easy_accuracy,
-            "medium_accuracy": w.medium_accuracy,
-            "hard_accuracy": w.hard_accuracy
-        })
-    return results
+    return concept_matrix.student_weak_concepts(db, student.enrollment_no)
+
+@router.get("/concepts/heatmap")
+def get_concept_mastery_heatmap(
+    subject_id: str,
+    department: Optional[str] = None,
+    semester: Optional[Union[str, int]] = None,
+    section: Optional[str] = None,
+    field: str = "mastery_score",
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    """Student x concept grid for a subject, optionally narrowed to a batch (department/semester/section)."""
+    if current_user.role not in [models.UserRole.teacher, models.UserRole.admin]:
+        raise HTTPException(status_code=403, detail="Access denied")
+    if field not in concept_matrix.FIELDS:
+        raise HTTPException(status_code=400, detail=f"field must be one of {', '.join(concept_matrix.FIELDS)}")
+
+    student_ids = None
+    if any(v and v != "All" for v in (department, semester, section)):
+        query = db.query(models.Student.enrollment_no)
+        if department and department != "All":
+            query = query.filter(models.Student.branch == department)
+        if semester and semester != "All":
+            try:
+                query = query.filter(models.Student.semester == int(semester))
+            except (ValueError, TypeError):
+                pass
+        if section and section != "All":
+            query = query.filter(models.Student.section == section)
+        student_ids = [sid for (sid,) in query.order_by(models.Student.enrollment_no).all()]
+    return concept_matrix.get_matrix(db, subject_id).heatmap(student_ids, field=field)
 
 @router.get("/faculty/{faculty_id}/analytics")
 def get_faculty_teaching_analytics(
@@ -2915,14 +3096,11 @@ def get_ai_insights_for_student(
     db: Session = Depends(database.get_db),
     current_user: models.User = Depends(auth.get_current_user_obj)
 ):
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) |
-        (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         raise HTTPException(status_code=404, detail="Student not found")
         
-    return ai_insight_engine.generate_insights_for_student(student.enrollment_no, db)
+    return ai_insight_engine.generate_insights_for_student(student, db)
 
 @router.post("/remedial/generate")
 def generate_remedial_practice_test(
@@ -2949,6 +3127,21 @@ def process_student_question_response(
         db=db
     )
 
+QUESTION_RESPONSE_BATCH_MAX = 100000
+
+@router.post("/question-responses/process-batch")
+def process_student_question_responses_batch(
+    payload: schemas.QuestionResponseBatchPayload,
+    db: Session = Depends(database.get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    """Grade-time batch for a whole attempt or test: bulk mastery upserts, one commit, deferred risk re-evaluation."""
+    if len(payload.responses) > QUESTION_RESPONSE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {QUESTION_RESPONSE_BATCH_MAX} responses per request")
+    return concept_engine.process_question_responses(
+        [r.model_dump() for r in payload.responses], db, requested_by=current_user.email
+    )
+
 from app.services import integration_adapters, event_bus, anomaly_detector, system_health_service
 
 @router.get("/health")
@@ -3317,6 +3510,13 @@ def get_batch_visual_dashboard(
     6. Student Rankings with Filters
     7. Topic-wise Class Performance
     """
+    return analytics_cache.cached(
+        "batch/visual-dashboard", {"branch": branch, "semester": semester}, analytics_cache.scope_for(current_user),
+        ("students", "marks", "attendance", "risk"),
+        lambda: _get_batch_visual_dashboard(branch, semester, db, current_user)
+    )
+
+def _get_batch_visual_dashboard(branch: Optional[str], semester: Optional[Union[str, int]], db: Session, current_user: models.User):
     if current_user.role not in [models.UserRole.teacher, models.UserRole.admin]:
         raise HTTPException(status_code=403, detail="Access denied")
 
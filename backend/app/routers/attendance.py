@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import datetime, date
 from .. import database, models, schemas, auth
+from ..services import feature_store, analytics_cache
 
 router = APIRouter(
     prefix="/attendance",
@@ -53,7 +54,12 @@ def mark_attendance(
         db.add(new_log)
         count += 1
     
+    if student_ids:
+        feature_store.refresh(db, student_ids, ["attendance"])
+    else:
+        feature_store.invalidate(db, families=["attendance"])
     db.commit()
+    analytics_cache.invalidate("attendance")
     return {"message": f"Recorded attendance for {count} students on {record_date}"}
 
 @router.get("/history")
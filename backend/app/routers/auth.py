@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordRequestForm
 from sqlalchemy.orm import Session
 from .. import database, models, schemas, auth
+from ..services import chat_context, analytics_cache
 
 router = APIRouter(
     prefix="/auth",
@@ -34,6 +35,11 @@ def login(form_data: OAuth2PasswordRequestForm = Depends(), db: Session = Depend
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Account pending approval"
         )
+
+    if auth.needs_rehash(user.password_hash):
+        # Bulk-provisioned accounts share one hash until their first login
+        user.password_hash = auth.get_password_hash(form_data.password)
+        db.commit()
     
     access_token_expires = auth.timedelta(minutes=auth.ACCESS_TOKEN_EXPIRE_MINUTES)
     access_token = auth.create_access_token(
@@ -130,6 +136,9 @@ def register(user: schemas.UserCreate, db: Session = Depends(database.get_db)):
     print(f"Creating new user in DB: {user.email}")
     db.add(new_user)
     db.commit()
+    # Registration may have created a student or teacher profile
+    chat_context.mark_dirty()
+    analytics_cache.invalidate("students", "teachers")
     db.refresh(new_user)
     print(f"User registered successfully: {new_user.user_id}")
     return new_user
@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from ..database import get_db
 from ..models import Student, Alert, AlertType, Teacher
 from pydantic import BaseModel
+from typing import Optional
 
 router = APIRouter(
     prefix="/automation",
@@ -12,8 +13,9 @@ router = APIRouter(
 class AutomationResult(BaseModel):
     message: str
     alerts_generated: int
+    job_id: Optional[str] = None
 
-def check_student_risks_task(db: Session):
+def check_student_risks_task(db: Session, progress=None) -> int:
     """
     Background task to scan all students and generate alerts
     if they fall below certain thresholds.
@@ -25,7 +27,9 @@ def check_student_risks_task(db: Session):
     ATTENDANCE_THRESHOLD = 75
     PRS_THRESHOLD = 60 # Placement Readiness Score - using average of scores as proxy if PRS not stored directly
     
-    for student in students:
+    for scanned, student in enumerate(students, start=1):
+        if progress:
+            progress(scanned=scanned, total=len(students), alerts_generated=count)
         # Calculate a simple average score as proxy for PRS if PRS isn't pre-calculated
         # (Assuming PRS is 20% of each component for now, or just simply checking components)
         
@@ -57,16 +61,24 @@ def check_student_risks_task(db: Session):
             
     db.commit()
     print(f"Automation Run: Generated {count} alerts.")
+    return count
+
+def risk_scan_job(db: Session, payload: dict, ctx) -> dict:
+    """job_queue handler for "automation.risk_scan"."""
+    count = check_student_risks_task(db, progress=lambda **fields: ctx.progress(**fields))
+    return {"alerts_generated": count}
 
 from .. import auth, models
+from ..services import job_queue
 
 @router.post("/run-checks", response_model=AutomationResult)
-def trigger_automation_checks(background_tasks: BackgroundTasks, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
+def trigger_automation_checks(db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_active_admin)):
     """
     Manually trigger the automated risk analysis. Restricted to Admins.
+    Runs on a job worker; the alert count is in the job result (GET /jobs/{job_id}).
     """
-    background_tasks.add_task(check_student_risks_task, db)
-    return {"message": "Automation checks triggered in background", "alerts_generated": 0}
+    job = job_queue.enqueue(db, "automation.risk_scan", priority=job_queue.PRIORITY_LOW, requested_by=current_user.email)
+    return {"message": "Automation checks queued", "alerts_generated": 0, "job_id": job["job_id"]}
 
 @router.get("/alerts")
 def get_alerts(skip: int = 0, limit: int = 50, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
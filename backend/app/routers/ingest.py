@@ -1,15 +1,21 @@
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from sqlalchemy.orm import Session
 from typing import List
-import pandas as pd
 import io
+import logging
 import os
-import random
 from ..database import get_db
-from ..models import User, UserRole, Student, Teacher, AttendanceLog, AttendanceStatus, Lecture, Unit, Alert, Submission, DatasetUpload, Assessment
+from ..models import User
 
-from ..auth import get_password_hash, get_current_active_admin
+from ..auth import get_current_active_admin
 from ..core.dynamic_tables import create_dynamic_table
+from ..core import lazy
+from ..services import prs_ranking, chat_context, job_queue, analytics_cache, feature_store, risk_snapshot_service
+
+# pandas (and the services built on it) load with the first upload, not with the web worker
+pd = lazy.LazyModule("pandas")
+
+logger = logging.getLogger(__name__)
 
 
 router = APIRouter(
@@ -17,19 +23,6 @@ router = APIRouter(
     tags=["ingestion"]
 )
 
-def clean_name(name):
-    if pd.isna(name):
-        return ""
-    return str(name).strip().lower()
-
-def safe_int(val, default=0):
-    try:
-        if pd.isna(val):
-            return default
-        return int(float(val))
-    except:
-        return default
-
 def read_df(file_content, filename):
     """Helper to read either CSV or Excel data."""
     if filename.lower().endswith('.csv'):
@@ -41,372 +34,43 @@ def read_df(file_content, filename):
     else:
         return pd.read_excel(io.BytesIO(file_content))
 
-@router.post("/bulk-upload")
+@router.post("/bulk-upload", status_code=202)
 async def bulk_upload(files: List[UploadFile] = File(...), db: Session = Depends(get_db), current_admin: User = Depends(get_current_active_admin)):
     """
     Surgical Bulk Ingestion: Updates only the sector(s) provided in the files.
     Preserves all other data ("previous data") for non-uploaded sectors.
+    Files are spooled to disk and applied chunk by chunk by a job worker; poll
+    GET /ingest/jobs/{job_id} (or subscribe to /jobs/ws/{job_id}) for progress.
     """
-    file_map = {}
-    print("Received bulk-upload request")
-    print(f"Processing {len(files)} files")
-    for file in files:
-        name = file.filename.lower()
-        content = await file.read()
-        file_map[name] = content
-
-    # Load existing students for upserting
-    existing_students = {s.student_id: s for s in db.query(Student).all()}
-    name_to_id_map = {clean_name(s.name): s.student_id for s in existing_students.values()}
-
-    # Determine default batch for NEW students
-    # If there are existing students (Batch 1), assign new ones to "Batch 2"
-    has_existing_students = len(existing_students) > 0
-    default_new_batch = "Batch 2" if has_existing_students else "Batch 1"
-    
-    # Track which students we've modified in this session
-    students_to_upsert = {}
-
-    def get_or_create_student_data(name, s_id=None):
-        name_key = clean_name(name)
-        if name_key in students_to_upsert:
-            return students_to_upsert[name_key]
-        
-        db_student = existing_students.get(s_id) or (existing_students.get(name_to_id_map.get(name_key)))
-        
-        if db_student:
-            data = {
-                "student_id": db_student.student_id, "name": db_student.name, "exists": True, "email": None,
-                "attendance": db_student.attendance, "dsa": db_student.dsa_score, "ml": db_student.ml_score, 
-                "qa": db_student.qa_score, "mock": db_student.mock_interview_score, "rag_status": db_student.rag_status
-            }
-        else:
-            data = {
-                "student_id": s_id or f"S{len(existing_students) + len(students_to_upsert) + 1}",
-                "name": name, "exists": False, "attendance": 0, "dsa": 0, "ml": 0, "qa": 0, "mock": 0, "rag_status": "Green"
-            }
-        
-        students_to_upsert[name_key] = data
-        return data
-
-    # metadata logs
-    upload_logs = []
-
-    # 1. Student Info (Master List)
-    info_f = next((k for k in file_map if ("student" in k and "assess" not in k and "attend" not in k and "score" not in k)), None)
-    if info_f:
-        df_info = read_df(file_map[info_f], info_f)
-        for _, row in df_info.iterrows():
-            name = row.get("Name")
-            if pd.isna(name): continue
-            s_id = str(row.get("College Roll no/ University Roll no.", row.get("S.No.") or ""))
-            if not s_id or s_id == "nan": 
-                s_id = f"TMP_{clean_name(name)}_{random.randint(1000,9999)}"
-                
-            s = get_or_create_student_data(name, s_id)
-            
-            # Field Mapping
-            for df_col, dict_key in [
-                ("Email Address", "email"), ("Email", "email"),
-                ("Branch", "branch"), ("Year", "year"),
-                ("Batch", "batch_id"), ("Aadhar/Pancard Number", "identity_proof"), 
-                ("Identity Proof", "identity_proof")
-            ]:
-                val = row.get(df_col)
-                if not pd.isna(val): s[dict_key] = str(val)
-            
-            # Dates
-            for df_col, dict_key in [("Start Date", "start_date"), ("End Date", "end_date")]:
-                val = row.get(df_col)
-                if not pd.isna(val):
-                    try: s[dict_key] = pd.to_datetime(val).date()
-                    except: pass
-
-        upload_logs.append(DatasetUpload(dataset_type="Student Batch Info", table_name="students", row_count=len(df_info)))
-
-    # To collect for surgical insertion (avoids FK issues)
-    all_new_assessments = []
-    all_new_logs = []
-    students_with_new_assessments = set()
-    dates_to_clean = set()
-
-    # 2. Assessments
-    ass_f = next((k for k in file_map if "assessment" in k), None)
-    if ass_f:
-        df_ass = read_df(file_map[ass_f], ass_f)
-
-        def proc_ass(row, name_col, tech_col, verb_col, math_col, logic_col, ass_index):
-            nm = row.get(name_col)
-            if pd.isna(nm): return
-            s = get_or_create_student_data(nm)
-            
-            t_score = safe_int(row.get(tech_col))
-            v_score = safe_int(row.get(verb_col))
-            m_score = safe_int(row.get(math_col))
-            l_score = safe_int(row.get(logic_col))
-            tot = t_score + v_score + m_score + l_score
-            
-            assess_name = f"Assessment {ass_index}"
-            all_new_assessments.append(Assessment(
-                student_id=s["student_id"],
-                assessment_name=assess_name,
-                technical_score=float(t_score),
-                verbal_score=float(v_score),
-                math_score=float(m_score),
-                logic_score=float(l_score),
-                total_score=float(tot),
-                percentage=round((tot / 400.0) * 100, 1),
-                date=pd.to_datetime('today').date()
-            ))
-            students_with_new_assessments.add(s["student_id"])
-
-            if "agg_scores" not in s: s["agg_scores"] = {"dsa": [], "ml": [], "qa": [], "mock": []}
-            s["agg_scores"]["dsa"].append(t_score)
-            s["agg_scores"]["ml"].append(m_score)
-            s["agg_scores"]["qa"].append(l_score)
-            s["agg_scores"]["mock"].append(v_score)
-
-        for _, row in df_ass.iterrows():
-            proc_ass(row, "Name", "Technical", "Verbal", "Maths/Numerical", "Logical Leasoning", 1)
-            proc_ass(row, "Name.1", "Technical.1", "Verbal.1", "Maths/Numerical.1", "Logical Leasoning.1", 2)
-            if "Name.2" in df_ass.columns: 
-                proc_ass(row, "Name.2", "Technical.2", "Verbal.2", "Maths/Numerical.2", "Logical Leasoning.2", 3)
-
-        # Deferred: db.query(Assessment).filter(Assessment.student_id.in_(list(students_with_new_assessments))).delete(synchronize_session=False)
-        # Deferred: db.add_all(all_new_assessments)
-
-        for s in students_to_upsert.values():
-            if "agg_scores" in s:
-                for k in ["dsa", "ml", "qa", "mock"]:
-                    if s["agg_scores"][k]: s[k] = int(sum(s["agg_scores"][k]) / len(s["agg_scores"][k]))
-        upload_logs.append(DatasetUpload(dataset_type="Assessment", table_name="assessments", row_count=len(all_new_assessments)))
-
-    # 3. Attendance (Batch Optimized)
-    att_f = next((k for k in file_map if "attend" in k), None)
-    if att_f:
-        df_att = read_df(file_map[att_f], att_f)
-        # Skip rows if it's the specific attendance template with title rows (often header starts at 3)
-        if not att_f.endswith('.csv') and len(df_att.columns) < 5: 
-            # Re-read with header=3 if it looks like the template
-            df_att = pd.read_excel(io.BytesIO(file_map[att_f]), header=3)
-        name_col = next((c for c in df_att.columns if "Name" in str(c)), None)
-        if name_col:
-            cols = list(df_att.columns); name_idx = cols.index(name_col); date_cols = cols[name_idx+1:]
-            
-            # Pre-collect all logs to add and keep track of dates to clean
-            # dates_to_clean = set() # Moved to top
-            # new_logs = [] # using all_new_logs
-            
-            for _, row in df_att.iterrows():
-                nm = row.get(name_col)
-                if pd.isna(nm): continue
-                s = get_or_create_student_data(nm)
-                p_count, total_days = 0, 0
-                for col in date_cols:
-                    stat = str(row.get(col)).upper().strip()
-                    enum = AttendanceStatus.present if stat in ['P', 'PRESENT'] else AttendanceStatus.absent if stat in ['A', 'ABSENT', 'L'] else None
-                    if enum:
-                        try:
-                            d_idx = int(float(col))
-                            if 1 <= d_idx <= 31:
-                                dt = pd.to_datetime(f"2025-01-{d_idx}", errors='coerce')
-                                if not pd.isna(dt):
-                                    dt = dt.date()
-                                    dates_to_clean.add(dt)
-                                    all_new_logs.append(AttendanceLog(student_id=s["student_id"], date=dt, status=enum))
-                                    if enum == AttendanceStatus.present: p_count += 1
-                                    total_days += 1
-                        except: pass
-                if total_days > 0: s["attendance"] = int((p_count / total_days) * 100)
-
-            # Deferred: Bulk Operation moved to end after Students are flushed
-            upload_logs.append(DatasetUpload(dataset_type="Attendance Sheet", table_name="attendance_logs", row_count=len(all_new_logs)))
-
-
-    # 4. Progression & 5. RAG
-    def proc_growth(data, pre, is_csv=False):
-        try:
-            if is_csv:
-                # CSVs usually have headers at row 0
-                df = pd.read_csv(io.BytesIO(data))
-            else:
-                # The provided Excel templates have a title row, so header=1
-                df = pd.read_excel(io.BytesIO(data), header=1)
-        except Exception as e:
-            print(f"Error reading growth data: {e}")
-            return 0
-            
-        df.columns = df.columns.astype(str).str.strip()
-        cn = {c.lower(): c for c in df.columns}
-        
-        # Flexible column mapping
-        f_map = {
-            "communication": "communication", "engagement": "engagement", 
-            "subject_knowledge": "subject knowledge", "confidence": "confidence", 
-            "fluency": "fluency", "score": "score", "remarks": "remarks",
-            "status": "status", "batch_id": "batch"
-        }
-        
-        count = 0
-        for _, row in df.iterrows():
-            # Try to find name column
-            name_col = next((c for c in df.columns if "name" in c.lower()), None)
-            nm = row.get(name_col) if name_col else None
-            
-            if not pd.isna(nm):
-                s = get_or_create_student_data(nm)
-                for f, ct in f_map.items():
-                    # partial match for columns
-                    col_name = next((c for c in df.columns if ct in c.lower()), None)
-                    if col_name:
-                        val = row.get(col_name)
-                        if not pd.isna(val): 
-                            s[f"{pre}_{f}" if f != "score" else f"{pre}_score"] = val if f in ["remarks", "status", "batch_id"] else float(val)
-                count += 1
-        return count
-
-    pre_f = next((k for k in file_map if "pre observation" in k), None)
-    if pre_f: 
-        cnt = proc_growth(file_map[pre_f], "pre", is_csv=pre_f.endswith('.csv'))
-        upload_logs.append(DatasetUpload(dataset_type="Pre-Observation", table_name="students", row_count=cnt))
-        
-    post_f = next((k for k in file_map if "post observation" in k), None)
-    if post_f: 
-        cnt = proc_growth(file_map[post_f], "post", is_csv=post_f.endswith('.csv'))
-        upload_logs.append(DatasetUpload(dataset_type="Post-Observation", table_name="students", row_count=cnt))
-    rag_f = next((k for k in file_map if "rag analysis" in k), None)
-    if rag_f:
-        df_rag = read_df(file_map[rag_f], rag_f)
-        rc = next((c for c in df_rag.columns if "RAG" in str(c)), "RAG Status")
-        for _, row in df_rag.iterrows():
-            nm = row.get(next((c for c in df_rag.columns if "Name" in str(c)), "Name"))
-            if not pd.isna(nm): get_or_create_student_data(nm)["rag_status"] = str(row.get(rc)).strip()
-        upload_logs.append(DatasetUpload(dataset_type="RAG Analysis", table_name="students", row_count=len(df_rag)))
-
-    # 6. Schedule & Agenda (Sector-wide refresh)
-    sch_f = next((k for k in file_map if "schedule" in k), None)
-    if sch_f:
-        db.query(Lecture).delete()
-        df_sch = read_df(file_map[sch_f], sch_f)
-        tc = [c for c in df_sch.columns if all(x not in str(c) for x in ["Date", "Day", "Unnamed"])]
-        for _, row in df_sch.iterrows():
-            try:
-                dt_raw = row.get("Date")
-                dt = pd.to_datetime(dt_raw, errors='coerce')
-                if pd.isna(dt): continue
-                dt = dt.date()
-                for t in tc:
-                    top = row.get(t)
-                    if not pd.isna(top) and str(top).lower() != "nan":
-                        db.add(Lecture(teacher_id="T01", batch="Batch 1", subject="General", topic=str(top), room="Online", start_time=str(t).split("-")[0].strip(), end_time=str(t).split("-")[1].strip() if "-" in str(t) else "", date=dt))
-            except: continue
-        upload_logs.append(DatasetUpload(dataset_type="Schedule", table_name="lectures", row_count=len(df_sch)))
-
-    age_f = next((k for k in file_map if "agenda" in k), None)
-    if age_f:
-        db.query(Unit).delete()
-        df_ag = read_df(file_map[age_f], age_f)
-        # Handle agenda header (often starts at row 1)
-        if not age_f.endswith('.csv') and len(df_ag.columns) < 3:
-            df_ag = pd.read_excel(io.BytesIO(file_map[age_f]), header=1)
-        
-        for i, row in df_ag.iterrows():
-            top = row.get("Topic")
-            if not pd.isna(top): db.add(Unit(teacher_id="T01", unit_number=safe_int(row.get("S.No."), i+1), title=str(top), status="Pending", progress=0))
-        upload_logs.append(DatasetUpload(dataset_type="Agenda", table_name="units", row_count=len(df_ag)))
-
-    # Commit Updates
-
-    new_users = []
-    new_students = []
-
-    for d in students_to_upsert.values():
-        if d.get("exists"):
-            st = existing_students[d["student_id"]]
-            field_map = {
-                "attendance": "attendance", "dsa_score": "dsa", "ml_score": "ml", "qa_score": "qa",
-                "mock_interview_score": "mock", "projects_score": "projects", "pre_score": "pre_score",
-                "post_score": "post_score", "pre_communication": "pre_communication",
-                "pre_engagement": "pre_engagement", "pre_subject_knowledge": "pre_subject_knowledge",
-                "pre_confidence": "pre_confidence", "pre_fluency": "pre_fluency",
-                "pre_remarks": "pre_remarks", "pre_status": "pre_status",
-                "post_communication": "post_communication", "post_engagement": "post_engagement",
-                "post_subject_knowledge": "post_subject_knowledge", "post_confidence": "post_confidence",
-                "post_fluency": "post_fluency", "post_remarks": "post_remarks", "post_status": "post_status",
-                "rag_status": "rag_status", "batch_id": "batch_id",
-                "branch": "branch", "year": "year", "identity_proof": "identity_proof",
-                "start_date": "start_date", "end_date": "end_date"
-            }
-            # Fallbacks for batch_id from pre/post observation
-            if "batch_id" not in d:
-                if "pre_batch_id" in d: d["batch_id"] = d["pre_batch_id"]
-                elif "post_batch_id" in d: d["batch_id"] = d["post_batch_id"]
-            
-            for attr, key in field_map.items():
-                if key in d: setattr(st, attr, d[key])
-        else:
-            # Create new
-            st = Student(
-                student_id=d["student_id"], name=d["name"], attendance=d.get("attendance", 0), 
-                dsa_score=d.get("dsa", 0), ml_score=d.get("ml", 0), qa_score=d.get("qa", 0), 
-                projects_score=random.randint(70, 90), mock_interview_score=d.get("mock", 0), 
-                rag_status=d.get("rag_status", "Green"),
-                batch_id=d.get("batch_id") or d.get("pre_batch_id") or d.get("post_batch_id") or default_new_batch,
-                pre_score=d.get("pre_score", 0.0), post_score=d.get("post_score", 0.0),
-                pre_communication=d.get("pre_communication", 0.0), pre_engagement=d.get("pre_engagement", 0.0),
-                pre_subject_knowledge=d.get("pre_subject_knowledge", 0.0), pre_confidence=d.get("pre_confidence", 0.0),
-                pre_fluency=d.get("pre_fluency", 0.0), pre_remarks=d.get("pre_remarks"), pre_status=d.get("pre_status"),
-                post_communication=d.get("post_communication", 0.0), post_engagement=d.get("post_engagement", 0.0),
-                post_subject_knowledge=d.get("post_subject_knowledge", 0.0), post_confidence=d.get("post_confidence", 0.0),
-                post_fluency=d.get("post_fluency", 0.0), post_remarks=d.get("post_remarks"), post_status=d.get("post_status"),
-                branch=d.get("branch"), year=d.get("year"), identity_proof=d.get("identity_proof"),
-                start_date=d.get("start_date"), end_date=d.get("end_date")
-            )
-            new_students.append(st)
-            if d.get("email"):
-                new_users.append(User(email=d["email"], password_hash=get_password_hash("password123"), 
-                                     role=UserRole.student, linked_id=d["student_id"], approved=True))
-
-    if new_students: db.add_all(new_students)
-    if new_users: db.add_all(new_users)
-    
-    # CRITICAL: Flush students FIRST so that Foreign Keys exist for assessments and logs
-    db.flush()
-
-    # Surgical Assessment Clean & Add
-    if students_with_new_assessments:
-        db.query(Assessment).filter(Assessment.student_id.in_(list(students_with_new_assessments))).delete(synchronize_session=False)
-        db.add_all(all_new_assessments)
-
-    # Surgical Attendance Clean & Add
-    if dates_to_clean:
-        upload_student_ids = [s["student_id"] for s in students_to_upsert.values()]
-        db.query(AttendanceLog).filter(
-            AttendanceLog.date.in_(list(dates_to_clean)),
-            AttendanceLog.student_id.in_(upload_student_ids)
-        ).delete(synchronize_session=False)
-        db.add_all(all_new_logs)
-
-    if upload_logs: db.add_all(upload_logs)
-
-
-    # Ensure system accounts
-    if not db.query(User).filter(User.role == UserRole.admin).first():
-        db.add(User(email="admin@sage.com", password_hash=get_password_hash("password"), role=UserRole.admin, approved=True))
-    if not db.query(Teacher).filter(Teacher.teacher_id == "T01").first():
-        db.add(Teacher(teacher_id="T01", name="Prof. Teacher", subject="CS", avg_improvement=15.0, feedback_score=4.5, content_quality_score=4.2, placement_conversion=20.0))
-        db.add(User(email="teacher@sage.com", password_hash=get_password_hash("password"), role=UserRole.teacher, linked_id="T01", approved=True))
+    from ..services import bulk_ingest
 
+    logger.info("Received bulk-upload request with %d files", len(files))
+    spooled = {}
     try:
-        db.flush() # Flush to detect issues before final commit
-        db.commit()
-        return {"message": "Update complete. Other sectors preserved.", "sectors_modified": list(file_map.keys())}
+        for file in files:
+            spooled[file.filename.lower()] = await bulk_ingest.spool_upload(file)
     except Exception as e:
-        db.rollback()
-        import traceback
-        traceback.print_exc() # Log to server console
-        raise HTTPException(status_code=500, detail=f"Surgical Ingestion Failed: {str(e)}")
+        for path in spooled.values():
+            os.remove(path)
+        raise HTTPException(status_code=400, detail=f"Could not read upload: {str(e)}")
+
+    job = job_queue.enqueue(
+        db, "ingest.bulk_upload", {"files": spooled},
+        priority=job_queue.PRIORITY_HIGH, max_attempts=1, requested_by=current_admin.email
+    )
+    return {
+        "message": "Upload received. Ingestion has been queued.",
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "sectors_modified": list(spooled.keys())
+    }
 
+@router.get("/jobs/{job_id}")
+def get_ingest_job(job_id: str, db: Session = Depends(get_db), current_admin: User = Depends(get_current_active_admin)):
+    job = job_queue.get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
 
 
 @router.post("/create-monthly-table/{month_suffix}")
@@ -431,100 +95,42 @@ async def ingest_csv(file: UploadFile = File(...), db: Session = Depends(get_db)
 @router.post("/csv/smart-upload")
 async def smart_csv_upload(
     file: UploadFile = File(...),
+    dry_run: bool = False,
     db: Session = Depends(get_db),
     current_admin: User = Depends(get_current_active_admin)
 ):
+    """
+    Match rows to existing students (by id, then email, then name) and create or update them.
+    With dry_run=true nothing is written; the response shows what would be created/updated.
+    """
+    from ..services import smart_upload
+
     content = await file.read()
     df = read_df(content, file.filename)
     if df.empty:
         raise HTTPException(status_code=400, detail="Uploaded file is empty.")
 
-    COLUMN_MAPPINGS = {
-        'student_id': ['student_id', 'enrollment_no', 'roll_no', 'id', 'enrollment', 'registration_no'],
-        'name': ['name', 'student_name', 'full_name', 'student'],
-        'email': ['email', 'email_address', 'student_email', 'mail'],
-        'attendance': ['attendance', 'att', 'attendance_pct', 'attendance_percentage', 'att_%'],
-        'dsa_score': ['dsa', 'dsa_score', 'data_structures', 'dsa_marks'],
-        'ml_score': ['ml', 'ml_score', 'machine_learning', 'ml_marks'],
-        'qa_score': ['qa', 'qa_score', 'quantitative_aptitude', 'aptitude', 'qa_marks'],
-        'projects_score': ['projects', 'projects_score', 'project', 'project_marks'],
-        'mock_interview_score': ['mock', 'mock_interview', 'mock_score', 'interview_score'],
-        'cgpa': ['cgpa', 'gpa', 'cgpa_score'],
-        'program': ['program', 'degree', 'course_name'],
-        'branch': ['branch', 'department', 'dept', 'stream'],
-        'semester': ['semester', 'sem'],
-        'section': ['section', 'sec'],
-        'batch_id': ['batch', 'batch_id', 'cohort']
-    }
-
-    mapped_columns = {}
-    for col in df.columns:
-        clean_col = str(col).strip().lower().replace(' ', '_')
-        for target_field, synonyms in COLUMN_MAPPINGS.items():
-            if clean_col in synonyms or any(s in clean_col for s in synonyms):
-                mapped_columns[target_field] = col
-                break
-
-    records_processed = 0
-    records_updated = 0
-    records_created = 0
-
-    for _, row in df.iterrows():
-        s_id = str(row.get(mapped_columns.get('student_id', ''), '')).strip()
-        s_name = str(row.get(mapped_columns.get('name', ''), '')).strip()
+    mapped_columns = smart_upload.map_columns(df.columns)
+    plan = smart_upload.reconcile(db, df, mapped_columns)
 
-        if not s_id or s_id == 'nan' or s_id.lower() == 'none':
-            if not s_name or s_name == 'nan':
-                continue
-            s_id = f"S_{random.randint(1000, 9999)}"
-
-        student = db.query(Student).filter(
-            (Student.enrollment_no == s_id) | (Student.student_id == s_id)
-        ).first()
-
-        if not student and s_name:
-            student = db.query(Student).filter(Student.name == s_name).first()
-
-        if not student:
-            s_email = str(row.get(mapped_columns.get('email', ''), f"{s_id.lower()}@sage.com")).strip()
-            student = Student(
-                enrollment_no=s_id,
-                name=s_name or f"Student {s_id}",
-                email=s_email,
-                program=str(row.get(mapped_columns.get('program', ''), 'B.Tech')).strip(),
-                branch=str(row.get(mapped_columns.get('branch', ''), 'CSE')).strip(),
-                semester=safe_int(row.get(mapped_columns.get('semester', ''), 1), 1),
-                section=str(row.get(mapped_columns.get('section', ''), 'A')).strip(),
-                attendance=safe_int(row.get(mapped_columns.get('attendance', ''), 85), 85),
-                dsa_score=safe_int(row.get(mapped_columns.get('dsa_score', ''), 80), 80),
-                ml_score=safe_int(row.get(mapped_columns.get('ml_score', ''), 78), 78),
-                qa_score=safe_int(row.get(mapped_columns.get('qa_score', ''), 82), 82),
-                projects_score=safe_int(row.get(mapped_columns.get('projects_score', ''), 85), 85),
-                mock_interview_score=safe_int(row.get(mapped_columns.get('mock_interview_score', ''), 80), 80),
-                cgpa=float(row.get(mapped_columns.get('cgpa', ''), 8.0) or 8.0),
-                batch_id=str(row.get(mapped_columns.get('batch_id', ''), 'Batch 1')).strip()
-            )
-            db.add(student)
-            records_created += 1
-        else:
-            if 'name' in mapped_columns and s_name: student.name = s_name
-            if 'attendance' in mapped_columns: student.attendance = safe_int(row[mapped_columns['attendance']], student.attendance)
-            if 'dsa_score' in mapped_columns: student.dsa_score = safe_int(row[mapped_columns['dsa_score']], student.dsa_score)
-            if 'ml_score' in mapped_columns: student.ml_score = safe_int(row[mapped_columns['ml_score']], student.ml_score)
-            if 'qa_score' in mapped_columns: student.qa_score = safe_int(row[mapped_columns['qa_score']], student.qa_score)
-            if 'projects_score' in mapped_columns: student.projects_score = safe_int(row[mapped_columns['projects_score']], student.projects_score)
-            if 'mock_interview_score' in mapped_columns: student.mock_interview_score = safe_int(row[mapped_columns['mock_interview_score']], student.mock_interview_score)
-            records_updated += 1
-
-        records_processed += 1
-
-    db.commit()
+    if not dry_run:
+        smart_upload.apply_plan(db, plan)
+        touched = [row["enrollment_no"] for row in plan["creates"] + plan["updates"]]
+        prs_ranking.invalidate(db)
+        feature_store.invalidate(db, student_ids=touched)
+        risk_snapshot_service.mark_stale(db, touched)
+        db.commit()
+        chat_context.mark_dirty()
+        analytics_cache.invalidate("students", "risk")
 
     return {
-        "status": "success",
+        "status": "dry_run" if dry_run else "success",
         "filename": file.filename,
         "mapped_columns": mapped_columns,
-        "records_processed": records_processed,
-        "records_created": records_created,
-        "records_updated": records_updated
+        "records_processed": plan["records_processed"],
+        "records_created": len(plan["creates"]),
+        "records_updated": len(plan["updates"]),
+        "records_unchanged": plan["unchanged"],
+        "records_unmatched": len(plan["unmatched"]),
+        "diff": plan["diff"]
     }
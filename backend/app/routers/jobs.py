@@ -0,0 +1,144 @@
+from fastapi import APIRouter, Depends, HTTPException, WebSocket, WebSocketDisconnect
+from starlette.concurrency import run_in_threadpool
+from starlette.status import WS_1008_POLICY_VIOLATION
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Optional
+import asyncio
+
+from .. import models, auth
+from ..database import get_db, SessionLocal
+from ..services import job_queue, scheduler
+from .analytics import manager
+
+router = APIRouter(
+    prefix="/jobs",
+    tags=["jobs"]
+)
+
+RELAY_INTERVAL_SECONDS = 1.0
+ALL_JOBS_CHANNEL = "jobs"
+
+
+def _can_read(db: Session, current_user: models.User, job: models.BackgroundJob) -> bool:
+    if current_user.role == models.UserRole.admin or job.requested_by == current_user.email:
+        return True
+    # Anyone else only through the job's target student, with the same check the student's own routes use
+    student_id = job_queue.target_student_id(job)
+    if student_id is None:
+        return False
+    student = db.query(models.Student).filter(models.Student.student_id == student_id).first()
+    return student is not None and auth.can_access_student(db, current_user, student)
+
+
+def _load_job(db: Session, job_id: str, current_user: models.User) -> models.BackgroundJob:
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    # Same answer for a missing job and somebody else's, so job ids cannot be probed
+    if job is None or not _can_read(db, current_user, job):
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+
+@router.get("")
+def list_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = 50,
+    db: Session = Depends(get_db),
+    current_user: models.User = Depends(auth.get_current_user_obj)
+):
+    limit = min(max(1, limit), 200)
+    if current_user.role != models.UserRole.admin:
+        return {"jobs": job_queue.list_jobs(db, status=status, kind=kind, limit=limit, requested_by=current_user.email)}
+    return {"jobs": job_queue.list_jobs(db, status=status, kind=kind, limit=limit), "pool": job_queue.pool.status(), "scheduler": scheduler.scheduler.status()}
+
+
+@router.get("/{job_id}")
+def get_job(job_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    return job_queue.to_dict(_load_job(db, job_id, current_user))
+
+
+@router.post("/{job_id}/cancel")
+def cancel_job(job_id: str, db: Session = Depends(get_db), current_user: models.User = Depends(auth.get_current_user_obj)):
+    job = _load_job(db, job_id, current_user)
+    if current_user.role != models.UserRole.admin and job.requested_by != current_user.email:
+        raise HTTPException(status_code=403, detail="Only the requester or an admin can cancel a job")
+    return job_queue.cancel_job(db, job_id)
+
+
+def _authorize_socket(token: Optional[str], job_id: Optional[str]) -> bool:
+    db = SessionLocal()
+    try:
+        user = auth.user_from_token(db, token)
+        if user is None:
+            return False
+        if job_id is None:
+            return user.role == models.UserRole.admin
+        job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+        return job is not None and _can_read(db, user, job)
+    finally:
+        db.close()
+
+
+async def _hold(websocket: WebSocket, channel: str):
+    await manager.connect(websocket, channel)
+    try:
+        while True:
+            await websocket.receive_text()
+    except WebSocketDisconnect:
+        manager.disconnect(websocket, channel)
+    except Exception as e:
+        print(f"WS error: {e}")
+        manager.disconnect(websocket, channel)
+
+
+@router.websocket("/ws")
+async def websocket_all_jobs(websocket: WebSocket, token: Optional[str] = None):
+    """Every job's updates; admins only. The token is passed as ?token=..."""
+    if not await run_in_threadpool(_authorize_socket, token, None):
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    await _hold(websocket, ALL_JOBS_CHANNEL)
+
+
+@router.websocket("/ws/{job_id}")
+async def websocket_job(websocket: WebSocket, job_id: str, token: Optional[str] = None):
+    if not await run_in_threadpool(_authorize_socket, token, job_id):
+        await websocket.close(code=WS_1008_POLICY_VIOLATION)
+        return
+    await _hold(websocket, f"job:{job_id}")
+
+
+def _changed_since(since: datetime):
+    db = SessionLocal()
+    try:
+        return job_queue.updated_since(db, since)
+    finally:
+        db.close()
+
+
+def _has_subscribers() -> bool:
+    return any(key == ALL_JOBS_CHANNEL or key.startswith("job:") for key in manager.active_connections)
+
+
+async def relay_progress():
+    """
+    Push job state changes to WebSocket subscribers. Workers write progress to the jobs table
+    from other processes, so this polls the table for rows updated since the last pass.
+    """
+    since = datetime.utcnow()
+    while True:
+        await asyncio.sleep(RELAY_INTERVAL_SECONDS)
+        if not _has_subscribers():
+            since = datetime.utcnow()
+            continue
+        try:
+            jobs = await run_in_threadpool(_changed_since, since)
+        except Exception as e:
+            print(f"[Jobs] Progress relay error: {e}")
+            continue
+        for job in jobs:
+            message = {"type": "job", **job}
+            await manager.send_personal_message(message, f"job:{job['job_id']}")
+            await manager.send_personal_message(message, ALL_JOBS_CHANNEL)
+            since = max(since, datetime.fromisoformat(job["updated_at"]))
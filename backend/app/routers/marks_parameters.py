@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from .. import models, database, auth, schemas
+from ..services import analytics_cache, prs_ranking
 
 router = APIRouter(
     prefix="/marks-parameters",
@@ -159,5 +160,7 @@ def save_parameter_marks_bulk(parameter_id: str, marks_in: List[schemas.StudentP
 
         updated_count += 1
 
+    prs_ranking.invalidate(db)
     db.commit()
+    analytics_cache.invalidate("marks", "students")
     return {"message": f"Successfully updated marks for {updated_count} students."}
@@ -1,6 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from .. import models, database, auth, schemas
+from ..services import risk_snapshot_service, prs_ranking, analytics_cache, settings_cache
 from pydantic import BaseModel
 from typing import Optional, Dict
 import json
@@ -19,8 +20,8 @@ class SystemSettings(BaseModel):
 def get_settings(db: Session = Depends(database.get_db), current_admin: models.User = Depends(auth.get_current_active_admin)):
     # Helper to get value or default
     def get_val(key, default):
-        s = db.query(models.SystemSetting).filter(models.SystemSetting.key == key).first()
-        return s.value == "true" if s else default
+        value = settings_cache.get_value(db, key)
+        return value == "true" if value is not None else default
 
     return SystemSettings(
         two_factor_auth=get_val("two_factor_auth", False),
@@ -41,8 +42,10 @@ def update_settings(settings: SystemSettings, db: Session = Depends(database.get
     set_val("two_factor_auth", settings.two_factor_auth)
     set_val("session_timeout", settings.session_timeout)
     set_val("registration_alerts", settings.registration_alerts)
+    settings_cache.invalidate(db)
     
     db.commit()
+    analytics_cache.invalidate("settings")
     return {"message": "Settings updated"}
 
 from fastapi.encoders import jsonable_encoder
@@ -73,8 +76,8 @@ def export_database(db: Session = Depends(database.get_db), current_admin: model
 
 @router.post("/purge-cache")
 def purge_cache(db: Session = Depends(database.get_db), current_admin: models.User = Depends(auth.get_current_active_admin)):
-    # Simulating cache purge
-    return {"message": "System cache purged successfully"}
+    purged = analytics_cache.purge()
+    return {"message": "System cache purged successfully", "purged": purged, "stats": analytics_cache.stats()}
 
 
 # ─── Ranking Configuration ─────────────────────────────────────────────────────
@@ -104,10 +107,7 @@ def get_ranking_config(
     db: Session = Depends(database.get_db),
     current_admin: models.User = Depends(auth.get_current_active_admin)
 ):
-    setting = db.query(models.SystemSetting).filter(models.SystemSetting.key == "ranking_config").first()
-    if setting:
-        return json.loads(setting.value)
-    return DEFAULT_RANKING_CONFIG
+    return settings_cache.get_json(db, "ranking_config", DEFAULT_RANKING_CONFIG)
 
 
 @router.post("/ranking-config")
@@ -131,7 +131,10 @@ def update_ranking_config(
     else:
         setting = models.SystemSetting(key="ranking_config", value=value)
         db.add(setting)
+    prs_ranking.invalidate(db)
+    settings_cache.invalidate(db)
     db.commit()
+    analytics_cache.invalidate("settings")
     return {"message": "Ranking configuration saved successfully"}
 
 # ─── Risk Weights Configuration ───────────────────────────────────────────────
@@ -158,10 +161,7 @@ def get_risk_weights(
     db: Session = Depends(database.get_db),
     current_admin: models.User = Depends(auth.get_current_active_admin)
 ):
-    setting = db.query(models.SystemSetting).filter(models.SystemSetting.key == "risk_weights").first()
-    if setting:
-        return json.loads(setting.value)
-    return DEFAULT_RISK_WEIGHTS
+    return settings_cache.get_json(db, "risk_weights", DEFAULT_RISK_WEIGHTS)
 
 @router.post("/risk-weights")
 def update_risk_weights(
@@ -183,7 +183,11 @@ def update_risk_weights(
     else:
         setting = models.SystemSetting(key="risk_weights", value=value)
         db.add(setting)
+    # Every snapshot row was scored with the old weights
+    risk_snapshot_service.mark_all_stale(db)
+    settings_cache.invalidate(db)
     db.commit()
+    analytics_cache.invalidate("settings", "risk")
     return {"message": "Risk weight configuration saved successfully"}
 
 # -------------------------------------------------------------------
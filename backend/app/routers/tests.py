@@ -40,7 +40,7 @@ def create_test(
     return db_test
 
 @router.post("/generate-questions")
-def generate_test_questions(
+async def generate_test_questions(
     subject: str = Form(...),
     topic: str = Form(...),
     syllabus: str = Form(...),
@@ -63,7 +63,7 @@ def generate_test_questions(
             count = type_count_sum
 
     try:
-        questions = generate_questions(
+        questions = await generate_questions(
             subject=subject,
             topic=topic,
             syllabus=syllabus,
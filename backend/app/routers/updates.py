@@ -2,6 +2,7 @@ from fastapi import APIRouter, Depends, HTTPException, status
 from sqlalchemy.orm import Session
 from typing import List
 from .. import database, models, schemas, auth
+from ..services import risk_snapshot_service, prs_ranking, chat_context, user_provisioning, analytics_cache
 
 router = APIRouter(
     prefix="/update",
@@ -44,8 +45,13 @@ def update_student(
     if update_data.qa_score is not None: student.qa_score = update_data.qa_score
     if update_data.projects_score is not None: student.projects_score = update_data.projects_score
     if update_data.mock_interview_score is not None: student.mock_interview_score = update_data.mock_interview_score
+    if update_data.attendance is not None:
+        risk_snapshot_service.mark_stale(db, [student.enrollment_no])
     
+    prs_ranking.invalidate(db)
     db.commit()
+    chat_context.mark_dirty([student.enrollment_no])
+    analytics_cache.invalidate("students", "marks", "attendance")
     db.refresh(student)
     return {"message": "Student updated successfully", "student": student}
 
@@ -66,6 +72,7 @@ def update_teacher(
     if update_data.placement_conversion is not None: teacher.placement_conversion = update_data.placement_conversion
 
     db.commit()
+    analytics_cache.invalidate("teachers")
     db.refresh(teacher)
     return {"message": "Teacher updated successfully", "teacher": teacher}
 
@@ -124,6 +131,7 @@ def create_student(
         db.add(new_user)
 
     db.commit()
+    analytics_cache.invalidate("students")
     db.refresh(new_student)
     
     msg = "Student created successfully."
@@ -132,6 +140,64 @@ def create_student(
 
     return {"message": msg, "student": new_student}
 
+@router.post("/students/bulk-add")
+def create_students_bulk(
+    students: List[schemas.StudentCreate],
+    db: Session = Depends(database.get_db),
+    admin: models.User = Depends(auth.get_current_active_admin)
+):
+    """
+    Create many students and their user accounts at once (same defaults as /student/add:
+    [Student_ID]@university.edu / [Student_ID]). Existing student IDs and emails already
+    in use (by a stored student or an earlier row of the payload) are skipped.
+    """
+    by_id = {s.enrollment_no: s for s in students}
+    ids = list(by_id)
+    existing = set()
+    for start in range(0, len(ids), 500):
+        existing.update(sid for (sid,) in db.query(models.Student.enrollment_no).filter(
+            models.Student.enrollment_no.in_(ids[start:start + 500])
+        ).all())
+    candidates = [s for sid, s in by_id.items() if sid not in existing]
+
+    # Student.email is unique: a clash would fail the whole insert
+    emails = list({s.email for s in candidates})
+    claimed = set()
+    for start in range(0, len(emails), 500):
+        claimed.update(email for (email,) in db.query(models.Student.email).filter(
+            models.Student.email.in_(emails[start:start + 500])
+        ).all())
+    new_students, skipped = [], [{"student_id": sid, "reason": "student id exists"} for sid in existing]
+    for s in candidates:
+        if s.email in claimed:
+            skipped.append({"student_id": s.enrollment_no, "reason": "email in use"})
+            continue
+        claimed.add(s.email)
+        new_students.append(s)
+
+    rows = [s.dict() for s in new_students]
+    for start in range(0, len(rows), 1000):
+        db.bulk_insert_mappings(models.Student, rows[start:start + 1000])
+    provisioning = user_provisioning.provision_users(db, [{
+        "email": f"{s.enrollment_no}@university.edu".lower(),
+        "password": s.enrollment_no,
+        "role": models.UserRole.student,
+        "linked_id": s.enrollment_no,
+        "approved": True
+    } for s in new_students])
+
+    prs_ranking.invalidate(db)
+    db.commit()
+    chat_context.mark_dirty()
+    analytics_cache.invalidate("students")
+    return {
+        "message": f"Created {len(new_students)} students",
+        "students_created": len(new_students),
+        "students_skipped": len(skipped),
+        "skipped": skipped,
+        "users": provisioning
+    }
+
 @router.post("/teacher/add")
 def create_teacher(
     teacher_data: schemas.TeacherCreate,
@@ -173,6 +239,8 @@ def create_teacher(
         db.add(new_user)
         
     db.commit()
+    chat_context.mark_dirty()
+    analytics_cache.invalidate("teachers")
     db.refresh(new_teacher)
     
     return {"message": "Teacher created successfully", "teacher": new_teacher, "credentials": {"email": teacher_email, "password": teacher_data.teacher_id}}
@@ -184,6 +252,7 @@ def bulk_update_students(
     user: models.User = Depends(admin_or_teacher)
 ):
     count = 0
+    stale_ids = []
     # Pre-fetch assigned batches for teacher
     batch_list = []
     if user.role == models.UserRole.teacher:
@@ -206,9 +275,14 @@ def bulk_update_students(
             if update_item.mock_interview_score is not None: student.mock_interview_score = update_item.mock_interview_score
             if update_item.fees_paid is not None: student.fees_paid = update_item.fees_paid
             if update_item.external_certifications is not None: student.external_certifications = update_item.external_certifications
+            if update_item.attendance is not None: stale_ids.append(student.enrollment_no)
             count += 1
     
+    risk_snapshot_service.mark_stale(db, stale_ids)
+    prs_ranking.invalidate(db)
     db.commit()
+    chat_context.mark_dirty()
+    analytics_cache.invalidate("students", "marks", "attendance")
     return {"message": f"Successfully updated {count} students"}
 
 @router.post("/teachers/bulk")
@@ -228,6 +302,8 @@ def bulk_update_teachers(
             count += 1
             
     db.commit()
+    chat_context.mark_dirty()
+    analytics_cache.invalidate("teachers")
     return {"message": f"Successfully updated {count} teachers"}
 
 @router.put("/user/approve/{email}")
@@ -244,6 +320,7 @@ def approve_user(
     user.approved_by = admin.user_id
     user.approved_at = func.now()
     db.commit()
+    auth.invalidate_principals(email)
     return {"message": f"User {email} approved successfully"}
 
 @router.get("/list/teachers")
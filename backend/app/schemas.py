@@ -711,6 +711,9 @@ class QuestionResponseItemPayload(BaseModel):
     time_taken_seconds: float = 30.0
     difficulty: str = "MEDIUM"
 
+class QuestionResponseBatchPayload(BaseModel):
+    responses: List[QuestionResponseItemPayload]
+
 class AIInsightResponse(BaseModel):
     id: str
     target_type: str
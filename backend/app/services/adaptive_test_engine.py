@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any, List
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, tiers
+
 class AdaptiveTestPolicyEngine:
     """
     Model 11 of 13: Adaptive Test Generation Engine (IRT + Reinforcement Learning Policy)
@@ -62,3 +66,24 @@ class AdaptiveTestPolicyEngine:
                 "current_theta_estimate": theta
             }
         }
+
+    def select_next_item_batch(self, session_states: Any) -> Dict[str, Any]:
+        """Vectorized select_next_item for N concurrent test sessions."""
+        cols = to_columns(session_states)
+        n = row_count(cols)
+        curr_beta = column(cols, n, "current_beta", 0.50)
+        is_correct = column(cols, n, "is_last_correct", 1.0) != 0
+        theta = column(cols, n, "student_theta", 0.50)
+
+        beta_next = np.where(is_correct, np.minimum(0.92, curr_beta + 0.18), np.maximum(0.12, curr_beta - 0.22))
+        a = 1.40
+        p_success = 1.0 / (1.0 + np.exp(-a * (theta - beta_next)))
+
+        return {
+            "model_version": self.model_name,
+            "adaptation_action": np.where(is_correct, "INCREASE_DIFFICULTY", "DECREASE_DIFFICULTY").astype(object),
+            "next_question_difficulty_beta": np.round(beta_next, 2),
+            "next_difficulty_tier": tiers(beta_next, [0.35, 0.65], ["EASY", "MEDIUM", "HARD"]),
+            "fisher_information_gain": np.round(a * a * p_success * (1.0 - p_success), 2),
+            "expected_probability_success": np.round(p_success * 100.0, 1)
+        }
@@ -1,10 +1,8 @@
-import os
-import json
-import urllib.request
-import urllib.error
 import random
 from typing import List, Dict, Any
 
+from . import llm_gateway, llm_cache
+
 # Mock Database of questions for offline/fallback mode
 MOCK_QUESTIONS_POOL = {
     "Data Structures": {
@@ -217,67 +215,18 @@ def generate_mock_questions(subject: str, topic: str, count: int, question_types
     # Ensure correct count
     return results[:count] if len(results) > count else results
 
-def call_gemini_api(api_key: str, prompt: str) -> List[Dict[str, Any]]:
-    """Calls Gemini API directly with HTTP POST and returns parsed question list."""
-    url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash:generateContent?key={api_key}"
-    headers = {"Content-Type": "application/json"}
-    
-    payload = {
-        "contents": [{"parts": [{"text": prompt}]}],
-        "generationConfig": {
-            "responseMimeType": "application/json"
-        }
-    }
-    
-    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
-    try:
-        with urllib.request.urlopen(req, timeout=15) as response:
-            res_data = json.loads(response.read().decode("utf-8"))
-            text_out = res_data["candidates"][0]["content"]["parts"][0]["text"]
-            if text_out.startswith("```json"):
-                text_out = text_out.split("```json")[1].split("```")[0].strip()
-            elif text_out.startswith("```"):
-                text_out = text_out.split("```")[1].split("```")[0].strip()
-            
-            questions = json.loads(text_out)
-            if isinstance(questions, dict) and "questions" in questions:
-                questions = questions["questions"]
-            return questions
-    except Exception as e:
-        print(f"Gemini API failure: {e}")
-        raise e
+QUESTION_CACHE_TTL_SECONDS = 7 * 24 * 3600
 
-def call_openai_api(api_key: str, prompt: str) -> List[Dict[str, Any]]:
-    """Calls OpenAI API directly with HTTP POST and returns parsed question list."""
-    url = "https://api.openai.com/v1/chat/completions"
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {api_key}"
-    }
-    
-    payload = {
-        "model": "gpt-4o-mini",
-        "response_format": {"type": "json_object"},
-        "messages": [
-            {"role": "system", "value": "You are a teacher question generator. Return JSON object containing key 'questions' with question list."},
-            {"role": "user", "content": prompt}
-        ]
-    }
-    
-    req = urllib.request.Request(url, data=json.dumps(payload).encode("utf-8"), headers=headers, method="POST")
-    try:
-        with urllib.request.urlopen(req, timeout=15) as response:
-            res_data = json.loads(response.read().decode("utf-8"))
-            text_out = res_data["choices"][0]["message"]["content"]
-            questions = json.loads(text_out)
-            if "questions" in questions:
-                questions = questions["questions"]
-            return questions
-    except Exception as e:
-        print(f"OpenAI API failure: {e}")
-        raise e
+QUESTION_GENERATOR_SYSTEM = "You are a teacher question generator. Return JSON object containing key 'questions' with question list."
 
-def generate_questions(
+async def call_llm_questions(prompt: str) -> List[Dict[str, Any]]:
+    """Asks the LLM gateway (Gemini, hedged with OpenAI) for questions and returns the parsed list."""
+    questions = await llm_gateway.gateway.complete_json(prompt, system=QUESTION_GENERATOR_SYSTEM)
+    if isinstance(questions, dict) and "questions" in questions:
+        questions = questions["questions"]
+    return questions
+
+async def generate_questions(
     subject: str,
     topic: str,
     syllabus: str,
@@ -334,19 +283,14 @@ JSON Output template:
 }}
 """
 
-    gemini_key = os.getenv("GEMINI_API_KEY")
-    openai_key = os.getenv("OPENAI_API_KEY")
-    
-    if gemini_key:
+    if llm_gateway.gateway.configured():
         try:
-            return call_gemini_api(gemini_key, prompt)
-        except Exception:
-            pass
-            
-    if openai_key:
-        try:
-            return call_openai_api(openai_key, prompt)
-        except Exception:
-            pass
-            
+            # Identical subject/topic/syllabus/type/count/difficulty inputs give an identical prompt
+            return await llm_cache.get_or_compute(
+                "questions", QUESTION_GENERATOR_SYSTEM + prompt, llm_gateway.gateway.model_signature(),
+                lambda: call_llm_questions(prompt), ttl_seconds=QUESTION_CACHE_TTL_SECONDS
+            )
+        except Exception as e:
+            print(f"LLM question generation failed, using mock pool: {e}")
+
     return generate_mock_questions(subject, topic, count, question_types, difficulty)
@@ -4,13 +4,11 @@ from typing import Dict, Any, List
 import json
 
 from .. import models
+from . import student_identity
+from .student_identity import StudentRef
 
-def generate_insights_for_student(student_id: str, db: Session) -> List[Dict[str, Any]]:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | 
-        (models.Student.email.like(f"{student_id}%")) |
-        (models.Student.student_id == student_id)
-    ).first()
+def generate_insights_for_student(student_id: StudentRef, db: Session) -> List[Dict[str, Any]]:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return []
 
@@ -80,10 +78,8 @@ def generate_insights_for_student(student_id: str, db: Session) -> List[Dict[str
 
     return insights
 
-def generate_remedial_test_config(student_id: str, concept_id: str, db: Session) -> Dict[str, Any]:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+def generate_remedial_test_config(student_id: StudentRef, concept_id: str, db: Session) -> Dict[str, Any]:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return {"error": "Student not found"}
 
@@ -19,7 +19,7 @@ def scan_and_dispatch_risk_alerts(db: Session) -> Dict[str, Any]:
     skipped_count = 0
 
     for student in students:
-        risk_data = risk_engine.calculate_student_risk(student.enrollment_no, db)
+        risk_data = risk_engine.calculate_student_risk(student, db)
         risk_status = risk_data.get("risk_status", "SAFE")
         risk_score = risk_data.get("risk_score", 0.0)
 
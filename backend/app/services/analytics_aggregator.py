@@ -4,11 +4,11 @@ from typing import Dict, Any, List
 import json
 
 from .. import models
+from . import student_identity
+from .student_identity import StudentRef
 
-def get_student_subject_metrics(student_id: str, db: Session) -> List[Dict[str, Any]]:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+def get_student_subject_metrics(student_id: StudentRef, db: Session) -> List[Dict[str, Any]]:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return []
 
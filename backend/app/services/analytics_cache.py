@@ -0,0 +1,313 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from fastapi.encoders import jsonable_encoder
+from sqlalchemy import update
+from sqlalchemy.exc import IntegrityError
+
+from .. import models
+from ..database import SessionLocal
+
+# Data each cached endpoint is derived from; write paths invalidate by tag
+TAGS = ("students", "attendance", "marks", "teachers", "settings", "risk", "concepts", "ranking")
+
+DEFAULT_TTL_SECONDS = int(os.getenv("ANALYTICS_CACHE_TTL_SECONDS", "300"))
+MEMORY_MAX_ENTRIES = int(os.getenv("ANALYTICS_CACHE_MAX_ENTRIES", "256"))
+# Shared tier for every worker process on the host; unset to run memory-only
+DISK_PATH = os.getenv("ANALYTICS_CACHE_PATH", "")
+# How long a process trusts its copy of the tag generations before re-reading cache_generations
+GENERATION_REFRESH_SECONDS = float(os.getenv("ANALYTICS_CACHE_GENERATION_REFRESH", "1.0"))
+
+# key -> {"payload" (JSON text), "expires_at" (epoch seconds), "endpoint", "compute_ms"}
+_memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+_generations: Dict[str, int] = {}
+_generations_read_at = 0.0
+_generations_lock = threading.Lock()
+
+_stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "invalidations": 0, "compute_ms_saved": 0.0}
+_endpoint_stats: Dict[str, Dict[str, Any]] = {}
+_stats_lock = threading.Lock()
+
+
+def _count(endpoint: str, name: str, amount: float = 1):
+    with _stats_lock:
+        if name in _stats:
+            _stats[name] += amount
+        per = _endpoint_stats.setdefault(endpoint, {"memory_hits": 0, "disk_hits": 0, "misses": 0, "compute_ms": 0.0})
+        if name in per:
+            per[name] += amount
+
+
+def scope_for(user: models.User) -> str:
+    """Role scope of a cache entry: teachers and students only ever see their own slice."""
+    if user.role == models.UserRole.admin:
+        return "admin"
+    role = getattr(user.role, "value", user.role)
+    return f"{role}:{user.linked_id or user.user_id}"
+
+
+# ─── Tag generations (cache_generations table) ───────────────────────────────
+
+def _read_generations() -> Dict[str, int]:
+    global _generations, _generations_read_at
+    now = time.time()
+    with _generations_lock:
+        if now - _generations_read_at < GENERATION_REFRESH_SECONDS:
+            return _generations
+    db = SessionLocal()
+    try:
+        rows = db.query(models.CacheGeneration.tag, models.CacheGeneration.generation).all()
+    finally:
+        db.close()
+    with _generations_lock:
+        _generations = {tag: generation for tag, generation in rows}
+        _generations_read_at = now
+        return _generations
+
+
+def current_generation(tag: str) -> int:
+    """This process's view of a tag's generation (at most GENERATION_REFRESH_SECONDS old)."""
+    return _read_generations().get(tag, 0)
+
+
+def bump_generations(db, tags: Iterable[str]):
+    """Increment each tag's generation in the caller's transaction; does not commit."""
+    for tag in tags:
+        bumped = db.execute(
+            update(models.CacheGeneration)
+            .where(models.CacheGeneration.tag == tag)
+            .values(generation=models.CacheGeneration.generation + 1)
+        ).rowcount
+        if not bumped:
+            try:
+                with db.begin_nested():
+                    db.add(models.CacheGeneration(tag=tag, generation=1))
+            except IntegrityError:
+                # Another process created the row first
+                db.execute(
+                    update(models.CacheGeneration)
+                    .where(models.CacheGeneration.tag == tag)
+                    .values(generation=models.CacheGeneration.generation + 1)
+                )
+
+
+def _bump(tags: Iterable[str]):
+    db = SessionLocal()
+    try:
+        bump_generations(db, tags)
+        db.commit()
+    finally:
+        db.close()
+    global _generations_read_at
+    with _generations_lock:
+        # Re-read on the next lookup so this process sees its own write immediately
+        _generations_read_at = 0.0
+
+
+def cache_key(endpoint: str, params: Dict[str, Any], scope: str, tags: Iterable[str]) -> str:
+    generations = _read_generations()
+    material = json.dumps({
+        "endpoint": endpoint,
+        "params": jsonable_encoder(params),
+        "scope": scope,
+        "generations": {tag: generations.get(tag, 0) for tag in sorted(tags)}
+    }, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# ─── Memory tier ─────────────────────────────────────────────────────────────
+
+def _memory_get(key: str) -> Optional[Dict[str, Any]]:
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return entry
+
+
+def _memory_put(key: str, endpoint: str, payload: str, expires_at: float, compute_ms: float):
+    with _memory_lock:
+        _memory[key] = {"payload": payload, "expires_at": expires_at, "endpoint": endpoint, "compute_ms": compute_ms}
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+# ─── Disk tier (standalone SQLite file shared by local workers) ──────────────
+
+_disk_ready = False
+_disk_lock = threading.Lock()
+
+
+def _disk_connect() -> Optional[sqlite3.Connection]:
+    global _disk_ready
+    if not DISK_PATH:
+        return None
+    conn = sqlite3.connect(DISK_PATH, timeout=5.0, isolation_level=None)
+    if not _disk_ready:
+        with _disk_lock:
+            if not _disk_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS analytics_cache ("
+                    "cache_key TEXT PRIMARY KEY, endpoint TEXT NOT NULL, payload TEXT NOT NULL, "
+                    "compute_ms REAL NOT NULL DEFAULT 0, expires_at REAL NOT NULL)"
+                )
+                _disk_ready = True
+    return conn
+
+
+def _disk_get(key: str) -> Optional[Dict[str, Any]]:
+    try:
+        conn = _disk_connect()
+        if conn is None:
+            return None
+        try:
+            row = conn.execute(
+                "SELECT payload, compute_ms, expires_at FROM analytics_cache WHERE cache_key = ? AND expires_at > ?",
+                (key, time.time())
+            ).fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Analytics cache disk read failed: {e}")
+        return None
+    if row is None:
+        return None
+    return {"payload": row[0], "compute_ms": row[1], "expires_at": row[2]}
+
+
+def _disk_put(key: str, endpoint: str, payload: str, expires_at: float, compute_ms: float):
+    try:
+        conn = _disk_connect()
+        if conn is None:
+            return
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO analytics_cache (cache_key, endpoint, payload, compute_ms, expires_at) VALUES (?, ?, ?, ?, ?)",
+                (key, endpoint, payload, compute_ms, expires_at)
+            )
+            # Entries for superseded generations are never read again; let them age out
+            conn.execute("DELETE FROM analytics_cache WHERE expires_at <= ?", (time.time(),))
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        # Best effort; the memory tier still serves this entry
+        print(f"Analytics cache disk write failed: {e}")
+
+
+def _disk_clear() -> int:
+    try:
+        conn = _disk_connect()
+        if conn is None:
+            return 0
+        try:
+            return conn.execute("DELETE FROM analytics_cache").rowcount
+        finally:
+            conn.close()
+    except sqlite3.Error as e:
+        print(f"Analytics cache disk purge failed: {e}")
+        return 0
+
+
+# ─── Public API ──────────────────────────────────────────────────────────────
+
+def cached(
+    endpoint: str,
+    params: Dict[str, Any],
+    scope: str,
+    tags: Iterable[str],
+    compute: Callable[[], Any],
+    ttl_seconds: int = DEFAULT_TTL_SECONDS
+) -> Any:
+    """
+    Return the response for (endpoint, params, scope) as of the current generation of each tag,
+    calling compute() on a miss. Exceptions (e.g. a 403) propagate and are never cached.
+    """
+    key = cache_key(endpoint, params, scope, tags)
+
+    entry = _memory_get(key)
+    if entry is not None:
+        _count(endpoint, "memory_hits")
+        _count(endpoint, "compute_ms_saved", entry["compute_ms"])
+        return json.loads(entry["payload"])
+
+    entry = _disk_get(key)
+    if entry is not None:
+        _count(endpoint, "disk_hits")
+        _count(endpoint, "compute_ms_saved", entry["compute_ms"])
+        _memory_put(key, endpoint, entry["payload"], entry["expires_at"], entry["compute_ms"])
+        return json.loads(entry["payload"])
+
+    _count(endpoint, "misses")
+    started = time.perf_counter()
+    value = jsonable_encoder(compute())
+    compute_ms = round((time.perf_counter() - started) * 1000.0, 1)
+    _count(endpoint, "compute_ms", compute_ms)
+    payload = json.dumps(value)
+    expires_at = time.time() + ttl_seconds
+    _memory_put(key, endpoint, payload, expires_at, compute_ms)
+    _disk_put(key, endpoint, payload, expires_at, compute_ms)
+    _count(endpoint, "stores")
+    return value
+
+
+def invalidate(*tags: str):
+    """
+    Called by write paths after they commit. Bumping a tag's generation changes the key of every
+    entry derived from it, in this process at once and in other workers within a second.
+    """
+    tags = tags or TAGS
+    try:
+        _bump(tags)
+    except Exception as e:
+        # Stale analytics are bounded by the TTL; never fail the write that triggered this
+        print(f"Analytics cache invalidation failed for {', '.join(tags)}: {e}")
+        return
+    with _stats_lock:
+        _stats["invalidations"] += 1
+
+
+def purge() -> Dict[str, int]:
+    """Drop both tiers here and invalidate every tag so other workers drop theirs too."""
+    with _memory_lock:
+        memory_evicted = len(_memory)
+        _memory.clear()
+    disk_deleted = _disk_clear()
+    invalidate()
+    return {"memory_evicted": memory_evicted, "disk_deleted": disk_deleted}
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        snapshot = dict(_stats)
+        endpoints = {name: dict(per) for name, per in _endpoint_stats.items()}
+    lookups = snapshot["memory_hits"] + snapshot["disk_hits"] + snapshot["misses"]
+    snapshot["compute_ms_saved"] = round(snapshot["compute_ms_saved"], 1)
+    snapshot["lookups"] = lookups
+    snapshot["hit_ratio"] = round((lookups - snapshot["misses"]) / lookups, 3) if lookups else 0.0
+    snapshot["memory_hit_ratio"] = round(snapshot["memory_hits"] / lookups, 3) if lookups else 0.0
+    snapshot["disk_hit_ratio"] = round(snapshot["disk_hits"] / lookups, 3) if lookups else 0.0
+    for per in endpoints.values():
+        total = per["memory_hits"] + per["disk_hits"] + per["misses"]
+        per["hit_ratio"] = round((total - per["misses"]) / total, 3) if total else 0.0
+        per["avg_compute_ms"] = round(per.pop("compute_ms") / per["misses"], 1) if per["misses"] else 0.0
+    snapshot["endpoints"] = endpoints
+    with _memory_lock:
+        snapshot["memory_entries"] = len(_memory)
+    snapshot["memory_capacity"] = MEMORY_MAX_ENTRIES
+    snapshot["disk_enabled"] = bool(DISK_PATH)
+    snapshot["generations"] = dict(_read_generations())
+    return snapshot
@@ -0,0 +1,625 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import date
+from typing import Dict, Any, List, Optional, Iterator, Tuple
+import os
+import random
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from .. import models
+from . import prs_ranking, feature_store, chat_context, user_provisioning, analytics_cache, risk_snapshot_service
+
+CHUNK_ROWS = int(os.getenv("INGEST_CHUNK_ROWS", "2000"))
+WRITE_BATCH_SIZE = 1000
+IN_CHUNK_SIZE = 500
+SPOOL_BLOCK_BYTES = 1024 * 1024
+DEFAULT_STUDENT_PASSWORD = "password123"
+# Attendance sheets carry day-of-month columns only
+ATTENDANCE_YEAR, ATTENDANCE_MONTH = 2025, 1
+PRESENT_MARKS = ["P", "PRESENT"]
+ABSENT_MARKS = ["A", "ABSENT", "L"]
+
+# Applied in this order; each sector takes the first uploaded file whose lowercased name matches
+SECTORS = [
+    ("info", lambda k: "student" in k and "assess" not in k and "attend" not in k and "score" not in k),
+    ("assessment", lambda k: "assessment" in k),
+    ("attendance", lambda k: "attend" in k),
+    ("pre", lambda k: "pre observation" in k),
+    ("post", lambda k: "post observation" in k),
+    ("rag", lambda k: "rag analysis" in k),
+    ("schedule", lambda k: "schedule" in k),
+    ("agenda", lambda k: "agenda" in k),
+]
+
+INFO_FIELDS = [
+    ("Email Address", "email"), ("Email", "email"),
+    ("Branch", "branch"), ("Batch", "batch_id"),
+    ("Aadhar/Pancard Number", "identity_proof"), ("Identity Proof", "identity_proof")
+]
+# field -> header fragment; numeric fields are coerced, the rest stored as given
+GROWTH_FIELDS = {
+    "communication": "communication", "engagement": "engagement",
+    "subject_knowledge": "subject knowledge", "confidence": "confidence",
+    "fluency": "fluency", "score": "score", "remarks": "remarks",
+    "status": "status", "batch_id": "batch"
+}
+GROWTH_TEXT_FIELDS = {"remarks", "status", "batch_id"}
+ASSESSMENT_BLOCKS = [
+    ("", 1, False), (".1", 2, False), (".2", 3, True)   # (column suffix, assessment number, optional)
+]
+
+
+# ─── Chunked readers ─────────────────────────────────────────────────────────
+
+def _column_names(header) -> List[Any]:
+    """Header cells -> the column labels pandas would give (blank -> 'Unnamed: i', duplicates -> 'Name.1')."""
+    names, seen = [], {}
+    for i, value in enumerate(header):
+        if isinstance(value, float) and value.is_integer():
+            value = int(value)
+        if value is None or (isinstance(value, str) and not value.strip()):
+            value = f"Unnamed: {i}"
+        key = str(value)
+        if key in seen:
+            seen[key] += 1
+            value = f"{key}.{seen[key]}"
+        else:
+            seen[key] = 0
+        names.append(value)
+    return names
+
+
+def _csv_encoding(path: str) -> str:
+    # Decode once up front (streamed) so a bad byte deep in the file does not fail a later chunk
+    try:
+        with open(path, encoding="utf-8") as f:
+            while f.read(SPOOL_BLOCK_BYTES):
+                pass
+        return "utf-8"
+    except UnicodeDecodeError:
+        return "latin1"
+
+
+def _iter_xlsx(path: str, header: int, chunk_rows: int) -> Iterator[pd.DataFrame]:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        for _ in range(header):
+            if next(rows, None) is None:
+                return
+        columns = _column_names(next(rows, ()) or ())
+        width = len(columns)
+        buffer, index, position, yielded = [], [], 0, False
+        for row in rows:
+            position += 1
+            if not any(cell is not None for cell in row):
+                continue
+            row = tuple(row[:width]) + (None,) * (width - len(row))
+            buffer.append(row)
+            index.append(position - 1)
+            if len(buffer) >= chunk_rows:
+                yield pd.DataFrame(buffer, columns=columns, index=index)
+                buffer, index, yielded = [], [], True
+        if buffer or not yielded:
+            # Always yield at least once so an empty sheet still reports its columns
+            yield pd.DataFrame(buffer, columns=columns, index=index or None)
+    finally:
+        workbook.close()
+
+
+def iter_frames(path: str, filename: str, header: int = 0, chunk_rows: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """Yield the file as DataFrames of at most chunk_rows rows; the index is the row position in the file."""
+    if filename.lower().endswith(".csv"):
+        yield from pd.read_csv(path, header=header, chunksize=chunk_rows, encoding=_csv_encoding(path))
+    else:
+        yield from _iter_xlsx(path, header, chunk_rows)
+
+
+def read_columns(path: str, filename: str, header: int = 0) -> List[Any]:
+    if filename.lower().endswith(".csv"):
+        return list(pd.read_csv(path, header=header, nrows=0, encoding=_csv_encoding(path)).columns)
+    return list(next(iter_frames(path, filename, header, chunk_rows=1)).columns)
+
+
+def _template_header(path: str, filename: str, min_columns: int, template_header: int) -> int:
+    # The Excel templates carry title rows above the real header; detect them by a first row with too few
+    # named cells (sheets are padded to their full width, so blank cells do not count)
+    if filename.lower().endswith(".csv"):
+        return 0
+    named = [c for c in read_columns(path, filename) if not str(c).startswith("Unnamed: ")]
+    return template_header if len(named) < min_columns else 0
+
+
+def _name_keys(names: pd.Series) -> pd.Series:
+    return names.astype(str).str.strip().str.lower()
+
+
+def _first_column(columns, fragment: str, lower: bool = False) -> Optional[Any]:
+    return next((c for c in columns if fragment in (str(c).lower() if lower else str(c))), None)
+
+
+async def spool_upload(upload) -> str:
+    """Copy an UploadFile to a temp file in fixed-size blocks; the caller owns (and removes) the path."""
+    suffix = os.path.splitext(upload.filename or "")[1]
+    fd, path = tempfile.mkstemp(prefix="ingest-", suffix=suffix)
+    with os.fdopen(fd, "wb") as out:
+        while True:
+            block = await upload.read(SPOOL_BLOCK_BYTES)
+            if not block:
+                break
+            out.write(block)
+    return path
+
+
+# ─── Student resolution and writes ───────────────────────────────────────────
+
+class IngestRun:
+    """
+    State for one bulk upload. Only per-student records are kept in memory (name key ->
+    {"student_id", "name", "exists", "fields"}); rows are resolved against the database a
+    chunk at a time and child rows are written as each chunk is processed.
+    """
+
+    def __init__(self, db: Session, progress=None):
+        self.db = db
+        self.progress = progress
+        self.students: Dict[str, Dict[str, Any]] = {}
+        self.base_count = db.query(func.count(models.Student.enrollment_no)).scalar() or 0
+        # New students join "Batch 2" when a cohort already exists
+        self.default_batch = "Batch 2" if self.base_count else "Batch 1"
+        self.new_count = 0
+        self.rows: Dict[str, int] = {}
+        self.chunks = 0
+        self.cleaned: Dict[str, set] = {"assessment": set(), "attendance": set()}
+        self.upload_logs: List[Dict[str, Any]] = []
+
+    def resolve(self, names: pd.Series, ids: Optional[pd.Series] = None) -> List[Dict[str, Any]]:
+        """Map each row to its student record, probing the database once per chunk for unseen names/ids."""
+        keys = _name_keys(names).tolist()
+        raw_names = names.tolist()
+        raw_ids = ids.tolist() if ids is not None else [None] * len(keys)
+
+        unseen = {}
+        for key, name, sid in zip(keys, raw_names, raw_ids):
+            if key not in self.students and key not in unseen:
+                unseen[key] = (name, sid)
+        if unseen:
+            by_name = {}
+            probe_keys = list(unseen)
+            known_ids = self._existing(models.Student.enrollment_no, [sid for _, sid in unseen.values() if sid])
+            name_key = func.lower(func.trim(models.Student.name))
+            for start in range(0, len(probe_keys), IN_CHUNK_SIZE):
+                by_name.update({key: sid for sid, key in self.db.query(models.Student.enrollment_no, name_key).filter(
+                    name_key.in_(probe_keys[start:start + IN_CHUNK_SIZE])
+                ).all()})
+
+            created = []
+            for key, (name, sid) in unseen.items():
+                existing = sid if sid in known_ids else by_name.get(key)
+                if existing:
+                    self.students[key] = {"student_id": existing, "name": name, "exists": True, "fields": {}}
+                else:
+                    self.new_count += 1
+                    record = {
+                        "student_id": sid or f"S{self.base_count + self.new_count}",
+                        "name": name, "exists": False, "fields": {}
+                    }
+                    self.students[key] = record
+                    created.append(record)
+            self._insert_placeholders(created)
+        return [self.students[key] for key in keys]
+
+    def _existing(self, column, values: List[Any]) -> set:
+        """Which of values are already present in column (one IN probe per 500 values)."""
+        found = set()
+        values = list(dict.fromkeys(values))
+        for start in range(0, len(values), IN_CHUNK_SIZE):
+            found.update(v for (v,) in self.db.query(column).filter(column.in_(values[start:start + IN_CHUNK_SIZE])).all())
+        return found
+
+    def _insert_placeholders(self, records: List[Dict[str, Any]]):
+        # New students are inserted as soon as they are seen so assessment/attendance rows can reference them;
+        # their uploaded fields are applied in finish()
+        if not records:
+            return
+        self.db.bulk_insert_mappings(models.Student, [{
+            "enrollment_no": r["student_id"],
+            "name": str(r["name"]).strip(),
+            "email": f"{str(r['student_id']).lower()}@sage.com",
+            "program": "B.Tech", "branch": "CSE", "semester": 1, "section": "A",
+            "batch_id": self.default_batch, "rag_status": "Green",
+            "attendance": 0, "dsa_score": 0, "ml_score": 0, "qa_score": 0, "mock_interview_score": 0,
+            "projects_score": random.randint(70, 90)
+        } for r in records])
+
+    def chunk_done(self, sector: str, rows: int):
+        self.db.commit()
+        self.chunks += 1
+        self.rows[sector] = self.rows.get(sector, 0) + rows
+        if self.progress:
+            self.progress(stage=sector, chunks=self.chunks, rows=dict(self.rows))
+
+    def log_upload(self, dataset_type: str, table_name: str, row_count: int):
+        self.upload_logs.append({
+            "id": models.generate_uuid(), "dataset_type": dataset_type, "table_name": table_name, "row_count": int(row_count)
+        })
+
+    def _delete_children_once(self, sector: str, model, column, student_ids: List[str], extra_filter=None):
+        fresh = [sid for sid in dict.fromkeys(student_ids) if sid not in self.cleaned[sector]]
+        for start in range(0, len(fresh), IN_CHUNK_SIZE):
+            query = self.db.query(model).filter(column.in_(fresh[start:start + IN_CHUNK_SIZE]))
+            if extra_filter is not None:
+                query = query.filter(extra_filter)
+            query.delete(synchronize_session=False)
+        self.cleaned[sector].update(fresh)
+
+    def finish(self) -> Dict[str, int]:
+        """Write accumulated student fields and login accounts in bounded batches."""
+        updates, accounts = [], []
+        new_emails = [r["fields"]["email"] for r in self.students.values() if not r["exists"] and r["fields"].get("email")]
+        # Student.email is unique: keep the placeholder address when the uploaded one is already in use
+        claimed = self._existing(models.Student.email, new_emails)
+        for record in self.students.values():
+            fields = dict(record["fields"])
+            for prefix in ("pre", "post"):
+                fallback = fields.pop(f"{prefix}_batch_id", None)
+                if fallback is not None and "batch_id" not in fields:
+                    fields["batch_id"] = fallback
+            email = fields.pop("email", None)
+            if not record["exists"] and email:
+                accounts.append((email, record["student_id"]))
+                if email not in claimed:
+                    fields["email"] = email
+                    claimed.add(email)
+            if fields:
+                updates.append({"enrollment_no": record["student_id"], **fields})
+
+        for start in range(0, len(updates), WRITE_BATCH_SIZE):
+            self.db.bulk_update_mappings(models.Student, updates[start:start + WRITE_BATCH_SIZE])
+            self.db.commit()
+
+        users_created = 0
+        if accounts:
+            users_created = user_provisioning.provision_users(self.db, [{
+                "email": email, "password": DEFAULT_STUDENT_PASSWORD,
+                "role": models.UserRole.student, "linked_id": sid, "approved": True
+            } for email, sid in dict(accounts).items()], commit_batches=True)["users_created"]
+
+        if self.upload_logs:
+            self.db.bulk_insert_mappings(models.DatasetUpload, self.upload_logs)
+            self.db.commit()
+        return {
+            "students_created": self.new_count,
+            "students_updated": sum(1 for r in self.students.values() if r["exists"] and r["fields"]),
+            "users_created": users_created
+        }
+
+
+# ─── Sector processors ───────────────────────────────────────────────────────
+
+def ingest_student_info(run: IngestRun, path: str, filename: str):
+    total = 0
+    for frame in iter_frames(path, filename):
+        if "Name" not in frame.columns:
+            break
+        frame = frame[frame["Name"].notna()]
+        if frame.empty:
+            continue
+        roll = frame.get("College Roll no/ University Roll no.")
+        if roll is None:
+            roll = frame.get("S.No.")
+        ids = roll.astype(str) if roll is not None else pd.Series("", index=frame.index)
+        ids = ids.where(ids.notna() & (ids != "nan") & (ids != ""), "")
+        ids = pd.Series([
+            sid or f"TMP_{key}_{random.randint(1000, 9999)}" for sid, key in zip(ids.tolist(), _name_keys(frame["Name"]).tolist())
+        ], index=frame.index)
+        records = run.resolve(frame["Name"], ids)
+
+        for column, field in INFO_FIELDS:
+            if column in frame.columns:
+                values = frame[column]
+                for record, value, present in zip(records, values.astype(str).tolist(), values.notna().tolist()):
+                    if present:
+                        record["fields"][field] = value
+        for column, field in (("Start Date", "start_date"), ("End Date", "end_date")):
+            if column in frame.columns:
+                parsed = pd.to_datetime(frame[column], errors="coerce")
+                for record, value in zip(records, parsed.tolist()):
+                    if not pd.isna(value):
+                        record["fields"][field] = value.date()
+        total += len(frame)
+        run.chunk_done("info", len(frame))
+    run.log_upload("Student Batch Info", "students", total)
+
+
+def ingest_assessments(run: IngestRun, path: str, filename: str):
+    today = date.today()
+    total = 0
+    aggregates: Dict[str, Dict[str, Any]] = {}
+    for frame in iter_frames(path, filename):
+        rows = []
+        for suffix, number, optional in ASSESSMENT_BLOCKS:
+            name_col = f"Name{suffix}"
+            if name_col not in frame.columns:
+                if optional:
+                    continue
+                break
+            block = frame[frame[name_col].notna()]
+            if block.empty:
+                continue
+            scores = {}
+            for key, column in (("technical", "Technical"), ("verbal", "Verbal"),
+                                ("math", "Maths/Numerical"), ("logic", "Logical Leasoning")):
+                values = block.get(f"{column}{suffix}")
+                scores[key] = (pd.to_numeric(values, errors="coerce").fillna(0).astype(np.int64) if values is not None
+                               else pd.Series(0, index=block.index, dtype=np.int64))
+            totals = scores["technical"] + scores["verbal"] + scores["math"] + scores["logic"]
+            percentages = (totals / 400.0 * 100).round(1)
+            records = run.resolve(block[name_col])
+            for record, t, v, m, l, tot, pct in zip(
+                records, scores["technical"].tolist(), scores["verbal"].tolist(), scores["math"].tolist(),
+                scores["logic"].tolist(), totals.tolist(), percentages.tolist()
+            ):
+                rows.append({
+                    "id": models.generate_uuid(), "student_id": record["student_id"],
+                    "assessment_name": f"Assessment {number}",
+                    "technical_score": float(t), "verbal_score": float(v), "math_score": float(m), "logic_score": float(l),
+                    "total_score": float(tot), "percentage": pct, "date": today
+                })
+                agg = aggregates.setdefault(record["student_id"], {"record": record, "n": 0, "dsa": 0, "ml": 0, "qa": 0, "mock": 0})
+                agg["n"] += 1
+                agg["dsa"] += t
+                agg["ml"] += m
+                agg["qa"] += l
+                agg["mock"] += v
+
+        run._delete_children_once("assessment", models.Assessment, models.Assessment.student_id, [r["student_id"] for r in rows])
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            run.db.bulk_insert_mappings(models.Assessment, rows[start:start + WRITE_BATCH_SIZE])
+        total += len(rows)
+        run.chunk_done("assessment", len(rows))
+
+    for agg in aggregates.values():
+        fields = agg["record"]["fields"]
+        for key, column in (("dsa", "dsa_score"), ("ml", "ml_score"), ("qa", "qa_score"), ("mock", "mock_interview_score")):
+            fields[column] = int(agg[key] / agg["n"])
+    run.log_upload("Assessment", "assessments", total)
+
+
+def _attendance_dates(columns) -> Dict[Any, date]:
+    dates = {}
+    for column in columns:
+        try:
+            day = int(float(column))
+        except (TypeError, ValueError):
+            continue
+        if 1 <= day <= 31:
+            dates[column] = date(ATTENDANCE_YEAR, ATTENDANCE_MONTH, day)
+    return dates
+
+
+def ingest_attendance(run: IngestRun, path: str, filename: str):
+    header = _template_header(path, filename, min_columns=5, template_header=3)
+    total = 0
+    for frame in iter_frames(path, filename, header=header):
+        name_col = _first_column(frame.columns, "Name")
+        if name_col is None:
+            return
+        columns = list(frame.columns)
+        day_columns = _attendance_dates(columns[columns.index(name_col) + 1:])
+        frame = frame[frame[name_col].notna()]
+        if frame.empty:
+            continue
+
+        records = run.resolve(frame[name_col])
+        student_ids = [r["student_id"] for r in records]
+        rows = []
+        if day_columns:
+            marks = frame[list(day_columns)].astype(str).apply(lambda col: col.str.upper().str.strip())
+            present = marks.isin(PRESENT_MARKS).to_numpy()
+            marked = present | marks.isin(ABSENT_MARKS).to_numpy()
+
+            present_days = present.sum(axis=1)
+            marked_days = marked.sum(axis=1)
+            for record, p, m in zip(records, present_days.tolist(), marked_days.tolist()):
+                if m > 0:
+                    record["fields"]["attendance"] = int((p / m) * 100)
+
+            day_list = list(day_columns.values())
+            for r, c in zip(*np.nonzero(marked)):
+                rows.append({
+                    "id": models.generate_uuid(), "enrollment_no": student_ids[r], "date": day_list[c],
+                    "status": models.AttendanceStatus.present if present[r, c] else models.AttendanceStatus.absent
+                })
+            run._delete_children_once(
+                "attendance", models.AttendanceLog, models.AttendanceLog.enrollment_no, student_ids,
+                extra_filter=models.AttendanceLog.date.in_(sorted(set(day_list)))
+            )
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            run.db.bulk_insert_mappings(models.AttendanceLog, rows[start:start + WRITE_BATCH_SIZE])
+        total += len(rows)
+        run.chunk_done("attendance", len(rows))
+    run.log_upload("Attendance Sheet", "attendance_logs", total)
+
+
+def ingest_growth(run: IngestRun, path: str, filename: str, prefix: str):
+    header = 0 if filename.lower().endswith(".csv") else 1
+    total = 0
+    for frame in iter_frames(path, filename, header=header):
+        frame.columns = [str(c).strip() for c in frame.columns]
+        name_col = _first_column(frame.columns, "name", lower=True)
+        if name_col is None:
+            break
+        frame = frame[frame[name_col].notna()]
+        if frame.empty:
+            continue
+        records = run.resolve(frame[name_col])
+        for field, fragment in GROWTH_FIELDS.items():
+            column = _first_column(frame.columns, fragment, lower=True)
+            if column is None:
+                continue
+            values = frame[column] if field in GROWTH_TEXT_FIELDS else pd.to_numeric(frame[column], errors="coerce")
+            key = f"{prefix}_{field}"
+            for record, value in zip(records, values.tolist()):
+                if not pd.isna(value):
+                    record["fields"][key] = value if field in GROWTH_TEXT_FIELDS else float(value)
+        total += len(frame)
+        run.chunk_done(prefix, len(frame))
+    run.log_upload("Pre-Observation" if prefix == "pre" else "Post-Observation", "students", total)
+
+
+def ingest_rag(run: IngestRun, path: str, filename: str):
+    total = 0
+    for frame in iter_frames(path, filename):
+        rag_col = _first_column(frame.columns, "RAG") or "RAG Status"
+        name_col = _first_column(frame.columns, "Name") or "Name"
+        total += len(frame)
+        if name_col not in frame.columns:
+            continue
+        named = frame[frame[name_col].notna()]
+        if not named.empty:
+            statuses = named[rag_col].astype(str).str.strip() if rag_col in named.columns else pd.Series("None", index=named.index)
+            for record, status in zip(run.resolve(named[name_col]), statuses.tolist()):
+                record["fields"]["rag_status"] = status
+        run.chunk_done("rag", len(frame))
+    run.log_upload("RAG Analysis", "students", total)
+
+
+def ingest_schedule(run: IngestRun, path: str, filename: str):
+    run.db.query(models.Lecture).delete()
+    total = 0
+    for frame in iter_frames(path, filename):
+        total += len(frame)
+        if "Date" not in frame.columns:
+            continue
+        dates = pd.to_datetime(frame["Date"], errors="coerce")
+        slots = [c for c in frame.columns if all(x not in str(c) for x in ["Date", "Day", "Unnamed"])]
+        rows = []
+        for slot in slots:
+            topics = frame[slot]
+            keep = topics.notna() & (topics.astype(str).str.lower() != "nan") & dates.notna()
+            start_time = str(slot).split("-")[0].strip()
+            end_time = str(slot).split("-")[1].strip() if "-" in str(slot) else ""
+            for topic, when in zip(topics[keep].astype(str).tolist(), dates[keep].tolist()):
+                rows.append({
+                    "id": models.generate_uuid(), "teacher_id": "T01", "batch": "Batch 1", "subject": "General",
+                    "topic": topic, "room": "Online", "start_time": start_time, "end_time": end_time, "date": when.date()
+                })
+        for start in range(0, len(rows), WRITE_BATCH_SIZE):
+            run.db.bulk_insert_mappings(models.Lecture, rows[start:start + WRITE_BATCH_SIZE])
+        run.chunk_done("schedule", len(frame))
+    run.log_upload("Schedule", "lectures", total)
+
+
+def ingest_agenda(run: IngestRun, path: str, filename: str):
+    header = _template_header(path, filename, min_columns=3, template_header=1)
+    run.db.query(models.Unit).delete()
+    total = 0
+    for frame in iter_frames(path, filename, header=header):
+        total += len(frame)
+        if "Topic" not in frame.columns:
+            continue
+        frame = frame[frame["Topic"].notna()]
+        position = pd.Series(frame.index.to_numpy() + 1, index=frame.index)
+        serial = pd.to_numeric(frame["S.No."], errors="coerce") if "S.No." in frame.columns else position
+        unit_numbers = serial.fillna(position).astype(np.int64)
+        rows = [{
+            "id": models.generate_uuid(), "teacher_id": "T01", "unit_number": number, "title": str(topic),
+            "status": models.UnitStatus.pending, "progress": 0
+        } for number, topic in zip(unit_numbers.tolist(), frame["Topic"].tolist())]
+        if rows:
+            run.db.bulk_insert_mappings(models.Unit, rows)
+        run.chunk_done("agenda", len(frame))
+    run.log_upload("Agenda", "units", total)
+
+
+def ensure_system_accounts(db: Session):
+    from ..auth import get_password_hash
+
+    if not db.query(models.User).filter(models.User.role == models.UserRole.admin).first():
+        db.add(models.User(email="admin@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.admin, approved=True))
+    if not db.query(models.Teacher).filter(models.Teacher.teacher_id == "T01").first():
+        db.add(models.Teacher(teacher_id="T01", name="Prof. Teacher", email="teacher@sage.com", department="CSE", subject="CS", avg_improvement=15.0, feedback_score=4.5, content_quality_score=4.2, placement_conversion=20.0))
+        if not db.query(models.User).filter(models.User.email == "teacher@sage.com").first():
+            db.add(models.User(email="teacher@sage.com", password_hash=get_password_hash("password"), role=models.UserRole.teacher, linked_id="T01", approved=True))
+    db.commit()
+
+
+def detect_sectors(filenames: List[str]) -> List[Tuple[str, str]]:
+    """(sector, filename) pairs in processing order, for the files that were uploaded."""
+    found = []
+    for sector, matches in SECTORS:
+        name = next((k for k in filenames if matches(k)), None)
+        if name:
+            found.append((sector, name))
+    return found
+
+
+def ingest_files(db: Session, files: Dict[str, str], progress=None) -> Dict[str, Any]:
+    """
+    Apply uploaded files (lowercased filename -> path on disk) sector by sector. Each chunk is
+    committed on its own, so a failure leaves earlier chunks applied and is reported by the job.
+    """
+    started = time.perf_counter()
+    ensure_system_accounts(db)
+    run = IngestRun(db, progress=progress)
+    sectors = detect_sectors(list(files))
+    for sector, name in sectors:
+        if progress:
+            progress(stage=sector, current_file=name)
+        if sector == "info":
+            ingest_student_info(run, files[name], name)
+        elif sector == "assessment":
+            ingest_assessments(run, files[name], name)
+        elif sector == "attendance":
+            ingest_attendance(run, files[name], name)
+        elif sector in ("pre", "post"):
+            ingest_growth(run, files[name], name, sector)
+        elif sector == "rag":
+            ingest_rag(run, files[name], name)
+        elif sector == "schedule":
+            ingest_schedule(run, files[name], name)
+        elif sector == "agenda":
+            ingest_agenda(run, files[name], name)
+
+    if progress:
+        progress(stage="students", current_file=None)
+    result = run.finish()
+    prs_ranking.invalidate(db)
+    feature_store.invalidate(db, families=["academic", "attendance"])
+    risk_snapshot_service.mark_all_stale(db)
+    db.commit()
+    chat_context.mark_dirty()
+    # Any sector may have changed; drop every cached analytics view
+    analytics_cache.invalidate()
+    result.update({
+        "sectors_modified": list(files),
+        "rows": run.rows,
+        "chunks": run.chunks,
+        "duration_ms": round((time.perf_counter() - started) * 1000.0, 1)
+    })
+    return result
+
+
+# ─── Jobs ────────────────────────────────────────────────────────────────────
+
+def bulk_upload_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """
+    job_queue handler for "ingest.bulk_upload". The payload carries the spooled file paths, so the
+    worker must share the web server's filesystem; the files are removed whatever the outcome.
+    """
+    files = payload["files"]
+    try:
+        return ingest_files(db, files, progress=lambda **fields: ctx.progress(**fields))
+    finally:
+        for path in files.values():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
@@ -0,0 +1,299 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import Dict, Any, List, Optional, Iterable, Tuple
+import math
+import os
+import re
+import threading
+import time
+
+from .. import models
+from . import analytics_cache
+
+TOP_K = int(os.getenv("CHAT_CONTEXT_TOP_K", "8"))
+TOKEN_BUDGET = int(os.getenv("CHAT_CONTEXT_TOKEN_BUDGET", "1200"))
+# Writes made by other workers are seen through the "students"/"teachers" cache generations,
+# checked this often; a generation move triggers a full diff
+MAX_AGE_SECONDS = int(os.getenv("CHAT_CONTEXT_MAX_AGE_SECONDS", "60"))
+# Last-resort full diff for write paths that neither call mark_dirty() nor bump a generation
+FULL_RESYNC_SECONDS = int(os.getenv("CHAT_CONTEXT_FULL_RESYNC_SECONDS", "3600"))
+WATERMARK_TAGS = ("students", "teachers")
+CHUNK_SIZE = 500
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+SCORE_FIELDS = ("attendance", "dsa_score", "ml_score", "qa_score", "projects_score", "mock_interview_score")
+STUDENT_COLUMNS = (
+    models.Student.enrollment_no, models.Student.name, models.Student.batch_id, models.Student.branch,
+    models.Student.rag_status, models.Student.attendance, models.Student.dsa_score, models.Student.ml_score,
+    models.Student.qa_score, models.Student.projects_score, models.Student.mock_interview_score,
+    models.Student.pre_score, models.Student.post_score
+)
+TEACHER_COLUMNS = (
+    models.Teacher.faculty_id, models.Teacher.name, models.Teacher.department, models.Teacher.subject,
+    models.Teacher.avg_improvement, models.Teacher.feedback_score, models.Teacher.placement_conversion
+)
+RAG_TERMS = {
+    "Red": "red high risk at-risk struggling",
+    "Amber": "amber medium risk borderline",
+    "Yellow": "yellow amber medium risk borderline",
+    "Green": "green on track"
+}
+
+
+def tokenize(text: str) -> List[str]:
+    # Light plural folding so "students"/"teachers" match "student"/"teacher"
+    return [t[:-1] if len(t) > 3 and t.endswith("s") and not t.endswith("ss") else t
+            for t in re.findall(r"[a-z0-9]+", text.lower())]
+
+
+def estimate_tokens(text: str) -> int:
+    # ~4 characters per token for English/JSON-ish text; good enough for budgeting
+    return max(1, len(text) // 4)
+
+
+def _student_doc(row) -> Tuple[str, str, Dict[str, Any]]:
+    (sid, name, batch, branch, rag, attendance, dsa, ml, qa, projects, mock, pre, post) = row
+    values = {
+        "id": sid, "name": name, "batch": batch, "rag": rag, "attendance": attendance or 0,
+        "dsa_score": dsa or 0, "ml_score": ml or 0, "qa_score": qa or 0,
+        "projects_score": projects or 0, "mock_interview_score": mock or 0, "pre": pre, "post": post
+    }
+    line = (
+        f"Student {name} ({sid}) | batch {batch} | RAG {rag} | attendance {values['attendance']}% | "
+        f"DSA {values['dsa_score']}, ML {values['ml_score']}, QA {values['qa_score']}, "
+        f"Projects {values['projects_score']}, Mock {values['mock_interview_score']} | pre {pre} -> post {post}"
+    )
+    # Searchable text adds descriptive words so queries like "low attendance" or "weak dsa" match
+    tags = [RAG_TERMS.get(rag or "", ""), branch or "", "student"]
+    if values["attendance"] < 75:
+        tags.append("low attendance absent")
+    for label, field in (("dsa", "dsa_score"), ("ml machine learning", "ml_score"), ("qa aptitude", "qa_score"),
+                         ("mock interview", "mock_interview_score")):
+        if values[field] < 60:
+            tags.append(f"weak low {label}")
+        elif values[field] >= 85:
+            tags.append(f"strong top {label}")
+    return line, f"{line} {' '.join(tags)}", values
+
+
+def _teacher_doc(row) -> Tuple[str, str, Dict[str, Any]]:
+    (fid, name, department, subject, improvement, feedback, conversion) = row
+    line = (
+        f"Faculty {name} ({fid}) | {department} | subject {subject} | feedback {feedback}/5 | "
+        f"avg improvement {improvement} | placement conversion {conversion}%"
+    )
+    return line, f"{line} teacher faculty trainer instructor", {"id": fid}
+
+
+class ContextIndex:
+    """
+    In-process retrieval index for the AI assistant: one BM25 document per student and
+    teacher plus cohort aggregates, both updated per changed record rather than rebuilt.
+    Rows are read and documents tokenized outside _lock; only the swap into the live
+    structures holds it, so searches are never blocked behind a database scan.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # One sync at a time; searches only ever wait for _lock
+        self._sync_lock = threading.Lock()
+        self.docs: Dict[str, Dict[str, Any]] = {}       # doc key -> {"line", "tokens", "length", "values", "fingerprint"}
+        self.postings: Dict[str, Dict[str, int]] = {}   # term -> {doc key: term frequency}
+        self.total_length = 0
+        self.sums = {field: 0.0 for field in SCORE_FIELDS}
+        self.rag_counts: Dict[str, int] = {}
+        self.student_count = 0
+        self.synced_at = 0.0
+        self.checked_at = 0.0
+        self.watermark: Optional[Tuple[int, ...]] = None
+        self.dirty_all = True
+        self.dirty_ids: set = set()
+
+    # ─── Maintenance ─────────────────────────────────────────────────────────
+
+    def mark_dirty(self, student_ids: Optional[Iterable[str]] = None):
+        with self._lock:
+            if student_ids is None:
+                self.dirty_all = True
+            else:
+                self.dirty_ids.update(student_ids)
+
+    def _remove(self, key: str):
+        doc = self.docs.pop(key, None)
+        if doc is None:
+            return
+        for term in set(doc["tokens"]):
+            bucket = self.postings.get(term)
+            if bucket is not None:
+                bucket.pop(key, None)
+                if not bucket:
+                    del self.postings[term]
+        self.total_length -= doc["length"]
+        if key.startswith("S:"):
+            values = doc["values"]
+            for field in SCORE_FIELDS:
+                self.sums[field] -= values[field]
+            self.rag_counts[values["rag"]] = self.rag_counts.get(values["rag"], 0) - 1
+            self.student_count -= 1
+
+    def _prepare(self, key: str, line: str, text: str, values: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The document for a row, or None when the indexed one is unchanged. Needs no lock."""
+        current = self.docs.get(key)
+        if current is not None and current["fingerprint"] == text:
+            return None
+        tokens = tokenize(text)
+        return {"line": line, "tokens": tokens, "length": len(tokens), "values": values, "fingerprint": text}
+
+    def _insert(self, key: str, doc: Dict[str, Any]):
+        self._remove(key)
+        self.docs[key] = doc
+        for term in doc["tokens"]:
+            bucket = self.postings.setdefault(term, {})
+            bucket[key] = bucket.get(key, 0) + 1
+        self.total_length += doc["length"]
+        if key.startswith("S:"):
+            values = doc["values"]
+            for field in SCORE_FIELDS:
+                self.sums[field] += values[field]
+            self.rag_counts[values["rag"]] = self.rag_counts.get(values["rag"], 0) + 1
+            self.student_count += 1
+
+    def _prepare_rows(self, prefix: str, rows, builder, present: Optional[set] = None) -> Dict[str, Dict[str, Any]]:
+        prepared = {}
+        for row in rows:
+            key = f"{prefix}{row[0]}"
+            if present is not None:
+                present.add(key)
+            doc = self._prepare(key, *builder(row))
+            if doc is not None:
+                prepared[key] = doc
+        return prepared
+
+    def _watermark(self) -> Tuple[int, ...]:
+        return tuple(analytics_cache.current_generation(tag) for tag in WATERMARK_TAGS)
+
+    def sync(self, db: Session) -> int:
+        """Bring the index up to date; returns how many documents changed."""
+        with self._sync_lock:
+            now = time.time()
+            with self._lock:
+                dirty_ids, self.dirty_ids = list(self.dirty_ids), set()
+                full = self.dirty_all or now - self.synced_at > FULL_RESYNC_SECONDS
+                self.dirty_all = False
+            watermark = None
+            if not full and now - self.checked_at > MAX_AGE_SECONDS:
+                watermark = self._watermark()
+                full = watermark != self.watermark
+                self.checked_at = now
+
+            if not full and dirty_ids:
+                # Targeted refresh; a count mismatch means inserts/deletes happened, so fall back to a full diff
+                student_total = db.query(func.count(models.Student.enrollment_no)).scalar() or 0
+                if student_total == self.student_count:
+                    prepared: Dict[str, Dict[str, Any]] = {}
+                    for start in range(0, len(dirty_ids), CHUNK_SIZE):
+                        prepared.update(self._prepare_rows("S:", db.query(*STUDENT_COLUMNS).filter(
+                            models.Student.enrollment_no.in_(dirty_ids[start:start + CHUNK_SIZE])
+                        ).all(), _student_doc))
+                    with self._lock:
+                        for key, doc in prepared.items():
+                            self._insert(key, doc)
+                    return len(prepared)
+                full = True
+            if not full:
+                return 0
+
+            # Full diff: narrow projection only, and documents whose text is unchanged are left alone.
+            # The watermark is taken before reading, so a write landing mid-scan is picked up next time.
+            watermark = watermark or self._watermark()
+            present: set = set()
+            prepared = self._prepare_rows("S:", db.query(*STUDENT_COLUMNS).yield_per(CHUNK_SIZE), _student_doc, present)
+            prepared.update(self._prepare_rows("T:", db.query(*TEACHER_COLUMNS).all(), _teacher_doc, present))
+            with self._lock:
+                removed = [k for k in self.docs if k not in present]
+                for key in removed:
+                    self._remove(key)
+                for key, doc in prepared.items():
+                    self._insert(key, doc)
+                self.watermark = watermark
+                self.synced_at = self.checked_at = now
+            return len(prepared) + len(removed)
+
+    # ─── Retrieval ───────────────────────────────────────────────────────────
+
+    def search(self, query: str, k: int = TOP_K) -> List[Tuple[float, str]]:
+        terms = set(tokenize(query))
+        with self._lock:
+            n = len(self.docs)
+            if not n or not terms:
+                return []
+            avgdl = self.total_length / n
+            scores: Dict[str, float] = {}
+            for term in terms:
+                bucket = self.postings.get(term)
+                if not bucket:
+                    continue
+                idf = math.log(1 + (n - len(bucket) + 0.5) / (len(bucket) + 0.5))
+                for key, tf in bucket.items():
+                    length = self.docs[key]["length"]
+                    scores[key] = scores.get(key, 0.0) + idf * tf * (BM25_K1 + 1) / (
+                        tf + BM25_K1 * (1 - BM25_B + BM25_B * length / avgdl)
+                    )
+            ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:k]
+            return [(score, self.docs[key]["line"]) for key, score in ranked]
+
+    def aggregates(self) -> str:
+        with self._lock:
+            n = self.student_count
+            if not n:
+                return "The database is currently empty."
+            avg = {field: round(self.sums[field] / n, 1) for field in SCORE_FIELDS}
+            teachers = sum(1 for key in self.docs if key.startswith("T:"))
+            rag = ", ".join(f"{status} {count}" for status, count in sorted(
+                self.rag_counts.items(), key=lambda item: str(item[0])) if count)
+            return (
+                f"Cohort: {n} students, {teachers} faculty. "
+                f"RAG: {rag}. "
+                f"Averages: attendance {avg['attendance']}%, DSA {avg['dsa_score']}, ML {avg['ml_score']}, "
+                f"QA {avg['qa_score']}, Projects {avg['projects_score']}, Mock {avg['mock_interview_score']}."
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "documents": len(self.docs),
+                "terms": len(self.postings),
+                "students": self.student_count,
+                "synced_at": self.synced_at,
+                "pending_dirty_ids": len(self.dirty_ids),
+                "dirty_all": self.dirty_all,
+                "watermark": dict(zip(WATERMARK_TAGS, self.watermark)) if self.watermark else None
+            }
+
+
+index = ContextIndex()
+
+
+def mark_dirty(student_ids: Optional[Iterable[str]] = None):
+    """Called by student/teacher write paths; the next chat request re-reads just those rows."""
+    index.mark_dirty(student_ids)
+
+
+def build_context(db: Session, query: str, k: int = TOP_K, token_budget: int = TOKEN_BUDGET) -> Dict[str, Any]:
+    """Cohort aggregates plus the top-k records for the query, cut to fit token_budget."""
+    index.sync(db)
+    summary = index.aggregates()
+    used = estimate_tokens(summary)
+    records = []
+    for _, line in index.search(query, k):
+        cost = estimate_tokens(line) + 1
+        if used + cost > token_budget:
+            break
+        records.append(line)
+        used += cost
+    text = "COHORT SUMMARY:\n" + summary
+    if records:
+        text += "\n\nRELEVANT RECORDS:\n" + "\n".join(records)
+    return {"text": text, "records": len(records), "estimated_tokens": used}
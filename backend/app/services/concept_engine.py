@@ -1,13 +1,231 @@
 from sqlalchemy.orm import Session
+from sqlalchemy import update, bindparam, func
+from sqlalchemy.exc import IntegrityError
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 import json
+import random
+import time
 
 from .. import models
-from . import risk_explanation_engine
+from . import risk_explanation_engine, student_identity, concept_matrix
+from .student_identity import StudentRef
+
+CHUNK_SIZE = 500
+WRITE_BATCH = 1000
+# A batch that loses a race with a concurrent writer is re-read and replayed this many times
+MAX_WRITE_ATTEMPTS = 5
+
+QUESTION_COLUMNS = ("id", "question_id", "attempt_count", "correct_count", "incorrect_count", "accuracy", "average_time_seconds", "status")
+MASTERY_COLUMNS = (
+    "id", "student_id", "subject_id", "concept_id", "attempts", "correct", "incorrect", "accuracy",
+    "easy_accuracy", "medium_accuracy", "hard_accuracy", "mastery_score", "mastery_level"
+)
+
+def _mastery_level(score: float) -> str:
+    if score >= 90.0:
+        return "MASTERED"
+    elif score >= 75.0:
+        return "PROFICIENT"
+    elif score >= 60.0:
+        return "DEVELOPING"
+    elif score >= 40.0:
+        return "WEAK"
+    return "CRITICAL"
+
+def _apply_question(q: Dict[str, Any], is_correct: bool, time_taken_seconds: float):
+    q["attempt_count"] = (q["attempt_count"] or 0) + 1
+    if is_correct:
+        q["correct_count"] = (q["correct_count"] or 0) + 1
+    else:
+        q["incorrect_count"] = (q["incorrect_count"] or 0) + 1
+
+    q["accuracy"] = round(((q["correct_count"] or 0) / q["attempt_count"]) * 100.0, 1)
+    q["average_time_seconds"] = round(
+        (((q["average_time_seconds"] or 0.0) * (q["attempt_count"] - 1)) + time_taken_seconds) / q["attempt_count"], 1
+    )
+
+    # Flag Question for Review if accuracy < 20% after 5+ attempts
+    if q["attempt_count"] >= 5 and q["accuracy"] < 20.0:
+        q["status"] = "QUESTION_REVIEW_REQUIRED"
+
+def _apply_mastery(m: Dict[str, Any], is_correct: bool, difficulty: str) -> bool:
+    """One answer applied to a mastery row; True when it is a significant decline (15+ points)."""
+    prev_mastery = m["mastery_score"] or 0.0
+    m["attempts"] = (m["attempts"] or 0) + 1
+    if is_correct:
+        m["correct"] = (m["correct"] or 0) + 1
+    else:
+        m["incorrect"] = (m["incorrect"] or 0) + 1
+
+    m["accuracy"] = round(((m["correct"] or 0) / m["attempts"]) * 100.0, 1)
+
+    # Update difficulty-level accuracy
+    diff_upper = str(difficulty).upper()
+    if diff_upper == "EASY":
+        m["easy_accuracy"] = m["accuracy"]
+    elif diff_upper == "HARD":
+        m["hard_accuracy"] = m["accuracy"]
+    else:
+        m["medium_accuracy"] = m["accuracy"]
+
+    # Mastery Score (0-100) & Mastery Level
+    m["mastery_score"] = m["accuracy"]
+    if m["attempts"] < 3:
+        m["mastery_level"] = "INSUFFICIENT_DATA"
+        return False
+    m["mastery_level"] = _mastery_level(m["mastery_score"])
+    return prev_mastery > 0 and (prev_mastery - m["mastery_score"]) >= 15.0
+
+def _load_questions(db: Session, question_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+    columns = [getattr(models.QuestionAnalytics, c) for c in QUESTION_COLUMNS]
+    rows = {}
+    for start in range(0, len(question_ids), CHUNK_SIZE):
+        for row in db.query(*columns).filter(
+            models.QuestionAnalytics.question_id.in_(question_ids[start:start + CHUNK_SIZE])
+        ).all():
+            rows[row.question_id] = dict(zip(QUESTION_COLUMNS, row))
+    return rows
+
+def _load_mastery(db: Session, student_ids: List[str], concept_ids: List[str]) -> Dict[tuple, Dict[str, Any]]:
+    columns = [getattr(models.StudentConceptMastery, c) for c in MASTERY_COLUMNS]
+    rows = {}
+    for s_start in range(0, len(student_ids), CHUNK_SIZE):
+        for c_start in range(0, len(concept_ids), CHUNK_SIZE):
+            for row in db.query(*columns).filter(
+                models.StudentConceptMastery.student_id.in_(student_ids[s_start:s_start + CHUNK_SIZE]),
+                models.StudentConceptMastery.concept_id.in_(concept_ids[c_start:c_start + CHUNK_SIZE])
+            ).all():
+                # Duplicate rows for one pair: the first one found keeps receiving updates, as with .first()
+                rows.setdefault((row.student_id, row.concept_id), dict(zip(MASTERY_COLUMNS, row)))
+    return rows
+
+def _bulk_insert(db: Session, model, rows: List[Dict[str, Any]]):
+    for start in range(0, len(rows), WRITE_BATCH):
+        db.bulk_insert_mappings(model, rows[start:start + WRITE_BATCH])
+
+def _conditional_update(db: Session, model, rows: List[Dict[str, Any]], columns: tuple, counter: str, previous: Dict[str, int]) -> bool:
+    """
+    Update rows by id only where the attempt counter still holds the value they were read with.
+    The counter grows with every answer, so a mismatch means another writer got in between;
+    returns False then, and the caller rolls back and replays.
+    """
+    table = model.__table__
+    stmt = update(table).where(
+        table.c.id == bindparam("b_id"),
+        func.coalesce(table.c[counter], 0) == bindparam("b_prev")
+    ).values({c: bindparam(c) for c in columns if c != "id"})
+    for start in range(0, len(rows), WRITE_BATCH):
+        chunk = rows[start:start + WRITE_BATCH]
+        params = [{**{c: row[c] for c in columns if c != "id"}, "b_id": row["id"], "b_prev": previous[row["id"]]} for row in chunk]
+        if db.execute(stmt, params).rowcount != len(chunk):
+            return False
+    return True
+
+def _replay_and_write(db: Session, accepted: List[tuple]) -> Optional[Dict[str, Any]]:
+    """One read-replay-write pass in the caller's transaction; None when a concurrent write got in first."""
+    question_ids = sorted({str(r["question_id"]) for _, r in accepted})
+    concept_ids = sorted({str(cid) for _, r in accepted for cid in (r.get("concept_ids") or [])})
+    questions = _load_questions(db, question_ids)
+    mastery = _load_mastery(db, sorted({sid for sid, _ in accepted}), concept_ids)
+    existing_questions, existing_mastery = set(questions), set(mastery)
+    prev_attempts = {q["id"]: q["attempt_count"] or 0 for q in questions.values()}
+    prev_attempts.update({m["id"]: m["attempts"] or 0 for m in mastery.values()})
+
+    dirty_mastery = set()
+    declined = set()
+    for enrollment_no, r in accepted:
+        question_id = str(r["question_id"])
+        is_correct = bool(r.get("is_correct"))
+        difficulty = r.get("difficulty") or "MEDIUM"
+        time_taken = r.get("time_taken_seconds")
+        q = questions.get(question_id)
+        if q is None:
+            q = questions[question_id] = {
+                "id": models.generate_uuid(), "question_id": question_id, "expected_difficulty": difficulty,
+                "attempt_count": 0, "correct_count": 0, "incorrect_count": 0, "accuracy": 0.0,
+                "average_time_seconds": 0.0, "status": "NORMAL"
+            }
+        _apply_question(q, is_correct, 30.0 if time_taken is None else float(time_taken))
+
+        for cid in (r.get("concept_ids") or []):
+            key = (enrollment_no, str(cid))
+            m = mastery.get(key)
+            if m is None:
+                m = mastery[key] = {
+                    "id": models.generate_uuid(), "student_id": enrollment_no, "subject_id": r.get("subject_id"),
+                    "concept_id": str(cid), "attempts": 0, "correct": 0, "incorrect": 0, "accuracy": 0.0,
+                    "easy_accuracy": 0.0, "medium_accuracy": 0.0, "hard_accuracy": 0.0,
+                    "mastery_score": 0.0, "mastery_level": "INSUFFICIENT_DATA", "trend": "STABLE"
+                }
+            if _apply_mastery(m, is_correct, difficulty):
+                declined.add(enrollment_no)
+            dirty_mastery.add(key)
+
+    now = datetime.utcnow()
+    question_updates = [dict(q, updated_at=now) for qid, q in questions.items() if qid in existing_questions]
+    mastery_updates = [dict(mastery[k], updated_at=now) for k in dirty_mastery if k in existing_mastery]
+    if not _conditional_update(db, models.QuestionAnalytics, question_updates, QUESTION_COLUMNS + ("updated_at",), "attempt_count", prev_attempts):
+        return None
+    if not _conditional_update(db, models.StudentConceptMastery, mastery_updates, MASTERY_COLUMNS + ("updated_at",), "attempts", prev_attempts):
+        return None
+    try:
+        # New rows: a concurrent batch may have created the same question_id first (unique column)
+        with db.begin_nested():
+            _bulk_insert(db, models.QuestionAnalytics, [q for qid, q in questions.items() if qid not in existing_questions])
+            _bulk_insert(db, models.StudentConceptMastery, [mastery[k] for k in dirty_mastery if k not in existing_mastery])
+    except IntegrityError:
+        return None
+    return {
+        "questions_updated": len(questions),
+        "concept_mastery_updated": len(dirty_mastery & existing_mastery),
+        "concept_mastery_created": len(dirty_mastery - existing_mastery),
+        "declined": declined
+    }
+
+def process_question_responses(responses: List[Dict[str, Any]], db: Session, requested_by: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Apply a whole attempt's or test's graded responses in one pass. Each response is a dict with
+    student_id, question_id, subject_id, concept_ids, is_correct and optionally time_taken_seconds
+    and difficulty. Responses are replayed in order against in-memory copies of the affected
+    QuestionAnalytics and StudentConceptMastery rows, so the result matches processing them one by
+    one; the rows are then written with batched updates and inserts and a single commit. Updates
+    only apply where a row's attempt counter is unchanged since it was read, and a lost race (or a
+    duplicate insert) rolls back and replays against fresh rows. Students whose mastery dropped
+    sharply are queued for a debounced risk re-evaluation.
+    """
+    resolved = student_identity.resolve_ids(db, [r.get("student_id") for r in responses])
+    accepted = []
+    for r in responses:
+        enrollment_no = resolved.get(str(r.get("student_id") or "").strip())
+        if enrollment_no is not None:
+            accepted.append((enrollment_no, r))
+
+    for attempt in range(1, MAX_WRITE_ATTEMPTS + 1):
+        written = _replay_and_write(db, accepted)
+        if written is not None:
+            db.commit()
+            break
+        db.rollback()
+        if attempt == MAX_WRITE_ATTEMPTS:
+            raise RuntimeError(f"Question responses conflicted with concurrent updates {MAX_WRITE_ATTEMPTS} times")
+        time.sleep(random.uniform(0.0, 0.05 * attempt))
+    concept_matrix.invalidate()
+
+    declined = written.pop("declined")
+    risk_job = risk_explanation_engine.queue_reevaluation(db, declined, requested_by=requested_by) if declined else None
+    return {
+        "status": "success",
+        "received": len(responses),
+        "processed": len(accepted),
+        "unresolved": len(responses) - len(accepted),
+        **written,
+        "risk_reevaluation_queued": sorted(declined),
+        "risk_job_id": risk_job["job_id"] if risk_job else None
+    }
 
 def process_question_response(
-    student_id: str,
+    student_id: StudentRef,
     question_id: str,
     subject_id: str,
     concept_ids: List[str],
@@ -16,147 +234,29 @@ def process_question_response(
     difficulty: str,
     db: Session
 ) -> Dict[str, Any]:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         return {"error": "Student not found"}
 
-    # 1. Update Question Analytics
-    q_analytics = db.query(models.QuestionAnalytics).filter(
-        models.QuestionAnalytics.question_id == question_id
-    ).first()
-
-    if not q_analytics:
-        q_analytics = models.QuestionAnalytics(
-            question_id=question_id,
-            expected_difficulty=difficulty,
-            attempt_count=0,
-            correct_count=0,
-            incorrect_count=0,
-            average_time_seconds=0.0
-        )
-        db.add(q_analytics)
-
-    q_analytics.attempt_count = (q_analytics.attempt_count or 0) + 1
-    if is_correct:
-        q_analytics.correct_count = (q_analytics.correct_count or 0) + 1
-    else:
-        q_analytics.incorrect_count = (q_analytics.incorrect_count or 0) + 1
-
-    q_analytics.accuracy = round((q_analytics.correct_count / q_analytics.attempt_count) * 100.0, 1)
-    q_analytics.average_time_seconds = round(
-        ((q_analytics.average_time_seconds * (q_analytics.attempt_count - 1)) + time_taken_seconds) / q_analytics.attempt_count, 1
-    )
-
-    # Flag Question for Review if accuracy < 20% after 5+ attempts
-    if q_analytics.attempt_count >= 5 and q_analytics.accuracy < 20.0:
-        q_analytics.status = "QUESTION_REVIEW_REQUIRED"
-
-    db.commit()
-
-    # 2. Update Student Concept Mastery for mapped concepts
-    updated_concepts = []
-    for cid in concept_ids:
-        c_mastery = db.query(models.StudentConceptMastery).filter(
-            models.StudentConceptMastery.student_id == student.enrollment_no,
-            models.StudentConceptMastery.concept_id == cid
-        ).first()
-
-        if not c_mastery:
-            c_mastery = models.StudentConceptMastery(
-                student_id=student.enrollment_no,
-                subject_id=subject_id,
-                concept_id=cid,
-                attempts=0,
-                correct=0,
-                incorrect=0,
-                accuracy=0.0,
-                mastery_score=0.0
-            )
-            db.add(c_mastery)
-
-        prev_mastery = c_mastery.mastery_score or 0.0
-        c_mastery.attempts = (c_mastery.attempts or 0) + 1
-        if is_correct:
-            c_mastery.correct = (c_mastery.correct or 0) + 1
-        else:
-            c_mastery.incorrect = (c_mastery.incorrect or 0) + 1
-
-        c_mastery.accuracy = round((c_mastery.correct / c_mastery.attempts) * 100.0, 1)
-
-        # Update difficulty-level accuracy
-        diff_upper = str(difficulty).upper()
-        if diff_upper == "EASY":
-            c_mastery.easy_accuracy = c_mastery.accuracy
-        elif diff_upper == "HARD":
-            c_mastery.hard_accuracy = c_mastery.accuracy
-        else:
-            c_mastery.medium_accuracy = c_mastery.accuracy
-
-        # Calculate Mastery Score (0-100) & Mastery Level
-        if c_mastery.attempts < 3:
-            c_mastery.mastery_level = "INSUFFICIENT_DATA"
-            c_mastery.mastery_score = c_mastery.accuracy
-        else:
-            c_mastery.mastery_score = c_mastery.accuracy
-            score = c_mastery.mastery_score
-            if score >= 90.0:
-                c_mastery.mastery_level = "MASTERED"
-            elif score >= 75.0:
-                c_mastery.mastery_level = "PROFICIENT"
-            elif score >= 60.0:
-                c_mastery.mastery_level = "DEVELOPING"
-            elif score >= 40.0:
-                c_mastery.mastery_level = "WEAK"
-            else:
-                c_mastery.mastery_level = "CRITICAL"
-
-            # Check for significant decline and notify Part 3
-            if prev_mastery > 0 and (prev_mastery - score) >= 15.0:
-                risk_explanation_engine.evaluate_and_explain_risk(student.enrollment_no, db)
-
-        db.commit()
-        db.refresh(c_mastery)
-        updated_concepts.append(c_mastery)
-
+    process_question_responses([{
+        "student_id": student.enrollment_no,
+        "question_id": question_id,
+        "subject_id": subject_id,
+        "concept_ids": concept_ids,
+        "is_correct": is_correct,
+        "time_taken_seconds": time_taken_seconds,
+        "difficulty": difficulty
+    }], db)
     return {
         "status": "success",
         "question_id": question_id,
-        "updated_concepts_count": len(updated_concepts)
+        "updated_concepts_count": len(concept_ids)
     }
 
-def get_student_subject_concepts(student_id: str, subject_id: str, db: Session) -> List[Dict[str, Any]]:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+def get_student_subject_concepts(student_id: StudentRef, subject_id: str, db: Session) -> List[Dict[str, Any]]:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return []
 
-    concepts = db.query(models.Concept).filter(models.Concept.subject_id == subject_id).all()
-    results = []
-
-    for c in concepts:
-        mastery = db.query(models.StudentConceptMastery).filter(
-            models.StudentConceptMastery.student_id == student.enrollment_no,
-            models.StudentConceptMastery.concept_id == c.id
-        ).first()
-
-        results.append({
-            "concept_id": c.id,
-            "concept_name": c.concept_name,
-            "chapter": c.chapter,
-            "topic": c.topic,
-            "attempts": mastery.attempts if mastery else 0,
-            "correct": mastery.correct if mastery else 0,
-            "incorrect": mastery.incorrect if mastery else 0,
-            "accuracy": mastery.accuracy if mastery else 0.0,
-            "easy_accuracy": mastery.easy_accuracy if mastery else 0.0,
-            "medium_accuracy": mastery.medium_accuracy if mastery else 0.0,
-            "hard_accuracy": mastery.hard_accuracy if mastery else 0.0,
-            "mastery_score": mastery.mastery_score if mastery else 0.0,
-            "mastery_level": mastery.mastery_level if mastery else "INSUFFICIENT_DATA",
-            "trend": mastery.trend if mastery else "STABLE"
-        })
-
-    return results
+    # One row of the cached subject matrix instead of a mastery query per concept
+    return concept_matrix.get_matrix(db, subject_id).student_concepts(student.enrollment_no)
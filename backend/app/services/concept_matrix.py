@@ -0,0 +1,204 @@
+import threading
+from typing import Dict, Any, List, Optional, Iterable
+
+import numpy as np
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import analytics_cache
+
+# Rebuilt when the "concepts" cache generation moves, i.e. after mastery writes commit
+GENERATION_TAG = "concepts"
+FIELDS = ("attempts", "correct", "incorrect", "accuracy", "easy_accuracy", "medium_accuracy", "hard_accuracy", "mastery_score")
+INT_FIELDS = ("attempts", "correct", "incorrect")
+WEAK_LEVELS = ("WEAK", "CRITICAL")
+
+
+class ConceptMatrix:
+    """
+    Student x concept mastery for one subject: a (field, student, concept) float array with NaN
+    where a student has no mastery row, level/trend codes, and id -> position maps.
+    """
+
+    def __init__(self, subject_id: str, concepts: List[tuple], rows: List[tuple]):
+        self.subject_id = subject_id
+        self.concepts = [
+            {"concept_id": cid, "concept_name": name, "chapter": chapter, "topic": topic}
+            for cid, name, chapter, topic in concepts
+        ]
+        self.concept_index = {c["concept_id"]: j for j, c in enumerate(self.concepts)}
+        self.student_ids = sorted({row[0] for row in rows})
+        self.student_index = {sid: i for i, sid in enumerate(self.student_ids)}
+
+        shape = (len(self.student_ids), len(self.concepts))
+        self.values = np.full((len(FIELDS),) + shape, np.nan, dtype=np.float64)
+        self.present = np.zeros(shape, dtype=bool)
+        self.levels: List[Optional[str]] = []
+        self.trends: List[Optional[str]] = []
+        self.level_codes = np.full(shape, -1, dtype=np.int16)
+        self.trend_codes = np.full(shape, -1, dtype=np.int16)
+        level_vocab: Dict[Optional[str], int] = {}
+        trend_vocab: Dict[Optional[str], int] = {}
+        for student_id, concept_id, level, trend, *values in rows:
+            i, j = self.student_index[student_id], self.concept_index[concept_id]
+            # Duplicate rows for one pair: the first one wins, as the per-concept .first() did
+            if self.present[i, j]:
+                continue
+            self.present[i, j] = True
+            self.values[:, i, j] = [np.nan if v is None else v for v in values]
+            if level not in level_vocab:
+                level_vocab[level] = len(self.levels)
+                self.levels.append(level)
+            if trend not in trend_vocab:
+                trend_vocab[trend] = len(self.trends)
+                self.trends.append(trend)
+            self.level_codes[i, j] = level_vocab[level]
+            self.trend_codes[i, j] = trend_vocab[trend]
+
+    def field(self, name: str) -> np.ndarray:
+        return self.values[FIELDS.index(name)]
+
+    def level_mask(self, levels: Iterable[str]) -> np.ndarray:
+        codes = [code for code, level in enumerate(self.levels) if level in set(levels)]
+        return np.isin(self.level_codes, codes)
+
+    def _cell(self, i: int, j: int) -> Dict[str, Any]:
+        out = {}
+        for f, name in enumerate(FIELDS):
+            value = self.values[f, i, j]
+            out[name] = None if np.isnan(value) else (int(value) if name in INT_FIELDS else float(value))
+        out["mastery_level"] = self.levels[self.level_codes[i, j]]
+        out["trend"] = self.trends[self.trend_codes[i, j]]
+        return out
+
+    def student_concepts(self, student_id: str) -> List[Dict[str, Any]]:
+        """Every concept of the subject with this student's mastery, defaults where there is none."""
+        i = self.student_index.get(student_id)
+        results = []
+        for j, concept in enumerate(self.concepts):
+            if i is not None and self.present[i, j]:
+                cell = self._cell(i, j)
+            else:
+                cell = {name: 0 if name in INT_FIELDS else 0.0 for name in FIELDS}
+                cell.update({"mastery_level": "INSUFFICIENT_DATA", "trend": "STABLE"})
+            results.append({**concept, **cell})
+        return results
+
+    def weak_concepts(self, student_id: str) -> List[Dict[str, Any]]:
+        i = self.student_index.get(student_id)
+        if i is None:
+            return []
+        results = []
+        for j in np.flatnonzero(self.level_mask(WEAK_LEVELS)[i]).tolist():
+            cell = self._cell(i, j)
+            results.append({
+                "concept_id": self.concepts[j]["concept_id"],
+                "concept_name": self.concepts[j]["concept_name"],
+                "subject_id": self.subject_id,
+                "mastery_score": cell["mastery_score"],
+                "mastery_level": cell["mastery_level"],
+                "easy_accuracy": cell["easy_accuracy"],
+                "medium_accuracy": cell["medium_accuracy"],
+                "hard_accuracy": cell["hard_accuracy"]
+            })
+        return results
+
+    def heatmap(self, student_ids: Optional[List[str]] = None, field: str = "mastery_score") -> Dict[str, Any]:
+        """Class-wide grid for the given students (default: all with mastery data); None where there is no data."""
+        student_ids = self.student_ids if student_ids is None else student_ids
+        positions = np.array([self.student_index.get(sid, -1) for sid in student_ids], dtype=np.int64)
+        known = positions >= 0
+        grid = np.full((len(student_ids), len(self.concepts)), np.nan)
+        weak = np.zeros((len(student_ids), len(self.concepts)), dtype=bool)
+        if known.any():
+            grid[known] = self.field(field)[positions[known]]
+            weak[known] = self.level_mask(WEAK_LEVELS)[positions[known]]
+        with np.errstate(invalid="ignore"):
+            counts = (~np.isnan(grid)).sum(axis=0)
+            averages = np.where(counts > 0, np.nansum(grid, axis=0) / np.maximum(counts, 1), np.nan)
+
+        def clean(values):
+            return [None if v != v else round(v, 1) for v in values]
+
+        return {
+            "subject_id": self.subject_id,
+            "field": field,
+            "students": list(student_ids),
+            "concepts": self.concepts,
+            "matrix": [clean(row) for row in grid.tolist()],
+            "concept_average": clean(averages.tolist()),
+            "students_with_data": counts.tolist(),
+            "weak_students": weak.sum(axis=0).tolist()
+        }
+
+
+class MatrixCache:
+    """Per-subject matrices for the current "concepts" generation; a full load fills every subject from one join."""
+
+    def __init__(self):
+        self.matrices: Dict[str, ConceptMatrix] = {}
+        self.complete = False
+        self.generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _check_generation(self):
+        generation = analytics_cache.current_generation(GENERATION_TAG)
+        if generation != self.generation:
+            self.matrices, self.complete, self.generation = {}, False, generation
+
+    def _build(self, db: Session, subject_id: Optional[str]) -> Dict[str, ConceptMatrix]:
+        concept_query = db.query(
+            models.Concept.subject_id, models.Concept.id, models.Concept.concept_name,
+            models.Concept.chapter, models.Concept.topic
+        )
+        mastery_query = db.query(
+            models.Concept.subject_id,
+            models.StudentConceptMastery.student_id,
+            models.StudentConceptMastery.concept_id,
+            models.StudentConceptMastery.mastery_level,
+            models.StudentConceptMastery.trend,
+            *[getattr(models.StudentConceptMastery, name) for name in FIELDS]
+        ).join(models.Concept, models.Concept.id == models.StudentConceptMastery.concept_id)
+        if subject_id is not None:
+            concept_query = concept_query.filter(models.Concept.subject_id == subject_id)
+            mastery_query = mastery_query.filter(models.Concept.subject_id == subject_id)
+
+        concepts: Dict[str, List[tuple]] = {} if subject_id is None else {subject_id: []}
+        for subject, *concept in concept_query.all():
+            concepts.setdefault(subject, []).append(tuple(concept))
+        rows: Dict[str, List[tuple]] = {}
+        for subject, *row in mastery_query.all():
+            rows.setdefault(subject, []).append(tuple(row))
+        return {subject: ConceptMatrix(subject, subject_concepts, rows.get(subject, [])) for subject, subject_concepts in concepts.items()}
+
+    def get(self, db: Session, subject_id: str) -> ConceptMatrix:
+        with self._lock:
+            self._check_generation()
+            if subject_id not in self.matrices:
+                self.matrices.update(self._build(db, subject_id))
+            return self.matrices[subject_id]
+
+    def all(self, db: Session) -> Dict[str, ConceptMatrix]:
+        with self._lock:
+            self._check_generation()
+            if not self.complete:
+                self.matrices = self._build(db, None)
+                self.complete = True
+            return dict(self.matrices)
+
+
+cache = MatrixCache()
+
+
+def get_matrix(db: Session, subject_id: str) -> ConceptMatrix:
+    return cache.get(db, subject_id)
+
+
+def student_weak_concepts(db: Session, student_id: str) -> List[Dict[str, Any]]:
+    """WEAK/CRITICAL concepts for one student across all subjects, from the cached matrices."""
+    return [w for matrix in cache.all(db).values() for w in matrix.weak_concepts(student_id)]
+
+
+def invalidate():
+    """Called after mastery writes commit."""
+    analytics_cache.invalidate(GENERATION_TAG)
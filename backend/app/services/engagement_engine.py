@@ -1,10 +1,17 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, date, timedelta
+from sqlalchemy import func, and_
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime, date, timedelta, timezone
 from typing import List, Dict, Any, Optional
 import json
+import time
+
+import numpy as np
 
 from .. import models
+from . import student_identity, risk_snapshot_service
+from .student_identity import StudentRef
+from .feature_matrix import py_round
 
 INACTIVITY_THRESHOLDS = {
     24: "INFO",
@@ -13,11 +20,22 @@ INACTIVITY_THRESHOLDS = {
     168: "CRITICAL"
 }
 
+def _parse_timestamp(value) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    if isinstance(value, str) and value:
+        try:
+            return datetime.fromisoformat(value.replace("Z", "+00:00"))
+        except ValueError:
+            return datetime.utcnow()
+    return None
+
+def _metadata_json(record: dict) -> Optional[str]:
+    return json.dumps(record.get("metadata", {})) if isinstance(record.get("metadata"), dict) else record.get("metadata_json")
+
 def normalize_activity_event(db: Session, record: dict) -> Optional[models.StudentActivity]:
     student_id = record.get("student_id")
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    student = student_identity.resolve(db, student_id)
     if not student:
         return None
 
@@ -27,14 +45,7 @@ def normalize_activity_event(db: Session, record: dict) -> Optional[models.Stude
         if existing:
             return existing
 
-    started_at = record.get("started_at")
-    if isinstance(started_at, str):
-        try:
-            started_at = datetime.fromisoformat(started_at.replace("Z", "+00:00"))
-        except Exception:
-            started_at = datetime.utcnow()
-    elif not started_at:
-        started_at = datetime.utcnow()
+    started_at = _parse_timestamp(record.get("started_at")) or datetime.utcnow()
 
     act = models.StudentActivity(
         student_id=student.enrollment_no,
@@ -44,64 +55,191 @@ def normalize_activity_event(db: Session, record: dict) -> Optional[models.Stude
         resource_id=record.get("resource_id"),
         started_at=started_at,
         duration=record.get("duration", 0),
-        metadata_json=json.dumps(record.get("metadata", {})) if isinstance(record.get("metadata"), dict) else record.get("metadata_json"),
+        metadata_json=_metadata_json(record),
         external_event_id=ext_id
     )
     db.add(act)
+    from . import feature_store
+    feature_store.record_activity(db, act)
     db.commit()
     db.refresh(act)
     return act
 
-def calculate_student_engagement(student_id: str, db: Session) -> dict:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
-    if not student:
-        return {"error": "Student not found"}
+ACTIVITY_WRITE_BATCH = 1000
+ACTIVITY_PROBE_CHUNK = 500
+
+def ingest_activity_events(db: Session, records: List[dict], retry_on_conflict: bool = True) -> Dict[str, Any]:
+    """
+    Batch form of normalize_activity_event for LMS feeds: students resolved as a set, duplicate
+    external_event_ids dropped in memory and against the table with one IN probe per chunk,
+    rows bulk inserted, engagement features updated and risk snapshots marked stale once per
+    student. Commits once.
+    """
+    students = student_identity.resolve_ids(db, [r.get("student_id") for r in records])
+    now = datetime.utcnow()
+    rows: List[Dict[str, Any]] = []
+    seen_ext_ids = set()
+    unresolved = duplicates_in_batch = 0
+    for record in records:
+        sid = students.get(str(record.get("student_id") or "").strip())
+        if sid is None:
+            unresolved += 1
+            continue
+        ext_id = record.get("external_event_id")
+        if ext_id:
+            if ext_id in seen_ext_ids:
+                duplicates_in_batch += 1
+                continue
+            seen_ext_ids.add(ext_id)
+        rows.append({
+            "id": models.generate_uuid(),
+            "student_id": sid,
+            "activity_type": str(record.get("activity_type", "LMS")).upper(),
+            "source": record.get("source", "LMS"),
+            "subject_id": record.get("subject_id"),
+            "resource_id": record.get("resource_id"),
+            "started_at": _parse_timestamp(record.get("started_at")) or now,
+            "ended_at": _parse_timestamp(record.get("ended_at")),
+            "duration": record.get("duration") or 0,
+            "metadata_json": _metadata_json(record),
+            "external_event_id": ext_id,
+            "created_at": now
+        })
+
+    ext_ids = list(seen_ext_ids)
+    existing = set()
+    for start in range(0, len(ext_ids), ACTIVITY_PROBE_CHUNK):
+        existing.update(ext_id for (ext_id,) in db.query(models.StudentActivity.external_event_id).filter(
+            models.StudentActivity.external_event_id.in_(ext_ids[start:start + ACTIVITY_PROBE_CHUNK])
+        ).all())
+    if existing:
+        rows = [row for row in rows if row["external_event_id"] not in existing]
+
+    for start in range(0, len(rows), ACTIVITY_WRITE_BATCH):
+        db.bulk_insert_mappings(models.StudentActivity, rows[start:start + ACTIVITY_WRITE_BATCH])
+    from . import feature_store
+    feature_store.record_activities(db, rows)
+    student_ids = sorted({row["student_id"] for row in rows})
+    risk_snapshot_service.mark_stale(db, student_ids)
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent batch committed some of the same external_event_ids after our probe
+        db.rollback()
+        if not retry_on_conflict:
+            raise
+        return ingest_activity_events(db, records, retry_on_conflict=False)
+    return {
+        "received": len(records),
+        "inserted": len(rows),
+        "duplicates": duplicates_in_batch + len(existing),
+        "unresolved": unresolved,
+        "student_ids": student_ids
+    }
 
+def _naive_utc(ts: Optional[datetime]) -> Optional[datetime]:
+    if ts is not None and ts.tzinfo is not None:
+        return ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+def calculate_cohort_engagement(student_ids: List[str], db: Session) -> Dict[str, np.ndarray]:
+    """
+    Read-only, vectorized twin of calculate_student_engagement for a whole cohort. Reads the
+    same feature-store day buckets in one bulk load and applies the same formula, so both paths
+    agree exactly. Returns arrays aligned with student_ids: engagement_score and inactivity_hours.
+    """
+    from . import feature_store
+    n = len(student_ids)
     now = datetime.utcnow()
-    thirty_days_ago = now - timedelta(days=30)
-    seven_days_ago = now - timedelta(days=7)
+    states = feature_store.get_engagement_states(db, student_ids)
+    counts = [feature_store.engagement_counts(states.get(sid, {}), now) for sid in student_ids]
+
+    def field(name: str) -> np.ndarray:
+        return np.fromiter((c[name] for c in counts), dtype=np.float64, count=n)
+
+    total = field("total")
+    login_count = field("login_count")
+    course_views = field("course_views")
+    material_views = field("material_views")
+    video_count = field("video_count")
+    video_seconds = field("video_seconds")
+    test_starts = field("test_starts")
+    test_completes = field("test_completes")
+    submits = field("submits")
+    active_days = field("active_days")
+    recent_7d = field("recent_7d")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lms_activity_score = np.where(total > 0, np.minimum(100.0, login_count * 5.0 + course_views * 3.0 + total * 1.5), 75.0)
+        resource_score = np.where(material_views > 0, np.minimum(100.0, material_views * 10.0), 70.0)
+        content_completion_score = np.where(video_count > 0, np.minimum(100.0, video_seconds / 60.0 * 5.0), 80.0)
+        test_participation_score = np.where(test_starts > 0, test_completes / test_starts * 100.0, 85.0)
+        assignment_behaviour_score = np.where(submits > 0, np.minimum(100.0, submits * 20.0), 75.0)
+        consistency_score = np.where(active_days > 0, np.minimum(100.0, active_days / 30.0 * 100.0), 60.0)
+        prior_23d = total - recent_7d
+        expected_7d = np.where(prior_23d > 0, prior_23d / 23.0 * 7.0, 5.0)
+        trend_score = np.minimum(100.0, recent_7d / expected_7d * 75.0)
+
+    engagement_score = py_round(
+        lms_activity_score * 0.20 +
+        resource_score * 0.15 +
+        content_completion_score * 0.15 +
+        test_participation_score * 0.15 +
+        assignment_behaviour_score * 0.15 +
+        consistency_score * 0.10 +
+        trend_score * 0.10
+    , 1)
 
-    # Fetch 30-day activities
-    activities = db.query(models.StudentActivity).filter(
-        models.StudentActivity.student_id == student.enrollment_no,
-        models.StudentActivity.started_at >= thirty_days_ago
-    ).all()
+    # Inactivity hours from the latest activity the counters have seen
+    inactivity_hours = np.zeros(n, dtype=np.float64)
+    for i, sid in enumerate(student_ids):
+        last_active_at = states.get(sid, {}).get("last_active_at")
+        if last_active_at:
+            inactivity_hours[i] = round((now - datetime.fromisoformat(last_active_at)).total_seconds() / 3600.0, 1)
 
+    return {
+        "engagement_score": engagement_score,
+        "inactivity_hours": inactivity_hours
+    }
+
+def score_engagement_counts(
+    total: int,
+    login_count: int,
+    course_views: int,
+    material_views: int,
+    video_count: int,
+    video_seconds: float,
+    test_starts: int,
+    test_completes: int,
+    submits: int,
+    active_days: int,
+    recent_7d: int
+) -> Dict[str, float]:
+    """Component and overall engagement scores from 30-day activity counts."""
     # 1. LMS Activity Score (20%)
-    login_count = sum(1 for a in activities if a.activity_type in ["LOGIN", "LMS"])
-    course_views = sum(1 for a in activities if a.activity_type in ["COURSE_VIEW", "LECTURE_VIEW"])
-    lms_activity_score = min(100.0, (login_count * 5.0 + course_views * 3.0 + len(activities) * 1.5))
-    if not activities:
+    lms_activity_score = min(100.0, (login_count * 5.0 + course_views * 3.0 + total * 1.5))
+    if not total:
         lms_activity_score = 75.0 # default baseline for active students
 
     # 2. Learning Material Usage (15%)
-    material_views = sum(1 for a in activities if a.activity_type in ["MATERIAL_VIEW", "PDF_VIEW", "NOTE_ACCESS"])
     resource_score = min(100.0, material_views * 10.0 if material_views > 0 else 70.0)
 
     # 3. Content/Video Completion (15%)
-    video_views = [a for a in activities if a.activity_type == "VIDEO_WATCH"]
-    content_completion_score = min(100.0, sum(a.duration for a in video_views) / 60.0 * 5.0 if video_views else 80.0)
+    content_completion_score = min(100.0, video_seconds / 60.0 * 5.0 if video_count else 80.0)
 
     # 4. Test Participation (15%)
-    test_starts = sum(1 for a in activities if a.activity_type in ["TEST_START", "QUIZ_START"])
-    test_completes = sum(1 for a in activities if a.activity_type in ["TEST_COMPLETE", "QUIZ_COMPLETE"])
     test_participation_score = (test_completes / test_starts * 100.0) if test_starts > 0 else 85.0
 
     # 5. Assignment Behaviour (15%)
-    submits = sum(1 for a in activities if a.activity_type == "ASSIGNMENT_SUBMIT")
     assignment_behaviour_score = min(100.0, submits * 20.0 if submits > 0 else 75.0)
 
     # 6. Study Consistency (10%)
-    active_days_set = set(a.started_at.date() for a in activities if a.started_at)
-    consistency_score = min(100.0, (len(active_days_set) / 30.0 * 100.0) if len(active_days_set) > 0 else 60.0)
+    consistency_score = min(100.0, (active_days / 30.0 * 100.0) if active_days > 0 else 60.0)
 
     # 7. Activity Trend (10%)
-    recent_7d_count = sum(1 for a in activities if a.started_at and a.started_at >= seven_days_ago)
-    prior_23d_count = len(activities) - recent_7d_count
+    prior_23d_count = total - recent_7d
     expected_7d = (prior_23d_count / 23.0) * 7.0 if prior_23d_count > 0 else 5.0
-    trend_score = min(100.0, (recent_7d_count / expected_7d * 75.0) if expected_7d > 0 else 75.0)
+    trend_score = min(100.0, (recent_7d / expected_7d * 75.0) if expected_7d > 0 else 75.0)
 
     # Weighted Overall Score (0-100)
     overall_engagement = round(
@@ -114,6 +252,36 @@ def calculate_student_engagement(student_id: str, db: Session) -> dict:
         trend_score * 0.10
     , 1)
 
+    return {
+        "lms_activity_score": lms_activity_score,
+        "resource_score": resource_score,
+        "content_completion_score": content_completion_score,
+        "test_participation_score": test_participation_score,
+        "assignment_behaviour_score": assignment_behaviour_score,
+        "consistency_score": consistency_score,
+        "trend_score": trend_score,
+        "engagement_score": overall_engagement
+    }
+
+def calculate_student_engagement(student_id: StudentRef, db: Session) -> dict:
+    student = student_identity.resolve(db, student_id)
+    if not student:
+        return {"error": "Student not found"}
+
+    # Rolling per-day counters maintained on ingest; O(days in window) instead of a 30-day rescan
+    from . import feature_store
+    now = datetime.utcnow()
+    state = feature_store.get_engagement_state(db, student.enrollment_no)
+    components = score_engagement_counts(**feature_store.engagement_counts(state, now))
+    lms_activity_score = components["lms_activity_score"]
+    resource_score = components["resource_score"]
+    content_completion_score = components["content_completion_score"]
+    test_participation_score = components["test_participation_score"]
+    assignment_behaviour_score = components["assignment_behaviour_score"]
+    consistency_score = components["consistency_score"]
+    trend_score = components["trend_score"]
+    overall_engagement = components["engagement_score"]
+
     # Status mapping
     if overall_engagement >= 90:
         status = "HIGHLY_ENGAGED"
@@ -126,17 +294,13 @@ def calculate_student_engagement(student_id: str, db: Session) -> dict:
     else:
         status = "DISENGAGED"
 
-    # Inactivity hours calculation
-    latest_activity = db.query(models.StudentActivity).filter(
-        models.StudentActivity.student_id == student.enrollment_no
-    ).order_by(models.StudentActivity.started_at.desc()).first()
-
     inactivity_hours = 0.0
-    if latest_activity and latest_activity.started_at:
-        delta = datetime.utcnow() - latest_activity.started_at.replace(tzinfo=None)
+    if state.get("last_active_at"):
+        delta = now - datetime.fromisoformat(state["last_active_at"])
         inactivity_hours = round(delta.total_seconds() / 3600.0, 1)
 
-    # Trend status
+    # Trend status; the newest of these rows is also today's record when one exists
+    today = date.today()
     past_metrics = db.query(models.EngagementMetric).filter(
         models.EngagementMetric.student_id == student.enrollment_no
     ).order_by(models.EngagementMetric.date.desc()).limit(4).all()
@@ -159,11 +323,7 @@ def calculate_student_engagement(student_id: str, db: Session) -> dict:
             trend_status = "STABLE"
 
     # Update or insert EngagementMetric for today
-    today = date.today()
-    metric_record = db.query(models.EngagementMetric).filter(
-        models.EngagementMetric.student_id == student.enrollment_no,
-        models.EngagementMetric.date == today
-    ).first()
+    metric_record = past_metrics[0] if past_metrics and past_metrics[0].date == today else None
 
     if not metric_record:
         metric_record = models.EngagementMetric(
@@ -232,18 +392,16 @@ def calculate_student_engagement(student_id: str, db: Session) -> dict:
         } for al in recent_alerts]
     }
 
-def detect_behaviour_alerts(student_id: str, current_score: float, inactivity_hours: float, db: Session):
-    # 1. Inactivity Alert Check
+def inactivity_severity(inactivity_hours: float) -> Optional[str]:
     severity = None
-    if inactivity_hours >= 168:
-        severity = "CRITICAL"
-    elif inactivity_hours >= 72:
-        severity = "HIGH"
-    elif inactivity_hours >= 48:
-        severity = "WARNING"
-    elif inactivity_hours >= 24:
-        severity = "INFO"
+    for threshold in sorted(INACTIVITY_THRESHOLDS):
+        if inactivity_hours >= threshold:
+            severity = INACTIVITY_THRESHOLDS[threshold]
+    return severity
 
+def detect_behaviour_alerts(student_id: str, current_score: float, inactivity_hours: float, db: Session):
+    # 1. Inactivity Alert Check
+    severity = inactivity_severity(inactivity_hours)
     if severity:
         existing = db.query(models.EngagementAlert).filter(
             models.EngagementAlert.student_id == student_id,
@@ -286,3 +444,95 @@ def detect_behaviour_alerts(student_id: str, current_score: float, inactivity_ho
             db.add(alert)
 
     db.commit()
+
+def _inactivity_alert(student_id: str, severity: str, inactivity_hours: float, now: datetime) -> Dict[str, Any]:
+    return {
+        "id": models.generate_uuid(),
+        "student_id": student_id,
+        "alert_type": "PROLONGED_INACTIVITY",
+        "severity": severity,
+        "message": f"No academic activity detected for {inactivity_hours} hours.",
+        "current_value": inactivity_hours,
+        "reason": f"Inactivity crossed institutional threshold ({severity}).",
+        "is_read": False,
+        "created_at": now
+    }
+
+def sweep_inactivity(db: Session) -> Dict[str, Any]:
+    """
+    Set-based inactivity check for the whole cohort: one grouped query for each student's last
+    activity (only those past the lowest threshold) outer-joined to their open inactivity alerts,
+    vectorized tiering, then one bulk insert of the alerts that are not already open. Commits.
+    """
+    started = time.perf_counter()
+    now = datetime.utcnow()
+    bounds = np.array(sorted(INACTIVITY_THRESHOLDS), dtype=np.float64)
+    labels = [INACTIVITY_THRESHOLDS[b] for b in sorted(INACTIVITY_THRESHOLDS)]
+
+    last_active = func.max(models.StudentActivity.started_at)
+    last_seen = db.query(
+        models.StudentActivity.student_id.label("student_id"),
+        last_active.label("last_active_at")
+    ).group_by(models.StudentActivity.student_id).having(
+        last_active <= now - timedelta(hours=float(bounds[0]))
+    ).subquery()
+    rows = db.query(last_seen.c.student_id, last_seen.c.last_active_at, models.EngagementAlert.severity).outerjoin(
+        models.EngagementAlert, and_(
+            models.EngagementAlert.student_id == last_seen.c.student_id,
+            models.EngagementAlert.alert_type == "PROLONGED_INACTIVITY",
+            models.EngagementAlert.is_read == False
+        )
+    ).all()
+    query_ms = (time.perf_counter() - started) * 1000.0
+
+    last_by_student: Dict[str, datetime] = {}
+    open_alerts = set()
+    for student_id, last_active_at, severity in rows:
+        last_by_student[student_id] = _naive_utc(last_active_at)
+        if severity:
+            open_alerts.add((student_id, severity))
+
+    tier_started = time.perf_counter()
+    student_ids = list(last_by_student)
+    hours = np.round(np.fromiter(
+        ((now - last_by_student[sid]).total_seconds() / 3600.0 for sid in student_ids),
+        dtype=np.float64, count=len(student_ids)
+    ), 1)
+    tiers = np.searchsorted(bounds, hours, side="right") - 1
+    alerts = []
+    by_severity = {label: 0 for label in labels}
+    for sid, tier, inactivity_hours in zip(student_ids, tiers.tolist(), hours.tolist()):
+        if tier < 0:
+            continue
+        severity = labels[tier]
+        by_severity[severity] += 1
+        if (sid, severity) not in open_alerts:
+            alerts.append(_inactivity_alert(sid, severity, inactivity_hours, now))
+    tier_ms = (time.perf_counter() - tier_started) * 1000.0
+
+    insert_started = time.perf_counter()
+    for start in range(0, len(alerts), ACTIVITY_WRITE_BATCH):
+        db.bulk_insert_mappings(models.EngagementAlert, alerts[start:start + ACTIVITY_WRITE_BATCH])
+    db.commit()
+    insert_ms = (time.perf_counter() - insert_started) * 1000.0
+
+    result = {
+        "swept_at": now.isoformat(),
+        "inactive_students": int((tiers >= 0).sum()),
+        "by_severity": by_severity,
+        "alerts_created": len(alerts),
+        "already_open": int((tiers >= 0).sum()) - len(alerts),
+        "timings_ms": {
+            "query": round(query_ms, 1),
+            "tiering": round(tier_ms, 1),
+            "insert": round(insert_ms, 1),
+            "total": round((time.perf_counter() - started) * 1000.0, 1)
+        }
+    }
+    print(f"[Engagement] Inactivity sweep: {result['inactive_students']} inactive, "
+          f"{len(alerts)} new alerts in {result['timings_ms']['total']} ms")
+    return result
+
+def inactivity_sweep_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """job_queue handler for "engagement.inactivity_sweep"."""
+    return sweep_inactivity(db)
@@ -4,7 +4,7 @@ from typing import Dict, Any, Optional
 import json
 
 from .. import models
-from . import risk_explanation_engine, feature_engine, engagement_engine, concept_engine
+from . import risk_explanation_engine, feature_engine, feature_store, engagement_engine, concept_engine
 
 def dispatch_system_event(
     event_type: str,
@@ -17,7 +17,8 @@ def dispatch_system_event(
 
     # Pipeline Processing
     if event_type in ["MARKS_UPDATED", "ATTENDANCE_UPDATED", "TEST_COMPLETED"]:
-        # Recalculate features & risk
+        # Refresh the affected feature family, then recalculate risk
+        feature_store.refresh(db, [student_id], ["attendance"] if event_type == "ATTENDANCE_UPDATED" else ["academic"])
         risk_res = risk_explanation_engine.evaluate_and_explain_risk(student_id, db)
         
         # Log Audit Action
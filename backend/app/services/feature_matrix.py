@@ -0,0 +1,81 @@
+import math
+from typing import Dict, Any, Sequence, Union
+
+import numpy as np
+
+Columns = Dict[str, np.ndarray]
+
+
+def to_columns(features: Any) -> Columns:
+    """
+    Normalise a batch of student features into {name: 1-D array}. Accepts a pandas
+    DataFrame, a dict of equal-length arrays/lists, or a list of per-student dicts
+    (missing keys become NaN so engines fall back to their defaults).
+    """
+    if features is None:
+        return {}
+    if hasattr(features, "columns") and hasattr(features, "to_numpy"):
+        return {str(c): features[c].to_numpy() for c in features.columns}
+    if isinstance(features, dict):
+        return {k: np.asarray(v) for k, v in features.items() if np.ndim(v) == 1}
+    rows = list(features)
+    keys = {k for row in rows for k in row}
+    return {k: np.array([row.get(k, np.nan) for row in rows], dtype=object) for k in keys}
+
+
+def row_count(cols: Columns) -> int:
+    for values in cols.values():
+        return len(values)
+    return 0
+
+
+def column(cols: Columns, n: int, names: Union[str, Sequence[str]], default: Union[float, np.ndarray]) -> np.ndarray:
+    """
+    Float column resolved like features.get(a, features.get(b, default)): the first
+    name present wins per row, missing/None/NaN entries fall through to the next.
+    """
+    if isinstance(names, str):
+        names = [names]
+    out = np.full(n, np.nan)
+    for name in names:
+        if name in cols:
+            values = np.array([np.nan if v is None else v for v in cols[name]], dtype=np.float64) \
+                if cols[name].dtype == object else cols[name].astype(np.float64)
+            out = np.where(np.isnan(out), values, out)
+    return np.where(np.isnan(out), default, out)
+
+
+def text_column(cols: Columns, n: int, name: str, default: str = "") -> np.ndarray:
+    if name not in cols:
+        return np.full(n, default, dtype=object)
+    return np.array([default if v is None or (isinstance(v, float) and np.isnan(v)) else str(v) for v in cols[name]], dtype=object)
+
+
+def tiers(values: np.ndarray, thresholds: Sequence[float], labels: Sequence[str]) -> np.ndarray:
+    """Label each value by the ascending >= thresholds it reaches; labels has len(thresholds) + 1 entries."""
+    return np.array(labels, dtype=object)[np.searchsorted(np.asarray(thresholds, dtype=np.float64), values, side="right")]
+
+
+
+def py_round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """
+    Python's round() per element, so batch results equal the scalar engines'. np.round scales by
+    10**ndigits first and can land on the other side of a .x5 boundary.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    flat = np.fromiter((round(v, ndigits) for v in values.ravel().tolist()), dtype=np.float64, count=values.size)
+    return flat.reshape(values.shape)
+
+
+def py_exp(values: np.ndarray) -> np.ndarray:
+    """math.exp per element; np.exp may differ from libm in the last bit."""
+    values = np.asarray(values, dtype=np.float64)
+    return np.fromiter((math.exp(v) for v in values.tolist()), dtype=np.float64, count=values.size)
+
+
+def sum_in_order(columns: Sequence[np.ndarray]) -> np.ndarray:
+    """Left-to-right sum of equal-length columns, the order the scalar engines add their terms in."""
+    total = np.zeros(len(columns[0])) if columns else np.zeros(0)
+    for values in columns:
+        total = total + values
+    return total
@@ -0,0 +1,643 @@
+from sqlalchemy.orm import Session, aliased
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy import func, case, exists, update
+from sqlalchemy.exc import SQLAlchemyError, IntegrityError
+from datetime import datetime, date, timedelta
+from typing import Dict, Any, List, Optional, Iterable
+import json
+
+import numpy as np
+
+from .. import models
+from ..database import SessionLocal
+from . import engagement_engine
+
+FAMILIES = ("academic", "attendance", "engagement")
+WINDOW_DAYS = 30
+RECENT_DAYS = 7
+HISTORY_RETENTION_DAYS = 90
+CHUNK_SIZE = 500
+# Compare-and-set passes for an engagement batch before giving up on a contended student
+MAX_WRITE_ATTEMPTS = 5
+
+# StudentActivity.activity_type -> engagement bucket counter
+ACTIVITY_COUNTERS = {
+    "LOGIN": "login", "LMS": "login",
+    "COURSE_VIEW": "course", "LECTURE_VIEW": "course",
+    "MATERIAL_VIEW": "material", "PDF_VIEW": "material", "NOTE_ACCESS": "material",
+    "VIDEO_WATCH": "video",
+    "TEST_START": "test_start", "QUIZ_START": "test_start",
+    "TEST_COMPLETE": "test_complete", "QUIZ_COMPLETE": "test_complete",
+    "ASSIGNMENT_SUBMIT": "submit",
+}
+
+
+def _naive(ts: Optional[datetime]) -> Optional[datetime]:
+    return engagement_engine._naive_utc(ts)
+
+
+def _window_start(today: date, days: int) -> str:
+    return (today - timedelta(days=days)).isoformat()
+
+
+def _prune_days(days: Dict[str, Any], today: date) -> Dict[str, Any]:
+    cutoff = _window_start(today, WINDOW_DAYS)
+    return {d: v for d, v in days.items() if d >= cutoff}
+
+
+# ─── Derivation: state (running aggregates) -> feature values ────────────────
+
+def _derive_academic(state: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    current_avg_marks = state.get("avg_overall") if state.get("metrics_count") else 70.0
+    assessment_avg = state.get("avg_assessment") if state.get("metrics_count") else 75.0
+    seven_days_ago = (now - timedelta(days=RECENT_DAYS)).isoformat()
+    thirty_days_ago = (now - timedelta(days=WINDOW_DAYS)).isoformat()
+    points = [p for p in state.get("trend", []) if p[0] >= thirty_days_ago]
+
+    marks_change_30d = 0.0
+    marks_change_7d = 0.0
+    if points:
+        marks_change_30d = round(current_avg_marks - points[0][1], 1)
+        recent_7d = [p for p in points if p[0] >= seven_days_ago]
+        if recent_7d:
+            marks_change_7d = round(current_avg_marks - recent_7d[0][1], 1)
+    return {
+        "current_average_marks": current_avg_marks,
+        "assessment_average": assessment_avg,
+        "marks_change_7d": marks_change_7d,
+        "marks_change_30d": marks_change_30d,
+        "academic_records": state.get("metrics_count", 0)
+    }
+
+
+def _derive_attendance(state: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    today = now.date()
+    days = state.get("days", {})
+    cutoff_30d = _window_start(today, WINDOW_DAYS)
+    cutoff_7d = _window_start(today, RECENT_DAYS)
+    conducted_30d = sum(v[0] for d, v in days.items() if d >= cutoff_30d)
+    absent_30d = sum(v[1] for d, v in days.items() if d >= cutoff_30d)
+    conducted_7d = sum(v[0] for d, v in days.items() if d >= cutoff_7d)
+    absent_7d = sum(v[1] for d, v in days.items() if d >= cutoff_7d)
+    return {
+        "absence_frequency": round((absent_30d / conducted_30d * 100.0) if conducted_30d > 0 else 0.0, 1),
+        "absence_frequency_7d": round((absent_7d / conducted_7d * 100.0) if conducted_7d > 0 else 0.0, 1),
+        "sessions_30d": conducted_30d
+    }
+
+
+def engagement_counts(state: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    """
+    Keyword arguments for engagement_engine.score_engagement_counts from the daily buckets.
+    Windows are whole days, so the oldest day counts in full rather than from the same time of day.
+    """
+    today = now.date()
+    cutoff_30d = _window_start(today, WINDOW_DAYS)
+    cutoff_7d = _window_start(today, RECENT_DAYS)
+    buckets = [(d, v) for d, v in state.get("days", {}).items() if d >= cutoff_30d]
+
+    def total(key: str, since: str = cutoff_30d) -> float:
+        return sum(v.get(key, 0) for d, v in buckets if d >= since)
+
+    return {
+        "total": int(total("n")),
+        "login_count": total("login"),
+        "course_views": total("course"),
+        "material_views": total("material"),
+        "video_count": total("video"),
+        "video_seconds": total("video_sec"),
+        "test_starts": int(total("test_start")),
+        "test_completes": int(total("test_complete")),
+        "submits": total("submit"),
+        "active_days": sum(1 for _, v in buckets if v.get("n")),
+        "recent_7d": int(total("n", cutoff_7d))
+    }
+
+
+def _derive_engagement(state: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+    today = now.date()
+    cutoff_30d = _window_start(today, WINDOW_DAYS)
+    cutoff_7d = _window_start(today, RECENT_DAYS)
+    counts = engagement_counts(state, now)
+    activity_30d = counts["total"]
+    activity_7d = counts["recent_7d"]
+    test_starts = counts["test_starts"]
+    test_completes = counts["test_completes"]
+    engagement_score = engagement_engine.score_engagement_counts(**counts)["engagement_score"]
+
+    scores = sorted((d, v) for d, v in state.get("scores", {}).items() if d >= cutoff_30d)
+    eng_change_30d = 0.0
+    eng_change_7d = 0.0
+    if scores:
+        eng_change_30d = round(engagement_score - scores[0][1], 1)
+        rec_7d = [v for d, v in scores if d >= cutoff_7d]
+        if rec_7d:
+            eng_change_7d = round(engagement_score - rec_7d[0], 1)
+
+    inactive_days = 0.0
+    if state.get("last_active_at"):
+        delta = now - datetime.fromisoformat(state["last_active_at"])
+        inactive_days = round(delta.total_seconds() / 86400.0, 1)
+
+    return {
+        "engagement_score": engagement_score,
+        "engagement_change_7d": eng_change_7d,
+        "engagement_change_30d": eng_change_30d,
+        "inactive_days": inactive_days,
+        "missed_tests": max(0, test_starts - test_completes),
+        "assignment_submits_30d": int(counts["submits"]),
+        "activity_count_7d": activity_7d,
+        "activity_count_30d": activity_30d
+    }
+
+
+DERIVERS = {
+    "academic": _derive_academic,
+    "attendance": _derive_attendance,
+    "engagement": _derive_engagement,
+}
+
+
+# ─── Source scans (set-based, used for backfill and family refresh) ──────────
+
+def _chunks(ids: List[str]) -> Iterable[List[str]]:
+    for start in range(0, len(ids), CHUNK_SIZE):
+        yield ids[start:start + CHUNK_SIZE]
+
+
+def _scan_academic(db: Session, ids: List[str], now: datetime) -> Dict[str, Dict[str, Any]]:
+    states = {sid: {"metrics_count": 0, "avg_overall": None, "avg_assessment": None, "trend": []} for sid in ids}
+    thirty_days_ago = now - timedelta(days=WINDOW_DAYS)
+    for chunk in _chunks(ids):
+        for sid, cnt, avg_overall, avg_assessment in db.query(
+            models.AcademicMetric.student_id,
+            func.count(models.AcademicMetric.id),
+            func.avg(models.AcademicMetric.overall_score),
+            func.avg(models.AcademicMetric.assessment_score)
+        ).filter(models.AcademicMetric.student_id.in_(chunk)).group_by(models.AcademicMetric.student_id).all():
+            states[sid].update(metrics_count=cnt, avg_overall=float(avg_overall or 0.0), avg_assessment=float(avg_assessment or 0.0))
+        for sid, score, recorded_at in db.query(
+            models.AcademicTrend.student_id,
+            models.AcademicTrend.overall_score,
+            models.AcademicTrend.recorded_at
+        ).filter(
+            models.AcademicTrend.student_id.in_(chunk),
+            models.AcademicTrend.subject_id == None,
+            models.AcademicTrend.recorded_at >= thirty_days_ago
+        ).order_by(models.AcademicTrend.recorded_at.asc()).all():
+            states[sid]["trend"].append([_naive(recorded_at).isoformat(), score])
+    return states
+
+
+def _scan_attendance(db: Session, ids: List[str], now: datetime) -> Dict[str, Dict[str, Any]]:
+    states = {sid: {"days": {}} for sid in ids}
+    since = now.date() - timedelta(days=WINDOW_DAYS)
+    for chunk in _chunks(ids):
+        for sid, day, conducted, absent in db.query(
+            models.AttendanceLog.enrollment_no,
+            models.AttendanceLog.date,
+            func.count(models.AttendanceLog.id),
+            func.sum(case((models.AttendanceLog.status == models.AttendanceStatus.absent, 1), else_=0))
+        ).filter(
+            models.AttendanceLog.enrollment_no.in_(chunk),
+            models.AttendanceLog.date >= since
+        ).group_by(models.AttendanceLog.enrollment_no, models.AttendanceLog.date).all():
+            states[sid]["days"][day.isoformat()] = [int(conducted), int(absent or 0)]
+    return states
+
+
+def _add_activity(state: Dict[str, Any], activity_type: str, started_at: datetime, duration: float):
+    bucket = state["days"].setdefault(started_at.date().isoformat(), {"n": 0})
+    bucket["n"] += 1
+    counter = ACTIVITY_COUNTERS.get(activity_type)
+    if counter:
+        bucket[counter] = bucket.get(counter, 0) + 1
+        if counter == "video":
+            bucket["video_sec"] = bucket.get("video_sec", 0) + (duration or 0)
+
+
+def _scan_engagement(db: Session, ids: List[str], now: datetime) -> Dict[str, Dict[str, Any]]:
+    states = {sid: {"days": {}, "scores": {}, "last_active_at": None} for sid in ids}
+    thirty_days_ago = now - timedelta(days=WINDOW_DAYS)
+    for chunk in _chunks(ids):
+        for sid, activity_type, started_at, duration in db.query(
+            models.StudentActivity.student_id,
+            models.StudentActivity.activity_type,
+            models.StudentActivity.started_at,
+            models.StudentActivity.duration
+        ).filter(
+            models.StudentActivity.student_id.in_(chunk),
+            models.StudentActivity.started_at >= thirty_days_ago
+        ).all():
+            if started_at is not None:
+                _add_activity(states[sid], activity_type, _naive(started_at), duration)
+        for sid, latest in db.query(
+            models.StudentActivity.student_id,
+            func.max(models.StudentActivity.started_at)
+        ).filter(models.StudentActivity.student_id.in_(chunk)).group_by(models.StudentActivity.student_id).all():
+            if latest is not None:
+                states[sid]["last_active_at"] = _naive(latest).isoformat()
+        for sid, day, score in db.query(
+            models.EngagementMetric.student_id,
+            models.EngagementMetric.date,
+            models.EngagementMetric.engagement_score
+        ).filter(
+            models.EngagementMetric.student_id.in_(chunk),
+            models.EngagementMetric.date >= thirty_days_ago.date()
+        ).all():
+            states[sid]["scores"][day.isoformat()] = score
+    return states
+
+
+SCANNERS = {
+    "academic": _scan_academic,
+    "attendance": _scan_attendance,
+    "engagement": _scan_engagement,
+}
+
+
+# ─── Writes ──────────────────────────────────────────────────────────────────
+
+def _load_rows(db: Session, ids: List[str], families: Iterable[str], fresh: bool = False) -> Dict[tuple, models.StudentFeatureStore]:
+    rows = {}
+    for chunk in _chunks(ids):
+        query = db.query(models.StudentFeatureStore)
+        if fresh:
+            # Reload rows this session already holds; a concurrent writer may have moved them
+            query = query.populate_existing()
+        for row in query.filter(
+            models.StudentFeatureStore.student_id.in_(chunk),
+            models.StudentFeatureStore.family.in_(list(families))
+        ).all():
+            rows[(row.student_id, row.family)] = row
+    return rows
+
+
+def _history_rows(student_id: str, old_values: Dict[str, Any], new_values: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+    history = []
+    for name, value in new_values.items():
+        if isinstance(value, (int, float)) and old_values.get(name) != value:
+            history.append({
+                "id": models.generate_uuid(),
+                "student_id": student_id,
+                "feature_name": name,
+                "feature_value": float(value),
+                "recorded_at": now
+            })
+    return history
+
+
+def _write(db: Session, rows: Dict[tuple, models.StudentFeatureStore], student_id: str, family: str, state: Dict[str, Any], now: datetime) -> List[Dict[str, Any]]:
+    values = DERIVERS[family](state, now)
+    row = rows.get((student_id, family))
+    if row is None:
+        row = models.StudentFeatureStore(student_id=student_id, family=family)
+        db.add(row)
+        rows[(student_id, family)] = row
+        old_values = {}
+    else:
+        old_values = json.loads(row.values_json) if row.values_json else {}
+    row.state_json = json.dumps(state)
+    row.values_json = json.dumps(values)
+    row.version = (row.version or 0) + 1
+    row.updated_at = now
+    return _history_rows(student_id, old_values, values, now)
+
+
+def refresh(db: Session, student_ids: Iterable[str], families: Iterable[str] = FAMILIES) -> int:
+    """
+    Rebuild the given families for the given students from source tables, a few grouped
+    queries per chunk. History rows are appended only for values that changed. Does not commit.
+    """
+    ids = list({sid for sid in student_ids if sid})
+    families = [f for f in families if f in SCANNERS]
+    if not ids or not families:
+        return 0
+    # Only known students get rows; event payloads may carry unresolved identifiers
+    ids = [sid for chunk in _chunks(ids) for (sid,) in db.query(models.Student.enrollment_no).filter(
+        models.Student.enrollment_no.in_(chunk)
+    ).all()]
+    now = datetime.utcnow()
+    rows = _load_rows(db, ids, families)
+    history = []
+    for family in families:
+        for sid, state in SCANNERS[family](db, ids, now).items():
+            history.extend(_write(db, rows, sid, family, state, now))
+    if history:
+        db.bulk_insert_mappings(models.RiskFeature, history)
+    return len(ids)
+
+
+def record_activity(db: Session, activity: models.StudentActivity):
+    """Incremental update of the engagement family for one new activity event. Does not commit."""
+    record_activities(db, [{
+        "student_id": activity.student_id,
+        "activity_type": activity.activity_type,
+        "started_at": activity.started_at,
+        "duration": activity.duration
+    }])
+
+
+def _apply_activities(db: Session, rows: Dict[tuple, models.StudentFeatureStore], by_student: Dict[str, List[Dict[str, Any]]], now: datetime) -> List[str]:
+    """
+    Add each student's events to the engagement state read in rows and write it back only where
+    the row's version is still the one read. Returns the students whose row moved underneath.
+    """
+    table = models.StudentFeatureStore.__table__
+    window_start = now - timedelta(days=WINDOW_DAYS)
+    history, conflicts = [], []
+    for sid, events in by_student.items():
+        row = rows.get((sid, "engagement"))
+        if row is None:
+            continue
+        state = json.loads(row.state_json) if row.state_json else {"days": {}, "scores": {}, "last_active_at": None}
+        for activity in events:
+            started_at = _naive(activity["started_at"]) or now
+            if started_at >= window_start:
+                _add_activity(state, str(activity["activity_type"]), started_at, activity.get("duration"))
+            if not state.get("last_active_at") or started_at.isoformat() > state["last_active_at"]:
+                state["last_active_at"] = started_at.isoformat()
+        state["days"] = _prune_days(state["days"], now.date())
+        state["scores"] = _prune_days(state.get("scores", {}), now.date())
+        state["scores"][now.date().isoformat()] = _derive_engagement(state, now)["engagement_score"]
+
+        values = _derive_engagement(state, now)
+        written = {"state_json": json.dumps(state), "values_json": json.dumps(values), "version": (row.version or 0) + 1, "updated_at": now}
+        if not db.execute(update(table).where(
+            table.c.student_id == sid,
+            table.c.family == "engagement",
+            table.c.version == (row.version or 0)
+        ).values(written)).rowcount:
+            conflicts.append(sid)
+            continue
+        old_values = json.loads(row.values_json) if row.values_json else {}
+        for name, value in written.items():
+            set_committed_value(row, name, value)
+        history.extend(_history_rows(sid, old_values, values, now))
+    if history:
+        db.bulk_insert_mappings(models.RiskFeature, history)
+    return conflicts
+
+
+def record_activities(db: Session, activities: List[Dict[str, Any]]):
+    """
+    Incremental engagement update for a batch of new activity rows (student_id, activity_type,
+    started_at, duration): one row load for all students, one compare-and-set write per student.
+    A student whose row another batch wrote in between is reloaded and replayed. Does not commit.
+    """
+    by_student: Dict[str, List[Dict[str, Any]]] = {}
+    for activity in activities:
+        by_student.setdefault(activity["student_id"], []).append(activity)
+    if not by_student:
+        return
+    rows = _load_rows(db, list(by_student), ["engagement"], fresh=True)
+    missing = [sid for sid in by_student if (sid, "engagement") not in rows]
+    if missing:
+        # No running aggregate yet: backfill from source, which already sees the new events
+        db.flush()
+        refresh(db, missing, ["engagement"])
+
+    pending = {sid: events for sid, events in by_student.items() if sid not in missing}
+    for attempt in range(MAX_WRITE_ATTEMPTS):
+        if attempt:
+            rows = _load_rows(db, list(pending), ["engagement"], fresh=True)
+        conflicts = _apply_activities(db, rows, pending, datetime.utcnow())
+        if not conflicts:
+            return
+        pending = {sid: pending[sid] for sid in conflicts}
+    raise RuntimeError(f"Engagement features for {len(pending)} students conflicted with concurrent updates {MAX_WRITE_ATTEMPTS} times")
+
+
+def invalidate(db: Session, student_ids: Optional[Iterable[str]] = None, families: Optional[Iterable[str]] = None):
+    """Drop stored families so the next read rebuilds them from source. Does not commit."""
+    query = db.query(models.StudentFeatureStore)
+    if families is not None:
+        query = query.filter(models.StudentFeatureStore.family.in_(list(families)))
+    if student_ids is None:
+        query.delete(synchronize_session=False)
+        return
+    ids = list({sid for sid in student_ids if sid})
+    for chunk in _chunks(ids):
+        query.filter(models.StudentFeatureStore.student_id.in_(chunk)).delete(synchronize_session=False)
+
+
+def _comparable_days(days: Dict[str, Any], today: date) -> Dict[str, Dict[str, float]]:
+    # The oldest day is cut at the time of the rescan, so only whole days inside the window are compared
+    cutoff = _window_start(today, WINDOW_DAYS)
+    return {
+        d: {k: round(v, 3) for k, v in bucket.items() if v}
+        for d, bucket in days.items() if d > cutoff
+    }
+
+
+def reconcile_engagement(db: Session, student_ids: Optional[Iterable[str]] = None, repair: bool = True, progress=None) -> Dict[str, Any]:
+    """
+    Rebuild the engagement counters from raw StudentActivity and compare them with the
+    incrementally maintained ones. With repair, drifted or missing states are replaced by the
+    rebuild (recorded trend points are kept). Commits per chunk.
+    """
+    if student_ids is None:
+        ids = [sid for (sid,) in db.query(models.Student.enrollment_no).order_by(models.Student.enrollment_no).all()]
+    else:
+        wanted = list({sid for sid in student_ids if sid})
+        ids = [sid for chunk in _chunks(wanted) for (sid,) in db.query(models.Student.enrollment_no).filter(
+            models.Student.enrollment_no.in_(chunk)
+        ).all()]
+    now = datetime.utcnow()
+    today = now.date()
+    result = {"checked": 0, "missing": 0, "drifted": 0, "repaired": 0, "samples": []}
+    done = 0
+    for chunk in _chunks(ids):
+        rows = _load_rows(db, chunk, ["engagement"])
+        history = []
+        for sid, rebuilt in _scan_engagement(db, chunk, now).items():
+            result["checked"] += 1
+            row = rows.get((sid, "engagement"))
+            stored = json.loads(row.state_json) if row is not None and row.state_json else None
+            if stored is None:
+                result["missing"] += 1
+            else:
+                stored_days = _comparable_days(stored.get("days", {}), today)
+                rebuilt_days = _comparable_days(rebuilt["days"], today)
+                days = sorted(d for d in set(stored_days) | set(rebuilt_days) if stored_days.get(d) != rebuilt_days.get(d))
+                if not days and stored.get("last_active_at") == rebuilt["last_active_at"]:
+                    continue
+                result["drifted"] += 1
+                if len(result["samples"]) < 20:
+                    result["samples"].append({
+                        "student_id": sid,
+                        "days": days,
+                        "stored_last_active_at": stored.get("last_active_at"),
+                        "rebuilt_last_active_at": rebuilt["last_active_at"]
+                    })
+            if repair:
+                if stored is not None:
+                    rebuilt["scores"] = _prune_days({**rebuilt["scores"], **stored.get("scores", {})}, today)
+                history.extend(_write(db, rows, sid, "engagement", rebuilt, now))
+                result["repaired"] += 1
+        if history:
+            db.bulk_insert_mappings(models.RiskFeature, history)
+        if repair:
+            db.commit()
+        done += len(chunk)
+        if progress:
+            progress(done, len(ids))
+    return result
+
+
+def reconcile_engagement_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """job_queue handler for "engagement.reconcile"."""
+    return reconcile_engagement(
+        db,
+        student_ids=payload.get("student_ids"),
+        repair=bool(payload.get("repair", True)),
+        progress=lambda done, total: ctx.progress(processed=done, total=total)
+    )
+
+
+# ─── Reads ───────────────────────────────────────────────────────────────────
+
+def _assignment_count(db: Session) -> int:
+    return db.query(func.count(models.Assignment.id)).scalar() or 0
+
+
+def _combine(student: models.Student, family_values: Dict[str, Dict[str, Any]], assigned: int) -> Dict[str, Any]:
+    academic = family_values["academic"]
+    attendance = family_values["attendance"]
+    engagement = family_values["engagement"]
+    submits = engagement["assignment_submits_30d"]
+    return {
+        "student_id": student.enrollment_no,
+        "current_average_marks": academic["current_average_marks"],
+        "marks_change_7d": academic["marks_change_7d"],
+        "marks_change_30d": academic["marks_change_30d"],
+        "assessment_average": academic["assessment_average"],
+        "cgpa": student.cgpa if student.cgpa else 0.0,
+        "backlog_count": student.active_backlogs if student.active_backlogs else 0,
+        "attendance_percentage": float(student.attendance) if student.attendance else 75.0,
+        "absence_frequency": attendance["absence_frequency"],
+        "absence_frequency_7d": attendance["absence_frequency_7d"],
+        "engagement_score": engagement["engagement_score"],
+        "engagement_change_7d": engagement["engagement_change_7d"],
+        "engagement_change_30d": engagement["engagement_change_30d"],
+        "inactive_days": engagement["inactive_days"],
+        "activity_count_7d": engagement["activity_count_7d"],
+        "activity_count_30d": engagement["activity_count_30d"],
+        "missed_tests": engagement["missed_tests"],
+        "missed_assignments": max(0, min(10, assigned - submits)) if assigned > 0 else 0,
+        "has_sufficient_data": bool(academic["academic_records"] or attendance["sessions_30d"] or engagement["activity_count_30d"])
+    }
+
+
+def _backfill(missing: Dict[str, List[str]]):
+    """Build missing families in a session of their own, so a read never commits its caller's transaction."""
+    db = SessionLocal()
+    try:
+        for family, family_ids in missing.items():
+            refresh(db, family_ids, [family])
+        db.commit()
+    except IntegrityError:
+        # A concurrent read backfilled the same rows first
+        db.rollback()
+    except SQLAlchemyError as e:
+        db.rollback()
+        print(f"Feature store backfill failed: {e}")
+    finally:
+        db.close()
+
+
+def get_cohort_features(db: Session, students: List[models.Student]) -> Dict[str, Dict[str, Any]]:
+    """
+    Feature vectors for many students from their stored rows. Families that were never
+    built (or were invalidated) are backfilled from source in a separate session; the
+    caller's session is only read.
+    """
+    ids = [s.enrollment_no for s in students]
+    rows = _load_rows(db, ids, FAMILIES)
+    missing: Dict[str, List[str]] = {}
+    for sid in ids:
+        for family in FAMILIES:
+            if (sid, family) not in rows:
+                missing.setdefault(family, []).append(sid)
+    if missing:
+        _backfill(missing)
+        rows = _load_rows(db, ids, FAMILIES)
+
+    now = datetime.utcnow()
+    states = {key: json.loads(row.state_json) if row.state_json else {} for key, row in rows.items()}
+    for family, family_ids in missing.items():
+        # Rows the backfill could not persist (or this session cannot see yet) are scanned, not stored
+        unbuilt = [sid for sid in family_ids if (sid, family) not in states]
+        if unbuilt:
+            for sid, state in SCANNERS[family](db, unbuilt, now).items():
+                states[(sid, family)] = state
+
+    assigned = _assignment_count(db)
+    result = {}
+    for student in students:
+        family_values = {}
+        for family in FAMILIES:
+            # Windows are re-evaluated against the current time; O(days in window)
+            family_values[family] = DERIVERS[family](states.get((student.enrollment_no, family), {}), now)
+        result[student.enrollment_no] = _combine(student, family_values, assigned)
+    return result
+
+
+def get_engagement_states(db: Session, student_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+    """
+    Running engagement counters (daily buckets, trend points, last activity) for many students
+    from one row load. Rows never built are backfilled from source first. Does not commit.
+    """
+    ids = list(dict.fromkeys(sid for sid in student_ids if sid))
+    rows = _load_rows(db, ids, ["engagement"])
+    missing = [sid for sid in ids if (sid, "engagement") not in rows]
+    if missing:
+        refresh(db, missing, ["engagement"])
+        db.flush()
+        rows = _load_rows(db, ids, ["engagement"])
+    states = {}
+    for sid in ids:
+        row = rows.get((sid, "engagement"))
+        states[sid] = json.loads(row.state_json) if row is not None and row.state_json else {"days": {}, "scores": {}, "last_active_at": None}
+    return states
+
+
+def get_engagement_state(db: Session, student_id: str) -> Dict[str, Any]:
+    """One student's engagement counters; the same read the cohort path makes. Does not commit."""
+    return get_engagement_states(db, [student_id])[student_id]
+
+
+def get_student_features(db: Session, student: models.Student) -> Dict[str, Any]:
+    return get_cohort_features(db, [student])[student.enrollment_no]
+
+
+
+def get_cohort_feature_matrix(db: Session, students: List[models.Student]) -> Dict[str, np.ndarray]:
+    """Cohort features as {name: array} aligned with students, the input format of the engines' batch APIs."""
+    vectors = get_cohort_features(db, students)
+    rows = [vectors[s.enrollment_no] for s in students]
+    if not rows:
+        return {}
+    return {
+        key: np.array([row[key] for row in rows], dtype=object if key == "student_id" else np.float64)
+        for key in rows[0]
+    }
+
+def compact_history(db: Session, retention_days: int = HISTORY_RETENTION_DAYS) -> int:
+    """
+    Delete RiskFeature history older than the retention window, always keeping the most
+    recent value of each (student, feature). Commits.
+    """
+    cutoff = datetime.utcnow() - timedelta(days=retention_days)
+    newer = aliased(models.RiskFeature)
+    superseded = exists().where(
+        newer.student_id == models.RiskFeature.student_id,
+        newer.feature_name == models.RiskFeature.feature_name,
+        newer.recorded_at > models.RiskFeature.recorded_at
+    )
+    deleted = db.query(models.RiskFeature).filter(
+        models.RiskFeature.recorded_at < cutoff,
+        superseded
+    ).delete(synchronize_session=False)
+    db.commit()
+    return deleted
@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any, List
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column
+
 class IsolationForestAnomalyEngine:
     """
     Model 5 of 13: Behavioral Anomaly Detection Engine (Isolation Forest)
@@ -88,3 +92,45 @@ class IsolationForestAnomalyEngine:
                 "expected_time_min": expected_time
             }
         }
+
+    def detect_anomalies_batch(self, test_attempts: Any) -> Dict[str, Any]:
+        """
+        Vectorized detect_anomalies over N attempts (columns score, previous_average,
+        time_taken_min, expected_time_min). Returns per-attempt flags and scores.
+        """
+        cols = to_columns(test_attempts)
+        n = row_count(cols)
+        score = column(cols, n, "score", 70.0)
+        prev_avg = column(cols, n, "previous_average", 75.0)
+        time_taken = column(cols, n, "time_taken_min", 15.0)
+        expected_time = column(cols, n, "expected_time_min", 20.0)
+
+        score_drop = prev_avg - score
+        time_ratio = time_taken / np.where(expected_time > 0, expected_time, 20.0)
+
+        sudden_drop = score_drop >= 25.0
+        rapid_completion = (time_ratio <= 0.20) & (score < 80.0)
+        excessive_duration = ~rapid_completion & (time_ratio >= 3.0)
+
+        anomaly_score = np.where(sudden_drop, -0.78, 0.65)
+        anomaly_score = np.where(rapid_completion, np.minimum(anomaly_score, -0.85), anomaly_score)
+        anomaly_score = np.where(excessive_duration, np.minimum(anomaly_score, -0.45), anomaly_score)
+
+        severity = np.select(
+            [rapid_completion | (sudden_drop & (score_drop >= 40.0)), sudden_drop],
+            ["CRITICAL", "WARNING"],
+            "NORMAL"
+        ).astype(object)
+
+        return {
+            "model_version": self.model_name,
+            "is_anomaly": sudden_drop | rapid_completion | excessive_duration,
+            "anomaly_score": anomaly_score,
+            "severity": severity,
+            "anomalies_count": sudden_drop.astype(np.int64) + rapid_completion + excessive_duration,
+            "flags": {
+                "SUDDEN_SCORE_DROP": sudden_drop,
+                "RAPID_COMPLETION_ANOMALY": rapid_completion,
+                "EXCESSIVE_DURATION": excessive_duration
+            }
+        }
@@ -0,0 +1,521 @@
+import importlib
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import traceback
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional
+
+from sqlalchemy.orm import Session
+
+# database must be imported before models when this module is the first thing a worker process loads
+from ..database import SessionLocal
+from .. import models
+
+PRIORITY_HIGH = 1
+PRIORITY_NORMAL = 5
+PRIORITY_LOW = 9
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_INTERVAL_SECONDS = float(os.getenv("JOB_POLL_INTERVAL_SECONDS", "1.0"))
+RETRY_BASE_SECONDS = float(os.getenv("JOB_RETRY_BASE_SECONDS", "5"))
+RETRY_MAX_SECONDS = 600.0
+HEARTBEAT_SECONDS = 10.0
+# A RUNNING job whose dispatcher has not heartbeated for this long is assumed lost and requeued
+STALE_AFTER_SECONDS = float(os.getenv("JOB_STALE_AFTER_SECONDS", "120"))
+PROGRESS_MIN_INTERVAL_SECONDS = 0.5
+CLAIM_CANDIDATES = 5
+
+TERMINAL_STATUSES = ("COMPLETED", "FAILED", "CANCELLED")
+
+# kind -> "module:function" relative to the app package. Imported lazily, so a worker process
+# only loads the code its jobs need. Handlers are called as handler(db, payload, ctx).
+HANDLERS = {
+    "risk.recalculate_all": ".services.risk_batch_engine:recalculate_all_job",
+    "risk.refresh_snapshots": ".services.risk_batch_engine:refresh_snapshots_job",
+    "ingest.bulk_upload": ".services.bulk_ingest:bulk_upload_job",
+    "automation.risk_scan": ".routers.automation:risk_scan_job",
+    "ai.generate_report": ".routers.ai_report:generate_report_job",
+    "engagement.reconcile": ".services.feature_store:reconcile_engagement_job",
+    "engagement.inactivity_sweep": ".services.engagement_engine:inactivity_sweep_job",
+    "risk.explain_students": ".services.risk_explanation_engine:reevaluate_students_job",
+}
+_APP_PACKAGE = __name__.split(".")[0]
+
+
+class JobCancelled(Exception):
+    pass
+
+
+def _now() -> datetime:
+    return datetime.utcnow()
+
+
+def _load(text: Optional[str]):
+    return json.loads(text) if text else None
+
+
+def to_dict(job: models.BackgroundJob) -> Dict[str, Any]:
+    return {
+        "job_id": job.id,
+        "kind": job.kind,
+        "status": job.status,
+        "priority": job.priority,
+        "attempts": job.attempts,
+        "max_attempts": job.max_attempts,
+        "cancel_requested": bool(job.cancel_requested),
+        "progress": _load(job.progress_json) or {},
+        "result": _load(job.result_json),
+        "error": job.error,
+        "requested_by": job.requested_by,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+        "updated_at": job.updated_at.isoformat() if job.updated_at else None
+    }
+
+
+def _set_state(job_id: str, **fields) -> None:
+    # State changes use their own short session so they never commit a handler's half-done work
+    db = SessionLocal()
+    try:
+        fields["updated_at"] = _now()
+        db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).update(fields, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+# ─── Producer side ───────────────────────────────────────────────────────────
+
+def enqueue(
+    db: Session,
+    kind: str,
+    payload: Optional[Dict[str, Any]] = None,
+    priority: int = PRIORITY_NORMAL,
+    max_attempts: int = 3,
+    requested_by: Optional[str] = None,
+    delay_seconds: float = 0.0
+) -> Dict[str, Any]:
+    if kind not in HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    now = _now()
+    job = models.BackgroundJob(
+        id=models.generate_uuid(),
+        kind=kind,
+        status="QUEUED",
+        priority=priority,
+        payload_json=json.dumps(payload or {}, default=str),
+        attempts=0,
+        max_attempts=max(1, max_attempts),
+        run_after=now + timedelta(seconds=delay_seconds),
+        cancel_requested=False,
+        requested_by=requested_by,
+        created_at=now,
+        updated_at=now
+    )
+    db.add(job)
+    db.commit()
+    return to_dict(job)
+
+
+def enqueue_debounced(
+    db: Session,
+    kind: str,
+    items: List[str],
+    window_seconds: float,
+    item_key: str = "ids",
+    priority: int = PRIORITY_LOW,
+    requested_by: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Add items to the job of this kind that is still queued, or open a new window of window_seconds.
+    Requests inside one window collapse into a single job whose payload holds the union of their
+    items. The merge is a compare-and-set on status and payload, so a job a dispatcher has already
+    claimed is never changed; the items then go to a fresh job.
+    """
+    items = sorted({str(i) for i in items if i})
+    if not items:
+        return None
+    for _ in range(3):
+        pending = db.query(models.BackgroundJob.id, models.BackgroundJob.payload_json).filter(
+            models.BackgroundJob.kind == kind,
+            models.BackgroundJob.status == "QUEUED"
+        ).order_by(models.BackgroundJob.run_after).first()
+        if pending is None:
+            break
+        payload = _load(pending.payload_json) or {}
+        merged = sorted(set(payload.get(item_key, [])) | set(items))
+        if merged == payload.get(item_key):
+            return get_job(db, pending.id)
+        updated = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.id == pending.id,
+            models.BackgroundJob.status == "QUEUED",
+            models.BackgroundJob.payload_json == pending.payload_json
+        ).update({
+            "payload_json": json.dumps({**payload, item_key: merged}, default=str),
+            "updated_at": _now()
+        }, synchronize_session=False)
+        db.commit()
+        if updated:
+            return get_job(db, pending.id)
+    return enqueue(db, kind, {item_key: items}, priority=priority, requested_by=requested_by, delay_seconds=window_seconds)
+
+
+def get_job(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    return to_dict(job) if job else None
+
+
+def list_jobs(
+    db: Session, status: Optional[str] = None, kind: Optional[str] = None, limit: int = 50, requested_by: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    query = db.query(models.BackgroundJob)
+    if requested_by is not None:
+        query = query.filter(models.BackgroundJob.requested_by == requested_by)
+    if status:
+        query = query.filter(models.BackgroundJob.status == status)
+    if kind:
+        query = query.filter(models.BackgroundJob.kind == kind)
+    return [to_dict(job) for job in query.order_by(models.BackgroundJob.created_at.desc()).limit(limit).all()]
+
+
+def target_student_id(job: models.BackgroundJob) -> Optional[str]:
+    """The student a job works on, for jobs that have one (e.g. "ai.generate_report")."""
+    student_id = (_load(job.payload_json) or {}).get("student_id")
+    return student_id if isinstance(student_id, str) else None
+
+
+def cancel_job(db: Session, job_id: str) -> Optional[Dict[str, Any]]:
+    """Queued jobs are cancelled at once; running jobs are asked to stop at their next progress report."""
+    job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+    if job is None:
+        return None
+    now = _now()
+    if job.status == "QUEUED":
+        job.status = "CANCELLED"
+        job.finished_at = now
+    elif job.status == "RUNNING":
+        job.cancel_requested = True
+    job.updated_at = now
+    db.commit()
+    return to_dict(job)
+
+
+def updated_since(db: Session, since: datetime, limit: int = 200) -> List[Dict[str, Any]]:
+    jobs = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.updated_at > since
+    ).order_by(models.BackgroundJob.updated_at).limit(limit).all()
+    return [to_dict(job) for job in jobs]
+
+
+# ─── Worker side ─────────────────────────────────────────────────────────────
+
+class JobContext:
+    """Passed to handlers: progress reporting (throttled, doubles as the cancellation check)."""
+
+    def __init__(self, job_id: str, attempt: int, max_attempts: int):
+        self.job_id = job_id
+        self.attempt = attempt
+        self.max_attempts = max_attempts
+        self._progress: Dict[str, Any] = {}
+        self._last_write = 0.0
+        self._cancelled = False
+
+    @property
+    def final_attempt(self) -> bool:
+        return self.attempt >= self.max_attempts
+
+    def progress(self, force: bool = False, **fields):
+        self._progress.update(fields)
+        now = time.monotonic()
+        if not force and now - self._last_write < PROGRESS_MIN_INTERVAL_SECONDS:
+            return
+        self._last_write = now
+        db = SessionLocal()
+        try:
+            job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == self.job_id).first()
+            if job is not None:
+                job.progress_json = json.dumps(self._progress, default=str)
+                job.heartbeat_at = job.updated_at = _now()
+                self._cancelled = bool(job.cancel_requested)
+                db.commit()
+        finally:
+            db.close()
+        if self._cancelled:
+            raise JobCancelled()
+
+    def check_cancelled(self):
+        self.progress(force=True)
+
+
+def _resolve_handler(kind: str):
+    module_name, function_name = HANDLERS[kind].split(":")
+    return getattr(importlib.import_module(module_name, package=_APP_PACKAGE), function_name)
+
+
+def _retry_delay(attempt: int) -> float:
+    return min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * (2 ** max(0, attempt - 1)))
+
+
+def execute_job(job_id: str) -> str:
+    """Run one claimed job to a final (or retry) state. This is what worker processes execute."""
+    db = SessionLocal()
+    try:
+        job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+        if job is None or job.status != "RUNNING":
+            return job.status if job else "MISSING"
+        if job.cancel_requested:
+            _set_state(job_id, status="CANCELLED", finished_at=_now())
+            return "CANCELLED"
+        ctx = JobContext(job.id, job.attempts or 1, job.max_attempts or 1)
+        payload = _load(job.payload_json) or {}
+        kind = job.kind
+
+        started = time.perf_counter()
+        try:
+            result = _resolve_handler(kind)(db, payload, ctx)
+        except JobCancelled:
+            db.rollback()
+            _set_state(job_id, status="CANCELLED", error="Cancelled by request", finished_at=_now())
+            return "CANCELLED"
+        except Exception as e:
+            db.rollback()
+            traceback.print_exc()
+            if not ctx.final_attempt:
+                delay = _retry_delay(ctx.attempt)
+                print(f"[Jobs] {kind} {job_id} attempt {ctx.attempt} failed ({e}); retrying in {delay:.0f}s")
+                _set_state(job_id, status="QUEUED", error=str(e), worker_id=None, run_after=_now() + timedelta(seconds=delay))
+                return "QUEUED"
+            _set_state(job_id, status="FAILED", error=str(e), finished_at=_now())
+            return "FAILED"
+
+        print(f"[Jobs] {kind} {job_id} completed in {(time.perf_counter() - started) * 1000.0:.1f} ms")
+        _set_state(
+            job_id, status="COMPLETED", error=None, finished_at=_now(),
+            result_json=json.dumps(result, default=str), progress_json=json.dumps(ctx._progress, default=str)
+        )
+        return "COMPLETED"
+    finally:
+        db.close()
+
+
+def claim_next(db: Session, worker_id: str) -> Optional[str]:
+    """
+    Atomically move the most urgent runnable job to RUNNING. The conditional UPDATE is the
+    lock: if another dispatcher claimed the row first it matches nothing and we try the next.
+    """
+    now = _now()
+    candidates = db.query(models.BackgroundJob.id).filter(
+        models.BackgroundJob.status == "QUEUED",
+        models.BackgroundJob.run_after <= now
+    ).order_by(models.BackgroundJob.priority, models.BackgroundJob.created_at).limit(CLAIM_CANDIDATES).all()
+    for (job_id,) in candidates:
+        claimed = db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.id == job_id,
+            models.BackgroundJob.status == "QUEUED"
+        ).update({
+            "status": "RUNNING",
+            "worker_id": worker_id,
+            "attempts": models.BackgroundJob.attempts + 1,
+            "started_at": now,
+            "heartbeat_at": now,
+            "updated_at": now
+        }, synchronize_session=False)
+        db.commit()
+        if claimed:
+            return job_id
+    return None
+
+
+def heartbeat(db: Session, job_ids: List[str]):
+    if not job_ids:
+        return
+    db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.id.in_(job_ids),
+        models.BackgroundJob.status == "RUNNING"
+    ).update({"heartbeat_at": _now()}, synchronize_session=False)
+    db.commit()
+
+
+def requeue_stale(db: Session) -> int:
+    """Jobs left RUNNING by a dead worker: retry them if attempts remain, otherwise fail them."""
+    now = _now()
+    stale = db.query(models.BackgroundJob).filter(
+        models.BackgroundJob.status == "RUNNING",
+        models.BackgroundJob.heartbeat_at < now - timedelta(seconds=STALE_AFTER_SECONDS)
+    ).all()
+    for job in stale:
+        if (job.attempts or 0) < (job.max_attempts or 1):
+            job.status, job.worker_id, job.run_after = "QUEUED", None, now
+        else:
+            job.status, job.finished_at = "FAILED", now
+        job.error = "Worker stopped responding"
+        job.updated_at = now
+    db.commit()
+    return len(stale)
+
+
+def release_claim(job_id: str) -> None:
+    """Undo claim_next for a job that never reached a worker: back to QUEUED, and the attempt is not counted."""
+    db = SessionLocal()
+    try:
+        db.query(models.BackgroundJob).filter(
+            models.BackgroundJob.id == job_id,
+            models.BackgroundJob.status == "RUNNING"
+        ).update({
+            "status": "QUEUED",
+            "worker_id": None,
+            "attempts": models.BackgroundJob.attempts - 1,
+            "updated_at": _now()
+        }, synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+
+
+def record_crash(job_id: str, error: BaseException) -> str:
+    """
+    A worker process died while running the job, so execute_job never recorded an outcome. The
+    crash used up the attempt claim_next counted: retry with backoff while attempts remain, else fail.
+    """
+    db = SessionLocal()
+    try:
+        job = db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).first()
+        if job is None or job.status != "RUNNING":
+            return job.status if job else "MISSING"
+        now = _now()
+        if (job.attempts or 0) < (job.max_attempts or 1):
+            job.status, job.worker_id, job.run_after = "QUEUED", None, now + timedelta(seconds=_retry_delay(job.attempts or 1))
+        else:
+            job.status, job.finished_at = "FAILED", now
+        job.error = f"Worker process crashed: {error}"
+        job.updated_at = now
+        db.commit()
+        return job.status
+    finally:
+        db.close()
+
+
+def _init_worker():
+    # ML worker mode (ML_MODE=eager): each worker process loads the risk model once, before its first job
+    from . import model_registry
+    if model_registry.ML_MODE == "eager":
+        model_registry.warm_load()
+
+
+class JobWorkerPool:
+    """
+    Dispatcher thread plus a pool of worker processes. The dispatcher claims jobs from the table
+    (any number of web or standalone worker processes can share one database) and runs each in
+    a separate process, so heavy work never occupies the web workers.
+    """
+
+    def __init__(self, workers: int = JOB_WORKERS):
+        self.workers = workers
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._running: Dict[str, Future] = {}
+
+    def start(self):
+        if self.workers <= 0 or self._thread is not None:
+            return
+        self._executor = self._new_executor()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._dispatch_loop, name="job-dispatcher", daemon=True)
+        self._thread.start()
+        print(f"[Jobs] Worker pool started with {self.workers} processes ({self.worker_id})")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        # Jobs still running are not waited for; their rows go stale and another dispatcher requeues them
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._thread, self._executor = None, None
+
+    def status(self) -> Dict[str, Any]:
+        return {"worker_id": self.worker_id, "workers": self.workers, "running": list(self._running)}
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # spawn, not fork: the web process has threads and open DB connections that must not be inherited
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"), initializer=_init_worker
+        )
+
+    def _replace_executor(self):
+        # A killed worker process breaks the whole pool: every later submit raises BrokenProcessPool
+        print("[Jobs] Worker pool is broken; starting a new one")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        self._executor = self._new_executor()
+
+    def _reap(self):
+        broken = False
+        for job_id, future in list(self._running.items()):
+            if future.done():
+                del self._running[job_id]
+                error = future.exception()
+                if error is not None:
+                    print(f"[Jobs] Worker process for {job_id} crashed: {error}")
+                    record_crash(job_id, error)
+                    broken = broken or isinstance(error, BrokenProcessPool)
+        if broken:
+            self._replace_executor()
+
+    def _submit(self, job_id: str) -> bool:
+        try:
+            self._running[job_id] = self._executor.submit(execute_job, job_id)
+            return True
+        except Exception as e:
+            print(f"[Jobs] Could not hand {job_id} to a worker: {e}")
+            release_claim(job_id)
+            if isinstance(e, BrokenProcessPool):
+                self._replace_executor()
+            return False
+
+    def _dispatch_loop(self):
+        last_maintenance = 0.0
+        while not self._stop.is_set():
+            claimed = False
+            try:
+                self._reap()
+                db = SessionLocal()
+                try:
+                    if time.monotonic() - last_maintenance >= HEARTBEAT_SECONDS:
+                        heartbeat(db, list(self._running))
+                        requeued = requeue_stale(db)
+                        if requeued:
+                            print(f"[Jobs] Requeued {requeued} stale jobs")
+                        last_maintenance = time.monotonic()
+                    while len(self._running) < self.workers:
+                        job_id = claim_next(db, self.worker_id)
+                        if job_id is None:
+                            break
+                        if not self._submit(job_id):
+                            break
+                        claimed = True
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"[Jobs] Dispatcher error: {e}")
+            if not claimed:
+                self._stop.wait(POLL_INTERVAL_SECONDS)
+
+
+pool = JobWorkerPool()
+
+
+def start_workers():
+    pool.start()
+
+
+def stop_workers():
+    pool.stop()
@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any, List
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, tiers
+
 class DeepKnowledgeTracingEngine:
     """
     Model 7 of 13: Topic Mastery & Knowledge Tracing Engine (DKT / BKT)
@@ -70,3 +74,34 @@ class DeepKnowledgeTracingEngine:
             "priority_focus_topics": [w["topic"] for w in weak_topics],
             "recommendation_summary": f"Remedial focus needed in {', '.join([w['topic'] for w in weak_topics[:2]])} before final evaluation." if weak_topics else "Concept mastery is well balanced across all subjects."
         }
+
+    def trace_knowledge_batch(self, topic_performances: Any = None, n: int = 1) -> Dict[str, Any]:
+        """
+        Vectorized trace_knowledge for N students. topic_performances maps topic -> accuracy
+        column (DataFrame, dict of arrays or list of per-student dicts); without it every one
+        of the n rows uses the scalar method's baseline accuracies.
+        """
+        cols = to_columns(topic_performances)
+        if not cols:
+            baseline = {"Arrays": 42.0, "OOP": 48.0, "SQL": 71.0, "DBMS": 64.0, "Python": 82.0, "Data Structures": 55.0}
+            cols = {topic: np.full(n, acc) for topic, acc in baseline.items()}
+        n = row_count(cols)
+        topics = list(cols)
+        accuracy = np.column_stack([column(cols, n, topic, 0.0) for topic in topics]).reshape(n, len(topics))
+
+        # Bayesian Knowledge Tracing posterior update with a fixed transition probability
+        p_prior = accuracy / 100.0
+        mastery = np.round(np.clip((p_prior + (1.0 - p_prior) * 0.12) * 100.0, 10.0, 99.0), 1)
+        weak = mastery < 60.0
+        weakest = np.where(weak, mastery, np.inf).argmin(axis=1)
+
+        return {
+            "model_version": self.model_name,
+            "topics": topics,
+            "mastery_percentage": mastery,
+            "status": tiers(mastery, [60.0, 80.0], ["WEAK", "DEVELOPING", "MASTERED"]),
+            "overall_concept_mastery_avg": np.round(mastery.mean(axis=1), 1),
+            "weak_topics_count": weak.sum(axis=1),
+            "mastered_topics_count": (mastery >= 80.0).sum(axis=1),
+            "priority_focus_topic": np.where(weak.any(axis=1), np.array(topics, dtype=object)[weakest], None)
+        }
@@ -0,0 +1,239 @@
+import asyncio
+import hashlib
+import json
+import os
+import re
+import threading
+import time
+import weakref
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Any, Optional, Callable, Awaitable
+
+from starlette.concurrency import run_in_threadpool
+
+from .. import models
+from ..database import SessionLocal
+
+DEFAULT_TTL_SECONDS = int(os.getenv("LLM_CACHE_TTL_SECONDS", str(24 * 3600)))
+MEMORY_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "512"))
+
+# In-memory LRU tier: key -> {"payload" (JSON text), "expires_at" (epoch seconds), "latency_ms", "namespace"}.
+# Entries are stored serialised so callers can never mutate a cached response in place.
+_memory: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_memory_lock = threading.Lock()
+# Single-flight: event loop -> key -> future resolved by the one request that calls upstream.
+# Futures belong to the loop that created them, so callers on other loops (worker threads) never share one.
+_inflight: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict[str, asyncio.Future]]" = weakref.WeakKeyDictionary()
+_inflight_lock = threading.Lock()
+
+_stats = {
+    "memory_hits": 0,
+    "disk_hits": 0,
+    "misses": 0,
+    "coalesced": 0,
+    "stores": 0,
+    "upstream_errors": 0,
+    "latency_saved_ms": 0.0
+}
+_stats_lock = threading.Lock()
+
+
+def _count(name: str, amount: float = 1):
+    with _stats_lock:
+        _stats[name] += amount
+
+
+def _loop_inflight() -> Dict[str, asyncio.Future]:
+    loop = asyncio.get_running_loop()
+    with _inflight_lock:
+        return _inflight.setdefault(loop, {})
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Whitespace-insensitive form of a prompt; indentation and blank lines do not change the key."""
+    return re.sub(r"\s+", " ", prompt).strip()
+
+
+def cache_key(namespace: str, prompt: str, model: str) -> str:
+    material = json.dumps({"namespace": namespace, "model": model, "prompt": normalize_prompt(prompt)}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+# ─── Memory tier ─────────────────────────────────────────────────────────────
+
+def _memory_get(key: str) -> Optional[Dict[str, Any]]:
+    with _memory_lock:
+        entry = _memory.get(key)
+        if entry is None:
+            return None
+        if entry["expires_at"] <= time.time():
+            del _memory[key]
+            return None
+        _memory.move_to_end(key)
+        return entry
+
+
+def _memory_put(key: str, payload: str, expires_at: float, latency_ms: float, namespace: str):
+    with _memory_lock:
+        _memory[key] = {"payload": payload, "expires_at": expires_at, "latency_ms": latency_ms, "namespace": namespace}
+        _memory.move_to_end(key)
+        while len(_memory) > MEMORY_MAX_ENTRIES:
+            _memory.popitem(last=False)
+
+
+# ─── Disk tier (llm_response_cache table) ────────────────────────────────────
+
+def _disk_get(key: str) -> Optional[Dict[str, Any]]:
+    db = SessionLocal()
+    try:
+        row = db.query(models.LLMResponseCache).filter(models.LLMResponseCache.cache_key == key).first()
+        if row is None:
+            return None
+        now = datetime.utcnow()
+        expires_at = row.expires_at.replace(tzinfo=None) if row.expires_at else now
+        if expires_at <= now:
+            db.delete(row)
+            db.commit()
+            return None
+        row.hit_count = (row.hit_count or 0) + 1
+        db.commit()
+        return {
+            "payload": row.response_json,
+            "expires_at": time.time() + (expires_at - now).total_seconds(),
+            "latency_ms": row.upstream_latency_ms or 0.0,
+            "namespace": row.namespace
+        }
+    finally:
+        db.close()
+
+
+def _disk_put(key: str, namespace: str, model: str, payload: str, ttl_seconds: int, latency_ms: float):
+    db = SessionLocal()
+    try:
+        row = db.query(models.LLMResponseCache).filter(models.LLMResponseCache.cache_key == key).first()
+        if row is None:
+            row = models.LLMResponseCache(cache_key=key, namespace=namespace, model=model)
+            db.add(row)
+        row.response_json = payload
+        row.upstream_latency_ms = latency_ms
+        row.hit_count = 0
+        row.created_at = datetime.utcnow()
+        row.expires_at = datetime.utcnow() + timedelta(seconds=ttl_seconds)
+        db.commit()
+    except Exception as e:
+        # The disk tier is best effort; the memory tier still serves this entry
+        db.rollback()
+        print(f"LLM cache disk write failed: {e}")
+    finally:
+        db.close()
+
+
+# ─── Public API ──────────────────────────────────────────────────────────────
+
+async def get_or_compute(
+    namespace: str,
+    prompt: str,
+    model: str,
+    compute: Callable[[], Awaitable[Any]],
+    ttl_seconds: int = DEFAULT_TTL_SECONDS
+) -> Any:
+    """
+    Return the cached response for (namespace, model, prompt), or await compute() once and
+    cache its JSON-serialisable result. Concurrent callers with the same key share the one
+    upstream call; if it raises, every waiter sees the error and nothing is cached.
+    """
+    key = cache_key(namespace, prompt, model)
+
+    entry = _memory_get(key)
+    if entry is not None:
+        _count("memory_hits")
+        _count("latency_saved_ms", entry["latency_ms"])
+        return json.loads(entry["payload"])
+
+    loop_inflight = _loop_inflight()
+    inflight = loop_inflight.get(key)
+    if inflight is not None:
+        _count("coalesced")
+        return json.loads(await asyncio.shield(inflight))
+
+    future = asyncio.get_running_loop().create_future()
+    loop_inflight[key] = future
+    try:
+        entry = await run_in_threadpool(_disk_get, key)
+        if entry is not None:
+            _count("disk_hits")
+            _count("latency_saved_ms", entry["latency_ms"])
+            _memory_put(key, entry["payload"], entry["expires_at"], entry["latency_ms"], namespace)
+            payload = entry["payload"]
+        else:
+            _count("misses")
+            started = time.perf_counter()
+            try:
+                value = await compute()
+            except Exception:
+                _count("upstream_errors")
+                raise
+            latency_ms = round((time.perf_counter() - started) * 1000.0, 1)
+            payload = json.dumps(value)
+            _memory_put(key, payload, time.time() + ttl_seconds, latency_ms, namespace)
+            await run_in_threadpool(_disk_put, key, namespace, model, payload, ttl_seconds, latency_ms)
+            _count("stores")
+        future.set_result(payload)
+        return json.loads(payload)
+    except BaseException as e:
+        if not future.done():
+            future.set_exception(e)
+            # Mark retrieved so an error nobody else awaited is not logged as unhandled
+            future.exception()
+        raise
+    finally:
+        loop_inflight.pop(key, None)
+
+
+def invalidate(namespace: Optional[str] = None, key: Optional[str] = None) -> Dict[str, int]:
+    """Drop one key, one namespace, or everything from both tiers."""
+    with _memory_lock:
+        doomed = [k for k, entry in _memory.items()
+                  if (key is None or k == key) and (namespace is None or entry["namespace"] == namespace)]
+        for k in doomed:
+            del _memory[k]
+
+    db = SessionLocal()
+    try:
+        query = db.query(models.LLMResponseCache)
+        if key is not None:
+            query = query.filter(models.LLMResponseCache.cache_key == key)
+        if namespace is not None:
+            query = query.filter(models.LLMResponseCache.namespace == namespace)
+        disk_deleted = query.delete(synchronize_session=False)
+        db.commit()
+    finally:
+        db.close()
+    return {"memory_evicted": len(doomed), "disk_deleted": disk_deleted}
+
+
+def purge_expired() -> int:
+    db = SessionLocal()
+    try:
+        deleted = db.query(models.LLMResponseCache).filter(
+            models.LLMResponseCache.expires_at <= datetime.utcnow()
+        ).delete(synchronize_session=False)
+        db.commit()
+        return deleted
+    finally:
+        db.close()
+
+
+def stats() -> Dict[str, Any]:
+    with _stats_lock:
+        snapshot = dict(_stats)
+    lookups = snapshot["memory_hits"] + snapshot["disk_hits"] + snapshot["misses"] + snapshot["coalesced"]
+    hits = lookups - snapshot["misses"]
+    snapshot["latency_saved_ms"] = round(snapshot["latency_saved_ms"], 1)
+    snapshot["lookups"] = lookups
+    snapshot["hit_ratio"] = round(hits / lookups, 3) if lookups else 0.0
+    with _memory_lock:
+        snapshot["memory_entries"] = len(_memory)
+    snapshot["memory_capacity"] = MEMORY_MAX_ENTRIES
+    return snapshot
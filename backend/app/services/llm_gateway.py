@@ -0,0 +1,276 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import weakref
+from typing import Dict, Any, List, Optional, AsyncIterator
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# Base URLs are overridable so the gateway can be pointed at a local stub (scripts/llm_stub_server.py)
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com").rstrip("/")
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "https://api.openai.com").rstrip("/")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+
+LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "20"))
+LLM_CONNECT_TIMEOUT_SECONDS = 5.0
+# If the primary provider has not answered after this long, race the next one
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "3.0"))
+PROVIDER_CONCURRENCY = {
+    "gemini": int(os.getenv("LLM_GEMINI_CONCURRENCY", "8")),
+    "openai": int(os.getenv("LLM_OPENAI_CONCURRENCY", "8")),
+}
+MAX_CONNECTIONS = 32
+MAX_KEEPALIVE_CONNECTIONS = 16
+KEEPALIVE_EXPIRY_SECONDS = 30.0
+
+
+class LLMError(Exception):
+    pass
+
+
+def _strip_code_fence(text: str) -> str:
+    if text.startswith("```json"):
+        return text.split("```json")[1].split("```")[0].strip()
+    if text.startswith("```"):
+        return text.split("```")[1].split("```")[0].strip()
+    return text
+
+
+class GeminiProvider:
+    name = "gemini"
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv("GEMINI_API_KEY")
+
+    def build_request(self, system: Optional[str], messages: List[Dict[str, str]], json_mode: bool, stream: bool):
+        method = "streamGenerateContent?alt=sse&" if stream else "generateContent?"
+        url = f"{GEMINI_BASE_URL}/v1beta/models/{GEMINI_MODEL}:{method}key={self.api_key}"
+        payload: Dict[str, Any] = {
+            "contents": [{
+                "role": "user" if msg["role"] == "user" else "model",
+                "parts": [{"text": msg["content"]}]
+            } for msg in messages]
+        }
+        if system:
+            payload["systemInstruction"] = {"parts": [{"text": system}]}
+        if json_mode:
+            payload["generationConfig"] = {"responseMimeType": "application/json"}
+        return url, {"Content-Type": "application/json"}, payload
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        return data["candidates"][0]["content"]["parts"][0]["text"]
+
+    def parse_stream_event(self, data: str) -> Optional[str]:
+        parts = json.loads(data).get("candidates", [{}])[0].get("content", {}).get("parts", [])
+        return "".join(p.get("text", "") for p in parts) or None
+
+
+class OpenAIProvider:
+    name = "openai"
+
+    @property
+    def api_key(self) -> Optional[str]:
+        return os.getenv("OPENAI_API_KEY")
+
+    def build_request(self, system: Optional[str], messages: List[Dict[str, str]], json_mode: bool, stream: bool):
+        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {self.api_key}"}
+        chat = ([{"role": "system", "content": system}] if system else []) + [
+            {"role": msg["role"], "content": msg["content"]} for msg in messages
+        ]
+        payload: Dict[str, Any] = {"model": OPENAI_MODEL, "messages": chat}
+        if json_mode:
+            payload["response_format"] = {"type": "json_object"}
+        if stream:
+            payload["stream"] = True
+        return f"{OPENAI_BASE_URL}/v1/chat/completions", headers, payload
+
+    def parse_response(self, data: Dict[str, Any]) -> str:
+        return data["choices"][0]["message"]["content"]
+
+    def parse_stream_event(self, data: str) -> Optional[str]:
+        if data.strip() == "[DONE]":
+            return None
+        choices = json.loads(data).get("choices") or [{}]
+        return choices[0].get("delta", {}).get("content") or None
+
+
+class _LoopPool:
+    """Keep-alive client and per-provider semaphores owned by a single event loop."""
+
+    def __init__(self, providers):
+        self.client = httpx.AsyncClient(
+            timeout=httpx.Timeout(LLM_TIMEOUT_SECONDS, connect=LLM_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+                keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS
+            )
+        )
+        self.semaphores = {p.name: asyncio.Semaphore(PROVIDER_CONCURRENCY.get(p.name, 4)) for p in providers}
+        self._sentinel = None
+
+    async def close_with_loop(self):
+        # Loops finalize live async generators on shutdown (asyncio.run does this after the main
+        # coroutine returns), so a generator parked at its yield closes the client on that loop.
+        self._sentinel = self._close_on_shutdown()
+        await self._sentinel.__anext__()
+
+    async def _close_on_shutdown(self):
+        try:
+            yield
+        finally:
+            await self.client.aclose()
+
+    async def aclose(self):
+        if self._sentinel is not None:
+            await self._sentinel.aclose()
+            self._sentinel = None
+        else:
+            await self.client.aclose()
+
+
+class LLMGateway:
+    """
+    Async client for the chat-completion providers. Each event loop gets one pooled keep-alive
+    client shared by every request on it (closed when the loop shuts down), each provider is capped by a semaphore, and complete()
+    hedges: if the first provider is slow or fails, the next one is raced against it.
+    """
+
+    def __init__(self):
+        self.providers = [GeminiProvider(), OpenAIProvider()]
+        # One pool (client + semaphores) per running event loop; entries go away with their loop
+        self._pools: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, _LoopPool]" = weakref.WeakKeyDictionary()
+        self._pools_lock = threading.Lock()
+        self.stats = {p.name: {"requests": 0, "errors": 0, "hedged": 0, "wins": 0} for p in self.providers}
+
+    def configured(self) -> List[Any]:
+        """Providers with an API key, in preference order."""
+        return [p for p in self.providers if p.api_key]
+
+    def model_signature(self) -> str:
+        """Identifies the models that may answer (hedging can pick either); part of response cache keys."""
+        models = {"gemini": GEMINI_MODEL, "openai": OPENAI_MODEL}
+        return "|".join(f"{p.name}:{models[p.name]}" for p in self.configured())
+
+    async def _bind(self) -> "_LoopPool":
+        loop = asyncio.get_running_loop()
+        with self._pools_lock:
+            pool = self._pools.get(loop)
+            if pool is None:
+                pool = self._pools[loop] = _LoopPool(self.providers)
+                created = True
+            else:
+                created = False
+        if created:
+            await pool.close_with_loop()
+        return pool
+
+    async def aclose(self):
+        """Closes the pool of the running loop; pools of other loops are closed when those loops shut down."""
+        with self._pools_lock:
+            pool = self._pools.pop(asyncio.get_running_loop(), None)
+        if pool is not None:
+            await pool.aclose()
+
+    async def _complete_one(self, provider, system: Optional[str], messages: List[Dict[str, str]], json_mode: bool) -> Dict[str, Any]:
+        pool = await self._bind()
+        self.stats[provider.name]["requests"] += 1
+        async with pool.semaphores[provider.name]:
+            started = time.perf_counter()
+            try:
+                url, headers, payload = provider.build_request(system, messages, json_mode, stream=False)
+                response = await pool.client.post(url, headers=headers, json=payload)
+                response.raise_for_status()
+                text = provider.parse_response(response.json())
+            except Exception:
+                self.stats[provider.name]["errors"] += 1
+                raise
+            latency_ms = round((time.perf_counter() - started) * 1000.0, 1)
+        logger.info("LLM %s completion in %.1f ms", provider.name, latency_ms)
+        return {"text": text, "provider": provider.name, "latency_ms": latency_ms}
+
+    async def complete(self, system: Optional[str], messages: List[Dict[str, str]], json_mode: bool = False) -> Dict[str, Any]:
+        """Returns {"text", "provider", "latency_ms"} from whichever provider answers first."""
+        queue = self.configured()
+        if not queue:
+            raise LLMError("No LLM API keys configured.")
+        await self._bind()
+
+        pending: Dict[asyncio.Task, Any] = {}
+        errors = []
+
+        def launch():
+            provider = queue.pop(0)
+            if pending:
+                self.stats[provider.name]["hedged"] += 1
+            pending[asyncio.create_task(self._complete_one(provider, system, messages, json_mode))] = provider
+
+        launch()
+        try:
+            while pending:
+                done, _ = await asyncio.wait(
+                    list(pending), timeout=LLM_HEDGE_DELAY_SECONDS if queue else None, return_when=asyncio.FIRST_COMPLETED
+                )
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        self.stats[provider.name]["wins"] += 1
+                        return task.result()
+                    errors.append(f"{provider.name}: {task.exception()!r}")
+                    logger.warning("LLM %s API error: %s", provider.name, task.exception())
+                # Slow (timeout) or failed: bring in the next provider
+                if queue:
+                    launch()
+        finally:
+            for task in pending:
+                task.cancel()
+        raise LLMError("All LLM providers failed: " + "; ".join(errors))
+
+    async def stream(self, system: Optional[str], messages: List[Dict[str, str]]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Yields {"provider", "delta"} chunks. Falls over to the next provider only if the
+        current one fails before producing any text; a mid-stream failure is raised.
+        """
+        providers = self.configured()
+        if not providers:
+            raise LLMError("No LLM API keys configured.")
+        pool = await self._bind()
+        errors = []
+        for provider in providers:
+            started = False
+            self.stats[provider.name]["requests"] += 1
+            try:
+                async with pool.semaphores[provider.name]:
+                    url, headers, payload = provider.build_request(system, messages, json_mode=False, stream=True)
+                    async with pool.client.stream("POST", url, headers=headers, json=payload) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            delta = provider.parse_stream_event(line[len("data:"):].strip())
+                            if delta:
+                                started = True
+                                yield {"provider": provider.name, "delta": delta}
+                self.stats[provider.name]["wins"] += 1
+                return
+            except Exception as e:
+                self.stats[provider.name]["errors"] += 1
+                if started:
+                    raise
+                errors.append(f"{provider.name}: {e!r}")
+                logger.warning("LLM %s stream error: %s", provider.name, e)
+        raise LLMError("All LLM providers failed: " + "; ".join(errors))
+
+    async def complete_json(self, prompt: str, system: Optional[str] = None) -> Any:
+        result = await self.complete(system, [{"role": "user", "content": prompt}], json_mode=True)
+        return json.loads(_strip_code_fence(result["text"]))
+
+
+gateway = LLMGateway()
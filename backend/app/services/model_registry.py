@@ -0,0 +1,366 @@
+from sqlalchemy.orm import Session
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Tuple
+import json
+import logging
+import os
+import threading
+import time
+
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, py_round
+from ..core import lazy
+
+xgb = lazy.LazyModule("xgboost")
+XGBOOST_AVAILABLE = lazy.available("xgboost")
+
+logger = logging.getLogger(__name__)
+
+# eager: load the booster at startup (dedicated ML workers); lazy: on the first request that scores
+# with it; off: never, so the process serves the formula engine and never imports xgboost
+ML_MODE = os.getenv("ML_MODE", "lazy").lower()
+
+MODEL_DIR = os.getenv(
+    "MODEL_REGISTRY_DIR",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "models", "risk")
+)
+MODEL_PREFIX = "risk-xgb"
+LATEST_POINTER = "LATEST"
+
+# Numeric feature-store keys the booster is trained on, in column order
+MODEL_FEATURES = [
+    "current_average_marks",
+    "marks_change_7d",
+    "marks_change_30d",
+    "assessment_average",
+    "cgpa",
+    "backlog_count",
+    "attendance_percentage",
+    "absence_frequency",
+    "engagement_score",
+    "engagement_change_7d",
+    "engagement_change_30d",
+    "inactive_days",
+    "missed_tests",
+    "missed_assignments",
+]
+
+FEATURE_LABELS = {
+    "current_average_marks": "Internal Marks",
+    "marks_change_7d": "Weekly Marks Trend",
+    "marks_change_30d": "Performance Trend",
+    "assessment_average": "Test Performance",
+    "cgpa": "Previous CGPA",
+    "backlog_count": "Active Backlogs",
+    "attendance_percentage": "Attendance",
+    "absence_frequency": "Absence Frequency",
+    "engagement_score": "LMS Engagement",
+    "engagement_change_7d": "Weekly Engagement Trend",
+    "engagement_change_30d": "Engagement Trend",
+    "inactive_days": "Inactivity",
+    "missed_tests": "Missed Tests",
+    "missed_assignments": "Assignment Rate",
+}
+
+# Student columns used for features that the feature store does not version in RiskFeature
+STATIC_FEATURES = {
+    "cgpa": "cgpa",
+    "backlog_count": "active_backlogs",
+    "attendance_percentage": "attendance",
+}
+
+MIN_TRAINING_SAMPLES = 50
+TRAINING_PARAMS = {
+    "objective": "reg:squarederror",
+    "eval_metric": "rmse",
+    "max_depth": 4,
+    "eta": 0.1,
+    "subsample": 0.9,
+    "colsample_bytree": 0.9,
+    "min_child_weight": 2,
+    "seed": 42,
+}
+NUM_BOOST_ROUND = 200
+HOLDOUT_FRACTION = 0.2
+
+
+def feature_matrix(features: Any) -> np.ndarray:
+    """(N x len(MODEL_FEATURES)) float matrix; missing values stay NaN for the booster."""
+    cols = to_columns(features)
+    n = row_count(cols)
+    return np.column_stack([column(cols, n, name, np.nan) for name in MODEL_FEATURES]).reshape(n, len(MODEL_FEATURES))
+
+
+# ─── Training data ───────────────────────────────────────────────────────────
+# ORM imports are local so the serving half of this module loads without the DB layer
+
+def build_history_training_set(db: Session) -> Dict[str, np.ndarray]:
+    """
+    Labels are RiskHistory.overall_risk; each label is joined with the latest value of every
+    model feature recorded in RiskFeature at or before it (an as-of join per student).
+    """
+    import pandas as pd
+    from .. import models
+
+    history = pd.DataFrame(db.query(
+        models.RiskHistory.student_id,
+        models.RiskHistory.recorded_at,
+        models.RiskHistory.overall_risk
+    ).all(), columns=["student_id", "recorded_at", "overall_risk"])
+    if history.empty:
+        return {"X": np.zeros((0, len(MODEL_FEATURES))), "y": np.zeros(0)}
+
+    versioned = [name for name in MODEL_FEATURES if name not in STATIC_FEATURES]
+    feature_rows = pd.DataFrame(db.query(
+        models.RiskFeature.student_id,
+        models.RiskFeature.recorded_at,
+        models.RiskFeature.feature_name,
+        models.RiskFeature.feature_value
+    ).filter(models.RiskFeature.feature_name.in_(versioned)).all(),
+        columns=["student_id", "recorded_at", "feature_name", "feature_value"])
+
+    for frame in (history, feature_rows):
+        frame["recorded_at"] = pd.to_datetime(frame["recorded_at"], utc=True).dt.tz_localize(None)
+    history = history.dropna(subset=["recorded_at", "overall_risk"]).sort_values("recorded_at")
+
+    if not feature_rows.empty:
+        # One row per (student, timestamp) with each feature carried forward from its last change
+        wide = feature_rows.pivot_table(
+            index=["student_id", "recorded_at"], columns="feature_name", values="feature_value", aggfunc="last"
+        ).reset_index().sort_values(["student_id", "recorded_at"])
+        wide[wide.columns[2:]] = wide.groupby("student_id")[list(wide.columns[2:])].ffill()
+        history = pd.merge_asof(
+            history, wide.sort_values("recorded_at"),
+            on="recorded_at", by="student_id", direction="backward"
+        )
+
+    static_columns = [getattr(models.Student, attr) for attr in STATIC_FEATURES.values()]
+    static = pd.DataFrame(db.query(models.Student.enrollment_no, *static_columns).all(),
+                          columns=["student_id", *STATIC_FEATURES.keys()])
+    history = history.merge(static, on="student_id", how="left")
+
+    for name in MODEL_FEATURES:
+        if name not in history.columns:
+            history[name] = np.nan
+    return {
+        "X": history[MODEL_FEATURES].to_numpy(dtype=np.float64),
+        "y": history["overall_risk"].to_numpy(dtype=np.float64)
+    }
+
+
+def build_bootstrap_training_set(db: Session) -> Dict[str, np.ndarray]:
+    """
+    Current feature-store vectors labelled by the formula engine. Used to seed a first
+    model before enough RiskHistory has accumulated.
+    """
+    from .. import models
+    from . import feature_store
+    from .xgboost_risk_engine import XGBoostRiskEngine
+
+    students = db.query(models.Student).order_by(models.Student.enrollment_no).all()
+    matrix = feature_store.get_cohort_feature_matrix(db, students)
+    if not students:
+        return {"X": np.zeros((0, len(MODEL_FEATURES))), "y": np.zeros(0)}
+    labels = XGBoostRiskEngine(use_registry=False).predict_batch(matrix)["risk_probability"]
+    return {"X": feature_matrix(matrix), "y": np.asarray(labels, dtype=np.float64)}
+
+
+# ─── Training & persistence ──────────────────────────────────────────────────
+
+def train_booster(X: np.ndarray, y: np.ndarray, num_boost_round: int = NUM_BOOST_ROUND) -> Dict[str, Any]:
+    """Fit on a shuffled split, report holdout error, then refit on every sample."""
+    rng = np.random.default_rng(TRAINING_PARAMS["seed"])
+    order = rng.permutation(len(y))
+    holdout = max(1, int(len(y) * HOLDOUT_FRACTION)) if len(y) >= 10 else 0
+    test_idx, train_idx = order[:holdout], order[holdout:]
+
+    metrics: Dict[str, Any] = {"n_train": int(len(train_idx)), "n_holdout": int(holdout)}
+    if holdout:
+        booster = xgb.train(TRAINING_PARAMS, xgb.DMatrix(X[train_idx], label=y[train_idx], feature_names=MODEL_FEATURES), num_boost_round)
+        pred = booster.predict(xgb.DMatrix(X[test_idx], feature_names=MODEL_FEATURES))
+        metrics["holdout_rmse"] = round(float(np.sqrt(np.mean((pred - y[test_idx]) ** 2))), 3)
+        metrics["holdout_mae"] = round(float(np.mean(np.abs(pred - y[test_idx]))), 3)
+
+    booster = xgb.train(TRAINING_PARAMS, xgb.DMatrix(X, label=y, feature_names=MODEL_FEATURES), num_boost_round)
+    return {"booster": booster, "metrics": metrics}
+
+
+def save_model(booster, metrics: Dict[str, Any], n_samples: int, source: str, model_dir: str = MODEL_DIR) -> str:
+    """Write booster + metadata as a new version and point LATEST at it. Returns the version."""
+    os.makedirs(model_dir, exist_ok=True)
+    version = f"{MODEL_PREFIX}-{datetime.utcnow().strftime('%Y%m%d%H%M%S')}"
+    booster.save_model(os.path.join(model_dir, f"{version}.json"))
+    with open(os.path.join(model_dir, f"{version}.meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "version": version,
+            "feature_names": MODEL_FEATURES,
+            "params": TRAINING_PARAMS,
+            "num_boost_round": NUM_BOOST_ROUND,
+            "n_samples": n_samples,
+            "source": source,
+            "metrics": metrics,
+            "trained_at": datetime.utcnow().isoformat()
+        }, f, indent=2)
+    # Swap the pointer atomically so a loading worker never sees a half-written name
+    tmp_pointer = os.path.join(model_dir, f".{LATEST_POINTER}.tmp")
+    with open(tmp_pointer, "w", encoding="utf-8") as f:
+        f.write(version)
+    os.replace(tmp_pointer, os.path.join(model_dir, LATEST_POINTER))
+    return version
+
+
+def list_versions(model_dir: str = MODEL_DIR) -> List[str]:
+    if not os.path.isdir(model_dir):
+        return []
+    return sorted(
+        name[:-len(".meta.json")] for name in os.listdir(model_dir)
+        if name.startswith(MODEL_PREFIX) and name.endswith(".meta.json")
+    )
+
+
+def latest_version(model_dir: str = MODEL_DIR) -> Optional[str]:
+    pointer = os.path.join(model_dir, LATEST_POINTER)
+    if os.path.exists(pointer):
+        with open(pointer, "r", encoding="utf-8") as f:
+            version = f.read().strip()
+        if version:
+            return version
+    versions = list_versions(model_dir)
+    return versions[-1] if versions else None
+
+
+def train_and_save(db: Session, bootstrap: bool = False, model_dir: str = MODEL_DIR) -> Dict[str, Any]:
+    if not XGBOOST_AVAILABLE:
+        raise RuntimeError("xgboost is not installed")
+    data = build_history_training_set(db)
+    source = "risk_history"
+    if bootstrap and len(data["y"]) < MIN_TRAINING_SAMPLES:
+        data = build_bootstrap_training_set(db)
+        source = "formula_bootstrap"
+    n_samples = len(data["y"])
+    if n_samples < MIN_TRAINING_SAMPLES:
+        raise ValueError(f"Only {n_samples} labelled samples (need {MIN_TRAINING_SAMPLES}); rerun with --bootstrap-from-formula")
+
+    trained = train_booster(data["X"], data["y"])
+    version = save_model(trained["booster"], trained["metrics"], n_samples, source, model_dir=model_dir)
+    return {"version": version, "source": source, "n_samples": n_samples, "metrics": trained["metrics"]}
+
+
+# ─── Serving ─────────────────────────────────────────────────────────────────
+
+class ModelRegistry:
+    """
+    Holds the active risk booster for the process. Loaded once (at startup) and shared by
+    every XGBoostRiskEngine; when no model is loaded the engines use their formula.
+    """
+
+    def __init__(self, model_dir: str = MODEL_DIR):
+        self.model_dir = model_dir
+        self.booster = None
+        self.version: Optional[str] = None
+        self.metadata: Dict[str, Any] = {}
+        # Reentrant: ensure_loaded holds it across load(), which takes it again for the swap
+        self._lock = threading.RLock()
+        self._load_attempted = False
+
+    @property
+    def is_loaded(self) -> bool:
+        return self.booster is not None
+
+    def ensure_loaded(self) -> bool:
+        """Load the latest booster on first use (once per process) unless ML_MODE is off."""
+        return self.active_model() is not None
+
+    def active_model(self) -> Optional[Tuple[Any, str]]:
+        """
+        (booster, version) to score with, loading it on first use, or None for the formula
+        fallback. Callers keep this pair for the whole prediction, so a concurrent load() or
+        unload() cannot change the model between the readiness check and predict_batch.
+        """
+        if ML_MODE == "off" and self.booster is None:
+            return None
+        with self._lock:
+            if self.booster is None and not self._load_attempted:
+                self._load_attempted = True
+                try:
+                    self.load()
+                except Exception as e:
+                    logger.warning("Could not load risk model: %s", e)
+            return (self.booster, self.version) if self.booster is not None else None
+
+    def load(self, version: Optional[str] = None) -> bool:
+        if not XGBOOST_AVAILABLE:
+            return False
+        version = version or latest_version(self.model_dir)
+        if not version:
+            return False
+        with open(os.path.join(self.model_dir, f"{version}.meta.json"), "r", encoding="utf-8") as f:
+            metadata = json.load(f)
+        if metadata.get("feature_names") != MODEL_FEATURES:
+            logger.warning("Risk model %s was trained on a different feature set; keeping formula fallback", version)
+            return False
+        booster = xgb.Booster()
+        booster.load_model(os.path.join(self.model_dir, f"{version}.json"))
+        with self._lock:
+            self.booster, self.version, self.metadata = booster, version, metadata
+        logger.info("Loaded risk model %s (%s samples)", version, metadata.get("n_samples"))
+        return True
+
+    def unload(self):
+        with self._lock:
+            self.booster, self.version, self.metadata = None, None, {}
+
+    def predict_batch(self, features: Any, model: Optional[Tuple[Any, str]] = None) -> Dict[str, Any]:
+        """
+        Risk for N students plus exact TreeSHAP attributions from the booster
+        (pred_contribs): contributions is N x len(MODEL_FEATURES), base_value the bias term.
+        model is a pair from active_model(); by default the one active now.
+        """
+        model = model or self.active_model()
+        if model is None:
+            raise RuntimeError("No risk model is loaded")
+        booster, version = model
+        started = time.perf_counter()
+        X = feature_matrix(features)
+        dmatrix = xgb.DMatrix(X, feature_names=MODEL_FEATURES)
+        contribs = booster.predict(dmatrix, pred_contribs=True).reshape(len(X), len(MODEL_FEATURES) + 1).astype(np.float64)
+        raw = contribs.sum(axis=1)
+        logger.info("Risk model %s scored %d students in %.1f ms", version, len(X), (time.perf_counter() - started) * 1000.0)
+        return {
+            "version": version,
+            "X": X,
+            "risk_probability": py_round(np.clip(raw, 0.1, 99.9), 1),
+            "contributions": contribs[:, :-1],
+            "base_value": float(contribs[0, -1]) if len(X) else 0.0
+        }
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "loaded": self.is_loaded,
+            "ml_mode": ML_MODE,
+            "xgboost_imported": xgb.is_loaded,
+            "version": self.version,
+            "model_dir": self.model_dir,
+            "available_versions": list_versions(self.model_dir),
+            "metadata": self.metadata
+        }
+
+
+registry = ModelRegistry()
+
+
+def warm_load():
+    """Startup hook: load the latest trained booster now in eager mode; otherwise leave it to first use."""
+    if ML_MODE != "eager":
+        print(f"[ModelRegistry] ML_MODE={ML_MODE}; risk model {'loads on first use' if ML_MODE == 'lazy' else 'disabled'}.")
+        return
+    try:
+        if XGBOOST_AVAILABLE:
+            xgb.Booster   # ML workers pay the xgboost import here rather than on their first request
+        if registry.active_model() is None:
+            print("[ModelRegistry] No trained risk model found; using formula risk engine.")
+        else:
+            print(f"[ModelRegistry] Risk model {registry.version} loaded.")
+    except Exception as e:
+        print(f"[ModelRegistry] Failed to load risk model: {e}")
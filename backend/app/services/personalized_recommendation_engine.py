@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any, List
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column
+
 class ContentBasedRecommender:
     """
     Model 8 of 13: Personalized Learning Recommendation Engine (Content-Based + DKT)
@@ -69,3 +73,18 @@ class ContentBasedRecommender:
             "total_estimated_time_min": 50,
             "personalized_pathway": pathway
         }
+
+    def recommend_difficulty_batch(self, student_features: Any) -> Dict[str, Any]:
+        """Vectorized difficulty tier, expected gain and target mastery for N students."""
+        cols = to_columns(student_features)
+        n = row_count(cols)
+        base_score = column(cols, n, "current_average_marks", 65.0)
+        band = np.searchsorted(np.array([50.0, 70.0]), base_score, side="right")
+        est_gain = np.array([22.5, 18.0, 14.0])[band]
+
+        return {
+            "model_version": self.model_name,
+            "recommended_difficulty": np.array(["EASY", "MEDIUM", "ADVANCED"], dtype=object)[band],
+            "estimated_mastery_gain": est_gain,
+            "target_mastery": np.round(np.minimum(95.0, base_score + est_gain))
+        }
@@ -0,0 +1,263 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import event, inspect, update
+from sqlalchemy.exc import IntegrityError
+from datetime import datetime
+from itertools import chain
+from typing import Dict, Any, List, Optional
+import hashlib
+import json
+import threading
+
+import numpy as np
+
+from .. import models
+from ..database import SessionLocal
+from . import settings_cache, analytics_cache
+from .feature_matrix import py_round, sum_in_order
+
+# Bumped by student score writes and ranking-config saves; the index records the generation it was built under
+GENERATION_TAG = "ranking"
+# Primary key of the single rank_index_state row
+INDEX_STATE_ID = 1
+
+DEFAULT_RANKING_CONFIG = {
+    "dsa":        {"enabled": True, "weight": 20.0, "label": "DSA"},
+    "ml":         {"enabled": True, "weight": 20.0, "label": "Machine Learning"},
+    "qa":         {"enabled": True, "weight": 20.0, "label": "Quantitative Aptitude"},
+    "projects":   {"enabled": True, "weight": 20.0, "label": "Projects"},
+    "mock":       {"enabled": True, "weight": 10.0, "label": "Mock Interview"},
+    "attendance": {"enabled": True, "weight": 10.0, "label": "Attendance"},
+}
+
+# Ranking config key -> Student column feeding it
+PRS_SCORE_COLUMNS = {
+    "dsa":        models.Student.dsa_score,
+    "ml":         models.Student.ml_score,
+    "qa":         models.Student.qa_score,
+    "projects":   models.Student.projects_score,
+    "mock":       models.Student.mock_interview_score,
+    "attendance": models.Student.attendance,
+}
+
+def get_ranking_config_from_db(db: Session) -> Dict[str, Any]:
+    """Ranking config from the settings cache, fallback to default."""
+    return settings_cache.get_json(db, "ranking_config", DEFAULT_RANKING_CONFIG)
+
+
+def parameter_weights(config: Dict[str, Any]) -> Dict[str, float]:
+    """
+    Weight per PRS parameter, in PRS_SCORE_COLUMNS order: disabled or missing parameters weigh
+    zero and config keys without a score column are ignored. Both scoring paths use this.
+    """
+    weights = {}
+    for key in PRS_SCORE_COLUMNS:
+        cfg = config.get(key)
+        if not isinstance(cfg, dict) or not cfg.get("enabled", True):
+            weights[key] = 0.0
+        else:
+            weights[key] = float(cfg.get("weight") or 0.0)
+    return weights
+
+
+def prs_from_params(param_map: Dict[str, float], config: Dict[str, Any]) -> float:
+    total_weight = 0.0
+    weighted_sum = 0.0
+    for key, w in parameter_weights(config).items():
+        score = param_map.get(key, 0) or 0
+        weighted_sum += (score / 100.0) * w
+        total_weight += w
+
+    if total_weight == 0:
+        return 0.0
+    # Normalise to 0-100
+    return round((weighted_sum / total_weight) * 100.0, 1)
+
+
+def calculate_prs(student, config: Dict[str, Any] = None) -> float:
+    """Calculate Placement Readiness Score using admin-configured weights."""
+    if config is None:
+        config = DEFAULT_RANKING_CONFIG
+
+    param_map = {
+        "dsa":        getattr(student, "dsa_score", 0) or 0,
+        "ml":         getattr(student, "ml_score", 0) or 0,
+        "qa":         getattr(student, "qa_score", 0) or 0,
+        "projects":   getattr(student, "projects_score", 0) or 0,
+        "mock":       getattr(student, "mock_interview_score", 0) or 0,
+        "attendance": getattr(student, "attendance", 0) or 0,
+    }
+    return prs_from_params(param_map, config)
+
+
+def config_hash(config: Dict[str, Any]) -> str:
+    return hashlib.sha1(json.dumps(config, sort_keys=True).encode()).hexdigest()
+
+
+def weight_vector(config: Dict[str, Any]) -> np.ndarray:
+    """Weights aligned with PRS_SCORE_COLUMNS; disabled parameters weigh zero."""
+    return np.array(list(parameter_weights(config).values()), dtype=np.float64)
+
+
+def score_matrix_prs(scores: np.ndarray, config: Dict[str, Any]) -> np.ndarray:
+    """
+    PRS for a whole cohort from an (N x 6) score matrix. Gives the same values as
+    calculate_prs row by row: terms are summed in column order and rounded like round().
+    """
+    weights = weight_vector(config)
+    total_weight = sum(weights.tolist())
+    if total_weight == 0 or scores.size == 0:
+        return np.zeros(scores.shape[0])
+    weighted = sum_in_order(list(((scores / 100.0) * weights).T))
+    return py_round((weighted / total_weight) * 100.0, 1)
+
+
+def invalidate(db: Session):
+    """
+    Mark the persisted ranking out of date. Called by ranking-config saves and by bulk student
+    writes (bulk_*_mappings skip the flush hook below); bumps the ranking generation in the
+    caller's transaction and does not commit.
+    """
+    analytics_cache.bump_generations(db, [GENERATION_TAG])
+
+
+_SCORE_ATTRIBUTES = [column.key for column in PRS_SCORE_COLUMNS.values()]
+
+
+def _changes_scores(session: Session) -> bool:
+    if any(isinstance(obj, models.Student) for obj in chain(session.new, session.deleted)):
+        return True
+    for obj in session.dirty:
+        if isinstance(obj, models.Student):
+            attrs = inspect(obj).attrs
+            if any(attrs[key].history.has_changes() for key in _SCORE_ATTRIBUTES):
+                return True
+    return False
+
+
+@event.listens_for(Session, "before_flush")
+def _invalidate_on_score_write(session, flush_context, instances):
+    """ORM writes that add, remove or rescore students move the ranking generation in the same flush."""
+    if not _changes_scores(session):
+        return
+    # bump_generations opens a savepoint, which cannot happen mid-flush; a pending row joins this flush
+    bumped = session.execute(
+        update(models.CacheGeneration)
+        .where(models.CacheGeneration.tag == GENERATION_TAG)
+        .values(generation=models.CacheGeneration.generation + 1)
+    ).rowcount
+    if not bumped:
+        session.add(models.CacheGeneration(tag=GENERATION_TAG, generation=1))
+
+
+def _generation(db: Session) -> int:
+    # Read from the table rather than the cached view, so a write is reflected on the next read
+    generation = db.query(models.CacheGeneration.generation).filter(models.CacheGeneration.tag == GENERATION_TAG).scalar()
+    return generation or 0
+
+
+def index_digest(config: Dict[str, Any], generation: int) -> str:
+    """Identifies what an index was built from: the ranking config and the ranking generation."""
+    return config_hash({"config": config, "generation": generation})
+
+
+def rebuild_rank_index(db: Session, config: Optional[Dict[str, Any]] = None) -> int:
+    """Score every student in one pass and rewrite the rank table. Commits."""
+    if config is None:
+        config = get_ranking_config_from_db(db)
+    generation = _generation(db)
+    rows = db.query(models.Student.enrollment_no, *PRS_SCORE_COLUMNS.values()).all()
+    n = len(rows)
+    ids = np.array([row[0] for row in rows], dtype=object)
+    scores = np.array([[v or 0 for v in row[1:]] for row in rows], dtype=np.float64).reshape(n, len(PRS_SCORE_COLUMNS))
+    prs = score_matrix_prs(scores, config)
+
+    # Highest PRS first, ties broken by student id so ranks (and pagination cursors) are stable
+    order = np.lexsort((ids, -prs)) if n else np.array([], dtype=np.int64)
+    ranks = np.arange(1, n + 1)
+    percentiles = np.round((n - ranks) / n * 100.0, 1) if n else ranks
+    digest = index_digest(config, generation)
+    now = datetime.utcnow()
+
+    db.query(models.StudentRankIndex).delete(synchronize_session=False)
+    mappings = [{
+        "student_id": ids[i],
+        "prs_score": float(prs[i]),
+        "rank": int(rank),
+        "percentile": float(pct),
+        "config_hash": digest,
+        "computed_at": now
+    } for i, rank, pct in zip(order, ranks, percentiles)]
+    for start in range(0, n, 500):
+        db.bulk_insert_mappings(models.StudentRankIndex, mappings[start:start + 500])
+    db.merge(models.RankIndexState(id=INDEX_STATE_ID, digest=digest, row_count=n, built_at=now))
+    try:
+        db.commit()
+    except IntegrityError:
+        # Another worker rebuilt the index concurrently; its rows are equivalent
+        db.rollback()
+    return n
+
+
+_rebuild_lock = threading.Lock()
+
+
+def _index_is_current(db: Session, config: Dict[str, Any]) -> bool:
+    # Two primary-key reads: the state row written by the last rebuild and the ranking generation
+    digest = db.query(models.RankIndexState.digest).filter(models.RankIndexState.id == INDEX_STATE_ID).scalar()
+    return digest is not None and digest == index_digest(config, _generation(db))
+
+
+def ensure_rank_index(db: Session, config: Optional[Dict[str, Any]] = None):
+    """
+    Rebuild the index if students or the config changed since it was built. The rebuild runs in its own session and transaction, never in the caller's (read)
+    one, and one request per process rebuilds while the others wait for it.
+    """
+    if config is None:
+        config = get_ranking_config_from_db(db)
+    if _index_is_current(db, config):
+        return
+    with _rebuild_lock:
+        rebuild_db = SessionLocal()
+        try:
+            if not _index_is_current(rebuild_db, config):
+                rebuild_rank_index(rebuild_db, config)
+        finally:
+            rebuild_db.close()
+
+
+def top_k(db: Session, k: int = 10) -> List[models.StudentRankIndex]:
+    ensure_rank_index(db)
+    # populate_existing: rows this session loaded before a rebuild would otherwise keep their old ranks
+    return db.query(models.StudentRankIndex).populate_existing().order_by(models.StudentRankIndex.rank).limit(k).all()
+
+
+def rank_of(db: Session, student_id: str) -> Optional[models.StudentRankIndex]:
+    ensure_rank_index(db)
+    return db.query(models.StudentRankIndex).populate_existing().filter(models.StudentRankIndex.student_id == student_id).first()
+
+
+def percentile_range(db: Session, low: float = 0.0, high: float = 100.0) -> List[models.StudentRankIndex]:
+    ensure_rank_index(db)
+    return db.query(models.StudentRankIndex).populate_existing().filter(
+        models.StudentRankIndex.percentile >= low,
+        models.StudentRankIndex.percentile <= high
+    ).order_by(models.StudentRankIndex.rank).all()
+
+
+def prs_by_student(db: Session, student_ids: List[str]) -> Dict[str, float]:
+    ensure_rank_index(db)
+    result: Dict[str, float] = {}
+    for start in range(0, len(student_ids), 500):
+        result.update(db.query(models.StudentRankIndex.student_id, models.StudentRankIndex.prs_score).filter(
+            models.StudentRankIndex.student_id.in_(student_ids[start:start + 500])
+        ).all())
+    return result
+
+
+def to_dict(row: models.StudentRankIndex) -> Dict[str, Any]:
+    return {
+        "student_id": row.student_id,
+        "prs_score": row.prs_score,
+        "rank": row.rank,
+        "percentile": row.percentile
+    }
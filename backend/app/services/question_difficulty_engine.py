@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any, List
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, text_column, tiers
+
 class IRTQuestionDifficultyEngine:
     """
     Model 9 of 13: Test Question Difficulty Prediction Engine (Item Response Theory - IRT / XGBoost)
@@ -63,3 +67,36 @@ class IRTQuestionDifficultyEngine:
                 "has_code_snippet": has_code
             }
         }
+
+    def predict_difficulty_batch(self, question_items: Any) -> Dict[str, Any]:
+        """
+        Vectorized predict_difficulty over N items (columns question_text, has_code_snippet,
+        historical_accuracy_pct). Text flags are derived once per item; scoring is array math.
+        """
+        cols = to_columns(question_items)
+        n = row_count(cols)
+        text = text_column(cols, n, "question_text").astype(str)
+        lower = np.char.lower(text)
+
+        def contains(haystack: np.ndarray, needle: str) -> np.ndarray:
+            return np.char.find(haystack, needle) >= 0
+
+        explicit_code = column(cols, n, "has_code_snippet", np.nan)
+        detected_code = contains(lower, "code") | contains(lower, "def ") | contains(text, "{")
+        has_code = np.where(np.isnan(explicit_code), detected_code, explicit_code != 0)
+        advanced = contains(lower, "advanced") | contains(lower, "complex")
+        lengths = np.char.str_len(text)
+
+        hist_acc = column(cols, n, "historical_accuracy_pct", np.nan)
+        text_beta = 0.45 + np.where(lengths > 100, 0.15, 0.0) + np.where(has_code, 0.20, 0.0) + np.where(advanced, 0.10, 0.0)
+        beta_val = np.clip(np.where(np.isnan(hist_acc), text_beta, (100.0 - hist_acc) / 100.0), 0.05, 0.95)
+        beta_score = np.round(beta_val, 2)
+
+        return {
+            "model_version": self.model_name,
+            "difficulty_score_beta": beta_score,
+            "discrimination_parameter_a": np.round(1.0 + (beta_score * 0.6), 2),
+            "expected_student_accuracy": np.round((1.0 - beta_score) * 100.0, 1),
+            "predicted_difficulty": tiers(beta_score, [0.35, 0.65], ["EASY", "MEDIUM", "HARD"]),
+            "has_code_snippet": has_code
+        }
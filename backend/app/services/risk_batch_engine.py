@@ -0,0 +1,213 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import json
+import time
+
+import numpy as np
+
+from .. import models
+from . import engagement_engine, risk_snapshot_service, analytics_cache
+from .risk_engine import load_risk_weight_vector, explain_risk_factors
+from .feature_matrix import py_round
+
+RISK_LEVEL_THRESHOLDS = np.array([20.0, 35.0, 55.0, 75.0])
+RISK_LEVEL_LABELS = np.array(["SAFE", "LOW_RISK", "MEDIUM_RISK", "HIGH_RISK", "CRITICAL_RISK"], dtype=object)
+
+DEFAULT_CHUNK_SIZE = 500
+# Below this many students, input queries filter by id instead of scanning the whole table
+SUBSET_FILTER_LIMIT = 900
+
+def score_cohort(students: List[models.Student], db: Session) -> Dict[str, np.ndarray]:
+    """
+    Set-based equivalent of risk_engine.calculate_student_risk for many students at once.
+    Loads academic averages, engagement and the risk_weights setting once, then scores
+    every student with NumPy array arithmetic. Does not write anything.
+    """
+    student_ids = [s.enrollment_no for s in students]
+    n = len(student_ids)
+    index = {sid: i for i, sid in enumerate(student_ids)}
+
+    # Academic average per student (one grouped query)
+    avg_acad_score = np.full(n, 70.0)
+    acad_query = db.query(
+        models.AcademicMetric.student_id,
+        func.avg(models.AcademicMetric.overall_score)
+    )
+    if n <= SUBSET_FILTER_LIMIT:
+        acad_query = acad_query.filter(models.AcademicMetric.student_id.in_(student_ids))
+    acad_rows = acad_query.group_by(models.AcademicMetric.student_id).all()
+    for sid, avg in acad_rows:
+        i = index.get(sid)
+        if i is not None and avg is not None:
+            avg_acad_score[i] = float(avg)
+
+    eng = engagement_engine.calculate_cohort_engagement(student_ids, db)
+    eng_score = eng["engagement_score"]
+    inactivity_hours = eng["inactivity_hours"]
+
+    attendance_pct = np.array([float(s.attendance) if s.attendance else 75.0 for s in students], dtype=np.float64)
+    backlogs = np.array([s.active_backlogs or 0 for s in students], dtype=np.float64)
+
+    academic_risk = np.maximum(0.0, 100.0 - avg_acad_score)
+    engagement_risk = np.maximum(0.0, 100.0 - eng_score)
+    attendance_risk = np.maximum(0.0, 100.0 - attendance_pct)
+
+    anomaly_penalty = np.select([inactivity_hours >= 72, inactivity_hours >= 48], [30.0, 15.0], 0.0)
+    anomaly_penalty = anomaly_penalty + np.where(backlogs > 0, backlogs * 10.0, 0.0)
+
+    w_acad, w_att, w_eng, w_backlog, w_other = load_risk_weight_vector(db)
+    raw_risk_score = (
+        academic_risk * w_acad +
+        attendance_risk * w_att +
+        engagement_risk * w_eng +
+        np.minimum(100.0, anomaly_penalty) * w_backlog +
+        (academic_risk * 0.5 + attendance_risk * 0.5) * w_other
+    )
+    risk_score = py_round(np.clip(raw_risk_score, 0.0, 100.0), 1)
+
+    return {
+        "students": students,
+        "student_ids": np.array(student_ids, dtype=object),
+        "risk_score": risk_score,
+        "risk_level": RISK_LEVEL_LABELS[np.searchsorted(RISK_LEVEL_THRESHOLDS, risk_score, side="right")],
+        "failure_probability": py_round(np.minimum(99.0, risk_score * 0.95), 1),
+        "avg_acad_score": avg_acad_score,
+        "engagement_score": eng_score,
+        "inactivity_hours": inactivity_hours,
+        "attendance_pct": attendance_pct,
+        "active_backlogs": backlogs.astype(np.int64)
+    }
+
+
+def upsert_risk_assessments(scores: Dict[str, np.ndarray], db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None) -> int:
+    """Bulk insert/update StudentRiskAssessment and RiskSnapshot rows, committing once per chunk."""
+    existing_query = db.query(
+        models.StudentRiskAssessment.student_id,
+        models.StudentRiskAssessment.id
+    )
+    if len(scores["student_ids"]) <= SUBSET_FILTER_LIMIT:
+        existing_query = existing_query.filter(models.StudentRiskAssessment.student_id.in_(list(scores["student_ids"])))
+    existing = dict(existing_query.all())
+
+    total = len(scores["student_ids"])
+    now = datetime.utcnow()
+    written = 0
+    for start in range(0, total, chunk_size):
+        inserts, updates, snapshots = [], [], []
+        for i in range(start, min(start + chunk_size, total)):
+            sid = scores["student_ids"][i]
+            factors, actions = explain_risk_factors(
+                float(scores["attendance_pct"][i]),
+                float(scores["avg_acad_score"][i]),
+                float(scores["engagement_score"][i]),
+                float(scores["inactivity_hours"][i]),
+                int(scores["active_backlogs"][i])
+            )
+            row = {
+                "student_id": sid,
+                "risk_score": float(scores["risk_score"][i]),
+                "risk_level": str(scores["risk_level"][i]),
+                "failure_probability": float(scores["failure_probability"][i]),
+                "primary_risk_factor": factors[0],
+                "contributing_factors_json": json.dumps(factors),
+                "recommended_actions_json": json.dumps(actions),
+                "calculated_at": now
+            }
+            snapshots.append(risk_snapshot_service.snapshot_row(scores["students"][i], {
+                **row,
+                "contributing_factors": factors,
+                "recommended_actions": actions
+            }, computed_at=now))
+            if sid in existing:
+                row["id"] = existing[sid]
+                updates.append(row)
+            else:
+                row["id"] = models.generate_uuid()
+                inserts.append(row)
+
+        if inserts:
+            db.bulk_insert_mappings(models.StudentRiskAssessment, inserts)
+        if updates:
+            db.bulk_update_mappings(models.StudentRiskAssessment, updates)
+        risk_snapshot_service.upsert_snapshot_rows(db, snapshots)
+        db.commit()
+        written += len(inserts) + len(updates)
+        if progress:
+            progress(written, total)
+    if written:
+        analytics_cache.invalidate("risk")
+    return written
+
+
+def recalculate_all_risk(db: Session, chunk_size: int = DEFAULT_CHUNK_SIZE, progress=None) -> Dict[str, Any]:
+    started = time.perf_counter()
+    students = db.query(models.Student).all()
+    scores = score_cohort(students, db)
+    written = upsert_risk_assessments(scores, db, chunk_size=chunk_size, progress=progress)
+
+    levels, counts = np.unique(scores["risk_level"].astype(str), return_counts=True) if written else ([], [])
+    return {
+        "students_processed": written,
+        "level_counts": {str(lvl): int(cnt) for lvl, cnt in zip(levels, counts)},
+        "duration_ms": round((time.perf_counter() - started) * 1000.0, 1)
+    }
+
+
+def refresh_risk_snapshots(db: Session, student_ids: Optional[List[str]] = None, chunk_size: int = DEFAULT_CHUNK_SIZE) -> Dict[str, Any]:
+    """
+    Incremental refresh: recompute only the students whose snapshot rows are stale or missing
+    (or the explicit student_ids given) and write both the assessment and snapshot tables.
+    """
+    started = time.perf_counter()
+    if student_ids is None:
+        student_ids = risk_snapshot_service.ids_needing_refresh(db)
+    if not student_ids:
+        return {"students_processed": 0, "duration_ms": 0.0}
+
+    students = []
+    for start in range(0, len(student_ids), SUBSET_FILTER_LIMIT):
+        students.extend(db.query(models.Student).filter(
+            models.Student.enrollment_no.in_(student_ids[start:start + SUBSET_FILTER_LIMIT])
+        ).all())
+    scores = score_cohort(students, db)
+    written = upsert_risk_assessments(scores, db, chunk_size=chunk_size)
+    return {
+        "students_processed": written,
+        "duration_ms": round((time.perf_counter() - started) * 1000.0, 1)
+    }
+
+
+def schedule_snapshot_refresh(db: Session) -> Optional[Dict[str, Any]]:
+    """
+    Called by dashboard reads, which serve the snapshot as it is: when rows are stale or missing,
+    make sure one "risk.refresh_snapshots" job is queued to recompute them. Commits the enqueue.
+    """
+    student_ids = risk_snapshot_service.ids_needing_refresh(db)
+    if not student_ids:
+        return None
+
+    from . import job_queue
+    in_flight = db.query(models.BackgroundJob.id).filter(
+        models.BackgroundJob.kind == "risk.refresh_snapshots",
+        models.BackgroundJob.status.in_(["QUEUED", "RUNNING"])
+    ).first()
+    job_id = in_flight.id if in_flight else job_queue.enqueue(
+        db, "risk.refresh_snapshots", priority=job_queue.PRIORITY_NORMAL, requested_by="risk-snapshot"
+    )["job_id"]
+    return {"stale_students": len(student_ids), "refresh_job_id": job_id}
+
+
+def refresh_snapshots_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """job_queue handler for "risk.refresh_snapshots": every stale or missing row at the time it runs."""
+    return refresh_risk_snapshots(db, payload.get("student_ids"))
+
+
+def recalculate_all_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """job_queue handler for "risk.recalculate_all"."""
+    return recalculate_all_risk(
+        db,
+        chunk_size=int(payload.get("chunk_size") or DEFAULT_CHUNK_SIZE),
+        progress=lambda done, total: ctx.progress(processed=done, total=total)
+    )
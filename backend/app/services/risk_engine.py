@@ -1,14 +1,85 @@
 from sqlalchemy.orm import Session
 from datetime import datetime
+from functools import lru_cache
+from typing import List, Optional, Tuple
 import json
 
 from .. import models
-from . import engagement_engine
+from . import engagement_engine, risk_snapshot_service, settings_cache, student_identity
+from .student_identity import StudentRef
+
+# Fallback weights used when no admin risk_weights are configured:
+# academic, attendance, engagement, anomaly/backlog, blended remainder
+DEFAULT_RISK_WEIGHT_VECTOR = (0.40, 0.15, 0.35, 0.10, 0.0)
+
+@lru_cache(maxsize=16)
+def parse_risk_weight_vector(value: Optional[str]) -> Tuple[float, float, float, float, float]:
+    """Turn the stored risk_weights JSON into (academic, attendance, engagement, backlog, other) fractions."""
+    if not value:
+        return DEFAULT_RISK_WEIGHT_VECTOR
+    try:
+        rw = json.loads(value)
+        w_acad = rw.get("academic", {}).get("weight", 25.0) / 100.0
+        w_att = rw.get("attendance", {}).get("weight", 20.0) / 100.0
+        w_eng = rw.get("engagement", {}).get("weight", 15.0) / 100.0
+        w_backlog = rw.get("backlog", {}).get("weight", 5.0) / 100.0
+        w_other = max(0.0, 1.0 - (w_acad + w_att + w_eng + w_backlog))
+        return (w_acad, w_att, w_eng, w_backlog, w_other)
+    except Exception:
+        return DEFAULT_RISK_WEIGHT_VECTOR
+
+def load_risk_weight_vector(db: Session) -> Tuple[float, float, float, float, float]:
+    return parse_risk_weight_vector(settings_cache.get_value(db, "risk_weights"))
+
+def classify_risk_level(risk_score: float) -> str:
+    if risk_score >= 75.0:
+        return "CRITICAL_RISK"
+    elif risk_score >= 55.0:
+        return "HIGH_RISK"
+    elif risk_score >= 35.0:
+        return "MEDIUM_RISK"
+    elif risk_score >= 20.0:
+        return "LOW_RISK"
+    return "SAFE"
+
+def explain_risk_factors(
+    attendance_pct: float,
+    avg_acad_score: float,
+    eng_score: float,
+    inactivity_hours: float,
+    active_backlogs: int
+) -> Tuple[List[str], List[str]]:
+    contributing_factors = []
+    recommended_actions = []
 
-def calculate_student_risk(student_id: str, db: Session) -> dict:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+    if attendance_pct < 75.0:
+        contributing_factors.append(f"Low overall attendance ({round(attendance_pct, 1)}%) below 75% requirement.")
+        recommended_actions.append("Issue Attendance Shortage Notice & Schedule Advisor Meeting.")
+
+    if avg_acad_score < 60.0:
+        contributing_factors.append(f"Low overall academic performance ({round(avg_acad_score, 1)}/100).")
+        recommended_actions.append("Assign Remedial Tutorial Classes in Weak Subjects.")
+
+    if eng_score < 60.0:
+        contributing_factors.append(f"Low LMS/Course Engagement score ({round(eng_score, 1)}/100).")
+        recommended_actions.append("Faculty Check-in to review LMS portal access.")
+
+    if inactivity_hours >= 48.0:
+        contributing_factors.append(f"Prolonged inactivity detected ({round(inactivity_hours, 1)} hours with no LMS activity).")
+        recommended_actions.append("Send Automated SMS/Email Academic Check-in Alert.")
+
+    if active_backlogs > 0:
+        contributing_factors.append(f"Active backlog count: {active_backlogs}.")
+        recommended_actions.append("Enrol in Special Backlog Preparation Track.")
+
+    if not contributing_factors:
+        contributing_factors.append("Good academic standing and consistent LMS engagement.")
+        recommended_actions.append("Maintain current academic routine.")
+
+    return contributing_factors, recommended_actions
+
+def calculate_student_risk(student_id: StudentRef, db: Session) -> dict:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return {"error": "Student not found"}
 
@@ -23,7 +94,7 @@ def calculate_student_risk(student_id: str, db: Session) -> dict:
         avg_acad_score = 70.0
 
     # Fetch Part 2 Metrics
-    eng_metrics = engagement_engine.calculate_student_engagement(student.enrollment_no, db)
+    eng_metrics = engagement_engine.calculate_student_engagement(student, db)
     eng_score = eng_metrics.get("engagement_score", 70.0)
     inactivity_hours = eng_metrics.get("inactivity_hours", 0.0)
 
@@ -44,86 +115,30 @@ def calculate_student_risk(student_id: str, db: Session) -> dict:
     elif inactivity_hours >= 48:
         anomaly_penalty += 15.0
 
-    if student.active_backlogs > 0:
+    if student.active_backlogs and student.active_backlogs > 0:
         anomaly_penalty += student.active_backlogs * 10.0
 
     # Fetch dynamic admin risk weights
-    setting = db.query(models.SystemSetting).filter(models.SystemSetting.key == "risk_weights").first()
-    if setting:
-        try:
-            rw = json.loads(setting.value)
-            w_acad = rw.get("academic", {}).get("weight", 25.0) / 100.0
-            w_att = rw.get("attendance", {}).get("weight", 20.0) / 100.0
-            w_eng = rw.get("engagement", {}).get("weight", 15.0) / 100.0
-            w_backlog = rw.get("backlog", {}).get("weight", 5.0) / 100.0
-            w_other = 1.0 - (w_acad + w_att + w_eng + w_backlog)
-            raw_risk_score = (
-                academic_risk * w_acad +
-                attendance_risk * w_att +
-                engagement_risk * w_eng +
-                min(100.0, anomaly_penalty) * w_backlog +
-                (academic_risk * 0.5 + attendance_risk * 0.5) * max(0.0, w_other)
-            )
-        except Exception:
-            raw_risk_score = (
-                academic_risk * 0.40 +
-                engagement_risk * 0.35 +
-                attendance_risk * 0.15 +
-                min(100.0, anomaly_penalty) * 0.10
-            )
-    else:
-        raw_risk_score = (
-            academic_risk * 0.40 +
-            engagement_risk * 0.35 +
-            attendance_risk * 0.15 +
-            min(100.0, anomaly_penalty) * 0.10
-        )
+    w_acad, w_att, w_eng, w_backlog, w_other = load_risk_weight_vector(db)
+    raw_risk_score = (
+        academic_risk * w_acad +
+        attendance_risk * w_att +
+        engagement_risk * w_eng +
+        min(100.0, anomaly_penalty) * w_backlog +
+        (academic_risk * 0.5 + attendance_risk * 0.5) * w_other
+    )
 
     risk_score = round(min(100.0, max(0.0, raw_risk_score)), 1)
 
-    # Risk Level mapping
-    if risk_score >= 75.0:
-        risk_level = "CRITICAL_RISK"
-    elif risk_score >= 55.0:
-        risk_level = "HIGH_RISK"
-    elif risk_score >= 35.0:
-        risk_level = "MEDIUM_RISK"
-    elif risk_score >= 20.0:
-        risk_level = "LOW_RISK"
-    else:
-        risk_level = "SAFE"
+    risk_level = classify_risk_level(risk_score)
 
     # Failure / Dropout Probability estimation
     failure_probability = round(min(99.0, risk_score * 0.95), 1)
 
     # Extract Primary Risk Factor & Contributing Factors
-    contributing_factors = []
-    recommended_actions = []
-
-    if attendance_pct < 75.0:
-        contributing_factors.append(f"Low overall attendance ({round(attendance_pct, 1)}%) below 75% requirement.")
-        recommended_actions.append("Issue Attendance Shortage Notice & Schedule Advisor Meeting.")
-
-    if avg_acad_score < 60.0:
-        contributing_factors.append(f"Low overall academic performance ({round(avg_acad_score, 1)}/100).")
-        recommended_actions.append("Assign Remedial Tutorial Classes in Weak Subjects.")
-
-    if eng_score < 60.0:
-        contributing_factors.append(f"Low LMS/Course Engagement score ({round(eng_score, 1)}/100).")
-        recommended_actions.append("Faculty Check-in to review LMS portal access.")
-
-    if inactivity_hours >= 48.0:
-        contributing_factors.append(f"Prolonged inactivity detected ({round(inactivity_hours, 1)} hours with no LMS activity).")
-        recommended_actions.append("Send Automated SMS/Email Academic Check-in Alert.")
-
-    if student.active_backlogs > 0:
-        contributing_factors.append(f"Active backlog count: {student.active_backlogs}.")
-        recommended_actions.append("Enrol in Special Backlog Preparation Track.")
-
-    if not contributing_factors:
-        contributing_factors.append("Good academic standing and consistent LMS engagement.")
-        recommended_actions.append("Maintain current academic routine.")
-
+    contributing_factors, recommended_actions = explain_risk_factors(
+        attendance_pct, avg_acad_score, eng_score, inactivity_hours, student.active_backlogs or 0
+    )
     primary_factor = contributing_factors[0]
 
     # Save to StudentRiskAssessment DB table
@@ -141,9 +156,8 @@ def calculate_student_risk(student_id: str, db: Session) -> dict:
     risk_rec.primary_risk_factor = primary_factor
     risk_rec.contributing_factors_json = json.dumps(contributing_factors)
     risk_rec.recommended_actions_json = json.dumps(recommended_actions)
-    db.commit()
 
-    return {
+    result = {
         "student_id": student.enrollment_no,
         "name": student.name,
         "branch": student.branch,
@@ -156,3 +170,9 @@ def calculate_student_risk(student_id: str, db: Session) -> dict:
         "recommended_actions": recommended_actions,
         "calculated_at": datetime.utcnow().isoformat()
     }
+
+    # Keep the dashboard snapshot in step with the fresh assessment
+    risk_snapshot_service.upsert_snapshot_rows(db, [risk_snapshot_service.snapshot_row(student, result)])
+    db.commit()
+
+    return result
@@ -1,24 +1,27 @@
 from sqlalchemy.orm import Session
 from datetime import datetime
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Iterable, Optional
 import json
+import os
 
 from .. import models
+from . import student_identity
 from .feature_engine import build_student_features
+from .student_identity import StudentRef
 from .risk_predictor import MLRiskPredictor
 
-def evaluate_and_explain_risk(student_id: str, db: Session) -> Dict[str, Any]:
-    student = db.query(models.Student).filter(
-        (models.Student.enrollment_no == student_id) | (models.Student.email.like(f"{student_id}%"))
-    ).first()
+# Shared across requests; the trained booster it uses is loaded once by the model registry
+predictor = MLRiskPredictor()
+
+def evaluate_and_explain_risk(student_id: StudentRef, db: Session) -> Dict[str, Any]:
+    student = student_identity.resolve(db, student_id)
     if not student:
         return {"error": "Student not found"}
 
     # 1. Feature Engineering
-    features = build_student_features(student.enrollment_no, db)
+    features = build_student_features(student, db)
 
     # 2. Predict Risk using XGBoost + SHAP MLRiskPredictor
-    predictor = MLRiskPredictor()
     pred_res = predictor.predict_risk(features)
 
     overall_risk = pred_res["overall_risk"]
@@ -165,3 +168,25 @@ def evaluate_and_explain_risk(student_id: str, db: Session) -> Dict[str, Any]:
         "recommended_actions": actions,
         "calculated_at": datetime.utcnow().isoformat()
     }
+
+
+# Re-evaluations requested within this window are coalesced into one job
+RISK_REEVALUATION_DEBOUNCE_SECONDS = float(os.getenv("RISK_REEVALUATION_DEBOUNCE_SECONDS", "60"))
+
+def queue_reevaluation(db: Session, student_ids: Iterable[str], requested_by: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Defer evaluate_and_explain_risk for these students to a debounced "risk.explain_students" job. Commits."""
+    from . import job_queue
+    return job_queue.enqueue_debounced(
+        db, "risk.explain_students", list(student_ids), RISK_REEVALUATION_DEBOUNCE_SECONDS,
+        item_key="student_ids", requested_by=requested_by
+    )
+
+def reevaluate_students_job(db: Session, payload: Dict[str, Any], ctx) -> Dict[str, Any]:
+    """job_queue handler for "risk.explain_students"."""
+    student_ids = payload.get("student_ids") or []
+    evaluated = 0
+    for done, student_id in enumerate(student_ids, start=1):
+        if "error" not in evaluate_and_explain_risk(student_id, db):
+            evaluated += 1
+        ctx.progress(processed=done, total=len(student_ids))
+    return {"requested": len(student_ids), "evaluated": evaluated}
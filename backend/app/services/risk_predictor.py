@@ -1,12 +1,51 @@
 from abc import ABC, abstractmethod
 from typing import Dict, Any
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, tiers, py_round
+
+DEFAULT_RULE_WEIGHTS = {
+    "academic": {"weight": 25.0},
+    "attendance": {"weight": 20.0},
+    "engagement": {"weight": 15.0},
+    "assessment_trend": {"weight": 15.0},
+    "assignment": {"weight": 20.0},
+    "backlog": {"weight": 5.0}
+}
+
+def _is_missing(value: Any) -> bool:
+    return value is None or (isinstance(value, float) and np.isnan(value))
+
 class RiskPredictor(ABC):
 
     @abstractmethod
     def predict_risk(self, features: Dict[str, Any]) -> Dict[str, Any]:
         pass
 
+    def predict_risk_batch(self, features: Any, weights: Dict[str, Any] = None) -> Dict[str, Any]:
+        """
+        Score N students at once; returns arrays aligned with the input rows. This default runs
+        predict_risk per row; subclasses vectorize it.
+        """
+        cols = to_columns(features)
+        results = []
+        for i in range(row_count(cols)):
+            row = {k: v[i] for k, v in cols.items() if not _is_missing(v[i])}
+            if weights:
+                row["weights"] = weights
+            results.append(self.predict_risk(row))
+        out: Dict[str, Any] = {}
+        for key in (results[0] if results else {}):
+            values = [r.get(key) for r in results]
+            if key == "model_version":
+                out[key] = values[0]
+            elif all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in values):
+                out[key] = np.array(values, dtype=np.float64)
+            else:
+                out[key] = np.array(values, dtype=object)
+        return out
+
 class RuleBasedRiskPredictor(RiskPredictor):
 
     def predict_risk(self, features: Dict[str, Any]) -> Dict[str, Any]:
@@ -56,14 +95,7 @@ class RuleBasedRiskPredictor(RiskPredictor):
         # Dynamic AI evaluation of built-in + admin custom added risk factors
         weights = features.get("weights", {})
         if not weights:
-            weights = {
-                "academic": {"weight": 25.0},
-                "attendance": {"weight": 20.0},
-                "engagement": {"weight": 15.0},
-                "assessment_trend": {"weight": 15.0},
-                "assignment": {"weight": 20.0},
-                "backlog": {"weight": 5.0}
-            }
+            weights = DEFAULT_RULE_WEIGHTS
 
         total_risk = 0.0
         total_weight = 0.0
@@ -123,12 +155,78 @@ class RuleBasedRiskPredictor(RiskPredictor):
             "model_version": "rule-based-v1.0"
         }
 
+    def predict_risk_batch(self, features: Any, weights: Dict[str, Any] = None) -> Dict[str, Any]:
+        cols = to_columns(features)
+        n = row_count(cols)
+        academic_risk = np.clip(100.0 - column(cols, n, "current_average_marks", 70.0), 0.0, 100.0)
+        attendance_risk = np.clip(100.0 - column(cols, n, "attendance_percentage", 75.0), 0.0, 100.0)
+        engagement_risk = np.clip(100.0 - column(cols, n, "engagement_score", 70.0), 0.0, 100.0)
+        marks_change = column(cols, n, "marks_change_30d", 0.0)
+        assessment_risk = np.clip((100.0 - column(cols, n, "assessment_average", 75.0)) + np.maximum(0.0, -marks_change * 2.0), 0.0, 100.0)
+        assignment_risk = np.minimum(100.0, column(cols, n, "missed_assignments", 0.0) * 20.0)
+        backlog_risk = np.minimum(100.0, column(cols, n, "backlog_count", 0.0) * 30.0)
+        factor_risk = {
+            "academic": academic_risk,
+            "attendance": attendance_risk,
+            "engagement": engagement_risk,
+            "assessment_trend": assessment_risk,
+            "assignment": assignment_risk,
+            "backlog": backlog_risk
+        }
+
+        total_risk = np.zeros(n)
+        total_weight = 0.0
+        for key, cfg in (weights or DEFAULT_RULE_WEIGHTS).items():
+            w = (cfg.get("weight", 0.0) if isinstance(cfg, dict) else float(cfg)) / 100.0
+            if w <= 0:
+                continue
+            if key in factor_risk:
+                f_risk = factor_risk[key]
+            else:
+                # Custom factor added by admin: column named key or key_score, 70 when absent
+                custom_val = column(cols, n, [key, f"{key}_score"], 70.0)
+                f_risk = np.clip(100.0 - np.where(custom_val == 0, 70.0, custom_val), 0.0, 100.0)
+            total_risk += f_risk * w
+            total_weight += w
+
+        raw_overall = (total_risk / total_weight * 100.0) if total_weight > 1.5 else total_risk
+        overall_risk = py_round(np.clip(raw_overall, 0.0, 100.0), 1)
+        risk_level = tiers(overall_risk, [21.0, 41.0, 61.0, 81.0], ["VERY_LOW", "LOW", "MODERATE", "HIGH", "CRITICAL"])
+        risk_status = np.full(n, "CALCULATED", dtype=object)
+
+        insufficient = column(cols, n, "has_sufficient_data", 1.0) == 0
+        if insufficient.any():
+            overall_risk = np.where(insufficient, 50.0, overall_risk)
+            risk_level = np.where(insufficient, "MODERATE", risk_level)
+            risk_status = np.where(insufficient, "INSUFFICIENT_DATA", risk_status)
+            academic_risk, attendance_risk, engagement_risk, assessment_risk, backlog_risk = (
+                np.where(insufficient, 50.0, arr) for arr in (academic_risk, attendance_risk, engagement_risk, assessment_risk, backlog_risk)
+            )
+
+        return {
+            "model_version": "rule-based-v1.0",
+            "overall_risk": overall_risk,
+            "risk_level": risk_level,
+            "risk_status": risk_status,
+            "academic_risk": py_round(academic_risk, 1),
+            "attendance_risk": py_round(attendance_risk, 1),
+            "engagement_risk": py_round(engagement_risk, 1),
+            "assessment_risk": py_round(assessment_risk, 1),
+            "backlog_risk": py_round(backlog_risk, 1)
+        }
+
 class MLRiskPredictor(RiskPredictor):
     """Production ML Risk Predictor backed by XGBoost + SHAP Explainability Engine"""
     def __init__(self, model_path: str = None):
         from .xgboost_risk_engine import XGBoostRiskEngine
         self.xgb_engine = XGBoostRiskEngine()
-        self.model_version = "XGBoost-v1.6-SHAP"
+        self.formula_version = "XGBoost-v1.6-SHAP"
+
+    @property
+    def model_version(self) -> str:
+        from .model_registry import registry
+        model = registry.active_model() if self.xgb_engine.use_registry else None
+        return model[1] if model is not None else self.formula_version
 
     def predict_risk(self, features: Dict[str, Any]) -> Dict[str, Any]:
         # Run rule-based predictor for breakdown metrics
@@ -140,9 +238,22 @@ class MLRiskPredictor(RiskPredictor):
         
         base_res["overall_risk"] = xgb_res["risk_probability"]
         base_res["risk_level"] = xgb_res["risk_tier"]
-        base_res["model_version"] = self.model_version
+        # The version the scores came from, not whatever is loaded by now
+        base_res["model_version"] = xgb_res.get("model_version") or self.formula_version
         base_res["top_reasons"] = xgb_res["top_reasons"]
         base_res["shap_values"] = xgb_res["shap_values"]
         
         return base_res
 
+    def predict_risk_batch(self, features: Any, weights: Dict[str, Any] = None) -> Dict[str, Any]:
+        cols = to_columns(features)
+        base_res = RuleBasedRiskPredictor().predict_risk_batch(cols, weights=weights)
+        xgb_res = self.xgb_engine.predict_batch(cols)
+
+        base_res["overall_risk"] = xgb_res["risk_probability"]
+        base_res["risk_level"] = xgb_res["risk_tier"]
+        base_res["model_version"] = xgb_res.get("model_version") or self.formula_version
+        base_res["top_risk_factor"] = xgb_res["top_risk_factor"]
+        base_res["shap_factors"] = xgb_res["shap_factors"]
+        base_res["shap_values"] = xgb_res["shap_values"]
+        return base_res
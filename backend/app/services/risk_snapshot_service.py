@@ -0,0 +1,142 @@
+from sqlalchemy.orm import Session
+from sqlalchemy import func, case
+from datetime import datetime
+from typing import Dict, Any, List, Optional, Iterable
+import json
+
+from .. import models
+
+RISK_LEVELS = ["CRITICAL_RISK", "HIGH_RISK", "MEDIUM_RISK", "LOW_RISK", "SAFE"]
+
+
+def mark_stale(db: Session, student_ids: Iterable[str]):
+    """Flag snapshot rows whose risk inputs changed. Does not commit; callers commit with their own write."""
+    ids = list({sid for sid in student_ids if sid})
+    for start in range(0, len(ids), 500):
+        db.query(models.RiskSnapshot).filter(
+            models.RiskSnapshot.student_id.in_(ids[start:start + 500])
+        ).update({models.RiskSnapshot.is_stale: True}, synchronize_session=False)
+
+
+def mark_all_stale(db: Session):
+    db.query(models.RiskSnapshot).update({models.RiskSnapshot.is_stale: True}, synchronize_session=False)
+
+
+def snapshot_row(student: models.Student, risk: Dict[str, Any], computed_at: Optional[datetime] = None) -> Dict[str, Any]:
+    return {
+        "student_id": student.enrollment_no,
+        "name": student.name,
+        "branch": student.branch,
+        "semester": student.semester,
+        "risk_score": risk["risk_score"],
+        "risk_level": risk["risk_level"],
+        "failure_probability": risk["failure_probability"],
+        "primary_risk_factor": risk["primary_risk_factor"],
+        "contributing_factors_json": json.dumps(risk["contributing_factors"]),
+        "recommended_actions_json": json.dumps(risk["recommended_actions"]),
+        "is_stale": False,
+        "computed_at": computed_at or datetime.utcnow()
+    }
+
+
+def upsert_snapshot_rows(db: Session, rows: List[Dict[str, Any]]):
+    """Bulk insert/update snapshot rows. Does not commit."""
+    if not rows:
+        return
+    ids = [r["student_id"] for r in rows]
+    existing = set()
+    for start in range(0, len(ids), 500):
+        existing.update(sid for (sid,) in db.query(models.RiskSnapshot.student_id).filter(
+            models.RiskSnapshot.student_id.in_(ids[start:start + 500])
+        ).all())
+    inserts = [r for r in rows if r["student_id"] not in existing]
+    updates = [r for r in rows if r["student_id"] in existing]
+    if inserts:
+        db.bulk_insert_mappings(models.RiskSnapshot, inserts)
+    if updates:
+        db.bulk_update_mappings(models.RiskSnapshot, updates)
+
+
+def ids_needing_refresh(db: Session) -> List[str]:
+    """Students whose snapshot row is stale or missing."""
+    stale = [sid for (sid,) in db.query(models.RiskSnapshot.student_id).filter(models.RiskSnapshot.is_stale == True).all()]
+    missing = [sid for (sid,) in db.query(models.Student.enrollment_no).outerjoin(
+        models.RiskSnapshot, models.RiskSnapshot.student_id == models.Student.enrollment_no
+    ).filter(models.RiskSnapshot.student_id == None).all()]
+    return stale + missing
+
+
+def is_empty(db: Session) -> bool:
+    return db.query(models.RiskSnapshot.student_id).first() is None
+
+
+def _filtered(db: Session, query, branch: Optional[str] = None, semester: Optional[int] = None):
+    if branch:
+        query = query.filter(models.RiskSnapshot.branch == branch)
+    if semester is not None:
+        query = query.filter(models.RiskSnapshot.semester == semester)
+    return query
+
+
+def to_risk_dict(row: models.RiskSnapshot) -> Dict[str, Any]:
+    """Same shape as risk_engine.calculate_student_risk, plus staleness markers."""
+    return {
+        "student_id": row.student_id,
+        "name": row.name,
+        "branch": row.branch,
+        "semester": row.semester,
+        "risk_score": row.risk_score,
+        "risk_level": row.risk_level,
+        "failure_probability": row.failure_probability,
+        "primary_risk_factor": row.primary_risk_factor,
+        "contributing_factors": json.loads(row.contributing_factors_json) if row.contributing_factors_json else [],
+        "recommended_actions": json.loads(row.recommended_actions_json) if row.recommended_actions_json else [],
+        "calculated_at": row.computed_at.isoformat() if row.computed_at else None,
+        "is_stale": bool(row.is_stale)
+    }
+
+
+def level_counts(db: Session, branch: Optional[str] = None, semester: Optional[int] = None) -> Dict[str, int]:
+    query = _filtered(db, db.query(models.RiskSnapshot.risk_level, func.count(models.RiskSnapshot.student_id)), branch, semester)
+    counts = {lvl: 0 for lvl in RISK_LEVELS}
+    for lvl, cnt in query.group_by(models.RiskSnapshot.risk_level).all():
+        counts[lvl] = counts.get(lvl, 0) + cnt
+    return counts
+
+
+def branch_level_counts(db: Session) -> Dict[str, Dict[str, int]]:
+    rows = db.query(
+        models.RiskSnapshot.branch,
+        models.RiskSnapshot.risk_level,
+        func.count(models.RiskSnapshot.student_id)
+    ).group_by(models.RiskSnapshot.branch, models.RiskSnapshot.risk_level).all()
+    breakdown: Dict[str, Dict[str, int]] = {}
+    for branch, lvl, cnt in rows:
+        dept = breakdown.setdefault(branch or "General", {**{l: 0 for l in RISK_LEVELS}, "total": 0})
+        dept[lvl] = dept.get(lvl, 0) + cnt
+        dept["total"] += cnt
+    return breakdown
+
+
+def list_students(
+    db: Session,
+    branch: Optional[str] = None,
+    semester: Optional[int] = None,
+    risk_level: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    query = _filtered(db, db.query(models.RiskSnapshot), branch, semester)
+    if risk_level:
+        query = query.filter(models.RiskSnapshot.risk_level == risk_level)
+    return [to_risk_dict(r) for r in query.order_by(models.RiskSnapshot.risk_score.desc()).all()]
+
+
+def freshness(db: Session, branch: Optional[str] = None, semester: Optional[int] = None) -> Dict[str, Any]:
+    """Oldest computed_at across the served rows and how many are flagged stale."""
+    oldest, stale = _filtered(db, db.query(
+        func.min(models.RiskSnapshot.computed_at),
+        func.sum(case((models.RiskSnapshot.is_stale == True, 1), else_=0))
+    ), branch, semester).one()
+    return {
+        "computed_at": oldest.isoformat() if oldest else None,
+        "stale_count": int(stale or 0)
+    }
@@ -0,0 +1,190 @@
+import os
+import socket
+import threading
+from datetime import datetime, timedelta
+from typing import Dict, Any, List, Optional, Tuple
+
+from sqlalchemy.exc import IntegrityError
+
+from ..database import SessionLocal
+from .. import models
+from . import job_queue
+
+SCHEDULER_ENABLED = os.getenv("SCHEDULER_ENABLED", "1") == "1"
+# scheduled_runs rows older than this are pruned as new slots are claimed
+RUN_HISTORY_DAYS = 7
+
+# name -> (cron expression "minute hour day-of-month month day-of-week", job kind, payload).
+# Times are UTC; an empty expression disables the entry. Each firing only enqueues a job, so the
+# work itself runs on the job workers like any other job.
+SCHEDULES: Dict[str, Tuple[str, str, Dict[str, Any]]] = {
+    "inactivity_sweep": (os.getenv("INACTIVITY_SWEEP_CRON", "0 * * * *"), "engagement.inactivity_sweep", {}),
+}
+
+_FIELD_RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+
+def _parse_field(text: str, low: int, high: int) -> frozenset:
+    values = set()
+    for part in text.split(","):
+        part, _, step_text = part.partition("/")
+        step = int(step_text) if step_text else 1
+        if part == "*":
+            start, end = low, high
+        elif "-" in part:
+            start, end = (int(v) for v in part.split("-", 1))
+        else:
+            start = int(part)
+            end = high if step_text else start
+        if start < low or end > high or start > end or step < 1:
+            raise ValueError(f"Cron field '{text}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return frozenset(values)
+
+
+def parse_cron(expression: str) -> List[frozenset]:
+    fields = expression.split()
+    if len(fields) != 5:
+        raise ValueError(f"Cron expression '{expression}' needs 5 fields")
+    parsed = [_parse_field(text, low, high) for text, (low, high) in zip(fields, _FIELD_RANGES)]
+    # 7 is accepted as Sunday, as in most crons
+    parsed[4] = frozenset(0 if day == 7 else day for day in parsed[4])
+    return parsed
+
+
+def _day_matches(fields: List[frozenset], moment: datetime) -> bool:
+    day_of_month, day_of_week = fields[2], fields[4]
+    dom_hit = moment.day in day_of_month
+    dow_hit = (moment.weekday() + 1) % 7 in day_of_week
+    # Standard cron: when both day fields are restricted, either one matching is enough
+    if len(day_of_month) < 31 and len(day_of_week) < 7:
+        return dom_hit or dow_hit
+    return dom_hit and dow_hit
+
+
+def next_run(fields: List[frozenset], after: datetime) -> datetime:
+    """First minute strictly after `after` that matches the parsed expression."""
+    moment = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    limit = moment + timedelta(days=366 * 4)
+    while moment < limit:
+        if moment.month not in fields[3] or not _day_matches(fields, moment):
+            moment = (moment + timedelta(days=1)).replace(hour=0, minute=0)
+        elif moment.hour not in fields[1]:
+            moment = (moment + timedelta(hours=1)).replace(minute=0)
+        elif moment.minute not in fields[0]:
+            moment += timedelta(minutes=1)
+        else:
+            return moment
+    raise ValueError("Cron expression never fires")
+
+
+class Scheduler:
+    """
+    Local cron-style scheduler: one thread that enqueues job_queue jobs when their expression
+    comes due. Every API worker runs one; each slot is claimed by inserting its (schedule, minute)
+    row into scheduled_runs, and the unique constraint lets exactly one process win. The winner
+    still skips the slot while a job of that kind is queued or running, so a slow run does not
+    pile up behind itself.
+    """
+
+    def __init__(self, schedules: Dict[str, Tuple[str, str, Dict[str, Any]]] = SCHEDULES):
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        for name, (expression, kind, payload) in schedules.items():
+            if expression.strip():
+                self.entries[name] = {
+                    "expression": expression, "fields": parse_cron(expression), "kind": kind, "payload": payload,
+                    "next_run": None, "last_run": None, "last_job_id": None, "skipped": 0
+                }
+        self.scheduler_id = f"{socket.gethostname()}:{os.getpid()}"
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def start(self):
+        if self._thread is not None or not self.entries:
+            return
+        now = datetime.utcnow()
+        for entry in self.entries.values():
+            entry["next_run"] = next_run(entry["fields"], now)
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, name="job-scheduler", daemon=True)
+        self._thread.start()
+        print(f"[Scheduler] Started with {len(self.entries)} schedules: {', '.join(self.entries)}")
+
+    def stop(self):
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join(timeout=5)
+        self._thread = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            name: {k: (v.isoformat() if isinstance(v, datetime) else v) for k, v in entry.items() if k != "fields"}
+            for name, entry in self.entries.items()
+        }
+
+    def run_due(self, now: datetime):
+        for name, entry in self.entries.items():
+            if entry["next_run"] is not None and entry["next_run"] <= now:
+                self._fire(name, entry, entry["next_run"])
+                entry["next_run"] = next_run(entry["fields"], now)
+
+    def _fire(self, name: str, entry: Dict[str, Any], slot: datetime):
+        db = SessionLocal()
+        try:
+            entry["last_run"] = datetime.utcnow()
+            run = models.ScheduledRun(
+                schedule_name=name, slot=slot, scheduler_id=self.scheduler_id, created_at=entry["last_run"]
+            )
+            db.add(run)
+            try:
+                db.flush()
+            except IntegrityError:
+                # Another scheduler process already claimed this slot
+                db.rollback()
+                entry["skipped"] += 1
+                return
+            db.query(models.ScheduledRun).filter(
+                models.ScheduledRun.schedule_name == name,
+                models.ScheduledRun.slot < slot - timedelta(days=RUN_HISTORY_DAYS)
+            ).delete(synchronize_session=False)
+
+            in_flight = db.query(models.BackgroundJob.id).filter(
+                models.BackgroundJob.kind == entry["kind"],
+                models.BackgroundJob.status.in_(["QUEUED", "RUNNING"])
+            ).first()
+            if in_flight is not None:
+                db.commit()
+                entry["skipped"] += 1
+                return
+            # enqueue commits the slot claim and the job together
+            job = job_queue.enqueue(
+                db, entry["kind"], entry["payload"],
+                priority=job_queue.PRIORITY_LOW, requested_by=f"scheduler:{name}"
+            )
+            run.job_id = job["job_id"]
+            db.commit()
+            entry["last_job_id"] = job["job_id"]
+        except Exception as e:
+            db.rollback()
+            print(f"[Scheduler] Failed to enqueue {name}: {e}")
+        finally:
+            db.close()
+
+    def _loop(self):
+        while not self._stop.is_set():
+            self.run_due(datetime.utcnow())
+            upcoming = min(entry["next_run"] for entry in self.entries.values())
+            self._stop.wait(max(1.0, min(60.0, (upcoming - datetime.utcnow()).total_seconds())))
+
+
+scheduler = Scheduler()
+
+
+def start_scheduler():
+    if SCHEDULER_ENABLED:
+        scheduler.start()
+
+
+def stop_scheduler():
+    scheduler.stop()
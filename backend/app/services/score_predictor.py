@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, py_round
+
 class AcademicScorePredictor:
     """
     Model 2 of 13: Academic Score Prediction Engine (XGBoost / LightGBM Regression)
@@ -71,3 +75,46 @@ class AcademicScorePredictor:
                 "trend_30d": trend
             }
         }
+
+    def predict_score_batch(self, features: Any) -> Dict[str, Any]:
+        """Vectorized predict_score for N students; arrays aligned with the input rows."""
+        cols = to_columns(features)
+        n = row_count(cols)
+        current_marks = column(cols, n, "current_average_marks", 65.0)
+        mid_sem = column(cols, n, "mid_sem_marks_avg", current_marks)
+        attendance = column(cols, n, "attendance_percentage", 75.0)
+        assignment_rate = column(cols, n, "assignment_completion_rate", 80.0)
+        quiz_accuracy = column(cols, n, "assessment_average", 70.0)
+        cgpa_scale = np.minimum(100.0, column(cols, n, "cgpa", 7.0) * 10.0)
+        trend = column(cols, n, "marks_change_30d", 0.0)
+
+        weighted_score = (
+            (mid_sem * 0.35) +
+            (current_marks * 0.25) +
+            (quiz_accuracy * 0.15) +
+            (cgpa_scale * 0.15) +
+            (assignment_rate * 0.10) +
+            (trend * 0.45)
+        )
+        low_attendance = attendance < 75.0
+        weighted_score = np.where(low_attendance, weighted_score - (75.0 - attendance) * 0.25, weighted_score)
+
+        predicted_score = py_round(np.clip(weighted_score, 15.0, 99.0), 1)
+        current_score = py_round(current_marks, 1)
+        score_delta = py_round(predicted_score - current_score, 1)
+        var_factor = np.abs(mid_sem - current_marks) + np.abs(quiz_accuracy - current_marks)
+        confidence_pct = py_round(np.clip(92.0 - (var_factor * 0.25), 78.0, 95.0), 1)
+        intervention_level = np.select(
+            [(score_delta <= -5.0) | (predicted_score < 50.0), (score_delta <= 0.0) | (predicted_score < 65.0)],
+            ["HIGH_URGENCY", "MODERATE"],
+            "STABLE"
+        ).astype(object)
+
+        return {
+            "model_version": self.model_name,
+            "current_score": current_score,
+            "predicted_endsem_score": predicted_score,
+            "confidence_percentage": confidence_pct,
+            "score_delta": score_delta,
+            "intervention_level": intervention_level
+        }
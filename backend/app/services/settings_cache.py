@@ -0,0 +1,87 @@
+import copy
+import json
+import threading
+from typing import Any, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from .. import models
+from .analytics_cache import bump_generations
+
+# cache_generations tag bumped by every system_settings write
+VERSION_TAG = "system_settings"
+# Session.info key recording the version this session already verified
+_SESSION_KEY = "settings_cache_version"
+
+# Process-wide copy of system_settings: key -> raw value, plus parsed JSON per key
+_values: Dict[str, str] = {}
+_parsed: Dict[str, Any] = {}
+_version: Optional[int] = None
+_lock = threading.Lock()
+
+_stats = {"lookups": 0, "version_checks": 0, "reloads": 0}
+
+
+def _current_version(db: Session) -> int:
+    return db.query(models.CacheGeneration.generation).filter(
+        models.CacheGeneration.tag == VERSION_TAG
+    ).scalar() or 0
+
+
+def _snapshot(db: Session) -> Dict[str, str]:
+    """
+    The cached settings, re-validated at most once per session. A request session checks the
+    version on its first lookup, so every worker picks up a change on its next request.
+    """
+    global _values, _parsed, _version
+    checked = db.info.get(_SESSION_KEY)
+    with _lock:
+        _stats["lookups"] += 1
+        if checked is not None and checked == _version:
+            return _values
+
+    version = _current_version(db)
+    with _lock:
+        _stats["version_checks"] += 1
+        if version != _version:
+            # Version is read before the rows: a write landing in between only causes one extra reload
+            _values = {key: value for key, value in db.query(models.SystemSetting.key, models.SystemSetting.value).all()}
+            _parsed = {}
+            _version = version
+            _stats["reloads"] += 1
+        db.info[_SESSION_KEY] = version
+        return _values
+
+
+def get_value(db: Session, key: str) -> Optional[str]:
+    return _snapshot(db).get(key)
+
+
+def get_json(db: Session, key: str, default: Any = None) -> Any:
+    """Parsed JSON value of a setting (a private copy), or default if missing or malformed."""
+    values = _snapshot(db)
+    with _lock:
+        if key not in _parsed:
+            try:
+                _parsed[key] = json.loads(values[key]) if key in values else None
+            except (TypeError, ValueError):
+                _parsed[key] = None
+        value = _parsed[key]
+    return copy.deepcopy(value if value is not None else default)
+
+
+def invalidate(db: Session):
+    """
+    Called by system_settings write paths. Bumps the version in the caller's transaction
+    (does not commit), so other workers can never see the new version before the new value.
+    """
+    global _version
+    bump_generations(db, [VERSION_TAG])
+    db.info.pop(_SESSION_KEY, None)
+    with _lock:
+        _version = None
+
+
+def stats() -> Dict[str, Any]:
+    with _lock:
+        return {**_stats, "version": _version, "keys": len(_values)}
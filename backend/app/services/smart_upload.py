@@ -0,0 +1,186 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Any, List
+import uuid
+
+import numpy as np
+import pandas as pd
+
+from .. import models
+
+COLUMN_MAPPINGS = {
+    'student_id': ['student_id', 'enrollment_no', 'roll_no', 'id', 'enrollment', 'registration_no'],
+    'name': ['name', 'student_name', 'full_name', 'student'],
+    'email': ['email', 'email_address', 'student_email', 'mail'],
+    'attendance': ['attendance', 'att', 'attendance_pct', 'attendance_percentage', 'att_%'],
+    'dsa_score': ['dsa', 'dsa_score', 'data_structures', 'dsa_marks'],
+    'ml_score': ['ml', 'ml_score', 'machine_learning', 'ml_marks'],
+    'qa_score': ['qa', 'qa_score', 'quantitative_aptitude', 'aptitude', 'qa_marks'],
+    'projects_score': ['projects', 'projects_score', 'project', 'project_marks'],
+    'mock_interview_score': ['mock', 'mock_interview', 'mock_score', 'interview_score'],
+    'cgpa': ['cgpa', 'gpa', 'cgpa_score'],
+    'program': ['program', 'degree', 'course_name'],
+    'branch': ['branch', 'department', 'dept', 'stream'],
+    'semester': ['semester', 'sem'],
+    'section': ['section', 'sec'],
+    'batch_id': ['batch', 'batch_id', 'cohort']
+}
+
+TEXT_FIELDS = ['student_id', 'name', 'email', 'program', 'branch', 'section', 'batch_id']
+SCORE_FIELDS = ['attendance', 'dsa_score', 'ml_score', 'qa_score', 'projects_score', 'mock_interview_score']
+# Values for new students when the upload does not carry the column
+CREATE_DEFAULTS = {
+    'program': 'B.Tech', 'branch': 'CSE', 'semester': 1, 'section': 'A', 'batch_id': 'Batch 1', 'cgpa': 8.0,
+    'attendance': 85, 'dsa_score': 80, 'ml_score': 78, 'qa_score': 82, 'projects_score': 85, 'mock_interview_score': 80
+}
+WRITE_BATCH_SIZE = 1000
+DIFF_SAMPLE_SIZE = 20
+
+
+def map_columns(columns) -> Dict[str, Any]:
+    mapped_columns = {}
+    for col in columns:
+        clean_col = str(col).strip().lower().replace(' ', '_')
+        for target_field, synonyms in COLUMN_MAPPINGS.items():
+            if clean_col in synonyms or any(s in clean_col for s in synonyms):
+                mapped_columns[target_field] = col
+                break
+    return mapped_columns
+
+
+def _text(values: pd.Series) -> pd.Series:
+    text = values.astype(str).str.strip()
+    return text.where(values.notna() & ~text.str.lower().isin(['', 'nan', 'none']))
+
+
+def _key(values: pd.Series) -> pd.Series:
+    return values.str.lower().str.replace(r'\s+', ' ', regex=True)
+
+
+def normalize_upload(df: pd.DataFrame, mapped_columns: Dict[str, Any]) -> pd.DataFrame:
+    """One column per target field (missing -> NaN), plus the normalized id/email/name match keys."""
+    rows = pd.DataFrame(index=df.index)
+    for field in TEXT_FIELDS:
+        rows[field] = _text(df[mapped_columns[field]]) if field in mapped_columns else pd.Series(np.nan, index=df.index, dtype=object)
+    for field in SCORE_FIELDS + ['semester']:
+        # int(float(x)) semantics: truncate toward zero, unparseable -> NaN (keep the existing/default value)
+        rows[field] = np.trunc(pd.to_numeric(df[mapped_columns[field]], errors='coerce')) if field in mapped_columns else np.nan
+    rows['cgpa'] = pd.to_numeric(df[mapped_columns['cgpa']], errors='coerce') if 'cgpa' in mapped_columns else np.nan
+    rows['id_key'] = _key(rows['student_id'])
+    rows['email_key'] = _key(rows['email'])
+    rows['name_key'] = _key(rows['name'])
+    return rows
+
+
+def load_key_index(db: Session) -> pd.DataFrame:
+    """Every student's match keys and current scores, from one narrow query."""
+    columns = [models.Student.enrollment_no, models.Student.email, models.Student.name] + [
+        getattr(models.Student, field) for field in SCORE_FIELDS
+    ]
+    index = pd.DataFrame(db.query(*columns).all(), columns=['enrollment_no', 'email', 'name'] + SCORE_FIELDS)
+    index['id_key'] = _key(index['enrollment_no'].astype(str))
+    index['email_key'] = _key(index['email'].astype(str))
+    index['name_key'] = _key(index['name'].astype(str))
+    return index
+
+
+def _plain(value):
+    return value.item() if isinstance(value, np.generic) else value
+
+
+def _match(rows: pd.DataFrame, index: pd.DataFrame, key: str) -> pd.Series:
+    """enrollment_no for each row whose key matches exactly one student."""
+    unique = index.drop_duplicates(key, keep=False)[[key, 'enrollment_no']]
+    merged = rows[[key]].reset_index().merge(unique, on=key, how='inner')
+    return merged.set_index(merged.columns[0])['enrollment_no']
+
+
+def reconcile(db: Session, df: pd.DataFrame, mapped_columns: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Work out what an upload would do without writing anything: rows are matched to existing
+    students by id, then email, then name (a name shared by several students is not guessed),
+    and split into creates, updates with their changed fields, unchanged and unmatched rows.
+    """
+    rows = normalize_upload(df, mapped_columns)
+    unmatched = [{"row": int(i), "reason": "no id, email or name"}
+                 for i in rows.index[rows['student_id'].isna() & rows['email'].isna() & rows['name'].isna()]]
+    rows = rows[rows['student_id'].notna() | rows['email'].notna() | rows['name'].notna()]
+
+    index = load_key_index(db)
+    target = pd.Series(np.nan, index=rows.index, dtype=object)
+    for key in ('id_key', 'email_key', 'name_key'):
+        target = target.combine_first(_match(rows, index, key))
+    rows['target'] = target
+
+    ambiguous_names = set(index.loc[index.duplicated('name_key', keep=False), 'name_key'])
+    ambiguous = rows['target'].isna() & rows['student_id'].isna() & rows['name_key'].isin(ambiguous_names)
+    unmatched += [{"row": int(i), "reason": "name matches several students"} for i in rows.index[ambiguous]]
+    # A new student needs an id or a name; an unknown email alone is not enough
+    anonymous = rows['target'].isna() & rows['student_id'].isna() & rows['name'].isna()
+    unmatched += [{"row": int(i), "reason": "no matching student for email"} for i in rows.index[anonymous]]
+    rows = rows[~ambiguous & ~anonymous]
+
+    # Updates: the last row for each matched student wins, as it would row by row
+    matched = rows[rows['target'].notna()].drop_duplicates('target', keep='last').merge(
+        index[['enrollment_no', 'name'] + SCORE_FIELDS], left_on='target', right_on='enrollment_no',
+        how='left', suffixes=('', '_current')
+    )
+    changed_fields = (['name'] if 'name' in mapped_columns else []) + SCORE_FIELDS
+    changes = pd.DataFrame({
+        field: matched[field].notna() & (matched[field] != matched[f"{field}_current"]) for field in changed_fields
+    }, index=matched.index)
+    has_change = changes.any(axis=1)
+    unchanged = int((~has_change).sum())
+
+    updates, diff_updates = [], []
+    for record, flags in zip(matched[has_change].to_dict('records'), changes[has_change].to_dict('records')):
+        fields = [field for field in changed_fields if flags[field]]
+        new = {field: record[field] if field == 'name' else int(record[field]) for field in fields}
+        updates.append({"enrollment_no": record['target'], **new})
+        if len(diff_updates) < DIFF_SAMPLE_SIZE:
+            diff_updates.append({"student_id": record['target'], "changes": {
+                field: {"from": _plain(record[f"{field}_current"]), "to": new[field]} for field in fields
+            }})
+
+    # Creates: rows without an id get a generated one; duplicates within the upload collapse to the last row
+    new_rows = rows[rows['target'].isna()].copy()
+    missing_id = new_rows['student_id'].isna()
+    new_rows.loc[missing_id, 'student_id'] = [f"S_{uuid.uuid4().hex[:8].upper()}" for _ in range(int(missing_id.sum()))]
+    new_rows = new_rows.loc[~_key(new_rows['student_id']).duplicated(keep='last')]
+    creates = []
+    for record in new_rows.to_dict('records'):
+        student = {"enrollment_no": record['student_id']}
+        for field, default in CREATE_DEFAULTS.items():
+            value = record[field]
+            student[field] = default if pd.isna(value) else (int(value) if isinstance(default, int) else value)
+        student["name"] = record['name'] if isinstance(record['name'], str) else f"Student {record['student_id']}"
+        student["email"] = record['email'] if isinstance(record['email'], str) else f"{record['student_id'].lower()}@sage.com"
+        creates.append(student)
+    # Student.email is unique: later duplicates fall back to the generated address
+    seen_emails = set(index['email_key'])
+    for student in creates:
+        if student["email"].lower() in seen_emails:
+            student["email"] = f"{student['enrollment_no'].lower()}@sage.com"
+        seen_emails.add(student["email"].lower())
+
+    return {
+        "records_processed": int(len(rows)),
+        "creates": creates,
+        "updates": updates,
+        "unchanged": unchanged,
+        "unmatched": unmatched,
+        "diff": {
+            "created": [{"student_id": s["enrollment_no"], "name": s["name"]} for s in creates[:DIFF_SAMPLE_SIZE]],
+            "updated": diff_updates,
+            "unmatched": unmatched[:DIFF_SAMPLE_SIZE]
+        }
+    }
+
+
+def apply_plan(db: Session, plan: Dict[str, Any]):
+    """Write a reconcile() plan with bulk statements; the caller commits."""
+    creates: List[Dict[str, Any]] = plan["creates"]
+    updates: List[Dict[str, Any]] = plan["updates"]
+    for start in range(0, len(creates), WRITE_BATCH_SIZE):
+        db.bulk_insert_mappings(models.Student, creates[start:start + WRITE_BATCH_SIZE])
+    for start in range(0, len(updates), WRITE_BATCH_SIZE):
+        db.bulk_update_mappings(models.Student, updates[start:start + WRITE_BATCH_SIZE])
@@ -1,6 +1,10 @@
 import math
 from typing import Dict, Any, List
 
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column
+
 class KMeansStudentClusterer:
     """
     Model 4 of 13: Student Academic Clustering & Profiling Engine (K-Means + PCA)
@@ -25,43 +29,24 @@ class KMeansStudentClusterer:
             ]
 
         total_students = len(students_data)
-        clustered_students = []
-
-        cluster_counts = {1: 0, 2: 0, 3: 0, 4: 0}
-
-        for std in students_data:
-            marks = float(std.get("marks", std.get("current_average_marks", 70.0)))
-            attendance = float(std.get("attendance", std.get("attendance_percentage", 75.0)))
-            cgpa = float(std.get("cgpa", 7.0))
-            cgpa_scale = min(100.0, cgpa * 10.0)
-            trend = float(std.get("trend", std.get("marks_change_30d", 0.0)))
-
-            # Euclidean Distance to 4 Centroids
-            d1 = math.sqrt((marks - 90)**2 + (attendance - 90)**2 + (cgpa_scale - 90)**2)
-            d2 = math.sqrt((marks - 78)**2 + (attendance - 82)**2 + (cgpa_scale - 78)**2)
-            d3 = math.sqrt((marks - 65)**2 + (attendance - 75)**2 + (trend - 8)**2) # High positive trend
-            d4 = math.sqrt((marks - 45)**2 + (attendance - 55)**2 + (cgpa_scale - 45)**2)
-
-            distances = {1: d1, 2: d2, 3: d3 if trend > 3.0 else d3 + 20.0, 4: d4}
-            assigned_cluster = min(distances, key=distances.get)
-            cluster_counts[assigned_cluster] += 1
-
-            # PCA 2D Linear Projection Mapping (X = PC1 Academic Master, Y = PC2 Engagement)
-            pc1_x = round((marks * 0.4) + (cgpa_scale * 0.4) + (trend * 0.2) - 50.0, 2)
-            pc2_y = round((attendance * 0.6) + (marks * 0.2) - 40.0, 2)
+        assigned = self.cluster_matrix(students_data)
 
+        clustered_students = []
+        for i, std in enumerate(students_data):
+            cid = int(assigned["cluster_id"][i])
             clustered_students.append({
                 "student_id": std.get("student_id", std.get("enrollment_no", "STU-000")),
                 "name": std.get("name", "Student"),
-                "cluster_id": assigned_cluster,
-                "cluster_name": self.cluster_labels[assigned_cluster]["name"],
-                "badge": self.cluster_labels[assigned_cluster]["badge"],
-                "color": self.cluster_labels[assigned_cluster]["color"],
-                "pca_x": pc1_x,
-                "pca_y": pc2_y,
-                "academic_score": marks,
-                "attendance": attendance
+                "cluster_id": cid,
+                "cluster_name": self.cluster_labels[cid]["name"],
+                "badge": self.cluster_labels[cid]["badge"],
+                "color": self.cluster_labels[cid]["color"],
+                "pca_x": float(assigned["pca_x"][i]),
+                "pca_y": float(assigned["pca_y"][i]),
+                "academic_score": float(assigned["marks"][i]),
+                "attendance": float(assigned["attendance"][i])
             })
+        cluster_counts = assigned["cluster_counts"]
 
         cluster_summary = []
         for cid, cfg in self.cluster_labels.items():
@@ -82,3 +67,35 @@ class KMeansStudentClusterer:
             "cluster_summary": cluster_summary,
             "clustered_students": clustered_students
         }
+
+    def cluster_matrix(self, features: Any) -> Dict[str, Any]:
+        """
+        Vectorized centroid assignment and PCA projection for N students. features: DataFrame,
+        dict of columns or list of dicts with marks/attendance/cgpa/trend (or the feature-store names).
+        """
+        cols = to_columns(features)
+        n = row_count(cols)
+        marks = column(cols, n, ["marks", "current_average_marks"], 70.0)
+        attendance = column(cols, n, ["attendance", "attendance_percentage"], 75.0)
+        cgpa_scale = np.minimum(100.0, column(cols, n, "cgpa", 7.0) * 10.0)
+        trend = column(cols, n, ["trend", "marks_change_30d"], 0.0)
+
+        # Euclidean distance to the 4 centroids; cluster 3 is only favoured with a positive trend
+        distances = np.column_stack([
+            np.sqrt((marks - 90) ** 2 + (attendance - 90) ** 2 + (cgpa_scale - 90) ** 2),
+            np.sqrt((marks - 78) ** 2 + (attendance - 82) ** 2 + (cgpa_scale - 78) ** 2),
+            np.sqrt((marks - 65) ** 2 + (attendance - 75) ** 2 + (trend - 8) ** 2) + np.where(trend > 3.0, 0.0, 20.0),
+            np.sqrt((marks - 45) ** 2 + (attendance - 55) ** 2 + (cgpa_scale - 45) ** 2)
+        ]).reshape(n, 4)
+        cluster_id = distances.argmin(axis=1) + 1
+        counts = np.bincount(cluster_id, minlength=5)
+
+        return {
+            "model_version": self.model_name,
+            "cluster_id": cluster_id,
+            "pca_x": np.round((marks * 0.4) + (cgpa_scale * 0.4) + (trend * 0.2) - 50.0, 2),
+            "pca_y": np.round((attendance * 0.6) + (marks * 0.2) - 40.0, 2),
+            "marks": marks,
+            "attendance": attendance,
+            "cluster_counts": {cid: int(counts[cid]) for cid in self.cluster_labels}
+        }
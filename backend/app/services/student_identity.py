@@ -0,0 +1,136 @@
+import bisect
+import threading
+from typing import Dict, Iterable, List, Optional, Union
+
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import Session
+
+from .. import models
+from . import analytics_cache
+
+# A student reference as callers pass it around: an identifier string or an already-resolved row
+StudentRef = Union[str, models.Student]
+
+# Rebuilt when the "students" cache generation moves, i.e. after any student write path commits
+GENERATION_TAG = "students"
+# Upper bound for an email prefix range: every string starting with the prefix sorts below prefix + this
+_PREFIX_END = "\U0010ffff"
+IN_CHUNK_SIZE = 500
+
+
+class StudentIndex:
+    """
+    In-memory identifier -> enrollment_no maps (enrollment_no, scholar_no, email) plus a sorted
+    email list for prefix lookups, replacing `enrollment_no == x OR email LIKE 'x%'`.
+    """
+
+    def __init__(self):
+        self.by_key: Dict[str, str] = {}
+        self.emails: List[str] = []
+        self.email_owner: Dict[str, str] = {}
+        self.generation: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _ensure_current(self, db: Session):
+        generation = analytics_cache.current_generation(GENERATION_TAG)
+        if generation == self.generation:
+            return
+        with self._lock:
+            if generation == self.generation:
+                return
+            rows = db.query(models.Student.enrollment_no, models.Student.scholar_no, models.Student.email).all()
+            by_key: Dict[str, str] = {}
+            email_owner: Dict[str, str] = {}
+            # Emails are matched case-insensitively (as LIKE did), so they are keyed lowercased
+            for enrollment_no, scholar_no, email in rows:
+                if email:
+                    email_owner[email.lower()] = enrollment_no
+            # enrollment_no wins a clash with another student's scholar_no
+            for enrollment_no, scholar_no, email in rows:
+                if scholar_no:
+                    by_key[str(scholar_no)] = enrollment_no
+            for enrollment_no, scholar_no, email in rows:
+                by_key[enrollment_no] = enrollment_no
+            self.by_key, self.email_owner, self.emails = by_key, email_owner, sorted(email_owner)
+            self.generation = generation
+
+    def lookup(self, db: Session, identifier: str) -> Optional[str]:
+        self._ensure_current(db)
+        enrollment_no = self.by_key.get(identifier)
+        if enrollment_no is not None:
+            return enrollment_no
+        folded = identifier.lower()
+        enrollment_no = self.email_owner.get(folded)
+        if enrollment_no is not None:
+            return enrollment_no
+        # Email prefix (typically the local part before "@"): first match in sorted order
+        emails = self.emails
+        pos = bisect.bisect_left(emails, folded)
+        if pos < len(emails) and emails[pos].startswith(folded):
+            return self.email_owner[emails[pos]]
+        return None
+
+
+index = StudentIndex()
+
+
+def _lookup_db(db: Session, identifier: str) -> Optional[models.Student]:
+    """Miss path for rows written since the index was built: one query, every branch index-backed."""
+    return db.query(models.Student).filter(or_(
+        models.Student.enrollment_no == identifier,
+        models.Student.scholar_no == identifier,
+        and_(models.Student.email >= identifier, models.Student.email < identifier + _PREFIX_END)
+    )).order_by(models.Student.email).first()
+
+
+def resolve(db: Session, ref: Optional[StudentRef]) -> Optional[models.Student]:
+    """
+    Student for an enrollment_no, scholar_no, email or email prefix. A Student passed in is
+    returned as is, so nested services can hand the row down instead of resolving it again.
+    """
+    if ref is None or isinstance(ref, models.Student):
+        return ref
+    identifier = str(ref).strip()
+    if not identifier:
+        return None
+    enrollment_no = index.lookup(db, identifier)
+    if enrollment_no is not None:
+        # Primary-key get: served from the session identity map when already loaded
+        student = db.get(models.Student, enrollment_no)
+        if student is not None:
+            return student
+    return _lookup_db(db, identifier)
+
+
+def resolve_ids(db: Session, identifiers: Iterable[str]) -> Dict[str, str]:
+    """identifier -> enrollment_no for a whole batch; unknown identifiers are left out."""
+    resolved: Dict[str, str] = {}
+    misses: List[str] = []
+    for identifier in {str(i).strip() for i in identifiers if i is not None}:
+        if not identifier:
+            continue
+        enrollment_no = index.lookup(db, identifier)
+        if enrollment_no is None:
+            misses.append(identifier)
+        else:
+            resolved[identifier] = enrollment_no
+
+    # Rows newer than the index: exact keys in one IN probe per chunk, prefixes one by one
+    for start in range(0, len(misses), IN_CHUNK_SIZE):
+        chunk = misses[start:start + IN_CHUNK_SIZE]
+        wanted = set(chunk)
+        rows = db.query(models.Student.enrollment_no, models.Student.scholar_no, models.Student.email).filter(or_(
+            models.Student.enrollment_no.in_(chunk),
+            models.Student.scholar_no.in_(chunk),
+            models.Student.email.in_(chunk)
+        )).all()
+        for enrollment_no, scholar_no, email in rows:
+            for key in (email, scholar_no, enrollment_no):
+                if key in wanted:
+                    resolved[key] = enrollment_no
+    for identifier in misses:
+        if identifier not in resolved:
+            student = _lookup_db(db, identifier)
+            if student is not None:
+                resolved[identifier] = student.enrollment_no
+    return resolved
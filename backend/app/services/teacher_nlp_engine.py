@@ -1,6 +1,8 @@
 import re
 from typing import Dict, Any, List
 
+import numpy as np
+
 class TeacherNLPRemarksEngine:
     """
     Model 12 of 13: NLP Teacher Remarks & Sentiment Analysis Engine (LLM / DistilBERT)
@@ -62,3 +64,37 @@ class TeacherNLPRemarksEngine:
             "extracted_weaknesses": weaknesses,
             "actionable_remediation": remediation_actions
         }
+
+    def analyze_remarks_batch(self, remark_texts: List[str]) -> Dict[str, Any]:
+        """
+        Vectorized keyword/sentiment pass over N remarks. Returns sentiment arrays plus
+        boolean strength/weakness flag columns keyed by the scalar method's labels.
+        """
+        lower = np.char.lower(np.array([t or "" for t in remark_texts], dtype=str))
+
+        def any_of(*words: str) -> np.ndarray:
+            hits = np.zeros(len(lower), dtype=bool)
+            for w in words:
+                hits |= np.char.find(lower, w) >= 0
+            return hits
+
+        needs_attention = any_of("struggle", "poor", "failing")
+        actionable = ~needs_attention & any_of("need", "practice", "but")
+
+        return {
+            "model_version": self.model_name,
+            "sentiment_polarity": np.select([needs_attention, actionable], ["REQUIRES_ATTENTION", "POSITIVE_WITH_ACTIONABLE_NEED"], "HIGHLY_POSITIVE").astype(object),
+            "sentiment_score": np.select([needs_attention, actionable], [-0.42, 0.35], 0.85),
+            "strengths": {
+                "Core Concept Comprehension": any_of("understand", "grasp"),
+                "Algorithmic Logic Flow": any_of("logic", "algorithm"),
+                "Programming Syntax": any_of("python", "code"),
+                "Active Classroom Engagement": any_of("attentive", "good")
+            },
+            "weaknesses": {
+                "SQL Query & Join Syntax": any_of("sql", "dbms", "database"),
+                "Timed Exam Pressure & Pace": any_of("time", "speed", "pace"),
+                "Hands-on Problem Solving": any_of("practice", "exercise"),
+                "Data Structure Implementations": any_of("array", "structure")
+            }
+        }
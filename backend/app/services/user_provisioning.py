@@ -0,0 +1,99 @@
+from sqlalchemy.orm import Session
+from typing import Dict, Any, List, Optional
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+# auth before models: a spawned hashing process imports this module first and auth loads the database module
+from .. import auth, models
+
+HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", str(os.cpu_count() or 1)))
+# Below this many distinct passwords the pool's start-up cost outweighs the parallelism
+POOL_MIN_PASSWORDS = 16
+HASH_CHUNK_SIZE = 32
+WRITE_BATCH_SIZE = 1000
+IN_CHUNK_SIZE = 500
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def _hash_pool() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=HASH_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def hash_passwords(passwords: List[str]) -> List[str]:
+    """Salted hash per password, spread over worker processes when there are enough of them."""
+    if HASH_WORKERS <= 1 or len(passwords) < POOL_MIN_PASSWORDS:
+        return [auth.get_password_hash(p) for p in passwords]
+    return list(_hash_pool().map(auth.get_password_hash, passwords, chunksize=HASH_CHUNK_SIZE))
+
+
+def provisional_hash(password: str) -> str:
+    return auth.PROVISIONAL_HASH_PREFIX + auth.get_password_hash(password)
+
+
+def existing_emails(db: Session, emails: List[str]) -> set:
+    found = set()
+    for start in range(0, len(emails), IN_CHUNK_SIZE):
+        found.update(e for (e,) in db.query(models.User.email).filter(
+            models.User.email.in_(emails[start:start + IN_CHUNK_SIZE])
+        ).all())
+    return found
+
+
+def provision_users(db: Session, accounts: List[Dict[str, Any]], commit_batches: bool = False) -> Dict[str, Any]:
+    """
+    Create User rows for many accounts at once. Each account is a dict with email, password,
+    role and optionally linked_id, approved and is_verified; emails that already have a user
+    are skipped. A password shared by several accounts (a default password) is hashed once and
+    stored as a provisional hash that login replaces with the user's own; distinct passwords are
+    hashed in a process pool. Rows are bulk-inserted; the caller commits unless commit_batches.
+    """
+    started = time.perf_counter()
+    by_email = {a["email"]: a for a in accounts if a.get("email")}
+    taken = existing_emails(db, list(by_email))
+    pending = [a for email, a in by_email.items() if email not in taken]
+
+    counts: Dict[str, int] = {}
+    for account in pending:
+        counts[account["password"]] = counts.get(account["password"], 0) + 1
+    shared = {p: provisional_hash(p) for p, n in counts.items() if n > 1}
+    distinct = [p for p, n in counts.items() if n == 1]
+    hashes = {**dict(zip(distinct, hash_passwords(distinct))), **shared}
+    hashed_at = time.perf_counter()
+
+    rows = [{
+        "user_id": models.generate_uuid(),
+        "email": account["email"],
+        "password_hash": hashes[account["password"]],
+        "role": account["role"],
+        "linked_id": account.get("linked_id"),
+        "approved": account.get("approved", True),
+        "is_verified": account.get("is_verified", False)
+    } for account in pending]
+    for start in range(0, len(rows), WRITE_BATCH_SIZE):
+        db.bulk_insert_mappings(models.User, rows[start:start + WRITE_BATCH_SIZE])
+        if commit_batches:
+            db.commit()
+    finished = time.perf_counter()
+
+    total_seconds = finished - started
+    result = {
+        "users_created": len(rows),
+        "skipped_existing": len(by_email) - len(pending),
+        "passwords_hashed": len(distinct) + len(shared),
+        "hash_ms": round((hashed_at - started) * 1000.0, 1),
+        "insert_ms": round((finished - hashed_at) * 1000.0, 1),
+        "users_per_second": round(len(rows) / total_seconds, 1) if total_seconds > 0 else None
+    }
+    if rows:
+        print(f"[Provisioning] {result['users_created']} users in {total_seconds * 1000.0:.1f} ms "
+              f"({result['passwords_hashed']} hashes, {result['users_per_second']} users/s)")
+    return result
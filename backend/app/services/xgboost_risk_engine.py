@@ -1,13 +1,19 @@
 import math
 from typing import Dict, Any, List
 
-try:
-    import numpy as np
-    import xgboost as xgb
-    import shap
-    XGBOOST_AVAILABLE = True
-except ImportError:
-    XGBOOST_AVAILABLE = False
+import numpy as np
+
+from .feature_matrix import to_columns, row_count, column, tiers, py_round, py_exp, sum_in_order
+from ..core import lazy
+
+# Checked without importing: the booster path goes through model_registry, which loads xgboost on first use
+XGBOOST_AVAILABLE = lazy.available("xgboost")
+
+
+SHAP_FACTORS = [
+    "Attendance", "Internal Marks", "Mid-Sem Marks", "Previous CGPA",
+    "Test Performance", "Topic Mastery", "Assignment Rate", "Performance Trend"
+]
 
 
 class XGBoostRiskEngine:
@@ -16,8 +22,9 @@ class XGBoostRiskEngine:
     Calculates student risk probability and SHAP feature attribution breakdown.
     """
 
-    def __init__(self):
+    def __init__(self, use_registry: bool = True):
         self.model_name = "XGBoost-SHAP-RiskEngine-v1.0"
+        self.use_registry = use_registry
         self.feature_names = [
             "attendance_percentage",
             "internal_marks_avg",
@@ -36,6 +43,10 @@ class XGBoostRiskEngine:
         Input: Raw student features dictionary
         Output: Risk probability, risk tier, top risk reasons, and SHAP value breakdown
         """
+        model = self._active_model()
+        if model is not None:
+            return self._predict_with_model(features, model)
+
         # Extract & normalize input features
         attendance = float(features.get("attendance_percentage", 75.0))
         internal_marks = float(features.get("current_average_marks", features.get("internal_marks_avg", 70.0)))
@@ -153,3 +164,114 @@ class XGBoostRiskEngine:
             "shap_values": shap_contributions,
             "feature_vector": feature_vector
         }
+
+    def predict_batch(self, features: Any) -> Dict[str, Any]:
+        """
+        Vectorized predict for N students. features: DataFrame, dict of columns or list of dicts.
+        Returns arrays aligned with the input rows; shap_values is an (N x F) matrix whose
+        columns follow shap_factors.
+        """
+        cols = to_columns(features)
+        model = self._active_model()
+        if model is not None:
+            return self._predict_batch_with_model(cols, model)
+        n = row_count(cols)
+        attendance = column(cols, n, "attendance_percentage", 75.0)
+        internal_marks = column(cols, n, ["current_average_marks", "internal_marks_avg"], 70.0)
+        mid_sem_marks = column(cols, n, "mid_sem_marks_avg", internal_marks)
+        cgpa_scale = np.minimum(100.0, column(cols, n, "cgpa", 7.0) * 10.0)
+        test_acc = column(cols, n, ["assessment_average", "test_accuracy_pct"], 72.0)
+        topic_acc = column(cols, n, "topic_accuracy_pct", test_acc)
+        assignment_rate = np.maximum(0.0, 100.0 - column(cols, n, "missed_assignments", 0.0) * 20.0)
+        trend = column(cols, n, "marks_change_30d", 0.0)
+
+        shap_values = py_round(np.column_stack([
+            (80.0 - attendance) * 0.35,
+            (75.0 - internal_marks) * 0.30,
+            (75.0 - mid_sem_marks) * 0.25,
+            (75.0 - cgpa_scale) * 0.20,
+            (75.0 - test_acc) * 0.20,
+            (75.0 - topic_acc) * 0.15,
+            (85.0 - assignment_rate) * 0.20,
+            -trend * 1.5
+        ]), 2).reshape(n, len(SHAP_FACTORS))
+
+        base_risk = 25.0
+        # Same operation order as the scalar path: sum the rounded contributions left to right
+        raw_score = base_risk + sum_in_order(list(shap_values.T))
+        scaled_probability = 100.0 / (1.0 + py_exp(-0.06 * (raw_score - 50.0)))
+        risk_probability = py_round(np.clip(scaled_probability, 0.1, 99.9), 1)
+
+        top = shap_values.argmax(axis=1) if n else np.zeros(0, dtype=np.int64)
+        has_positive = shap_values.max(axis=1) > 0 if n else np.zeros(0, dtype=bool)
+        top_risk_factor = np.where(has_positive, np.array(SHAP_FACTORS, dtype=object)[top], None)
+
+        return {
+            "model_engine": "XGBoost-v1.6 + SHAP Explainer",
+            "base_value": base_risk,
+            "shap_factors": SHAP_FACTORS,
+            "risk_probability": risk_probability,
+            "risk_tier": tiers(risk_probability, [20.0, 40.0, 60.0, 80.0], ["VERY_LOW", "LOW", "MODERATE", "HIGH", "CRITICAL"]),
+            "top_risk_factor": top_risk_factor,
+            "shap_values": shap_values
+        }
+
+    # ─── Trained booster path ────────────────────────────────────────────────
+
+    def _active_model(self):
+        if not self.use_registry:
+            return None
+        # Imported here so the engine stays importable without the ORM layer
+        from .model_registry import registry
+        return registry.active_model()
+
+    def _predict_batch_with_model(self, cols, model) -> Dict[str, Any]:
+        from . import model_registry
+        res = model_registry.registry.predict_batch(cols, model)
+        shap_values = py_round(res["contributions"], 2)
+        factors = [model_registry.FEATURE_LABELS[name] for name in model_registry.MODEL_FEATURES]
+        n = len(shap_values)
+        top = shap_values.argmax(axis=1) if n else np.zeros(0, dtype=np.int64)
+        has_positive = shap_values.max(axis=1) > 0 if n else np.zeros(0, dtype=bool)
+        return {
+            "model_engine": f"XGBoost {res['version']} + TreeSHAP",
+            "model_version": res["version"],
+            "base_value": round(res["base_value"], 2),
+            "shap_factors": factors,
+            "risk_probability": res["risk_probability"],
+            "risk_tier": tiers(res["risk_probability"], [20.0, 40.0, 60.0, 80.0], ["VERY_LOW", "LOW", "MODERATE", "HIGH", "CRITICAL"]),
+            "top_risk_factor": np.where(has_positive, np.array(factors, dtype=object)[top], None),
+            "shap_values": shap_values,
+            "feature_matrix": res["X"]
+        }
+
+    def _predict_with_model(self, features: Dict[str, Any], model) -> Dict[str, Any]:
+        from .model_registry import MODEL_FEATURES
+        res = self._predict_batch_with_model(to_columns([features]), model)
+        values = res["feature_matrix"][0]
+        shap_contributions = {factor: float(v) for factor, v in zip(res["shap_factors"], res["shap_values"][0])}
+
+        reasons_list = []
+        ranked = sorted(range(len(values)), key=lambda j: res["shap_values"][0][j], reverse=True)
+        for j in ranked[:4]:
+            impact = float(res["shap_values"][0][j])
+            if impact <= 0:
+                break
+            shown = "n/a" if np.isnan(values[j]) else f"{values[j]:.1f}"
+            reasons_list.append(f"{res['shap_factors'][j]} ({shown}) [+ {impact:.1f}% risk]")
+        if not reasons_list:
+            reasons_list.append("Academic progress is steady across all indicators.")
+
+        return {
+            "risk_probability": float(res["risk_probability"][0]),
+            "risk_tier": str(res["risk_tier"][0]),
+            "model_engine": res["model_engine"],
+            "model_version": res["model_version"],
+            "base_value": res["base_value"],
+            "top_reasons": reasons_list,
+            "shap_values": shap_contributions,
+            "feature_vector": {
+                name: (None if np.isnan(v) else float(v))
+                for name, v in zip(MODEL_FEATURES, values)
+            }
+        }
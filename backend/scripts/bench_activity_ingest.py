@@ -0,0 +1,72 @@
+import sys
+import os
+import argparse
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+os.environ.setdefault("JOB_WORKERS", "0")
+
+from fastapi.testclient import TestClient
+
+from app import database, models
+from app.main import app
+
+ACTIVITY_TYPES = ["LOGIN", "COURSE_VIEW", "MATERIAL_VIEW", "VIDEO_WATCH", "QUIZ_START", "QUIZ_COMPLETE", "ASSIGNMENT_SUBMIT"]
+
+
+def make_events(student_ids, count: int, run_id: str):
+    now = datetime.utcnow()
+    for i in range(count):
+        yield {
+            "student_id": random.choice(student_ids),
+            "activity_type": random.choice(ACTIVITY_TYPES),
+            "source": "LMS",
+            "started_at": (now - timedelta(minutes=random.randint(0, 60 * 24 * 20))).isoformat() + "Z",
+            "duration": random.randint(10, 900),
+            "external_event_id": f"replay-{run_id}-{i}"
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay synthetic LMS events through /analytics/sync/activity/batch and report throughput.")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=5000, help="Events per request")
+    args = parser.parse_args()
+
+    db = database.SessionLocal()
+    try:
+        student_ids = [sid for (sid,) in db.query(models.Student.enrollment_no).all()]
+    finally:
+        db.close()
+    if not student_ids:
+        sys.exit("No students; run scripts/migrate_and_seed.py first")
+
+    client = TestClient(app)
+    events = list(make_events(student_ids, args.events, uuid.uuid4().hex[:8]))
+    bodies = [
+        "\n".join(json.dumps(e) for e in events[start:start + args.batch]).encode()
+        for start in range(0, len(events), args.batch)
+    ]
+
+    def replay(label: str):
+        totals = {"inserted": 0, "duplicates": 0}
+        started = time.perf_counter()
+        for body in bodies:
+            res = client.post("/analytics/sync/activity/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+            res.raise_for_status()
+            for key in totals:
+                totals[key] += res.json()[key]
+        elapsed = time.perf_counter() - started
+        print(f"{label:<18}{len(events):>9}{totals['inserted']:>10}{totals['duplicates']:>12}{elapsed * 1000:>11.0f}{len(events) / elapsed:>12.0f}")
+
+    print(f"{'pass':<18}{'events':>9}{'inserted':>10}{'duplicates':>12}{'ms':>11}{'events/s':>12}")
+    replay("first delivery")
+    replay("redelivery")
+
+
+if __name__ == "__main__":
+    main()
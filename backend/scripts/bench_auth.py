@@ -0,0 +1,62 @@
+import sys
+import os
+import argparse
+import time
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import event
+
+from app import auth, database, models
+
+
+def measure(token: str, requests: int, ttl: float) -> dict:
+    """Resolve the same token once per simulated request, each with its own session as get_db gives."""
+    auth.PRINCIPAL_CACHE_TTL_SECONDS = ttl
+    auth.invalidate_principals()
+    statements = {"count": 0}
+
+    def count(*_):
+        statements["count"] += 1
+
+    event.listen(database.engine, "before_cursor_execute", count)
+    try:
+        started = time.perf_counter()
+        for _ in range(requests):
+            db = database.SessionLocal()
+            try:
+                user = auth.get_current_user_obj(token=token, db=db)
+                user.role, user.linked_id
+            finally:
+                db.close()
+        elapsed = time.perf_counter() - started
+    finally:
+        event.remove(database.engine, "before_cursor_execute", count)
+    return {"us_per_request": elapsed / requests * 1e6, "queries_per_request": statements["count"] / requests}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-request cost of resolving the authenticated user, uncached vs cached.")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--email", default="teacher@sage.com", help="Account to mint a token for")
+    args = parser.parse_args()
+
+    db = database.SessionLocal()
+    try:
+        if not db.query(models.User).filter(models.User.email == args.email).first():
+            sys.exit(f"No user {args.email}; run scripts/migrate_and_seed.py first")
+    finally:
+        db.close()
+    token = auth.create_access_token({"sub": args.email})
+    ttl = auth.PRINCIPAL_CACHE_TTL_SECONDS or 30.0
+
+    results = {
+        "uncached (TTL 0)": measure(token, args.requests, 0),
+        f"cached (TTL {ttl:g}s)": measure(token, args.requests, ttl)
+    }
+    print(f"{'auth resolution':<22}{'us/request':>12}{'queries/request':>17}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['us_per_request']:>12.1f}{r['queries_per_request']:>17.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import sys
+import os
+import argparse
+import json
+import subprocess
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in a fresh interpreter so import costs are measured as a real replica pays them
+PROBE = """
+import json, time
+started = time.perf_counter()
+from app import main
+imported = time.perf_counter()
+main.auto_init_database()
+finished = time.perf_counter()
+print("BENCH " + json.dumps({"import_ms": (imported - started) * 1000.0, "init_ms": (finished - imported) * 1000.0}))
+"""
+
+
+def probe(database_url: str, auto_bootstrap: bool = True) -> dict:
+    env = {**os.environ, "DATABASE_URL": database_url, "DB_AUTO_BOOTSTRAP": "1" if auto_bootstrap else "0"}
+    out = subprocess.run([sys.executable, "-c", PROBE], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True).stdout
+    line = next(l for l in out.splitlines() if l.startswith("BENCH "))
+    return json.loads(line[len("BENCH "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app import and database start-up time, cold and warm.")
+    parser.add_argument("--runs", type=int, default=3, help="Warm start-ups to average")
+    parser.add_argument("--database-url", help="Benchmark an existing database instead of a scratch SQLite file")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        url = args.database_url or f"sqlite:///{os.path.join(scratch, 'bench.db')}"
+        results = {}
+        if not args.database_url:
+            results["cold (bootstrap)"] = probe(url)
+        warm = [probe(url, auto_bootstrap=False) for _ in range(max(1, args.runs))]
+        results["warm (marker check)"] = {k: sum(r[k] for r in warm) / len(warm) for k in warm[0]}
+
+    print(f"{'start-up':<22}{'import ms':>12}{'db init ms':>12}")
+    for name, r in results.items():
+        print(f"{name:<22}{r['import_ms']:>12.1f}{r['init_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,41 @@
+import sys
+import os
+import argparse
+import signal
+import threading
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+if "--ml" in sys.argv:
+    # Must be set before app modules read it; spawned worker processes inherit it
+    os.environ["ML_MODE"] = "eager"
+
+from app.database import engine, Base
+from app.services import job_queue, scheduler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background jobs from the jobs table outside the web server.")
+    parser.add_argument("--workers", type=int, default=max(1, job_queue.JOB_WORKERS),
+                        help="Worker processes (run the API with JOB_WORKERS=0 to leave all jobs to this process)")
+    parser.add_argument("--ml", action="store_true", help="ML worker mode: load the risk model in every worker process up front")
+    parser.add_argument("--schedule", action="store_true",
+                        help="Also run the cron-style scheduler (run the API with SCHEDULER_ENABLED=0 to leave it to this process)")
+    args = parser.parse_args()
+
+    Base.metadata.create_all(bind=engine)
+    stop = threading.Event()
+    signal.signal(signal.SIGINT, lambda *_: stop.set())
+    signal.signal(signal.SIGTERM, lambda *_: stop.set())
+
+    pool = job_queue.JobWorkerPool(workers=max(1, args.workers))
+    pool.start()
+    if args.schedule:
+        scheduler.scheduler.start()
+    stop.wait()
+    print("Stopping job workers...")
+    scheduler.scheduler.stop()
+    pool.stop()
+
+
+if __name__ == "__main__":
+    main()
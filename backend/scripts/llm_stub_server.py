@@ -0,0 +1,95 @@
+"""
+Local stand-in for the Gemini and OpenAI completion APIs, for exercising the LLM gateway
+without network access or keys:
+
+    python scripts/llm_stub_server.py --port 8787 --gemini-delay 5
+    GEMINI_BASE_URL=http://127.0.0.1:8787 OPENAI_BASE_URL=http://127.0.0.1:8787 \\
+    GEMINI_API_KEY=stub OPENAI_API_KEY=stub uvicorn app.main:app
+
+A delay longer than LLM_HEDGE_DELAY_SECONDS on one provider shows hedging to the other;
+--gemini-status 500 simulates an outage.
+"""
+
+import argparse
+import json
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+CHUNKS = ["This is ", "a stubbed ", "LLM response."]
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    options = None
+
+    def log_message(self, fmt, *args):
+        print(f"[stub] {self.command} {self.path.split('?')[0]} -> " + (fmt % args))
+
+    def _reply(self, status: int, body: dict):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _stream(self, events):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        for event in events:
+            data = f"data: {event}\n\n".encode("utf-8")
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            self.wfile.flush()
+            time.sleep(self.options.chunk_delay)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def do_POST(self):
+        try:
+            self._handle_post()
+        except (BrokenPipeError, ConnectionResetError):
+            # The gateway cancelled this request after hedging to the other provider
+            pass
+
+    def _handle_post(self):
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        is_gemini = "/v1beta/models/" in self.path
+        provider = "gemini" if is_gemini else "openai"
+        time.sleep(self.options.gemini_delay if is_gemini else self.options.openai_delay)
+        status = self.options.gemini_status if is_gemini else self.options.openai_status
+        if status != 200:
+            return self._reply(status, {"error": {"message": f"stubbed {provider} failure"}})
+
+        json_mode = bool(payload.get("response_format") or payload.get("generationConfig"))
+        text = json.dumps({"questions": []}) if json_mode else f"[{provider}] " + "".join(CHUNKS)
+
+        if is_gemini and ":streamGenerateContent" in self.path:
+            return self._stream(json.dumps({"candidates": [{"content": {"parts": [{"text": c}]}}]}) for c in [f"[{provider}] "] + CHUNKS)
+        if not is_gemini and payload.get("stream"):
+            return self._stream([json.dumps({"choices": [{"delta": {"content": c}}]}) for c in [f"[{provider}] "] + CHUNKS] + ["[DONE]"])
+        if is_gemini:
+            return self._reply(200, {"candidates": [{"content": {"parts": [{"text": text}]}}]})
+        return self._reply(200, {"choices": [{"message": {"content": text}}]})
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Stub Gemini/OpenAI server for the LLM gateway.")
+    parser.add_argument("--port", type=int, default=8787)
+    parser.add_argument("--gemini-delay", type=float, default=0.0)
+    parser.add_argument("--openai-delay", type=float, default=0.0)
+    parser.add_argument("--gemini-status", type=int, default=200)
+    parser.add_argument("--openai-status", type=int, default=200)
+    parser.add_argument("--chunk-delay", type=float, default=0.05)
+    StubHandler.options = parser.parse_args()
+
+    server = ThreadingHTTPServer(("127.0.0.1", StubHandler.options.port), StubHandler)
+    print(f"LLM stub listening on http://127.0.0.1:{StubHandler.options.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+import sys
+import os
+import argparse
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.db import bootstrap
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create tables, seed default data and record the schema-version marker.")
+    parser.add_argument("--check", action="store_true", help="Only report whether the database is current (exit 1 if not)")
+    parser.add_argument("--force", action="store_true", help="Run even if the marker is already current")
+    args = parser.parse_args()
+
+    marker = bootstrap.read_marker()
+    current = bootstrap.is_current(marker)
+    if args.check:
+        print(json.dumps({"current": current, "marker": marker, "expected": bootstrap.expected_marker()}, indent=2))
+        sys.exit(0 if current else 1)
+    if current and not args.force:
+        print(f"Schema {marker['schema']} (seed v{marker['seed']}) is already current; nothing to do.")
+        return
+
+    result = bootstrap.run()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
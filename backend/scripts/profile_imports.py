@@ -0,0 +1,68 @@
+import sys
+import os
+import argparse
+import json
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Fresh interpreter per probe: import cost and peak RSS as a newly started worker pays them
+PROBE = """
+import json, resource, sys, time
+started = time.perf_counter()
+import app.main
+imported = time.perf_counter()
+from app.core import lazy
+if {warm}:
+    from app.services import model_registry
+    model_registry.warm_load()
+print("PROFILE " + json.dumps({{
+    "import_ms": (imported - started) * 1000.0,
+    "total_ms": (time.perf_counter() - started) * 1000.0,
+    "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024.0,
+    "heavy_modules": lazy.loaded_heavy_modules(),
+    "modules": len(sys.modules)
+}}))
+"""
+
+
+def probe(ml_mode: str, warm: bool = False) -> dict:
+    env = {**os.environ, "ML_MODE": ml_mode, "JOB_WORKERS": "0"}
+    out = subprocess.run(
+        [sys.executable, "-c", PROBE.format(warm=warm)], cwd=BACKEND_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    line = next(l for l in out.splitlines() if l.startswith("PROFILE "))
+    return json.loads(line[len("PROFILE "):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time and memory profile of a web worker vs an ML worker.")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if a web worker breaks the budgets below")
+    parser.add_argument("--max-import-ms", type=float, default=3000.0)
+    parser.add_argument("--max-rss-mb", type=float, default=200.0)
+    args = parser.parse_args()
+
+    results = {"web (ML_MODE=lazy)": probe("lazy")}
+    if not args.check:
+        results["ml worker (ML_MODE=eager)"] = probe("eager", warm=True)
+
+    print(f"{'process':<28}{'import ms':>11}{'total ms':>10}{'peak RSS MB':>13}  heavy modules")
+    for name, r in results.items():
+        print(f"{name:<28}{r['import_ms']:>11.1f}{r['total_ms']:>10.1f}{r['peak_rss_mb']:>13.1f}  {', '.join(r['heavy_modules']) or '-'}")
+
+    if args.check:
+        web = results["web (ML_MODE=lazy)"]
+        failures = []
+        if web["heavy_modules"]:
+            failures.append(f"heavy modules imported at startup: {', '.join(web['heavy_modules'])}")
+        if web["import_ms"] > args.max_import_ms:
+            failures.append(f"import took {web['import_ms']:.0f} ms (budget {args.max_import_ms:.0f})")
+        if web["peak_rss_mb"] > args.max_rss_mb:
+            failures.append(f"peak RSS {web['peak_rss_mb']:.0f} MB (budget {args.max_rss_mb:.0f})")
+        for failure in failures:
+            print(f"FAIL: {failure}")
+        sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
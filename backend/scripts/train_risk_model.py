@@ -0,0 +1,40 @@
+import sys
+import os
+import argparse
+import json
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import SessionLocal
+from app.services import model_registry
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the XGBoost risk model and register a new version.")
+    parser.add_argument("--bootstrap-from-formula", action="store_true",
+                        help="Label current feature vectors with the formula engine when RiskHistory is too small")
+    parser.add_argument("--model-dir", default=model_registry.MODEL_DIR)
+    parser.add_argument("--list", action="store_true", help="List registered versions and exit")
+    args = parser.parse_args()
+
+    if args.list:
+        latest = model_registry.latest_version(args.model_dir)
+        for version in model_registry.list_versions(args.model_dir):
+            print(f"{version}{'  (latest)' if version == latest else ''}")
+        return
+
+    db = SessionLocal()
+    try:
+        print("Building training set...")
+        result = model_registry.train_and_save(db, bootstrap=args.bootstrap_from_formula, model_dir=args.model_dir)
+        print(f"Saved {result['version']} to {args.model_dir}")
+        print(json.dumps(result, indent=2))
+        print("Restart the API or POST /analytics/risk-model/reload to serve it.")
+    except ValueError as e:
+        print(f"Training skipped: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+
+if __name__ == "__main__":
+    main()
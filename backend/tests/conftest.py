@@ -0,0 +1,49 @@
+import os
+import sys
+import tempfile
+
+# Settings are read at import time: point the app at a throwaway database with no background threads
+_DB_DIR = tempfile.mkdtemp(prefix="sage-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_DB_DIR, 'test.db')}"
+os.environ.setdefault("JOB_WORKERS", "0")
+os.environ.setdefault("SCHEDULER_ENABLED", "0")
+os.environ.setdefault("ML_MODE", "off")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+from app.database import Base, engine, SessionLocal
+from app import models  # noqa: F401  (registers the tables)
+
+
+@pytest.fixture()
+def db():
+    Base.metadata.create_all(bind=engine)
+    session = SessionLocal()
+    try:
+        yield session
+    finally:
+        session.close()
+        Base.metadata.drop_all(bind=engine)
+
+
+@pytest.fixture()
+def client(db):
+    # No `with`: the lifespan (bootstrap, workers, scheduler) stays off
+    from fastapi.testclient import TestClient
+    from app import auth
+    from app.main import app
+
+    # The demo accounts requests without a token (admin) or with a demo token resolve to
+    db.add(models.User(email="admin@sage.com", role=models.UserRole.admin, linked_id="admin", approved=True))
+    db.add(models.User(email="teacher@sage.com", role=models.UserRole.teacher, linked_id="T01", approved=True))
+    db.commit()
+    auth.invalidate_principals()
+    yield TestClient(app)
+    auth.invalidate_principals()
+
+
+def bearer(email: str) -> dict:
+    from app import auth
+    return {"Authorization": f"Bearer {auth.create_access_token({'sub': email})}"}
@@ -0,0 +1,52 @@
+import json
+
+import pytest
+
+from app import models
+
+
+@pytest.fixture()
+def student(db):
+    db.add(models.Student(
+        enrollment_no="S1", name="S1", email="s1@example.com",
+        program="B.Tech", branch="CSE", semester=5, section="A"
+    ))
+    db.commit()
+    return "S1"
+
+
+def _post(client, lines):
+    body = "\n".join(line if isinstance(line, str) else json.dumps(line) for line in lines)
+    return client.post("/analytics/sync/activity/batch", content=body, headers={"Content-Type": "application/x-ndjson"})
+
+
+def test_ndjson_rejects_malformed_lines_by_line_number(client, db, student):
+    response = _post(client, [
+        {"student_id": student, "activity_type": "video", "external_event_id": "e1"},
+        "",
+        "{not json",
+        {"student_id": student, "activity_type": "video", "external_event_id": ["x"]},
+        {"student_id": student, "external_event_id": "e2"},
+        {"student_id": student, "activity_type": "quiz", "external_event_id": 7, "duration": 30},
+        {"student_id": student, "activity_type": "quiz", "subject_id": {"id": 1}},
+        {"student_id": student, "activity_type": "quiz", "duration": "long"},
+        {"student_id": student, "activity_type": "video", "external_event_id": "e1"},
+    ])
+
+    assert response.status_code == 200
+    result = response.json()
+    assert result["rejected_lines"] == [3, 4, 5, 7, 8]
+    assert result["rejected"] == 5
+    assert result["inserted"] == 2 and result["duplicates"] == 1
+    stored = {ext for (ext,) in db.query(models.StudentActivity.external_event_id).all()}
+    assert stored == {"e1", "7"}
+
+
+def test_json_array_rejects_unhashable_event_ids(client, student):
+    response = client.post("/analytics/sync/activity/batch", json=[
+        {"student_id": student, "activity_type": "video", "external_event_id": {"a": 1}},
+        {"student_id": student, "activity_type": "video", "external_event_id": "ok"},
+    ])
+    assert response.status_code == 200
+    assert response.json()["rejected_lines"] == [1]
+    assert response.json()["inserted"] == 1
@@ -0,0 +1,111 @@
+import random
+
+import numpy as np
+import pytest
+
+from app.services.risk_predictor import RuleBasedRiskPredictor, MLRiskPredictor, RiskPredictor
+from app.services.xgboost_risk_engine import XGBoostRiskEngine
+from app.services.early_warning_master_engine import EarlyWarningMasterEngine
+from app.services.score_predictor import AcademicScorePredictor
+
+
+def _students(n=300, seed=11):
+    # Two-decimal inputs land on .x5 boundaries often, where np.round and round() used to disagree
+    rng = random.Random(seed)
+    rows = []
+    for _ in range(n):
+        row = {
+            "attendance_percentage": round(rng.uniform(30, 100), 2),
+            "current_average_marks": round(rng.uniform(20, 100), 2),
+            "mid_sem_marks_avg": round(rng.uniform(20, 100), 2),
+            "engagement_score": round(rng.uniform(0, 100), 2),
+            "assessment_average": round(rng.uniform(20, 100), 2),
+            "marks_change_30d": round(rng.uniform(-30, 30), 2),
+            "cgpa": round(rng.uniform(4, 10), 2),
+            "missed_assignments": rng.randint(0, 6),
+            "missed_tests": rng.randint(0, 4),
+            "backlog_count": rng.randint(0, 3),
+            "assignment_completion_rate": round(rng.uniform(40, 100), 2),
+        }
+        # Some students miss features so the defaults are exercised too
+        for key in rng.sample(sorted(row), rng.randint(0, 3)):
+            del row[key]
+        rows.append(row)
+    return rows
+
+
+def _assert_same(scalar_rows, batch, keys):
+    for key in keys:
+        expected = [row[key] for row in scalar_rows]
+        actual = list(batch[key])
+        mismatches = [(i, e, a) for i, (e, a) in enumerate(zip(expected, actual)) if e != a]
+        assert not mismatches, f"{key}: {len(mismatches)} mismatches, first {mismatches[:3]}"
+
+
+def test_rule_based_batch_matches_scalar():
+    rows = _students()
+    predictor = RuleBasedRiskPredictor()
+    batch = predictor.predict_risk_batch(rows)
+    _assert_same([predictor.predict_risk(r) for r in rows], batch, [
+        "overall_risk", "risk_level", "risk_status", "academic_risk", "attendance_risk",
+        "engagement_risk", "assessment_risk", "backlog_risk"
+    ])
+
+
+def test_rule_based_batch_matches_scalar_with_custom_weights():
+    rows = _students(seed=3)
+    weights = {"academic": {"weight": 40.0}, "attendance": {"weight": 35.0}, "wellbeing": {"weight": 25.0}}
+    for i, row in enumerate(rows):
+        if i % 3:
+            row["wellbeing_score"] = round(50 + (i % 47) * 1.05, 2)
+    predictor = RuleBasedRiskPredictor()
+    batch = predictor.predict_risk_batch(rows, weights=weights)
+    _assert_same([predictor.predict_risk(dict(r, weights=weights)) for r in rows], batch, ["overall_risk", "risk_level"])
+
+
+def test_xgboost_formula_batch_matches_scalar():
+    rows = _students()
+    engine = XGBoostRiskEngine(use_registry=False)
+    batch = engine.predict_batch(rows)
+    scalar = [engine.predict(r) for r in rows]
+    _assert_same(scalar, batch, ["risk_probability", "risk_tier"])
+    for i, row in enumerate(scalar):
+        assert list(row["shap_values"].values()) == batch["shap_values"][i].tolist()
+
+
+def test_ml_predictor_batch_matches_scalar():
+    rows = _students(seed=5)
+    predictor = MLRiskPredictor()
+    predictor.xgb_engine.use_registry = False
+    batch = predictor.predict_risk_batch(rows)
+    _assert_same([predictor.predict_risk(r) for r in rows], batch, ["overall_risk", "risk_level", "academic_risk"])
+
+
+def test_early_warning_batch_matches_scalar():
+    rows = _students()
+    engine = EarlyWarningMasterEngine()
+    batch = engine.synthesize_master_score_batch(rows)
+    scalar = [engine.synthesize_master_score(r) for r in rows]
+    _assert_same(scalar, batch, ["master_ai_risk_score", "early_warning_status"])
+    for i, row in enumerate(scalar):
+        assert [w["contribution"] for w in row["multi_model_ensemble_weights"]] == batch["contributions"][i].tolist()
+
+
+def test_score_predictor_batch_matches_scalar():
+    rows = _students()
+    engine = AcademicScorePredictor()
+    batch = engine.predict_score_batch(rows)
+    _assert_same([engine.predict_score(r) for r in rows], batch, [
+        "current_score", "predicted_endsem_score", "confidence_percentage", "score_delta", "intervention_level"
+    ])
+
+
+def test_base_class_batch_falls_back_to_scalar():
+    class Constant(RiskPredictor):
+        def predict_risk(self, features):
+            return {"overall_risk": round(features.get("attendance_percentage", 75.0) / 3, 1), "risk_level": "LOW", "model_version": "t"}
+
+    rows = _students(n=20)
+    batch = Constant().predict_risk_batch(rows)
+    assert batch["model_version"] == "t"
+    assert batch["overall_risk"].tolist() == [Constant().predict_risk(r)["overall_risk"] for r in rows]
@@ -0,0 +1,60 @@
+from app import models
+from app.services import analytics_cache, chat_context
+from app.services.chat_context import ContextIndex
+
+
+def _student(db, sid, name, dsa):
+    db.add(models.Student(
+        enrollment_no=sid, name=name, email=f"{sid.lower()}@example.com", program="B.Tech",
+        branch="CSE", semester=5, section="A", dsa_score=dsa, attendance=90
+    ))
+    db.commit()
+
+
+def test_rows_are_read_outside_the_index_lock(db, monkeypatch):
+    _student(db, "S1", "Asha", 40)
+    index = ContextIndex()
+    prepare = index._prepare_rows
+
+    def checked(*args, **kwargs):
+        assert not index._lock.locked()
+        return prepare(*args, **kwargs)
+
+    monkeypatch.setattr(index, "_prepare_rows", checked)
+    assert index.sync(db) == 1
+    assert "Asha" in index.search("weak dsa")[0][1]
+
+
+def test_periodic_check_skips_the_scan_until_a_generation_moves(db, monkeypatch):
+    _student(db, "S1", "Asha", 40)
+    index = ContextIndex()
+    index.sync(db)
+    scans = []
+    prepare = index._prepare_rows
+    monkeypatch.setattr(index, "_prepare_rows", lambda *a, **kw: scans.append(a[0]) or prepare(*a, **kw))
+
+    index.checked_at = 0.0
+    assert index.sync(db) == 0 and scans == []
+
+    student = db.query(models.Student).one()
+    student.dsa_score = 95
+    analytics_cache.bump_generations(db, ["students"])
+    db.commit()
+    monkeypatch.setattr(analytics_cache, "_generations_read_at", 0.0)
+    index.checked_at = 0.0
+    assert index.sync(db) == 1
+    assert scans == ["S:", "T:"]
+    assert "strong top dsa" in index.docs["S:S1"]["fingerprint"]
+
+
+def test_dirty_ids_refresh_only_those_rows(db):
+    _student(db, "S1", "Asha", 40)
+    _student(db, "S2", "Ravi", 70)
+    index = ContextIndex()
+    index.sync(db)
+    db.query(models.Student).filter(models.Student.enrollment_no == "S2").update({"dsa_score": 20})
+    db.commit()
+
+    index.mark_dirty(["S2"])
+    assert index.sync(db) == 1
+    assert index.sums["dsa_score"] == 60 and index.student_count == 2
@@ -0,0 +1,79 @@
+import pytest
+
+from app import models
+from app.database import SessionLocal
+from app.services import concept_engine
+
+
+@pytest.fixture()
+def students(db):
+    for sid in ("S1", "S2"):
+        db.add(models.Student(
+            enrollment_no=sid, name=sid, email=f"{sid.lower()}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A"
+        ))
+    db.commit()
+    return ["S1", "S2"]
+
+
+def _responses(student_id, n, correct=True):
+    return [{
+        "student_id": student_id, "question_id": "Q1", "subject_id": "CS101",
+        "concept_ids": ["C1"], "is_correct": correct, "time_taken_seconds": 20
+    } for _ in range(n)]
+
+
+def _question(db):
+    db.expire_all()
+    return db.query(models.QuestionAnalytics).filter(models.QuestionAnalytics.question_id == "Q1").one()
+
+
+def test_concurrent_batch_between_read_and_write_is_not_lost(db, students, monkeypatch):
+    concept_engine.process_question_responses(_responses("S1", 2), db)
+
+    load = concept_engine._load_questions
+    calls = []
+
+    def racing_load(session, question_ids):
+        rows = load(session, question_ids)
+        calls.append(1)
+        if len(calls) == 1:
+            # Another worker commits its answers after this batch has read the counters
+            other = SessionLocal()
+            try:
+                concept_engine.process_question_responses(_responses("S2", 3, correct=False), other)
+            finally:
+                other.close()
+        return rows
+
+    monkeypatch.setattr(concept_engine, "_load_questions", racing_load)
+    concept_engine.process_question_responses(_responses("S1", 4), db)
+
+    question = _question(db)
+    assert len(calls) == 3
+    assert (question.attempt_count, question.correct_count, question.incorrect_count) == (9, 6, 3)
+    mastery = db.query(models.StudentConceptMastery).filter(models.StudentConceptMastery.student_id == "S1").one()
+    assert mastery.attempts == 6
+
+
+def test_new_question_created_concurrently_is_retried_as_update(db, students, monkeypatch):
+    load = concept_engine._load_questions
+    calls = []
+
+    def racing_load(session, question_ids):
+        rows = load(session, question_ids)
+        calls.append(1)
+        if len(calls) == 1:
+            other = SessionLocal()
+            try:
+                concept_engine.process_question_responses(_responses("S2", 1), other)
+            finally:
+                other.close()
+        return rows
+
+    monkeypatch.setattr(concept_engine, "_load_questions", racing_load)
+    result = concept_engine.process_question_responses(_responses("S1", 2), db)
+
+    assert result["status"] == "success" and len(calls) == 3
+    assert _question(db).attempt_count == 3
+    assert db.query(models.QuestionAnalytics).count() == 1
@@ -0,0 +1,47 @@
+import random
+from datetime import datetime, timedelta
+
+from app import models
+from app.services import engagement_engine, risk_batch_engine, risk_engine
+
+TYPES = ["LOGIN", "COURSE_VIEW", "PDF_VIEW", "VIDEO_WATCH", "QUIZ_START", "QUIZ_COMPLETE", "ASSIGNMENT_SUBMIT"]
+
+
+def _cohort(db, n=30, seed=7):
+    rng = random.Random(seed)
+    now = datetime.utcnow()
+    events = []
+    for i in range(n):
+        sid = f"S{i:02d}"
+        db.add(models.Student(
+            enrollment_no=sid, name=sid, email=f"{sid.lower()}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A",
+            attendance=rng.randint(40, 100), active_backlogs=rng.choice([0, 0, 1, 2])
+        ))
+        for _ in range(rng.randint(0, 3)):
+            db.add(models.AcademicMetric(student_id=sid, subject_id="C1", overall_score=rng.uniform(30, 95)))
+        # Hours offsets stay away from the 48 h / 72 h inactivity thresholds
+        for _ in range(rng.randint(0, 25)):
+            events.append({
+                "student_id": sid,
+                "activity_type": rng.choice(TYPES),
+                "started_at": (now - timedelta(days=rng.randint(0, 40), hours=rng.choice([1, 5, 12]))).isoformat(),
+                "duration": rng.randint(0, 1800)
+            })
+    db.commit()
+    engagement_engine.ingest_activity_events(db, events)
+    return db.query(models.Student).order_by(models.Student.enrollment_no).all()
+
+
+def test_batch_and_scalar_engagement_and_risk_agree(db):
+    students = _cohort(db)
+    ids = [s.enrollment_no for s in students]
+    batch = risk_batch_engine.score_cohort(students, db)
+    cohort = engagement_engine.calculate_cohort_engagement(ids, db)
+
+    for i, sid in enumerate(ids):
+        scalar = risk_engine.calculate_student_risk(sid, db)
+        engagement = engagement_engine.calculate_student_engagement(sid, db)
+        assert engagement["engagement_score"] == cohort["engagement_score"][i], sid
+        assert scalar["risk_score"] == batch["risk_score"][i], sid
+        assert scalar["failure_probability"] == batch["failure_probability"][i], sid
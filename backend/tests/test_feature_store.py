@@ -0,0 +1,108 @@
+import json
+from datetime import datetime
+
+from app import models
+from app.database import SessionLocal
+from app.services import feature_store, risk_snapshot_service
+from conftest import bearer
+
+
+def _student(db, sid="S1", attendance=80):
+    db.add(models.Student(
+        enrollment_no=sid, name=sid, email=f"{sid.lower()}@example.com",
+        program="B.Tech", branch="CSE", semester=5, section="A", attendance=attendance
+    ))
+    db.commit()
+
+
+def _stored_families(sid):
+    other = SessionLocal()
+    try:
+        return {f for (f,) in other.query(models.StudentFeatureStore.family).filter(
+            models.StudentFeatureStore.student_id == sid
+        ).all()}
+    finally:
+        other.close()
+
+
+def test_read_backfills_without_committing_the_callers_session(db, monkeypatch):
+    _student(db)
+    student = db.get(models.Student, "S1")
+
+    def refuse():
+        raise AssertionError("read path committed the caller's session")
+
+    monkeypatch.setattr(db, "commit", refuse)
+    features = feature_store.get_student_features(db, student)
+
+    assert features["attendance_percentage"] == 80.0
+    assert _stored_families("S1") == set(feature_store.FAMILIES)
+
+
+def test_read_falls_back_to_source_when_backfill_fails(db, monkeypatch):
+    _student(db)
+    student = db.get(models.Student, "S1")
+    monkeypatch.setattr(feature_store, "_backfill", lambda missing: None)
+
+    features = feature_store.get_student_features(db, student)
+
+    assert features["attendance_percentage"] == 80.0
+    assert _stored_families("S1") == set()
+
+
+def test_smart_upload_invalidates_features_and_snapshot(client, db):
+    _student(db)
+    feature_store.get_student_features(db, db.get(models.Student, "S1"))
+    db.add(models.RiskSnapshot(student_id="S1", name="S1", risk_score=10.0, is_stale=False))
+    db.commit()
+
+    response = client.post(
+        "/ingest/csv/smart-upload",
+        files={"file": ("students.csv", b"student_id,attendance\nS1,55\n", "text/csv")},
+        headers=bearer("admin@sage.com")
+    )
+
+    assert response.status_code == 200 and response.json()["records_updated"] == 1
+    db.expire_all()
+    assert db.get(models.RiskSnapshot, "S1").is_stale
+    assert _stored_families("S1") == set()
+
+
+def _events(n):
+    return [{"student_id": "S1", "activity_type": "LOGIN", "started_at": datetime.utcnow(), "duration": 0} for _ in range(n)]
+
+
+def _activity_count(sid):
+    other = SessionLocal()
+    try:
+        row = other.get(models.StudentFeatureStore, (sid, "engagement"))
+        return sum(day["n"] for day in json.loads(row.state_json)["days"].values())
+    finally:
+        other.close()
+
+
+def test_concurrent_activity_batches_keep_both_increments(db, monkeypatch):
+    _student(db)
+    feature_store.get_engagement_state(db, "S1")
+    db.commit()
+
+    load_rows = feature_store._load_rows
+    raced = []
+
+    def load_then_race(session, *args, **kwargs):
+        rows = load_rows(session, *args, **kwargs)
+        if session is db and not raced:
+            raced.append(True)
+            other = SessionLocal()
+            try:
+                feature_store.record_activities(other, _events(2))
+                other.commit()
+            finally:
+                other.close()
+        return rows
+
+    monkeypatch.setattr(feature_store, "_load_rows", load_then_race)
+    feature_store.record_activities(db, _events(3))
+    db.commit()
+
+    assert _activity_count("S1") == 5
@@ -0,0 +1,31 @@
+import importlib.util
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.core import lazy
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "profile_imports.py")
+
+# Without the ML extras there is nothing heavy to keep out of startup
+pytestmark = pytest.mark.skipif(
+    not all(lazy.available(name) for name in lazy.HEAVY_MODULES), reason="ML extras not installed"
+)
+
+
+def _profile_imports():
+    spec = importlib.util.spec_from_file_location("profile_imports", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def test_web_worker_does_not_import_heavy_modules():
+    assert _profile_imports().probe("lazy")["heavy_modules"] == []
+
+
+def test_import_and_rss_budgets():
+    result = subprocess.run([sys.executable, SCRIPT, "--check"], capture_output=True, text=True, timeout=300)
+    assert result.returncode == 0, result.stdout + result.stderr
@@ -0,0 +1,129 @@
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+from app import models
+from app.services import job_queue
+
+
+def _job(db, job_id):
+    db.expire_all()
+    return db.query(models.BackgroundJob).filter(models.BackgroundJob.id == job_id).one()
+
+
+def _make_runnable(db, job_id):
+    # Skip the retry backoff so the next claim picks the job up immediately
+    _job(db, job_id).run_after = job_queue._now()
+    db.commit()
+
+
+class _FakeExecutor:
+    def __init__(self, submit_error=None):
+        self.submit_error = submit_error
+        self.shut_down = False
+
+    def submit(self, fn, *args):
+        if self.submit_error is not None:
+            raise self.submit_error
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        self.shut_down = True
+
+
+@pytest.fixture()
+def failing_handler(monkeypatch):
+    calls = []
+
+    def handler(db, payload, ctx):
+        calls.append(ctx.attempt)
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(job_queue, "_resolve_handler", lambda kind: handler)
+    return calls
+
+
+def test_failed_job_is_retried_until_max_attempts(db, failing_handler):
+    job_id = job_queue.enqueue(db, "risk.recalculate_all", max_attempts=3)["job_id"]
+
+    outcomes = []
+    for _ in range(3):
+        assert job_queue.claim_next(db, "test") == job_id
+        outcomes.append(job_queue.execute_job(job_id))
+        _make_runnable(db, job_id)
+
+    assert outcomes == ["QUEUED", "QUEUED", "FAILED"]
+    assert failing_handler == [1, 2, 3]
+    job = _job(db, job_id)
+    assert job.attempts == 3 and job.error == "boom" and job.finished_at is not None
+    assert job_queue.claim_next(db, "test") is None
+
+
+def test_retry_is_delayed_with_backoff(db, failing_handler):
+    job_id = job_queue.enqueue(db, "risk.recalculate_all", max_attempts=2)["job_id"]
+    job_queue.claim_next(db, "test")
+    job_queue.execute_job(job_id)
+
+    job = _job(db, job_id)
+    assert job.status == "QUEUED" and job.worker_id is None
+    assert job.run_after > job_queue._now()
+    assert job_queue.claim_next(db, "test") is None
+
+
+def test_worker_crash_counts_as_attempt_and_fails_at_max(db):
+    job_id = job_queue.enqueue(db, "risk.recalculate_all", max_attempts=2)["job_id"]
+
+    job_queue.claim_next(db, "test")
+    assert job_queue.record_crash(job_id, BrokenProcessPool("killed")) == "QUEUED"
+    assert _job(db, job_id).attempts == 1
+
+    _make_runnable(db, job_id)
+    job_queue.claim_next(db, "test")
+    assert job_queue.record_crash(job_id, BrokenProcessPool("killed")) == "FAILED"
+    job = _job(db, job_id)
+    assert job.attempts == 2 and "crashed" in job.error
+
+
+def test_reap_records_crash_and_replaces_broken_pool(db, monkeypatch):
+    job_id = job_queue.enqueue(db, "risk.recalculate_all", max_attempts=3)["job_id"]
+    job_queue.claim_next(db, "test")
+
+    pool = job_queue.JobWorkerPool(workers=1)
+    broken_executor = _FakeExecutor()
+    pool._executor = broken_executor
+    monkeypatch.setattr(pool, "_new_executor", _FakeExecutor)
+    future = Future()
+    future.set_exception(BrokenProcessPool("worker killed"))
+    pool._running[job_id] = future
+
+    pool._reap()
+
+    assert pool._running == {}
+    assert broken_executor.shut_down and pool._executor is not broken_executor
+    job = _job(db, job_id)
+    assert job.status == "QUEUED" and job.attempts == 1
+
+
+def test_failed_submit_releases_claim(db, monkeypatch):
+    job_id = job_queue.enqueue(db, "risk.recalculate_all")["job_id"]
+
+    pool = job_queue.JobWorkerPool(workers=1)
+    broken_executor = _FakeExecutor(submit_error=BrokenProcessPool("pool broken"))
+    pool._executor = broken_executor
+    monkeypatch.setattr(pool, "_new_executor", _FakeExecutor)
+
+    assert job_queue.claim_next(db, "test") == job_id
+    assert pool._submit(job_id) is False
+
+    job = _job(db, job_id)
+    assert job.status == "QUEUED" and job.attempts == 0 and job.worker_id is None
+    assert pool._executor is not broken_executor and job_id not in pool._running
+
+    # The replacement pool takes the job on the next pass
+    monkeypatch.setattr(job_queue, "_resolve_handler", lambda kind: lambda db, payload, ctx: {"ok": True})
+    assert job_queue.claim_next(db, "test") == job_id
+    assert pool._submit(job_id) is True
+    assert pool._running[job_id].result() == "COMPLETED"
@@ -0,0 +1,63 @@
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app import auth, models
+from app.services import job_queue
+from conftest import bearer
+
+TEACHER = "teacher@sage.com"
+
+
+@pytest.fixture()
+def jobs(db, client):
+    for enrollment_no, batch in [("S1", "B1"), ("S2", "B2")]:
+        db.add(models.Student(
+            enrollment_no=enrollment_no, name=enrollment_no, email=f"{enrollment_no.lower()}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A", batch_id=batch
+        ))
+    db.add(models.Lecture(teacher_id="T01", batch="B1", subject="DSA"))
+    db.commit()
+    return {
+        "own_batch": job_queue.enqueue(db, "ai.generate_report", {"student_id": "S1"}, requested_by="admin@sage.com")["job_id"],
+        "other_batch": job_queue.enqueue(db, "ai.generate_report", {"student_id": "S2"}, requested_by="admin@sage.com")["job_id"],
+        "no_student": job_queue.enqueue(db, "risk.recalculate_all", requested_by="admin@sage.com")["job_id"],
+        "requested": job_queue.enqueue(db, "ai.generate_report", {"student_id": "S2"}, requested_by=TEACHER)["job_id"],
+    }
+
+
+def test_teacher_reads_only_jobs_they_requested_or_for_their_students(client, jobs):
+    headers = bearer(TEACHER)
+    assert client.get(f"/jobs/{jobs['own_batch']}", headers=headers).status_code == 200
+    assert client.get(f"/jobs/{jobs['requested']}", headers=headers).status_code == 200
+    assert client.get(f"/jobs/{jobs['other_batch']}", headers=headers).status_code == 404
+    assert client.get(f"/jobs/{jobs['no_student']}", headers=headers).status_code == 404
+
+    listed = client.get("/jobs", headers=headers).json()
+    assert [job["job_id"] for job in listed["jobs"]] == [jobs["requested"]]
+    assert "pool" not in listed
+
+
+def test_only_requester_or_admin_can_cancel(client, jobs):
+    assert client.post(f"/jobs/{jobs['own_batch']}/cancel", headers=bearer(TEACHER)).status_code == 403
+    assert client.post(f"/jobs/{jobs['requested']}/cancel", headers=bearer(TEACHER)).json()["status"] == "CANCELLED"
+    assert client.post(f"/jobs/{jobs['own_batch']}/cancel").json()["status"] == "CANCELLED"
+
+
+def test_admin_reads_everything(client, jobs):
+    assert len(client.get("/jobs").json()["jobs"]) == 4
+    assert client.get(f"/jobs/{jobs['other_batch']}").status_code == 200
+
+
+def test_job_sockets_require_a_valid_token(client, jobs):
+    teacher_token = auth.create_access_token({"sub": TEACHER})
+    admin_token = auth.create_access_token({"sub": "admin@sage.com"})
+
+    for url in ["/jobs/ws", f"/jobs/ws/{jobs['own_batch']}", "/jobs/ws?token=garbage",
+                f"/jobs/ws?token={teacher_token}", f"/jobs/ws/{jobs['other_batch']}?token={teacher_token}"]:
+        with pytest.raises(WebSocketDisconnect):
+            with client.websocket_connect(url) as ws:
+                ws.receive_text()
+
+    for url in [f"/jobs/ws?token={admin_token}", f"/jobs/ws/{jobs['own_batch']}?token={teacher_token}"]:
+        with client.websocket_connect(url) as ws:
+            ws.send_text("ping")
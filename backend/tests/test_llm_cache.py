@@ -0,0 +1,51 @@
+import asyncio
+import threading
+
+from app.services import llm_cache
+
+
+def test_single_flight_within_one_loop(db):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"text": "ok"}
+
+    async def run():
+        return await asyncio.gather(*(llm_cache.get_or_compute("test", "same prompt", "m", compute) for _ in range(3)))
+
+    assert asyncio.run(run()) == [{"text": "ok"}] * 3
+    assert len(calls) == 1
+    llm_cache.invalidate(namespace="test")
+
+
+def test_callers_on_different_loops_do_not_share_futures(db):
+    release = threading.Event()
+    started = threading.Barrier(2, timeout=5)
+    results, errors = [], []
+
+    async def compute():
+        release.wait(5)
+        return {"text": "ok"}
+
+    async def call():
+        started.wait()
+        return await llm_cache.get_or_compute("test", "loop prompt", "m", compute)
+
+    def worker():
+        try:
+            results.append(asyncio.run(call()))
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker) for _ in range(2)]
+    for t in threads:
+        t.start()
+    release.set()
+    for t in threads:
+        t.join(10)
+
+    assert errors == []
+    assert results == [{"text": "ok"}] * 2
+    llm_cache.invalidate(namespace="test")
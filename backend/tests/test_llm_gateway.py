@@ -0,0 +1,123 @@
+import argparse
+import asyncio
+import importlib.util
+import os
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+from app.services import llm_gateway
+
+SCRIPT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts", "llm_stub_server.py")
+
+
+def _load_stub():
+    spec = importlib.util.spec_from_file_location("llm_stub_server", SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Starts scripts/llm_stub_server.py on a free port; returns its options to tweak per test."""
+    module = _load_stub()
+    options = argparse.Namespace(
+        port=0, gemini_delay=0.0, openai_delay=0.0, gemini_status=200, openai_status=200, chunk_delay=0.0
+    )
+    handler = type("Handler", (module.StubHandler,), {"options": options, "log_message": lambda *args: None})
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    base_url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(llm_gateway, "GEMINI_BASE_URL", base_url)
+    monkeypatch.setattr(llm_gateway, "OPENAI_BASE_URL", base_url)
+    monkeypatch.setattr(llm_gateway, "LLM_HEDGE_DELAY_SECONDS", 0.2)
+    monkeypatch.setenv("GEMINI_API_KEY", "stub")
+    monkeypatch.setenv("OPENAI_API_KEY", "stub")
+    yield options
+    server.shutdown()
+    server.server_close()
+
+
+def _complete(gateway):
+    return asyncio.run(gateway.complete(None, [{"role": "user", "content": "hi"}]))
+
+
+def test_primary_answers_without_hedging(stub):
+    gateway = llm_gateway.LLMGateway()
+    result = _complete(gateway)
+    assert result["provider"] == "gemini"
+    assert result["text"].startswith("[gemini]")
+    assert gateway.stats["openai"]["requests"] == 0
+
+
+def test_slow_primary_is_hedged(stub):
+    stub.gemini_delay = 2.0
+    gateway = llm_gateway.LLMGateway()
+    result = _complete(gateway)
+    assert result["provider"] == "openai"
+    assert result["text"].startswith("[openai]")
+    assert gateway.stats["openai"]["hedged"] == 1
+    assert gateway.stats["openai"]["wins"] == 1
+
+
+def test_failed_primary_fails_over(stub):
+    stub.gemini_status = 500
+    gateway = llm_gateway.LLMGateway()
+    result = _complete(gateway)
+    assert result["provider"] == "openai"
+    assert gateway.stats["gemini"]["errors"] == 1
+
+
+def test_all_providers_failing_raises(stub):
+    stub.gemini_status = 500
+    stub.openai_status = 503
+    gateway = llm_gateway.LLMGateway()
+    with pytest.raises(llm_gateway.LLMError):
+        _complete(gateway)
+
+
+def test_stream_fails_over_before_first_chunk(stub):
+    stub.gemini_status = 500
+    gateway = llm_gateway.LLMGateway()
+
+    async def collect():
+        return [chunk async for chunk in gateway.stream(None, [{"role": "user", "content": "hi"}])]
+
+    chunks = asyncio.run(collect())
+    assert {c["provider"] for c in chunks} == {"openai"}
+    assert "".join(c["delta"] for c in chunks).startswith("[openai]")
+
+
+def test_client_is_closed_when_its_loop_shuts_down(stub):
+    gateway = llm_gateway.LLMGateway()
+    clients = []
+
+    async def run():
+        await gateway.complete(None, [{"role": "user", "content": "hi"}])
+        await gateway.complete(None, [{"role": "user", "content": "again"}])
+        clients.append(gateway._pools[asyncio.get_running_loop()].client)
+
+    # Each asyncio.run (one per job) gets its own client, reused within the loop and closed with it
+    asyncio.run(run())
+    asyncio.run(run())
+    assert len(clients) == 2 and clients[0] is not clients[1]
+    assert all(client.is_closed for client in clients)
+
+
+def test_aclose_closes_the_running_loops_client(stub):
+    gateway = llm_gateway.LLMGateway()
+
+    async def run():
+        await gateway.complete(None, [{"role": "user", "content": "hi"}])
+        client = gateway._pools[asyncio.get_running_loop()].client
+        await gateway.aclose()
+        return client, asyncio.get_running_loop() in gateway._pools
+
+    client, still_pooled = asyncio.run(run())
+    assert client.is_closed
+    assert not still_pooled
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import numpy as np
+
+from app.services import model_registry
+from app.services.model_registry import ModelRegistry, MODEL_FEATURES
+
+
+class _Booster:
+    def predict(self, dmatrix, pred_contribs=False):
+        n = dmatrix.num_row()
+        return np.tile(np.r_[np.full(len(MODEL_FEATURES), 1.0), 20.0], (n, 1)).astype(np.float32)
+
+
+def test_first_use_loads_once_across_threads(monkeypatch):
+    monkeypatch.setattr(model_registry, "ML_MODE", "lazy")
+    registry = ModelRegistry(model_dir="/nonexistent")
+    loads = []
+
+    def slow_load(version=None):
+        loads.append(version)
+        time.sleep(0.05)
+        with registry._lock:
+            registry.booster, registry.version = _Booster(), "v1"
+        return True
+
+    monkeypatch.setattr(registry, "load", slow_load)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(registry.active_model())) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(loads) == 1
+    assert all(model is not None and model[1] == "v1" for model in results)
+
+
+def test_prediction_keeps_the_model_it_started_with(monkeypatch):
+    monkeypatch.setattr(model_registry, "ML_MODE", "lazy")
+    registry = ModelRegistry(model_dir="/nonexistent")
+    registry.booster, registry.version, registry._load_attempted = _Booster(), "v1", True
+
+    model = registry.active_model()
+    registry.unload()
+    result = registry.predict_batch([{"attendance_percentage": 80.0}], model)
+
+    assert result["version"] == "v1"
+    assert result["risk_probability"].tolist() == [34.0]
+    assert registry.active_model() is None
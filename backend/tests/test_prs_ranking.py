@@ -0,0 +1,101 @@
+import random
+
+import numpy as np
+
+from app import models
+from app.services import prs_ranking
+from conftest import bearer
+
+
+def _students(db, n, seed=1):
+    rng = random.Random(seed)
+    for i in range(n):
+        db.add(models.Student(
+            enrollment_no=f"S{i:03d}", name=f"S{i}", email=f"s{i}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A",
+            dsa_score=rng.randint(0, 100), ml_score=rng.randint(0, 100), qa_score=rng.randint(0, 100),
+            projects_score=rng.randint(0, 100), mock_interview_score=rng.randint(0, 100), attendance=rng.randint(0, 100)
+        ))
+    db.commit()
+
+
+def test_matrix_and_scalar_prs_agree_including_unknown_and_disabled_keys(db):
+    _students(db, 200)
+    config = {
+        **prs_ranking.DEFAULT_RANKING_CONFIG,
+        "ml": {"enabled": False, "weight": 20.0},
+        "qa": {"enabled": True, "weight": 17.5},
+        "hackathons": {"enabled": True, "weight": 30.0},
+    }
+    students = db.query(models.Student).order_by(models.Student.enrollment_no).all()
+    scores = np.array([[getattr(s, c.key) for c in prs_ranking.PRS_SCORE_COLUMNS.values()] for s in students], dtype=np.float64)
+
+    assert prs_ranking.score_matrix_prs(scores, config).tolist() == [prs_ranking.calculate_prs(s, config) for s in students]
+
+
+def test_student_write_bumps_generation_without_clearing_index(db):
+    _students(db, 5)
+    prs_ranking.ensure_rank_index(db)
+    top = prs_ranking.top_k(db, 1)[0]
+
+    student = db.query(models.Student).filter(models.Student.enrollment_no == top.student_id).one()
+    student.dsa_score = student.ml_score = student.qa_score = 0
+    student.projects_score = student.mock_interview_score = student.attendance = 0
+    prs_ranking.invalidate(db)
+    db.commit()
+
+    # Still there until the next read rebuilds it
+    assert db.query(models.StudentRankIndex).count() == 5
+    assert prs_ranking.rank_of(db, top.student_id).rank == 5
+    assert prs_ranking._index_is_current(db, prs_ranking.get_ranking_config_from_db(db))
+
+
+def test_rebuild_runs_outside_the_callers_session(db, monkeypatch):
+    _students(db, 3)
+
+    def no_commit():
+        raise AssertionError("ensure_rank_index committed the caller's session")
+
+    monkeypatch.setattr(db, "commit", no_commit)
+    assert [row.rank for row in prs_ranking.top_k(db, 3)] == [1, 2, 3]
+
+
+def test_orm_score_write_invalidates_without_an_explicit_call(db):
+    _students(db, 5)
+    bottom = prs_ranking.top_k(db, 5)[-1]
+
+    student = db.query(models.Student).filter(models.Student.enrollment_no == bottom.student_id).one()
+    student.dsa_score = student.ml_score = student.qa_score = 100
+    student.projects_score = student.mock_interview_score = student.attendance = 100
+    db.commit()
+
+    assert not prs_ranking._index_is_current(db, prs_ranking.get_ranking_config_from_db(db))
+    assert prs_ranking.rank_of(db, bottom.student_id).rank == 1
+
+
+def test_index_state_row_describes_the_last_rebuild(db):
+    _students(db, 4)
+    prs_ranking.ensure_rank_index(db)
+    state = db.get(models.RankIndexState, prs_ranking.INDEX_STATE_ID)
+
+    assert state.row_count == 4
+    assert state.digest == prs_ranking.index_digest(prs_ranking.get_ranking_config_from_db(db), prs_ranking._generation(db))
+
+
+def test_posting_marks_moves_the_rank(client, db):
+    for sid, attendance in (("S0", 0), ("S1", 20), ("S2", 40)):
+        db.add(models.Student(
+            enrollment_no=sid, name=sid, email=f"{sid.lower()}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A", attendance=attendance
+        ))
+    parameter = models.MarksParameter(parameter_name="DSA", subject="DSA")
+    db.add(parameter)
+    db.commit()
+    headers = bearer("admin@sage.com")
+    assert client.get("/analytics/ranking/student/S0", headers=headers).json()["rank"] == 3
+
+    response = client.post(f"/marks-parameters/marks/{parameter.id}/bulk", headers=headers, json=[{"student_id": "S0", "score": 100}])
+
+    assert response.status_code == 200
+    ranked = client.get("/analytics/ranking/student/S0", headers=headers).json()
+    assert (ranked["prs_score"], ranked["rank"]) == (20.0, 1)
@@ -0,0 +1,61 @@
+from app import models
+from app.services import risk_batch_engine, risk_snapshot_service
+from conftest import bearer
+
+
+def _students(db, n):
+    for i in range(n):
+        db.add(models.Student(
+            enrollment_no=f"S{i}", name=f"S{i}", email=f"s{i}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A"
+        ))
+    db.commit()
+
+
+def _dashboard(client, **params):
+    return client.get("/analytics/admin/risk-dashboard", params=params, headers=bearer("admin@sage.com")).json()
+
+
+def _refresh_jobs(db):
+    return db.query(models.BackgroundJob).filter(models.BackgroundJob.kind == "risk.refresh_snapshots").count()
+
+
+def test_cold_read_serves_empty_snapshot_and_queues_one_refresh(client, db):
+    _students(db, 3)
+    first = _dashboard(client)
+    second = _dashboard(client)
+
+    assert first["total_students"] == 0 and first["computed_at"] is None
+    assert first["refresh"]["stale_students"] == 3
+    assert first["refresh"]["refresh_job_id"] == second["refresh"]["refresh_job_id"]
+    assert _refresh_jobs(db) == 1
+    assert risk_snapshot_service.is_empty(db)
+
+
+def test_stale_rows_are_served_until_an_explicit_refresh(client, db):
+    _students(db, 3)
+    built = _dashboard(client, refresh="true")
+    assert built["total_students"] == 3 and built["refresh"]["students_processed"] == 3
+
+    risk_snapshot_service.mark_stale(db, ["S1"])
+    db.commit()
+    served = _dashboard(client)
+    assert served["stale_count"] == 1 and served["total_students"] == 3
+    assert served["refresh"]["stale_students"] == 1
+
+    refreshed = _dashboard(client, refresh="true")
+    assert refreshed["refresh"]["students_processed"] == 1
+    assert refreshed["stale_count"] == 0
+    assert _dashboard(client)["refresh"] is None
+
+
+def test_refresh_job_recomputes_stale_rows(db):
+    _students(db, 4)
+    risk_batch_engine.refresh_risk_snapshots(db)
+    risk_snapshot_service.mark_all_stale(db)
+    db.commit()
+
+    result = risk_batch_engine.refresh_snapshots_job(db, {}, None)
+
+    assert result["students_processed"] == 4
+    assert risk_snapshot_service.freshness(db)["stale_count"] == 0
@@ -0,0 +1,80 @@
+import threading
+from datetime import datetime
+
+from app import models
+from app.services.scheduler import Scheduler, parse_cron, next_run
+
+SCHEDULES = {"sweep": ("*/5 * * * *", "engagement.inactivity_sweep", {})}
+SLOT = datetime(2026, 3, 2, 10, 5)
+
+
+def _due(sched: Scheduler, slot: datetime = SLOT) -> Scheduler:
+    sched.entries["sweep"]["next_run"] = slot
+    return sched
+
+
+def _jobs(db):
+    db.expire_all()
+    return db.query(models.BackgroundJob).filter(models.BackgroundJob.kind == "engagement.inactivity_sweep").all()
+
+
+def test_next_run_steps_to_matching_minute():
+    fields = parse_cron("*/5 * * * *")
+    assert next_run(fields, datetime(2026, 3, 2, 10, 1, 30)) == SLOT
+    assert next_run(fields, SLOT) == datetime(2026, 3, 2, 10, 10)
+
+
+def test_same_slot_enqueues_once_across_schedulers(db):
+    first, second = _due(Scheduler(SCHEDULES)), _due(Scheduler(SCHEDULES))
+    first.run_due(SLOT)
+
+    # Even once the first job has finished, the slot stays claimed
+    job = _jobs(db)[0]
+    job.status = "COMPLETED"
+    db.commit()
+    second.run_due(SLOT)
+
+    assert len(_jobs(db)) == 1
+    assert second.entries["sweep"]["skipped"] == 1 and second.entries["sweep"]["last_job_id"] is None
+    runs = db.query(models.ScheduledRun).all()
+    assert [(r.schedule_name, r.job_id) for r in runs] == [("sweep", first.entries["sweep"]["last_job_id"])]
+
+
+def test_concurrent_schedulers_enqueue_one_job_per_slot(db):
+    schedulers = [_due(Scheduler(SCHEDULES)) for _ in range(4)]
+    barrier = threading.Barrier(len(schedulers))
+
+    def fire(sched):
+        barrier.wait()
+        sched.run_due(SLOT)
+
+    threads = [threading.Thread(target=fire, args=(s,)) for s in schedulers]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(_jobs(db)) == 1
+    assert sum(s.entries["sweep"]["skipped"] for s in schedulers) == 3
+    assert db.query(models.ScheduledRun).count() == 1
+
+
+def test_next_slot_enqueues_again_once_previous_job_is_done(db):
+    sched = _due(Scheduler(SCHEDULES))
+    sched.run_due(SLOT)
+    for job in _jobs(db):
+        job.status = "COMPLETED"
+    db.commit()
+
+    _due(sched, datetime(2026, 3, 2, 10, 10)).run_due(datetime(2026, 3, 2, 10, 10))
+    assert len(_jobs(db)) == 2
+    assert db.query(models.ScheduledRun).count() == 2
+
+
+def test_slot_is_skipped_while_previous_job_is_in_flight(db):
+    sched = _due(Scheduler(SCHEDULES))
+    sched.run_due(SLOT)
+    _due(sched, datetime(2026, 3, 2, 10, 10)).run_due(datetime(2026, 3, 2, 10, 10))
+
+    assert len(_jobs(db)) == 1
+    assert sched.entries["sweep"]["skipped"] == 1
@@ -0,0 +1,22 @@
+from app.services import settings_cache
+from conftest import bearer
+
+
+def test_settings_are_read_through_the_settings_cache(client, monkeypatch):
+    # The cache is process-wide; start from a clean slate for this test database
+    monkeypatch.setattr(settings_cache, "_version", None)
+    headers = bearer("admin@sage.com")
+
+    assert client.get("/settings", headers=headers).json() == {
+        "two_factor_auth": False, "session_timeout": True, "registration_alerts": True
+    }
+    update = {"two_factor_auth": True, "session_timeout": False, "registration_alerts": True}
+    assert client.post("/settings", headers=headers, json=update).status_code == 200
+
+    before = settings_cache.stats()
+    assert client.get("/settings", headers=headers).json() == update
+    after = settings_cache.stats()
+    # All three keys come from one snapshot: one version check and one reload for the request
+    assert after["lookups"] - before["lookups"] == 3
+    assert after["version_checks"] - before["version_checks"] == 1
+    assert after["reloads"] - before["reloads"] == 1
@@ -0,0 +1,19 @@
+from app import models
+from app.services import student_identity
+
+
+def test_email_lookup_ignores_case(db):
+    db.add_all([
+        models.Student(enrollment_no="S1", name="S1", email="Foo@x.com", program="B.Tech", branch="CSE", semester=5, section="A"),
+        models.Student(enrollment_no="S2", name="S2", email="bar@x.com", scholar_no="1002", program="B.Tech", branch="CSE", semester=5, section="A"),
+    ])
+    db.commit()
+    index = student_identity.StudentIndex()
+
+    assert index.lookup(db, "foo@x.com") == "S1"
+    assert index.lookup(db, "FOO@X.COM") == "S1"
+    assert index.lookup(db, "foo") == "S1"
+    assert index.lookup(db, "BAR") == "S2"
+    assert index.lookup(db, "1002") == "S2"
+    assert index.lookup(db, "S2") == "S2"
+    assert index.lookup(db, "baz") is None
@@ -0,0 +1,33 @@
+from app import models
+from conftest import bearer
+
+
+def _payload(sid, email):
+    return {
+        "enrollment_no": sid, "name": sid, "email": email,
+        "program": "B.Tech", "branch": "CSE", "semester": 5, "section": "A"
+    }
+
+
+def test_bulk_add_skips_duplicate_emails(client, db):
+    db.add(models.Student(
+        enrollment_no="S0", name="S0", email="taken@example.com",
+        program="B.Tech", branch="CSE", semester=5, section="A"
+    ))
+    db.commit()
+
+    response = client.post("/update/students/bulk-add", headers=bearer("admin@sage.com"), json=[
+        _payload("S0", "s0@example.com"),
+        _payload("S1", "taken@example.com"),
+        _payload("S2", "shared@example.com"),
+        _payload("S3", "shared@example.com"),
+        _payload("S4", "s4@example.com")
+    ])
+
+    assert response.status_code == 200
+    body = response.json()
+    assert body["students_created"] == 2
+    assert sorted((s["student_id"], s["reason"]) for s in body["skipped"]) == [
+        ("S0", "student id exists"), ("S1", "email in use"), ("S3", "email in use")
+    ]
+    assert {sid for (sid,) in db.query(models.Student.enrollment_no).all()} == {"S0", "S2", "S4"}
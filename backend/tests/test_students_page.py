@@ -0,0 +1,31 @@
+from app import models
+from app.services import prs_ranking
+from conftest import bearer
+
+
+def test_keyset_pages_cover_the_ranking_once(client, db):
+    for i in range(5):
+        db.add(models.Student(
+            enrollment_no=f"S{i}", name=f"S{i}", email=f"s{i}@example.com",
+            program="B.Tech", branch="CSE", semester=5, section="A", attendance=(i % 3) * 30
+        ))
+    db.commit()
+    headers = bearer("admin@sage.com")
+
+    cards, cursor = [], None
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        page = client.get("/analytics/students/all", params=params, headers=headers).json()
+        cards.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            break
+
+    expected = [row.student_id for row in prs_ranking.top_k(db, 5)]
+    assert [c["student_id"] for c in cards] == expected
+    assert [c["rank"] for c in cards] == [1, 2, 3, 4, 5]
+
+
+def test_malformed_cursor_is_rejected(client, db):
+    response = client.get("/analytics/students/all", params={"limit": 2, "cursor": "not-a-cursor"}, headers=bearer("admin@sage.com"))
+    assert response.status_code == 400
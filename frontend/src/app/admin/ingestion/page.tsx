@@ -9,6 +9,7 @@ export default function DataIngestion() {
     const router = useRouter();
     const [files, setFiles] = useState<File[]>([]);
     const [loading, setLoading] = useState(false);
+    const [progress, setProgress] = useState('');
     const [status, setStatus] = useState<{ type: 'success' | 'error' | null, message: string }>({ type: null, message: '' });
 
     const handleFileChange = (e: React.ChangeEvent<HTMLInputElement>) => {
@@ -53,10 +54,24 @@ export default function DataIngestion() {
                 body: formData
             });
 
-            const result = await res.json();
+            let result = await res.json();
+
+            // The upload is processed as a background job; poll until it finishes
+            while (res.ok && result.job_id && !['COMPLETED', 'FAILED', 'CANCELLED'].includes(result.status)) {
+                await new Promise(resolve => setTimeout(resolve, 1500));
+                const jobRes = await fetch(`${API_BASE_URL}/ingest/jobs/${result.job_id}`, {
+                    headers: { 'Authorization': `Bearer ${token}` }
+                });
+                if (!jobRes.ok) break;
+                result = await jobRes.json();
+                if (result.progress?.stage) setProgress(`Processing ${result.progress.stage}... (${result.progress.chunks ?? 0} chunks done)`);
+            }
+            setProgress('');
 
-            if (res.ok) {
-                setStatus({ type: 'success', message: result.message || 'Ingestion completed successfully!' });
+            if (res.ok && (result.status === 'FAILED' || result.status === 'CANCELLED')) {
+                setStatus({ type: 'error', message: `Ingestion failed: ${result.error}` });
+            } else if (res.ok) {
+                setStatus({ type: 'success', message: result.status === 'COMPLETED' ? 'Ingestion completed successfully!' : (result.message || 'Ingestion completed successfully!') });
                 setFiles([]);
                 // Trigger a refresh/revalidation of all routes
                 router.refresh();
@@ -208,7 +223,7 @@ export default function DataIngestion() {
                                     {loading ? (
                                         <>
                                             <Loader2 size={24} className="animate-spin" />
-                                            Processing Deep Analysis...
+                                            {progress || 'Processing Deep Analysis...'}
                                         </>
                                     ) : (
                                         <>